@@ -0,0 +1,73 @@
+"""Measure admission decisions under simulated user populations of growing size.
+
+Users send commands with Zipf-distributed activity over a simulated hour, so a few heavy
+users hit their limits while most stay within them; users are spread over 200 guilds. The time
+per decision stays flat as the population grows because each decision touches a fixed number
+of buckets.
+
+```bash
+python -m benchmarks.bench_admission
+```
+"""
+
+import time
+import random
+import asyncio
+import itertools
+
+from rich.table import Table
+from rich.console import Console
+from src.sdk.admission import AdmissionController
+
+console = Console()
+
+COMMANDS = ["oai", "oais", "search", "graph", "sum"]
+
+
+def make_requests(users: int, count: int, guilds: int = 200) -> list[tuple[str, int, int | None]]:
+    rng = random.Random(0)  # noqa: S311
+    weights = list(itertools.accumulate(1 / rank for rank in range(1, users + 1)))
+    senders = rng.choices(range(users), cum_weights=weights, k=count)
+    return [(rng.choice(COMMANDS), user, user % guilds if user % 10 else None) for user in senders]
+
+
+class SimulatedClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def measure(users: int, count: int, duration: float = 3600) -> tuple[float, int, int]:
+    clock = SimulatedClock()
+    controller = AdmissionController(clock=clock)
+    requests = make_requests(users, count)
+    step = duration / count
+    started = time.perf_counter()
+    for command, user, guild in requests:
+        clock.now += step
+        await controller.acquire(command, user, guild)
+    elapsed = time.perf_counter() - started
+    stats = controller.stats()
+    return elapsed, stats.rejected, stats.buckets
+
+
+async def run(count: int = 200_000) -> None:
+    table = Table(title=f"{count:,} admission decisions per population")
+    for column in ("users", "ns / decision", "decisions / s", "rejected", "buckets"):
+        table.add_column(column)
+    for users in (1_000, 10_000, 100_000):
+        elapsed, rejected, buckets = await measure(users, count)
+        table.add_row(
+            f"{users:,}",
+            f"{elapsed / count * 1e9:,.0f}",
+            f"{count / elapsed:,.0f}",
+            f"{rejected / count:.1%}",
+            f"{buckets:,}",
+        )
+    console.print(table)
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,111 @@
+"""Measure event-loop stalls while preparing large image attachments.
+
+"before" reproduces the previous `prepare_content`: a blocking download, a full-resolution
+decode and a PNG re-encode on the event loop, one image at a time. "after" is the
+`ImagePipeline`, with URL pass-through disabled so every image is really processed.
+
+```bash
+python -m benchmarks.bench_images
+```
+"""
+
+import io
+import os
+import time
+import base64
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from PIL import Image
+import requests
+from rich.table import Table
+from rich.console import Console
+from src.sdk.http import close_http_session
+from src.sdk.images import ImagePipeline
+
+console = Console()
+
+
+def make_photo(width: int, height: int) -> bytes:
+    # Noise does not compress, so the file is as large as a real photo of that size.
+    image = Image.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def legacy_prepare(urls: list[str]) -> list[str]:
+    parts = []
+    for url in urls:
+        image = Image.open(io.BytesIO(requests.get(url).content)).convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        parts.append(f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}")
+    return parts
+
+
+def serve_photo(photo: bytes) -> ThreadingHTTPServer:
+    # The server runs in its own thread so the blocking legacy download cannot deadlock it.
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(photo)))
+            self.end_headers()
+            self.wfile.write(photo)
+
+        def log_message(self, *args: object) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def measure_lag(lags: list[float], interval: float = 0.005) -> None:
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - started - interval))
+
+
+async def run(images: int = 4, width: int = 4000, height: int = 3000) -> None:
+    photo = make_photo(width, height)
+
+    server = serve_photo(photo)
+    urls = [f"http://127.0.0.1:{server.server_port}/{index}.jpg" for index in range(images)]
+
+    table = Table(title=f"{images} attachments of {width}x{height} ({len(photo) / 1e6:.1f} MB)")
+    for column in ("path", "wall (s)", "max loop stall (ms)", "total stall (ms)", "payload (KB)"):
+        table.add_column(column)
+
+    for name in ("before", "after"):
+        lags: list[float] = []
+        monitor = asyncio.create_task(measure_lag(lags))
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        if name == "before":
+            # The legacy code blocked the loop, so it runs inline on purpose.
+            payloads = legacy_prepare(urls)
+        else:
+            parts = await ImagePipeline(passthrough_max_bytes=0).prepare(urls)
+            payloads = [part["image_url"]["url"] for part in parts]
+        elapsed = time.perf_counter() - started
+        await asyncio.sleep(0.05)
+        monitor.cancel()
+        table.add_row(
+            name,
+            f"{elapsed:.2f}",
+            f"{max(lags) * 1000:.1f}",
+            f"{sum(lags) * 1000:.1f}",
+            f"{sum(len(payload) for payload in payloads) / 1024:,.0f}",
+        )
+
+    await close_http_session()
+    server.shutdown()
+    console.print(table)
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,245 @@
+"""Fire concurrent `/oai`, `/oais`, `/search`, `/graph` and `/sum` invocations at a fake backend.
+
+The cogs run unmodified against a local OpenAI-compatible server (see `fake_openai`) and
+fake Discord interactions (see `fake_discord`), so the whole path from the command callback
+through the dispatcher, the HTTP client pools and the stream renderer is exercised without
+any network. The server runs on its own event loop in a thread, so the measured event-loop
+lag is the bot's alone. Rate limiting is turned off; everything else uses its defaults.
+
+For every concurrency level it reports per command the latency percentiles and the time
+until the first model output was visible on Discord, and overall the throughput, the
+event-loop lag and the upstream requests and failures.
+
+```bash
+python -m benchmarks.bench_load
+```
+"""
+
+import os
+import time
+import asyncio
+import itertools
+import threading
+import contextlib
+from collections.abc import Callable, Iterator, Awaitable
+
+from rich.table import Table
+from src.sdk.llm import get_llm_services
+from rich.console import Console
+from src.sdk.http import close_http_session
+from src.sdk.clients import client_registry
+from src.cogs.summary import MessageFetcher, SummarizeMenuView
+from src.sdk.admission import admission_controller
+from src.cogs.gen_image import ImageGeneratorCogs
+from src.cogs.gen_reply import ReplyGeneratorCogs
+from src.cogs.gen_search import WebSearchCogs
+
+from benchmarks.fake_openai import MARKER, FakeOpenAI
+from benchmarks.fake_discord import FakeUser, FakeInteraction, make_channel
+
+console = Console()
+
+COMMANDS = ["oai", "oais", "search", "graph", "sum"]
+SUM_HISTORY = 50
+
+
+@contextlib.contextmanager
+def serve_in_thread(server: FakeOpenAI) -> Iterator[FakeOpenAI]:
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, name="fake-openai", daemon=True)
+    thread.start()
+    asyncio.run_coroutine_threadsafe(server.start(), loop).result()
+    try:
+        yield server
+    finally:
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def environment(server: FakeOpenAI) -> dict[str, str]:
+    """The settings that point the bot at the fake server."""
+    return {
+        "OPENAI_API_KEY": "sk-load-test",
+        "OPENAI_BASE_URL": server.base_url,
+        "PERPLEXITY_API_KEY": "pplx-load-test",
+        "PERPLEXITY_BASE_URL": server.pplx_base_url,
+        "DISCORD_BOT_TOKEN": "load-test",
+        # Prompts are unique, but a warm cache from an earlier level must not hide the upstream.
+        "RESPONSE_CACHE_ENABLED": "false",
+    }
+
+
+class FakeBot:
+    def __init__(self) -> None:
+        self.cogs: dict[str, object] = {}
+
+    def get_cog(self, name: str) -> object | None:
+        return self.cogs.get(name)
+
+
+def make_commands(bot: FakeBot) -> dict[str, Callable[[FakeInteraction, str], Awaitable[None]]]:
+    """Build one callable per command that runs the real cog code for an interaction."""
+    # The cogs share services read from the environment, which now points at this server.
+    get_llm_services.cache_clear()
+    reply, search, image = ReplyGeneratorCogs(bot), WebSearchCogs(bot), ImageGeneratorCogs(bot)
+    bot.cogs["MessageFetcher"] = MessageFetcher(bot)
+
+    async def summarize(interaction: FakeInteraction, prompt: str) -> None:
+        view = SummarizeMenuView(bot, interaction)
+        view.history_count = SUM_HISTORY
+        await view.submit.callback(interaction)
+
+    return {
+        "oai": lambda interaction, prompt: ReplyGeneratorCogs.oai.callback(
+            reply, interaction, prompt=prompt, image=None
+        ),
+        "oais": lambda interaction, prompt: ReplyGeneratorCogs.oais.callback(
+            reply, interaction, prompt=prompt, image=None
+        ),
+        "search": lambda interaction, prompt: WebSearchCogs.search.callback(
+            search, interaction, prompt=prompt
+        ),
+        "graph": lambda interaction, prompt: ImageGeneratorCogs.graph.callback(
+            image, interaction, prompt=prompt
+        ),
+        "sum": summarize,
+    }
+
+
+class Result:
+    def __init__(self, command: str, latency: float, visible: float | None, ok: bool) -> None:
+        self.command = command
+        self.latency = latency
+        self.visible = visible
+        self.ok = ok
+
+
+async def invoke(
+    command: str,
+    call: Callable[[FakeInteraction, str], Awaitable[None]],
+    interaction: FakeInteraction,
+    prompt: str,
+) -> Result:
+    started = time.perf_counter()
+    interaction.timeline.started = started
+    try:
+        await call(interaction, prompt)
+    except Exception:
+        return Result(command, time.perf_counter() - started, None, ok=False)
+    latency = time.perf_counter() - started
+    # The cogs report failures as a message, so only an answer that reached the user counts.
+    visible = interaction.timeline.first_seen(MARKER)
+    final = interaction.messages[-1].content if interaction.messages else ""
+    return Result(command, latency, visible, ok=MARKER in final)
+
+
+async def monitor_lag(stop: asyncio.Event, interval: float = 0.01) -> list[float]:
+    """Sample how late the event loop wakes up a sleeping task."""
+    lags = []
+    while not stop.is_set():
+        before = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - before - interval)
+    return lags
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q / 100 * (len(ordered) - 1)))]
+
+
+class LoadReport:
+    def __init__(
+        self, results: list[Result], elapsed: float, lags: list[float], server: FakeOpenAI
+    ) -> None:
+        self.results = results
+        self.elapsed = elapsed
+        self.lags = lags
+        self.upstream = sum(server.requests.values())
+        self.upstream_errors = server.errors
+
+    @property
+    def throughput(self) -> float:
+        return sum(result.ok for result in self.results) / self.elapsed
+
+    def by_command(self) -> dict[str, list[Result]]:
+        return {
+            command: [result for result in self.results if result.command == command]
+            for command in COMMANDS
+        }
+
+
+async def measure(concurrency: int, server: FakeOpenAI, api_latency: float = 0.05) -> LoadReport:
+    """Fire `concurrency` invocations at once, spread evenly over the commands."""
+    calls = make_commands(FakeBot())
+    channels = [make_channel(2000 + index, SUM_HISTORY) for index in range(10)]
+    invocations = []
+    for index, command in zip(range(concurrency), itertools.cycle(COMMANDS), strict=False):
+        interaction = FakeInteraction(
+            command,
+            FakeUser(index),
+            channels[index % len(channels)],
+            guild_id=3000 + index % 20,
+            api_latency=api_latency,
+        )
+        prompt = f"question {index}: how do rockets reach orbit?"
+        invocations.append(invoke(command, calls[command], interaction, prompt))
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(monitor_lag(stop))
+    started = time.perf_counter()
+    results = await asyncio.gather(*invocations)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return LoadReport(list(results), elapsed, await lag_task, server)
+
+
+def add_rows(table: Table, concurrency: int, report: LoadReport) -> None:
+    for command, results in report.by_command().items():
+        latencies = [result.latency for result in results if result.ok]
+        visible = [result.visible for result in results if result.visible is not None]
+        table.add_row(
+            f"{concurrency:,}",
+            command,
+            f"{len(results) - len(latencies)}/{len(results)}",
+            *(f"{percentile(latencies, q):.2f}" for q in (50, 95, 99)),
+            f"{percentile(visible, 50):.2f}",
+            f"{percentile(visible, 95):.2f}",
+        )
+    table.add_section()
+
+
+async def run(levels: tuple[int, ...] = (25, 100, 400)) -> None:
+    commands_table = Table(title="Per command (seconds)")
+    for column in ("concurrency", "command", "failed", "p50", "p95", "p99", "visible p50"):
+        commands_table.add_column(column)
+    commands_table.add_column("visible p95")
+    overall = Table(title="Overall")
+    for column in ("concurrency", "answers / s", "lag p99 ms", "lag max ms", "upstream", "5xx"):
+        overall.add_column(column)
+
+    admission_controller.enabled = False
+    for concurrency in levels:
+        with serve_in_thread(FakeOpenAI()) as server:
+            os.environ.update(environment(server))
+            report = await measure(concurrency, server)
+        add_rows(commands_table, concurrency, report)
+        overall.add_row(
+            f"{concurrency:,}",
+            f"{report.throughput:,.1f}",
+            f"{percentile(report.lags, 99) * 1000:,.1f}",
+            f"{max(report.lags, default=0) * 1000:,.1f}",
+            f"{report.upstream:,}",
+            f"{report.upstream_errors:,}",
+        )
+        await client_registry.aclose()
+    await close_http_session()
+    console.print(commands_table)
+    console.print(overall)
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
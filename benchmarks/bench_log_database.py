@@ -0,0 +1,46 @@
+"""Measure bulk-insert throughput and flush latency of the SQL message sink.
+
+SQLite is used as a local stand-in; pass a `postgresql+asyncpg://` DSN to measure PostgreSQL.
+
+```bash
+python -m benchmarks.bench_log_database
+```
+"""
+
+import asyncio
+from pathlib import Path
+import tempfile
+
+from rich.console import Console
+from src.sdk.log_writer import MessageRecord
+from src.sdk.log_database import SQLMessageSink, dispose_engines
+
+console = Console()
+
+
+def make_record(index: int) -> MessageRecord:
+    return MessageRecord(
+        author=f"user{index % 50}",
+        author_id=str(1143289646042853487 + index % 50),
+        content=f"message number {index} with a little bit of text",
+        created_at="2025-01-01T00:00:00+00:00",
+        channel_name="general",
+        channel_id=str(1143289646042853000 + index % 10),
+        attachments="",
+        stickers="",
+        message_id=str(1300000000000000000 + index),
+    )
+
+
+async def run(dsn: str | None = None, count: int = 100000, batch_size: int = 500) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        sink = SQLMessageSink(dsn=dsn or f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}")
+        records = [make_record(index) for index in range(count)]
+        for offset in range(0, count, batch_size):
+            await sink.write_batch(records[offset : offset + batch_size])
+        await dispose_engines()
+    console.print(sink.stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,90 @@
+"""Compare the per-message pandas CSV path with the batched background writer.
+
+```bash
+python -m benchmarks.bench_log_writer
+```
+"""
+
+import time
+import asyncio
+from pathlib import Path
+import tempfile
+
+import pandas as pd
+from rich.table import Table
+from rich.console import Console
+from src.sdk.log_writer import MessageRecord, CSVMessageSink, MessageLogWriter
+
+console = Console()
+
+
+def make_record(index: int) -> MessageRecord:
+    return MessageRecord(
+        author="wei",
+        author_id="1143289646042853487",
+        content=f"message number {index} with a little bit of text",
+        created_at="2025-01-01T00:00:00+00:00",
+        channel_name="general",
+        channel_id="1143289646042853488",
+        attachments="",
+        stickers="",
+    )
+
+
+async def legacy_save(record: MessageRecord, path: Path) -> None:
+    # The original `_save_message_data` implementation.
+    message_df = pd.DataFrame({key: [value] for key, value in record._asdict().items()})
+    message_df = message_df.astype(str)
+    message_df.to_csv(path, mode="a", header=False, index=False)
+
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def run(count: int = 20000) -> None:
+    records = [make_record(index) for index in range(count)]
+    table = Table(title=f"MessageLogger write path ({count} messages)")
+    for column in ("path", "msgs/sec", "handler p50 (us)", "handler p99 (us)"):
+        table.add_column(column)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = Path(tmp) / "legacy.csv"
+        handler_times = []
+        started = time.perf_counter()
+        for record in records:
+            t0 = time.perf_counter()
+            await legacy_save(record, legacy_path)
+            handler_times.append((time.perf_counter() - t0) * 1e6)
+        elapsed = time.perf_counter() - started
+        table.add_row(
+            "pandas per message",
+            f"{count / elapsed:,.0f}",
+            f"{percentile(handler_times, 0.5):.1f}",
+            f"{percentile(handler_times, 0.99):.1f}",
+        )
+
+        writer = MessageLogWriter(
+            sinks=[CSVMessageSink(path=str(Path(tmp) / "batched.csv"))], overflow="block"
+        )
+        handler_times = []
+        started = time.perf_counter()
+        for record in records:
+            t0 = time.perf_counter()
+            await writer.put(record)
+            handler_times.append((time.perf_counter() - t0) * 1e6)
+        await writer.aclose()
+        elapsed = time.perf_counter() - started
+        table.add_row(
+            "batched writer",
+            f"{count / elapsed:,.0f}",
+            f"{percentile(handler_times, 0.5):.1f}",
+            f"{percentile(handler_times, 0.99):.1f}",
+        )
+    console.print(table)
+    console.print(writer.stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,257 @@
+"""Measure resident memory against guild and member count, with and without the memory budget.
+
+Every configuration runs in a fresh interpreter, which imports the bot and its cogs, builds
+a nextcord client with the caching options of `main` and feeds its connection state
+synthetic GUILD_CREATE payloads (roles, text and voice channels, members, presences and
+voice states) followed by MESSAGE_CREATE payloads. The guild payloads carry every member,
+as if the guilds had been chunked; in budget mode the client drops what it does not cache.
+The table shows the RSS growth over an empty client and the per-cache counts and estimated
+bytes from `cache_usage`.
+
+```bash
+python -m benchmarks.bench_memory
+```
+"""
+
+import gc
+import os
+import sys
+import asyncio
+import resource
+import subprocess
+
+import orjson
+import nextcord
+from rich.table import Table
+from rich.console import Console
+
+from benchmarks.bench_startup import environment
+
+console = Console()
+
+GRID = [(10, 1_000), (100, 1_000), (10, 10_000), (50, 5_000)]
+MESSAGES = 5_000
+BUDGET_MESSAGE_CACHE = 200
+TIMESTAMP = "2025-01-01T00:00:00+00:00"
+
+
+def make_user(user_id: int) -> dict:
+    return {
+        "id": str(user_id),
+        "username": f"user{user_id}",
+        "global_name": f"User {user_id}",
+        "discriminator": "0",
+        "avatar": "a" * 32,
+    }
+
+
+def make_guild(guild_id: int, members: int, roles: int = 10, channels: int = 20) -> dict:
+    """A GUILD_CREATE payload; ids are derived from the guild id so guilds never overlap."""
+    base = guild_id * 10_000_000
+    text_ids = [base + 1_000 + index for index in range(channels)]
+    voice_ids = [base + 2_000, base + 2_001]
+    user_ids = [base + 100_000 + index for index in range(members)]
+    role_ids = [guild_id] + [base + 10 + index for index in range(roles - 1)]
+    return {
+        "id": str(guild_id),
+        "name": f"guild {guild_id}",
+        "owner_id": str(user_ids[0]),
+        "member_count": members,
+        "large": members >= 250,
+        "features": [],
+        "emojis": [],
+        "stickers": [],
+        "threads": [],
+        "roles": [
+            {
+                "id": str(role_id),
+                "name": "@everyone" if role_id == guild_id else f"role {index}",
+                "permissions": "1071698660929",
+                "position": index,
+                "color": 0,
+                "hoist": False,
+                "managed": False,
+                "mentionable": False,
+            }
+            for index, role_id in enumerate(role_ids)
+        ],
+        "channels": [
+            {
+                "id": str(channel_id),
+                "type": 0,
+                "name": f"channel-{index}",
+                "position": index,
+                "permission_overwrites": [],
+                "topic": "A synthetic channel.",
+            }
+            for index, channel_id in enumerate(text_ids)
+        ]
+        + [
+            {
+                "id": str(channel_id),
+                "type": 2,
+                "name": f"voice-{index}",
+                "position": index,
+                "permission_overwrites": [],
+                "bitrate": 64_000,
+                "user_limit": 0,
+            }
+            for index, channel_id in enumerate(voice_ids)
+        ],
+        "members": [
+            {
+                "user": make_user(user_id),
+                "roles": [str(role_ids[1 + index % (roles - 1)])],
+                "joined_at": TIMESTAMP,
+                "deaf": False,
+                "mute": False,
+                "nick": None,
+            }
+            for index, user_id in enumerate(user_ids)
+        ],
+        # A third of the members are online, with one activity each.
+        "presences": [
+            {
+                "user": {"id": str(user_id)},
+                "status": "online",
+                "activities": [{"name": "a game", "type": 0, "created_at": 0}],
+                "client_status": {"desktop": "online"},
+            }
+            for user_id in user_ids[::3]
+        ],
+        "voice_states": [
+            {
+                "user_id": str(user_id),
+                "channel_id": str(voice_ids[index % 2]),
+                "session_id": "session",
+                "deaf": False,
+                "mute": False,
+                "self_deaf": False,
+                "self_mute": False,
+                "self_video": False,
+                "suppress": False,
+            }
+            for index, user_id in enumerate(user_ids[:5])
+        ],
+    }
+
+
+def make_message(message_id: int, guild_id: int, members: int) -> dict:
+    base = guild_id * 10_000_000
+    user_id = base + 100_000 + message_id % members
+    return {
+        "id": str(base + 5_000_000 + message_id),
+        "channel_id": str(base + 1_000 + message_id % 20),
+        "guild_id": str(guild_id),
+        "author": make_user(user_id),
+        "member": {"roles": [], "joined_at": TIMESTAMP, "deaf": False, "mute": False},
+        "content": f"message {message_id} with a few words of text in it",
+        "timestamp": TIMESTAMP,
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "pinned": False,
+        "type": 0,
+    }
+
+
+def rss() -> int:
+    """The resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def feed(client: nextcord.Client, guilds: int, members: int, messages: int) -> None:
+    state = client._connection  # noqa: SLF001
+    for guild_id in range(1, guilds + 1):
+        state._add_guild_from_data(make_guild(guild_id, members))  # noqa: SLF001
+    for message_id in range(messages):
+        state.parse_message_create(make_message(message_id, 1 + message_id % guilds, members))
+
+
+async def measure(budget: bool, guilds: int, members: int) -> dict:
+    """Build the bot's client in this process, fill its caches and report RSS and usage."""
+    from main import DiscordBot, import_modules
+    from src.sdk.memory_budget import cache_usage, cog_classes, client_options, required_intents
+
+    bot = DiscordBot()
+    import_modules(bot.cog_modules)
+    options = client_options(
+        budget, BUDGET_MESSAGE_CACHE if budget else bot.config.message_cache_size
+    )
+    if budget:
+        options["intents"] = required_intents(DiscordBot, *cog_classes(bot.cog_modules))
+    client = nextcord.Client(**options)
+    gc.collect()
+    before = rss()
+    feed(client, guilds, members, MESSAGES)
+    gc.collect()
+    return {
+        "rss": rss() - before,
+        "intents": [name for name, enabled in client.intents if enabled],
+        "usage": [usage.model_dump() for usage in cache_usage(client)],
+    }
+
+
+def run_child(budget: bool, guilds: int, members: int) -> dict:
+    command = [sys.executable, "-m", "benchmarks.bench_memory", "--child"]
+    command += ["budget" if budget else "all", str(guilds), str(members)]
+    result = subprocess.run(  # noqa: S603
+        command,
+        capture_output=True,
+        text=True,
+        env=environment("./data/command_sync.json"),
+        check=True,
+    )
+    return orjson.loads(result.stdout.splitlines()[-1])
+
+
+def run() -> None:
+    table = Table(title=f"Cache memory by guilds and members ({MESSAGES} messages received)")
+    for column in (
+        "guilds",
+        "members/guild",
+        "mode",
+        "RSS growth MB",
+        "members",
+        "users",
+        "messages",
+        "est. cache MB",
+    ):
+        table.add_column(column, justify="right")
+    intents: dict[str, list[str]] = {}
+    for guilds, members in GRID:
+        for budget in (False, True):
+            report = run_child(budget, guilds, members)
+            usage = {entry["cache"]: entry for entry in report["usage"]}
+            mode = "budget" if budget else "all"
+            intents[mode] = report["intents"]
+            table.add_row(
+                str(guilds),
+                f"{members:,}",
+                mode,
+                f"{report['rss'] / 2**20:,.1f}",
+                f"{usage['members']['objects']:,}",
+                f"{usage['users']['objects']:,}",
+                f"{usage['messages']['objects']:,}",
+                f"{sum(entry['bytes'] for entry in usage.values()) / 2**20:,.1f}",
+            )
+    console.print(table)
+    for mode, names in intents.items():
+        console.print(f"intents ({mode}): {', '.join(names)}")
+
+
+if __name__ == "__main__":
+    if "--child" in sys.argv:
+        mode, guilds, members = sys.argv[sys.argv.index("--child") + 1 :]
+        report = asyncio.run(measure(mode == "budget", int(guilds), int(members)))
+        sys.stdout.write(orjson.dumps(report).decode() + "\n")
+    else:
+        run()
@@ -0,0 +1,121 @@
+"""Compare per-author summary lookups against paging the whole channel history.
+
+"before" reproduces the previous `/sum` path for a target user: `channel.history(limit=None)`
+until enough of their messages were seen. "cold" is the first `MessageIndex` lookup, which
+reads the same history once and records it as covered; "warm" is every lookup after that.
+Each history page sleeps to stand in for a Discord API round trip.
+
+```bash
+python -m benchmarks.bench_message_index
+```
+"""
+
+import time
+from types import SimpleNamespace
+import random
+import asyncio
+import datetime
+import tempfile
+from collections.abc import AsyncIterator
+
+from rich.table import Table
+from rich.console import Console
+from src.sdk.log_database import dispose_engines
+from src.sdk.message_index import MessageIndex
+
+console = Console()
+
+BASE_ID = 1300000000000000000
+
+
+class SimulatedChannel:
+    def __init__(self, messages: list[SimpleNamespace], page_latency: float) -> None:
+        self.id = 1143289646042853488
+        self.name = "general"
+        self.messages = messages
+        self.page_latency = page_latency
+        self.pages = 0
+
+    async def history(
+        self,
+        limit: int | None = 100,
+        before: SimpleNamespace | None = None,
+        after: SimpleNamespace | None = None,
+        oldest_first: bool = False,
+    ) -> AsyncIterator[SimpleNamespace]:
+        # Ids are consecutive, so a range of them maps straight onto list positions.
+        upper = before.id - BASE_ID if before is not None else len(self.messages)
+        lower = after.id - BASE_ID + 1 if after is not None else 0
+        # Newest first, in pages of 100 like the Discord API.
+        candidates = self.messages[max(lower, 0) : max(upper, 0)][::-1]
+        if limit is not None:
+            candidates = candidates[:limit]
+        for start in range(0, len(candidates), 100):
+            self.pages += 1
+            await asyncio.sleep(self.page_latency)
+            for message in candidates[start : start + 100]:
+                yield message
+
+
+def make_messages(count: int, authors: int, rare_author: int) -> list[SimpleNamespace]:
+    rng = random.Random(0)  # noqa: S311
+    created_at = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    messages = []
+    for index in range(count):
+        # The rare author posts once per 2000 messages, mostly early in the channel.
+        author_id = rare_author if index % 2000 == 0 else rng.randrange(authors)
+        messages.append(
+            SimpleNamespace(
+                id=BASE_ID + index,
+                author=SimpleNamespace(id=author_id, name=f"user-{author_id}", bot=False),
+                content=f"message {index}",
+                created_at=created_at,
+                attachments=[],
+                embeds=[],
+            )
+        )
+    return messages
+
+
+async def legacy_fetch(channel: SimulatedChannel, author_id: int, limit: int) -> int:
+    found = 0
+    async for message in channel.history(limit=None):
+        if message.author.id == author_id and not message.author.bot:
+            found += 1
+            if found == limit:
+                break
+    return found
+
+
+async def run(count: int = 100_000, limit: int = 50, page_latency: float = 0.002) -> None:
+    rare_author = 10_000
+    channel = SimulatedChannel(make_messages(count, 500, rare_author), page_latency)
+
+    table = Table(title=f"{limit} messages of a rare author in a {count:,}-message channel")
+    for column in ("path", "found", "wall (s)", "API pages", "at 250 ms/page (s)"):
+        table.add_column(column)
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = MessageIndex(dsn=f"sqlite+aiosqlite:///{directory}/index.db")
+        for name in ("before", "cold", "warm"):
+            channel.pages = 0
+            started = time.perf_counter()
+            if name == "before":
+                found = await legacy_fetch(channel, rare_author, limit)
+            else:
+                found = len(await index.recent_by_author(channel, rare_author, limit))
+            elapsed = time.perf_counter() - started
+            table.add_row(
+                name,
+                str(found),
+                f"{elapsed:.2f}",
+                f"{channel.pages:,}",
+                f"{channel.pages * 0.25:,.1f}",
+            )
+        await dispose_engines()
+
+    console.print(table)
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
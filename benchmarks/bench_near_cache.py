@@ -0,0 +1,96 @@
+"""Measure near-duplicate lookup latency with 1M prompts in the index.
+
+Prompts are random sentences drawn from a Zipf-distributed vocabulary; half of the lookups are
+perturbed copies of stored prompts (case, punctuation and spacing changes), the other half
+are fresh sentences.
+
+```bash
+python -m benchmarks.bench_near_cache
+```
+"""
+
+import time
+import random
+import string
+import hashlib
+import itertools
+
+import numpy as np
+from rich.table import Table
+from rich.console import Console
+from src.sdk.near_cache import NearDuplicateIndex
+
+console = Console()
+
+
+def make_vocabulary(rng: random.Random, size: int = 20_000) -> list[str]:
+    return [
+        "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 9)))
+        for _ in range(size)
+    ]
+
+
+def make_prompt(rng: random.Random, vocabulary: list[str], cum_weights: list[float]) -> str:
+    # Word frequencies follow Zipf's law, so common words are shared across many prompts.
+    return " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(6, 14)))
+
+
+def perturb(prompt: str, rng: random.Random) -> str:
+    words = prompt.split()
+    words[0] = words[0].capitalize()
+    return "  ".join(words) + rng.choice(["?", "!!", " ?", "..."])
+
+
+def percentile(samples: list[float], q: float) -> float:
+    return float(np.percentile(samples, q)) * 1000
+
+
+def run(prompts: int = 1_000_000, lookups: int = 2_000, scopes: int = 50) -> None:
+    rng = random.Random(0)  # noqa: S311
+    vocabulary = make_vocabulary(rng)
+    weights = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+    index = NearDuplicateIndex(capacity=prompts)
+    stored: list[tuple[str, str]] = []
+
+    started = time.perf_counter()
+    for number in range(prompts):
+        prompt, scope = make_prompt(rng, vocabulary, weights), f"guild:{number % scopes}"
+        index.add(prompt, key=hashlib.sha256(prompt.encode()).hexdigest(), scope=scope)
+        if number % (prompts // lookups or 1) == 0:
+            stored.append((prompt, scope))
+    insert_seconds = time.perf_counter() - started
+
+    hit_latency, miss_latency, hits, false_hits = [], [], 0, 0
+    for prompt, scope in stored[:lookups]:
+        query = perturb(prompt, rng)
+        started = time.perf_counter()
+        key = index.lookup(query, scope=scope)
+        hit_latency.append(time.perf_counter() - started)
+        hits += key is not None
+
+        fresh = make_prompt(rng, vocabulary, weights)
+        started = time.perf_counter()
+        key = index.lookup(fresh, scope=scope)
+        miss_latency.append(time.perf_counter() - started)
+        false_hits += key is not None
+
+    table = Table(title=f"Near-duplicate index with {prompts:,} prompts in {scopes} guilds")
+    for column in ("metric", "value"):
+        table.add_column(column)
+    table.add_row("insert rate", f"{prompts / insert_seconds:,.0f} prompts/s")
+    table.add_row("index memory", f"{index.stats().memory_bytes / 2**20:,.0f} MiB")
+    table.add_row(
+        "near-duplicate lookup p50 / p99",
+        f"{percentile(hit_latency, 50):.2f} / {percentile(hit_latency, 99):.2f} ms",
+    )
+    table.add_row(
+        "unrelated lookup p50 / p99",
+        f"{percentile(miss_latency, 50):.2f} / {percentile(miss_latency, 99):.2f} ms",
+    )
+    table.add_row("near-duplicate recall", f"{hits / len(hit_latency):.1%}")
+    table.add_row("false hits on unrelated prompts", f"{false_hits / len(miss_latency):.2%}")
+    console.print(table)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,181 @@
+"""Compare the Redis hash helpers against a local Redis stand-in.
+
+A `fakeredis` TCP server runs in a thread on a free port, so every operation crosses a real
+socket. For the same workload of hash writes, reads and key listings it reports ops/sec for:
+
+- the old helpers, which opened a new client (and connection) per call and listed keys with
+  `KEYS *`;
+- the same blocking calls on the client `RedisConfig` now builds once and reuses;
+- `RedisStore` awaiting one command per key;
+- `RedisStore.save_many` / `load_many`, pipelined into one round trip per batch;
+- `RedisStore` with client-side caching, re-reading a small set of hot keys.
+
+```bash
+python -m benchmarks.bench_redis
+```
+"""
+
+import time
+import socket
+import asyncio
+import threading
+import contextlib
+from collections.abc import Iterator
+
+from redis import Redis
+from fakeredis import TcpFakeServer
+from rich.table import Table
+from rich.console import Console
+from redis.asyncio import Redis as AsyncRedis
+from src.sdk.redis_store import RedisStore, dispose_pools, get_async_pool
+
+console = Console()
+
+
+@contextlib.contextmanager
+def fake_redis_server() -> Iterator[str]:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    thread = threading.Thread(target=server.serve_forever, name="fake-redis", daemon=True)
+    thread.start()
+    try:
+        yield f"redis://127.0.0.1:{port}/0"
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def make_items(count: int, prefix: str) -> dict[str, dict[str, str]]:
+    return {
+        f"{prefix}:{index}": {"author": f"user{index % 97}", "content": f"message {index}" * 4}
+        for index in range(count)
+    }
+
+
+def legacy(url: str, items: dict[str, dict[str, str]]) -> dict[str, float]:
+    port = int(url.rsplit(":", 1)[1].split("/", 1)[0])
+
+    def client() -> Redis:
+        # The old `redis_instance` property built a new client on every access.
+        return Redis(host="127.0.0.1", port=port, db=0)
+
+    started = time.perf_counter()
+    for key, data in items.items():
+        client().hset(key, mapping=data)
+    saved = time.perf_counter() - started
+    started = time.perf_counter()
+    for key in items:
+        client().hgetall(key)
+    loaded = time.perf_counter() - started
+    started = time.perf_counter()
+    client().keys("*")
+    listed = time.perf_counter() - started
+    return {"save": saved, "load": loaded, "keys": listed}
+
+
+def pooled(url: str, items: dict[str, dict[str, str]]) -> dict[str, float]:
+    redis = Redis.from_url(url)
+    started = time.perf_counter()
+    for key, data in items.items():
+        redis.hset(key, mapping=data)
+    saved = time.perf_counter() - started
+    started = time.perf_counter()
+    for key in items:
+        redis.hgetall(key)
+    loaded = time.perf_counter() - started
+    started = time.perf_counter()
+    list(redis.scan_iter(match="*", count=500))
+    listed = time.perf_counter() - started
+    redis.close()
+    return {"save": saved, "load": loaded, "keys": listed}
+
+
+async def store_per_key(store: RedisStore, items: dict[str, dict[str, str]]) -> dict[str, float]:
+    started = time.perf_counter()
+    for key, data in items.items():
+        await store.save(key, data)
+    saved = time.perf_counter() - started
+    started = time.perf_counter()
+    for key in items:
+        await store.load(key)
+    loaded = time.perf_counter() - started
+    started = time.perf_counter()
+    await store.keys()
+    listed = time.perf_counter() - started
+    return {"save": saved, "load": loaded, "keys": listed}
+
+
+async def store_pipelined(
+    store: RedisStore, items: dict[str, dict[str, str]], batch: int
+) -> dict[str, float]:
+    keys = list(items)
+    started = time.perf_counter()
+    for offset in range(0, len(keys), batch):
+        await store.save_many({key: items[key] for key in keys[offset : offset + batch]})
+    saved = time.perf_counter() - started
+    started = time.perf_counter()
+    for offset in range(0, len(keys), batch):
+        await store.load_many(keys[offset : offset + batch])
+    loaded = time.perf_counter() - started
+    started = time.perf_counter()
+    await store.keys()
+    listed = time.perf_counter() - started
+    return {"save": saved, "load": loaded, "keys": listed}
+
+
+async def store_cached(store: RedisStore, hot: list[str], reads: int) -> float:
+    started = time.perf_counter()
+    for index in range(reads):
+        await store.load(hot[index % len(hot)])
+    return time.perf_counter() - started
+
+
+async def run_async(url: str, count: int, batch: int) -> dict[str, dict[str, float]]:
+    pool = get_async_pool(url)
+    results = {}
+    store = RedisStore(redis=AsyncRedis(connection_pool=pool))
+    results["RedisStore, one await per key"] = await store_per_key(
+        store, make_items(count, "store")
+    )
+    store = RedisStore(redis=AsyncRedis(connection_pool=pool))
+    results[f"RedisStore, pipelined x{batch}"] = await store_pipelined(
+        store, make_items(count, "batch"), batch
+    )
+    uncached = RedisStore(redis=AsyncRedis(connection_pool=pool))
+    cached = RedisStore(redis=AsyncRedis(connection_pool=pool), cache_ttl=60.0)
+    hot = list(make_items(32, "batch"))
+    results["load of 32 hot keys, no cache"] = {"load": await store_cached(uncached, hot, count)}
+    results["load of 32 hot keys, cached"] = {"load": await store_cached(cached, hot, count)}
+    await dispose_pools()
+    return results
+
+
+def run(count: int = 2_000, batch: int = 100) -> None:
+    with fake_redis_server() as url:
+        results = {
+            "old helpers, new client per call": legacy(url, make_items(count, "legacy")),
+            "blocking helpers, reused client": pooled(url, make_items(count, "pooled")),
+        }
+        results.update(asyncio.run(run_async(url, count, batch)))
+        keyspace = len(list(Redis.from_url(url).scan_iter(count=1000)))
+
+    table = Table(title=f"Redis hash helpers, {count} hashes ({keyspace} keys in the keyspace)")
+    table.add_column("helpers")
+    table.add_column("save ops/s", justify="right")
+    table.add_column("load ops/s", justify="right")
+    table.add_column("list keys ms", justify="right")
+    for name, timings in results.items():
+        table.add_row(
+            name,
+            f"{count / timings['save']:,.0f}" if "save" in timings else "-",
+            f"{count / timings['load']:,.0f}",
+            f"{timings['keys'] * 1000:.1f}" if "keys" in timings else "-",
+        )
+    console.print(table)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,167 @@
+"""Measure the bot's cold start: what `import main` costs and how long until `on_ready`.
+
+The import breakdown comes from `python -X importtime -c "import main"` and lists the
+modules `main` imports directly by their cumulative time. The cold start runs the real bot
+in a fresh interpreter against a fake Discord login and gateway (see `fake_gateway`), once
+as it starts now, with the services and cogs imported while it logs in and connects, and
+once with everything imported up front.
+
+It doubles as a regression gate: it exits with status 1 when `import main` pulls in one of
+`HEAVY_MODULES`, or when `STARTUP_BUDGET` is set and the median time to `on_ready` exceeds
+that many seconds.
+
+```bash
+STARTUP_BUDGET=4 python -m benchmarks.bench_startup
+```
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+import tempfile
+import statistics
+import subprocess
+
+import orjson
+from rich.table import Table
+from rich.console import Console
+
+console = Console()
+
+HEAVY_MODULES = ("openai", "sqlalchemy", "numpy", "redis", "PIL")
+
+
+def environment(sync_file: str) -> dict[str, str]:
+    """Settings for a bot that never reaches a real service; nothing listens on port 9."""
+    return {
+        **os.environ,
+        "COMMAND_SYNC_FILE": sync_file,
+        "OPENAI_API_KEY": "sk-startup",
+        "OPENAI_BASE_URL": "http://127.0.0.1:9/v1",
+        "PERPLEXITY_API_KEY": "pplx-startup",
+        "PERPLEXITY_BASE_URL": "http://127.0.0.1:9",
+        "DISCORD_BOT_TOKEN": "startup",
+        "RESPONSE_CACHE_ENABLED": "false",
+        "POSTGRES_HOST": "localhost",
+        "POSTGRES_PORT": "5432",
+        "POSTGRES_DB": "postgres",
+        "POSTGRES_USER": "postgres",
+        "POSTGRES_PASSWORD": "postgres",
+        "SQLITE_FILE_PATH": "./data/sqlite.db",
+        "REDIS_HOST": "localhost",
+    }
+
+
+def heavy_imports() -> list[str]:
+    """The heavy modules that `import main` loads."""
+    code = f"import sys, main; print(*[m for m in {HEAVY_MODULES!r} if m in sys.modules])"
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return result.stdout.split()
+
+
+def import_breakdown() -> tuple[float, list[tuple[str, float]]]:
+    """Return the seconds `import main` took and the cumulative seconds of its direct imports."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Every module is listed after the modules it imported, indented two spaces per level.
+    total = 0.0
+    children: list[tuple[str, float]] = []
+    imported: list[tuple[str, float]] = []
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].removeprefix(" ")
+        seconds = int(fields[1]) / 1e6
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1:
+            imported.append((name.strip(), seconds))
+        elif depth == 0:
+            if name == "main":
+                total, children = seconds, imported
+            imported = []
+    return total, sorted(children, key=lambda child: child[1], reverse=True)
+
+
+def cold_start(eager: bool, sync_file: str, reconnects: int = 0) -> dict[str, float]:
+    """Start the bot in a fresh interpreter and time its import and its first `on_ready`.
+
+    Args:
+        eager (bool): Import every service and cog before building the bot.
+        sync_file (str): Where the bot keeps the hashes of its synced commands; a missing
+            file makes it sync.
+        reconnects (int): How often the fake gateway fires READY again afterwards.
+
+    Returns:
+        dict[str, float]: Seconds from launch until `main` was imported and until the bot was
+            ready, and the number of cogs and command syncs.
+    """
+    command = [sys.executable, "-m", "benchmarks.fake_gateway", f"--reconnects={reconnects}"]
+    if eager:
+        command.append("--eager")
+    started = time.time()
+    result = subprocess.run(  # noqa: S603
+        command, capture_output=True, text=True, env=environment(sync_file), check=True
+    )
+    line = next(line for line in result.stdout.splitlines() if line.startswith("READY "))
+    report = orjson.loads(line.removeprefix("READY "))
+    return {
+        "imported": report["imported"] - started,
+        "ready": report["ready"] - started,
+        "syncs": report["syncs"],
+        "cogs": len(report["cogs"]),
+    }
+
+
+def run(rounds: int = 3, top: int = 12) -> None:
+    total, children = import_breakdown()
+    table = Table(title=f"import main: {total * 1000:,.0f} ms")
+    for column in ("module", "cumulative ms"):
+        table.add_column(column)
+    for name, seconds in children[:top]:
+        table.add_row(name, f"{seconds * 1000:,.0f}")
+    console.print(table)
+
+    table = Table(title=f"Cold start to on_ready (median of {rounds})")
+    for column in ("imports", "import main ms", "on_ready ms", "cogs", "syncs"):
+        table.add_column(column)
+    ready = {}
+    for eager in (False, True):
+        with tempfile.TemporaryDirectory() as state_dir:
+            # A fresh sync file every time, so every start syncs like the first one.
+            samples = [
+                cold_start(eager, str(Path(state_dir) / f"sync-{index}.json"))
+                for index in range(rounds)
+            ]
+        ready[eager] = statistics.median(sample["ready"] for sample in samples)
+        table.add_row(
+            "up front" if eager else "while connecting",
+            f"{statistics.median(sample['imported'] for sample in samples) * 1000:,.0f}",
+            f"{ready[eager] * 1000:,.0f}",
+            str(samples[-1]["cogs"]),
+            str(samples[-1]["syncs"]),
+        )
+    console.print(table)
+
+    failures = []
+    heavy = heavy_imports()
+    if heavy:
+        failures.append(f"import main loads {', '.join(heavy)}")
+    budget = os.getenv("STARTUP_BUDGET")
+    if budget and ready[False] > float(budget):
+        failures.append(f"on_ready took {ready[False]:.2f} s, over the {budget} s budget")
+    for failure in failures:
+        console.print(f"[red]Regression: {failure}[/red]")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,85 @@
+"""Measure what building a `MessageLogger` costs per message, before and after lazy storage.
+
+Before, every `MessageLogger` built a `DatabaseConfig` through `default_factory`, whose
+class-level PostgreSQL, SQLite and Redis settings were all validated when `src.types.database`
+was imported and copied for every instance, though the logger used none of them. Now the
+logger holds only the message, and the SQL sinks get their DSN from the storage registry,
+which reads the settings of the selected backend once.
+
+```bash
+python -m benchmarks.bench_storage
+```
+"""
+
+import os
+import time
+
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_PORT", "5432")
+os.environ.setdefault("POSTGRES_DB", "postgres")
+os.environ.setdefault("POSTGRES_USER", "postgres")
+os.environ.setdefault("POSTGRES_PASSWORD", "postgres")
+os.environ.setdefault("SQLITE_FILE_PATH", "./data/sqlite.db")
+os.environ.setdefault("REDIS_HOST", "localhost")
+
+import nextcord
+from pydantic import Field, BaseModel
+from rich.table import Table
+from rich.console import Console
+from src.sdk.storage import StorageRegistry
+from src.types.database import RedisConfig, SQLiteConfig, PostgreSQLConfig
+from src.sdk.log_message import MessageLogger
+
+console = Console()
+
+
+class LegacyDatabaseConfig(BaseModel):
+    # The original `DatabaseConfig`.
+    postgres: PostgreSQLConfig = PostgreSQLConfig()
+    sqlite: SQLiteConfig = SQLiteConfig()
+    redis: RedisConfig = RedisConfig()
+
+
+class LegacyMessageLogger(MessageLogger):
+    database: LegacyDatabaseConfig = Field(default_factory=LegacyDatabaseConfig)
+
+
+def per_message(build: object, count: int) -> float:
+    started = time.perf_counter()
+    for _ in range(count):
+        build()
+    return (time.perf_counter() - started) / count
+
+
+def run(count: int = 20_000) -> None:
+    # Validation only checks the type, so an empty message is enough.
+    message = nextcord.Message.__new__(nextcord.Message)
+    storage = StorageRegistry()
+
+    results = {
+        "before: MessageLogger + DatabaseConfig": per_message(
+            lambda: LegacyMessageLogger(message=message), count
+        ),
+        "before: DatabaseConfig().sqlite DSN": per_message(
+            lambda: LegacyDatabaseConfig().sqlite.sqlite_async_dsn, count
+        ),
+        "after: MessageLogger": per_message(lambda: MessageLogger(message=message), count),
+        "after: storage_registry.relational().dsn": per_message(
+            lambda: storage.relational().dsn, count
+        ),
+        "one settings read, now paid once per backend": per_message(
+            lambda: SQLiteConfig().sqlite_async_dsn, count // 10
+        ),
+    }
+
+    table = Table(title=f"Per-message storage overhead ({count} messages)")
+    table.add_column("path")
+    table.add_column("us per message", justify="right")
+    table.add_column("messages/s", justify="right")
+    for name, seconds in results.items():
+        table.add_row(name, f"{seconds * 1e6:.2f}", f"{1 / seconds:,.0f}")
+    console.print(table)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,115 @@
+"""Count Discord edits per answer and end-to-end latency for `/oais` against a fake stream.
+
+The fake message applies Discord's per-channel edit limit (5 edits per 5 seconds) the same
+way nextcord does, by waiting until the bucket resets. All durations are multiplied by
+`time_scale` so the benchmark finishes quickly.
+
+```bash
+python -m benchmarks.bench_stream_renderer
+```
+"""
+
+import time
+import asyncio
+from collections.abc import AsyncGenerator
+
+from rich.table import Table
+from rich.console import Console
+from src.sdk.stream_renderer import StreamRenderer
+
+console = Console()
+
+
+class RateLimitedMessage:
+    def __init__(self, bucket: "EditBucket", content: str = "") -> None:
+        self.bucket = bucket
+        self.content = content
+
+    async def edit(self, content: str) -> None:
+        await self.bucket.acquire()
+        self.content = content
+
+
+class EditBucket:
+    def __init__(self, edits: int, window: float, latency: float) -> None:
+        self.edits = edits
+        self.window = window
+        self.latency = latency
+        self.calls: list[float] = []
+        self.total = 0
+
+    async def acquire(self) -> None:
+        now = time.monotonic()
+        self.calls = [call for call in self.calls if now - call < self.window]
+        if len(self.calls) >= self.edits:
+            await asyncio.sleep(self.window - (now - self.calls[0]))
+        self.calls.append(time.monotonic())
+        self.total += 1
+        await asyncio.sleep(self.latency)
+
+
+async def fake_stream(tokens: int, tokens_per_sec: float) -> AsyncGenerator[str, None]:
+    for index in range(tokens):
+        await asyncio.sleep(1 / tokens_per_sec)
+        yield f"token{index} "
+
+
+async def naive(bucket: EditBucket, tokens: int, tokens_per_sec: float) -> tuple[float, str]:
+    message = RateLimitedMessage(bucket, "生成中...")
+    text = "@user\n"
+    async for token in fake_stream(tokens, tokens_per_sec):
+        text += token
+        await message.edit(content=text)
+    return time.monotonic(), message.content
+
+
+async def rendered(
+    bucket: EditBucket, tokens: int, tokens_per_sec: float, time_scale: float
+) -> tuple[float, str]:
+    message = RateLimitedMessage(bucket, "生成中...")
+    sent: list[RateLimitedMessage] = []
+
+    async def send(content: str) -> RateLimitedMessage:
+        await bucket.acquire()
+        sent.append(RateLimitedMessage(bucket, content))
+        return sent[-1]
+
+    renderer = StreamRenderer(
+        message=message,
+        send=send,
+        content="@user\n",
+        min_interval=1.0 * time_scale,
+        max_interval=5.0 * time_scale,
+        slow_edit_seconds=1.0 * time_scale,
+    )
+    async for token in fake_stream(tokens, tokens_per_sec):
+        renderer.feed(token)
+    await renderer.finish()
+    return time.monotonic(), "".join(m.content for m in [message, *sent])
+
+
+async def run(tokens: int = 400, tokens_per_sec: float = 40.0, time_scale: float = 0.1) -> None:
+    table = Table(title=f"/oais rendering ({tokens} tokens at {tokens_per_sec:g} tok/s)")
+    for column in ("path", "edits", "end-to-end (s)", "after last token (s)"):
+        table.add_column(column)
+
+    stream_seconds = tokens / (tokens_per_sec / time_scale)
+    for name in ("edit per chunk", "stream renderer"):
+        bucket = EditBucket(edits=5, window=5.0 * time_scale, latency=0.08 * time_scale)
+        started = time.monotonic()
+        if name == "edit per chunk":
+            finished, _ = await naive(bucket, tokens, tokens_per_sec / time_scale)
+        else:
+            finished, _ = await rendered(bucket, tokens, tokens_per_sec / time_scale, time_scale)
+        elapsed = (finished - started) / time_scale
+        table.add_row(
+            name,
+            str(bucket.total),
+            f"{elapsed:.2f}",
+            f"{max(0.0, elapsed - stream_seconds / time_scale):.2f}",
+        )
+    console.print(table)
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,65 @@
+"""Measure token counting on chat lines, the unit the summary builders count per message.
+
+"estimate" is the offline estimator, "budget" adds the per-model calibration lookup of
+`TokenBudget.count`, and "tiktoken" is the exact count, measured only when `TOKENIZER_FILE`
+points at an `o200k_base.tiktoken` vocabulary.
+
+```bash
+python -m benchmarks.bench_tokens
+```
+"""
+
+import os
+import time
+import random
+from collections.abc import Callable
+
+from rich.table import Table
+from rich.console import Console
+from src.sdk.tokens import TokenBudget, estimate_tokens
+
+console = Console()
+
+WORDS = ["hello", "world", "今天", "天氣", "真好", "bot", "總結", "一下", "lol", "https://x.com/a"]
+
+
+def make_lines(count: int) -> list[str]:
+    rng = random.Random(0)  # noqa: S311
+    return [
+        f"user-{rng.randrange(50)}: " + " ".join(rng.choices(WORDS, k=rng.randint(3, 40)))
+        for _ in range(count)
+    ]
+
+
+def measure(count: Callable[[str], int], lines: list[str], repeat: int = 5) -> tuple[float, int]:
+    best = float("inf")
+    total = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        total = sum(count(line) for line in lines)
+        best = min(best, time.perf_counter() - started)
+    return best, total
+
+
+def run(count: int = 100_000) -> None:
+    lines = make_lines(count)
+    counters: dict[str, Callable[[str], int]] = {
+        "estimate": estimate_tokens,
+        "budget": TokenBudget().count,
+    }
+    if os.getenv("TOKENIZER_FILE"):
+        counters["tiktoken"] = TokenBudget(tokenizer_file=os.getenv("TOKENIZER_FILE")).count
+
+    table = Table(title=f"Counting {count:,} chat lines")
+    for column in ("counter", "ns / line", "lines / s", "tokens"):
+        table.add_column(column)
+    for name, counter in counters.items():
+        elapsed, tokens = measure(counter, lines)
+        table.add_row(
+            name, f"{elapsed / count * 1e9:,.0f}", f"{count / elapsed:,.0f}", f"{tokens:,}"
+        )
+    console.print(table)
+
+
+if __name__ == "__main__":
+    run()
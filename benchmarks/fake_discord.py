@@ -0,0 +1,146 @@
+"""Fake Discord interactions and messages for offline benchmarks.
+
+They implement the parts of nextcord's `Interaction` and `Message` the cogs use. Every reply,
+edit and follow-up takes `api_latency` seconds, like a REST call to Discord, and is recorded
+with its time on the interaction's timeline so a harness can tell when users first saw the
+model's answer.
+"""
+
+import time
+from types import SimpleNamespace
+import asyncio
+import datetime
+import itertools
+from collections.abc import AsyncIterator
+
+_ids = itertools.count(1300000000000000000)
+
+
+class Timeline:
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.events: list[tuple[float, str]] = []
+
+    def record(self, content: str) -> None:
+        self.events.append((time.perf_counter() - self.started, content))
+
+    def first_seen(self, marker: str) -> float | None:
+        """Seconds from the start until content containing `marker` was first visible."""
+        return next((at for at, content in self.events if marker in content), None)
+
+
+class FakeUser:
+    def __init__(self, user_id: int, bot: bool = False) -> None:
+        self.id = user_id
+        self.name = f"user-{user_id}"
+        self.display_name = self.name
+        self.mention = f"<@{user_id}>"
+        self.bot = bot
+
+
+class FakeMessage:
+    def __init__(
+        self, timeline: Timeline, content: str = "", api_latency: float = 0.0, **fields: object
+    ) -> None:
+        self.id = next(_ids)
+        self.timeline = timeline
+        self.content = content
+        self.api_latency = api_latency
+        self.author = fields.get("author")
+        self.created_at = fields.get("created_at", datetime.datetime.now(datetime.timezone.utc))
+        self.attachments: list = []
+        self.embeds: list = []
+        self.stickers: list = []
+
+    async def edit(self, content: str | None = None, **kwargs: object) -> "FakeMessage":
+        await asyncio.sleep(self.api_latency)
+        if content is not None:
+            self.content = content
+            self.timeline.record(content)
+        return self
+
+
+class FakeChannel:
+    """A channel whose history is served newest first from a list of messages."""
+
+    def __init__(self, channel_id: int, messages: list[FakeMessage]) -> None:
+        self.id = channel_id
+        self.name = f"channel-{channel_id}"
+        self.messages = messages
+
+    async def history(
+        self, limit: int | None = 100, **kwargs: object
+    ) -> AsyncIterator[FakeMessage]:
+        for message in reversed(self.messages[-limit:] if limit else self.messages):
+            yield message
+
+
+def make_channel(channel_id: int, count: int, authors: int = 5) -> FakeChannel:
+    timeline = Timeline()
+    started = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    messages = [
+        FakeMessage(
+            timeline,
+            f"message {index} about the release schedule and who reviews what",
+            author=FakeUser(1000 + index % authors),
+            created_at=started + datetime.timedelta(minutes=index),
+        )
+        for index in range(count)
+    ]
+    return FakeChannel(channel_id, messages)
+
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction") -> None:
+        self.interaction = interaction
+        self.done = False
+
+    def is_done(self) -> bool:
+        return self.done
+
+    async def send_message(self, content: str | None = None, **kwargs: object) -> FakeMessage:
+        if self.done:
+            raise RuntimeError("This interaction has already been responded to before")
+        self.done = True
+        return await self.interaction.followup.send(content or "")
+
+    async def defer(self, **kwargs: object) -> None:
+        if self.done:
+            raise RuntimeError("This interaction has already been responded to before")
+        self.done = True
+        await asyncio.sleep(self.interaction.api_latency)
+
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction") -> None:
+        self.interaction = interaction
+
+    async def send(self, content: str | None = None, **kwargs: object) -> FakeMessage:
+        interaction = self.interaction
+        await asyncio.sleep(interaction.api_latency)
+        message = FakeMessage(interaction.timeline, content or "", interaction.api_latency)
+        interaction.messages.append(message)
+        interaction.timeline.record(message.content)
+        return message
+
+
+class FakeInteraction:
+    def __init__(
+        self,
+        command: str,
+        user: FakeUser,
+        channel: FakeChannel,
+        guild_id: int | None = None,
+        api_latency: float = 0.05,
+    ) -> None:
+        self.application_command = SimpleNamespace(name=command)
+        self.user = user
+        self.channel = channel
+        self.channel_id = channel.id
+        self.guild_id = guild_id
+        self.message = None
+        self.api_latency = api_latency
+        self.timeline = Timeline()
+        self.messages: list[FakeMessage] = []
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
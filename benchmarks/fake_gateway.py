@@ -0,0 +1,120 @@
+"""A stand-in for Discord's login and gateway, for measuring how the bot starts.
+
+`FakeGateway.attach` replaces the network calls of a bot: logging in and connecting sleep for
+a configurable round trip, connecting then fires `on_ready` like the gateway's READY event
+(again for every simulated reconnect), and the application info and command syncs are
+answered locally and counted.
+
+Run as a module it starts the real bot against the fake gateway in a fresh interpreter and
+prints one `READY` line of JSON with wall-clock timestamps, so a parent process can measure
+the whole cold start, interpreter and imports included. `--eager` imports every service and
+cog before the bot is built, the way `main` used to, and `--reconnects=N` fires READY again
+N times after the first. `--report-dir=DIR` writes the report to `DIR/<pid>.json` instead,
+for processes started by the cluster launcher, whose output is not captured.
+
+```bash
+python -m benchmarks.fake_gateway --eager --reconnects=2
+```
+"""
+
+import os
+import sys
+import time
+from types import SimpleNamespace
+import asyncio
+from pathlib import Path
+import importlib
+
+import orjson
+from nextcord.ext import commands
+
+from benchmarks.fake_discord import FakeUser
+
+
+class FakeGateway:
+    def __init__(
+        self,
+        login_seconds: float = 0.2,
+        ready_seconds: float = 0.8,
+        sync_seconds: float = 0.3,
+        reconnects: int = 0,
+    ) -> None:
+        self.login_seconds = login_seconds
+        self.ready_seconds = ready_seconds
+        self.sync_seconds = sync_seconds
+        self.reconnects = reconnects
+        self.syncs = 0
+        self.ready_at: float | None = None
+        self.bot: commands.Bot | None = None
+
+    def attach(self, bot: commands.Bot) -> None:
+        self.bot = bot
+        bot.login = self.login
+        bot.connect = self.connect
+        bot.application_info = self.application_info
+        bot.sync_application_commands = self.sync_application_commands
+
+    async def login(self, token: str) -> None:
+        await asyncio.sleep(self.login_seconds)
+        self.bot._connection.application_id = 1  # noqa: SLF001
+
+    async def connect(self, *, reconnect: bool = True) -> None:
+        await asyncio.sleep(self.ready_seconds)
+        self.bot._connection.user = FakeUser(1, bot=True)  # noqa: SLF001
+        await self.bot.on_ready()
+        self.ready_at = time.time()
+        for _ in range(self.reconnects):
+            await asyncio.sleep(self.ready_seconds)
+            await self.bot.on_ready()
+
+    async def application_info(self) -> SimpleNamespace:
+        return SimpleNamespace(id=1)
+
+    async def sync_application_commands(self, **kwargs: object) -> None:
+        await asyncio.sleep(self.sync_seconds)
+        self.syncs += 1
+
+
+async def boot(eager: bool, reconnects: int = 0) -> dict[str, object]:
+    """Import `main`, start its bot against a fake gateway and report when it was ready."""
+    bot_module = importlib.import_module("main")
+    if eager:
+        bot_module.import_modules(list(bot_module.SERVICE_MODULES))
+    imported = time.time()
+    bot = bot_module.DiscordBot()
+    if eager:
+        bot_module.import_modules(bot.cog_modules)
+    gateway = FakeGateway(reconnects=reconnects)
+    gateway.attach(bot)
+    await bot.start("token")
+    from src.sdk.cache import response_cache
+    from src.sdk.admission import admission_controller
+
+    report = {
+        "pid": os.getpid(),
+        "imported": imported,
+        "ready": gateway.ready_at,
+        "syncs": gateway.syncs,
+        "cogs": sorted(bot.cogs),
+        "commands": len(bot.get_all_application_commands()),
+        "shard_count": bot.shard_count,
+        "shard_ids": bot.shard_ids,
+        "shared_state": admission_controller.redis is not None
+        and response_cache.redis is not None,
+    }
+    await bot.close()
+    return report
+
+
+if __name__ == "__main__":
+    reconnects = next(
+        (int(arg.split("=", 1)[1]) for arg in sys.argv if arg.startswith("--reconnects=")), 0
+    )
+    report_dir = next(
+        (arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--report-dir=")), None
+    )
+    report = asyncio.run(boot(eager="--eager" in sys.argv, reconnects=reconnects))
+    if report_dir is None:
+        sys.stdout.write("READY " + orjson.dumps(report).decode() + "\n")
+    else:
+        (Path(report_dir) / f"{os.getpid()}.json").write_bytes(orjson.dumps(report))
@@ -0,0 +1,151 @@
+"""A local OpenAI-compatible server for offline benchmarks.
+
+It serves chat completions (plain and streamed as server-sent events), image generations and
+Perplexity-style chat completions (no `/v1` prefix, with citations). Latency and failures are
+configurable: the time to first token, the tokens per second of the reply, the time an image
+takes and the share of requests that fail with a 500, which the OpenAI client retries.
+
+Every generated token starts with `MARKER`, so a harness can tell model output apart from
+placeholders such as "生成中..." in what the bot shows.
+"""
+
+import time
+import random
+import asyncio
+import itertools
+from collections import Counter
+
+import orjson
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+MARKER = "lorem"
+
+
+class FakeOpenAI:
+    def __init__(
+        self,
+        ttft: float = 0.2,
+        tokens_per_sec: float = 50.0,
+        reply_tokens: int = 40,
+        image_seconds: float = 1.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.reply_tokens = reply_tokens
+        self.image_seconds = image_seconds
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)  # noqa: S311
+        self.ids = itertools.count(1)
+        self.requests: Counter[str] = Counter()
+        self.errors = 0
+        self.server: TestServer | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.port}/v1"
+
+    @property
+    def pplx_base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.port}"
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.chat)
+        app.router.add_post("/v1/images/generations", self.images)
+        app.router.add_post("/chat/completions", self.search)
+        self.server = TestServer(app, host="127.0.0.1")
+        await self.server.start_server()
+
+    async def close(self) -> None:
+        await self.server.close()
+
+    def _fail(self, endpoint: str) -> web.Response | None:
+        self.requests[endpoint] += 1
+        if self.rng.random() >= self.error_rate:
+            return None
+        self.errors += 1
+        return web.json_response(
+            {"error": {"message": "The server had an error.", "type": "server_error"}}, status=500
+        )
+
+    def _tokens(self) -> list[str]:
+        return [f"{MARKER}{index} " for index in range(self.reply_tokens)]
+
+    def _usage(self, body: dict) -> dict[str, int]:
+        prompt_tokens = len(orjson.dumps(body["messages"])) // 4
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": self.reply_tokens,
+            "total_tokens": prompt_tokens + self.reply_tokens,
+        }
+
+    def _completion(self, body: dict, **extra: object) -> dict:
+        return {
+            "id": f"chatcmpl-{next(self.ids)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": "".join(self._tokens())},
+                }
+            ],
+            "usage": self._usage(body),
+            **extra,
+        }
+
+    async def _generate(self) -> None:
+        await asyncio.sleep(self.ttft + self.reply_tokens / self.tokens_per_sec)
+
+    async def chat(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        failure = self._fail("chat")
+        if failure is not None:
+            return failure
+        if not body.get("stream"):
+            await self._generate()
+            return web.json_response(self._completion(body))
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        chunk = {
+            "id": f"chatcmpl-{next(self.ids)}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body["model"],
+        }
+        await asyncio.sleep(self.ttft)
+        for token in self._tokens():
+            delta = {"index": 0, "delta": {"content": token}, "finish_reason": None}
+            await response.write(b"data: " + orjson.dumps({**chunk, "choices": [delta]}) + b"\n\n")
+            await asyncio.sleep(1 / self.tokens_per_sec)
+        if body.get("stream_options", {}).get("include_usage"):
+            usage = {**chunk, "choices": [], "usage": self._usage(body)}
+            await response.write(b"data: " + orjson.dumps(usage) + b"\n\n")
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    async def search(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        failure = self._fail("search")
+        if failure is not None:
+            return failure
+        await self._generate()
+        return web.json_response(
+            self._completion(body, citations=["https://example.com/lorem-ipsum"])
+        )
+
+    async def images(self, request: web.Request) -> web.Response:
+        await request.json()
+        failure = self._fail("images")
+        if failure is not None:
+            return failure
+        await asyncio.sleep(self.image_seconds)
+        return web.json_response({
+            "created": int(time.time()),
+            "data": [{"url": f"https://images.example.com/{MARKER}-{next(self.ids)}.png"}],
+        })
@@ -0,0 +1,32 @@
+import signal
+import asyncio
+
+import logfire
+
+logfire.configure(send_to_logfire=False, scrubbing=False)
+
+from src.sdk.cluster import ClusterLauncher, recommended_shard_count
+from src.types.config import get_config
+
+
+async def main() -> None:
+    """Run the bot's shards in `CLUSTER_PROCESSES` processes until they exit or we are stopped."""
+    config = get_config()
+    shard_count = config.shard_count
+    if shard_count == "auto":
+        shard_count = await recommended_shard_count(config.discord_bot_token)
+    launcher = ClusterLauncher(shard_count=shard_count, processes=config.cluster_processes)
+    logfire.info("Cluster Starting", shard_count=shard_count, processes=launcher.processes)
+
+    running = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, running.cancel)
+    try:
+        await launcher.run()
+    except asyncio.CancelledError:
+        logfire.info("Cluster Stopped", **launcher.stats().model_dump())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
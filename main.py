@@ -1,8 +1,11 @@
 import os
+import time
+import asyncio
 import logging
 from pathlib import Path
 import secrets
 import platform
+import importlib
 
 import logfire
 
@@ -11,31 +14,157 @@ logfire.configure(send_to_logfire=False, scrubbing=False)
 from logfire import LogfireLoggingHandler
 import nextcord
 from nextcord.ext import tasks, commands
-from src.types.config import Config
-from src.sdk.log_message import MessageLogger
+from src.types.config import get_config
+from src.sdk.memory_budget import client_options, required_intents
 
 logging.getLogger("sqlalchemy.engine.Engine").disabled = True
 
+# The services pull in openai, SQLAlchemy, numpy and redis. They are imported by `prepare`
+# in a worker thread while the bot logs in and connects, not when this module is imported.
+SERVICE_MODULES = (
+    "src.sdk.llm",
+    "src.sdk.memory",
+    "src.sdk.admission",
+    "src.sdk.log_message",
+    "src.sdk.log_database",
+    "src.sdk.message_index",
+    "src.sdk.lifecycle",
+    "src.sdk.storage",
+)
 
-class DiscordBot(commands.Bot):
+
+def import_modules(names: list[str]) -> None:
+    """Import the modules one after another; the first failure is raised."""
+    for name in names:
+        importlib.import_module(name)
+
+
+class DiscordBot(commands.AutoShardedBot):
     def __init__(self) -> None:
+        config = get_config()
+        # 預設只有一個 shard；SHARD_COUNT=auto 時由 Discord 建議 shard 數量，
+        # SHARD_IDS 則由 cluster launcher 設定，讓每個 process 只跑自己的 shards
+        # 預設啟用所有 Intents；MEMORY_BUDGET 時只啟用 cogs 需要的 Intents
         super().__init__(
             command_prefix=commands.when_mentioned_or("!"),
-            intents=nextcord.Intents.all(),  # 啟用所有 Intents
+            **client_options(
+                config.memory_budget, config.message_cache_size, required_intents(type(self))
+            ),
             help_command=None,
             description="A Discord bot made with Nextcord.",
+            shard_count=None if config.shard_count == "auto" else config.shard_count,
+            shard_ids=config.shard_ids,
         )
-        self.config = Config()
+        self.config = config
+        self.cog_modules = [
+            f"src.cogs.{f.stem}"
+            for f in Path("./src/cogs").glob("*.py")
+            if not f.stem.startswith("__")
+        ]
+        self.prepared: asyncio.Task[None] | None = None
         self.logger = logging.getLogger("nextcord.state")
         self.logger.setLevel(logging.INFO)
         self.logger.addHandler(LogfireLoggingHandler())
 
+    @property
+    def clustered(self) -> bool:
+        """Whether the other shards run in other processes, which share state through Redis."""
+        return self.config.shard_ids is not None
+
+    @property
+    def is_primary(self) -> bool:
+        """Whether this process runs shard 0 and so does the once-per-bot work."""
+        return self.shard_ids is None or 0 in self.shard_ids
+
+    async def start(self, token: str, *, reconnect: bool = True) -> None:
+        """Log in and connect while `prepare` imports the services and cogs."""
+        self.prepared = asyncio.create_task(self.prepare(), name="prepare")
+        await self.login(token)
+        if self.config.memory_budget:
+            # The intents are derived from the cogs, so IDENTIFY waits until they are imported.
+            await self.prepared
+            self.apply_required_intents()
+        # A failed import ends `start`, and `run` then closes the connection.
+        await asyncio.gather(self.prepared, self.connect(reconnect=reconnect))
+
+    async def prepare(self) -> None:
+        """Import the services and cogs in a worker thread, then configure the shared singletons."""
+        started = time.perf_counter()
+        await asyncio.to_thread(import_modules, [*SERVICE_MODULES, *self.cog_modules])
+        self.configure_services()
+        logfire.info("Services Prepared", seconds=round(time.perf_counter() - started, 3))
+
+    def apply_required_intents(self) -> None:
+        """Ask the gateway only for the intents this bot and its cogs need."""
+        from src.sdk.memory_budget import cog_classes
+
+        intents = required_intents(type(self), *cog_classes(self.cog_modules))
+        self._connection._intents = intents  # noqa: SLF001
+        logfire.info("Intents Derived", intents=[name for name, enabled in intents if enabled])
+
+    def configure_services(self) -> None:
+        from src.sdk.cache import response_cache
+        from src.sdk.memory import conversation_memory
+        from src.sdk.tokens import token_budget
+        from src.sdk.storage import storage_registry
+        from src.sdk.admission import admission_controller
+        from src.sdk.lifecycle import command_sync
+        from src.sdk.dispatcher import llm_dispatcher
+        from src.sdk.log_writer import message_log_writer
+        from src.sdk.near_cache import near_duplicate_index
+        from src.sdk.log_message import build_message_sinks
+        from src.sdk.asst_registry import assistant_registry
+        from src.sdk.message_index import message_index
+
+        # Backends are only built, and their settings only read, once they are asked for.
+        message_index.enabled = self.config.message_index_enabled
+        if message_index.enabled:
+            storage_registry.selected["relational"] = self.config.message_index
+            message_index.dsn = storage_registry.relational().dsn
+        message_log_writer.sinks = build_message_sinks(
+            sink_names=self.config.message_log_sinks,
+            storage=storage_registry,
+            index=message_index if message_index.enabled else None,
+        )
+        response_cache.ttl_seconds = self.config.response_cache_ttl
+        near_duplicate_index.ttl_seconds = self.config.response_cache_ttl
+        near_duplicate_index.threshold = self.config.near_cache_threshold
+        token_budget.tokenizer_file = self.config.tokenizer_file
+        conversation_memory.max_turns = self.config.conversation_memory_turns
+        # Shards in other processes see the same rate limits, caches and assistant threads.
+        shared = self.clustered
+        if self.config.conversation_memory_enabled:
+            conversation_memory.redis = storage_registry.kv().client
+        if self.config.response_cache_redis or shared:
+            response_cache.redis = storage_registry.kv().client
+        admission_controller.enabled = self.config.rate_limit_enabled
+        if self.config.rate_limit_redis or shared:
+            admission_controller.redis = storage_registry.kv().client
+        if shared:
+            assistant_registry.redis = storage_registry.kv().client
+        llm_dispatcher.concurrency = self.config.dispatch_concurrency
+        llm_dispatcher.limits = self.config.dispatch_limits
+        llm_dispatcher.max_queue = self.config.dispatch_max_queue
+        command_sync.state_file = self.config.command_sync_file
+        assistant_registry.path = self.config.assistant_registry_file
+
     async def on_connect(self) -> None:
         logfire.info("Bot Connected", bot_name=self.user.name, bot_id=self.user.id)
 
+    async def on_disconnect(self) -> None:
+        from src.sdk.message_index import message_index
+
+        # Messages sent while a shard is away are never logged, so /sum must fetch that stretch.
+        message_index.end_live()
+
     async def on_ready(self) -> None:
+        from src.sdk.lifecycle import lifecycle
+
+        # `on_ready` fires again after every gateway reconnect, but the setup runs only once.
+        if not await lifecycle.once("setup", self.setup_hook):
+            logfire.info("Bot Reconnected", bot_name=self.user.name, bot_id=self.user.id)
+            return
         app_info = await self.application_info()
-        await self.setup_hook()
         invite_url = (
             f"https://discord.com/oauth2/authorize?client_id={app_info.id}&permissions=8&scope=bot"
         )
@@ -47,23 +176,93 @@ class DiscordBot(commands.Bot):
         return await super().on_guild_available(guild)
 
     async def load_cogs(self) -> None:
-        cog_path = Path("./src/cogs")
-        cog_files = [
-            f"src.cogs.{f.stem}" for f in cog_path.glob("*.py") if not f.stem.startswith("__")
-        ]
-        self.load_extensions(cog_files, stop_at_error=True)
-        # for cog_file in cog_files:
-        #     filename = f"src.cogs.{cog_file}"
-        #     self.load_extension(filename)
-        logfire.info("Cogs Loaded", cog_files=", ".join(cog_files))
+        # Their imports are cached by `prepare`; the async `setup` of each cog runs as its own task.
+        # A setup retried after a failure keeps the cogs that were loaded before it failed.
+        pending = [name for name in self.cog_modules if name not in self.extensions]
+        self.load_extensions(pending, stop_at_error=True)
+        logfire.info("Cogs Loaded", cog_files=", ".join(self.cog_modules))
 
     @tasks.loop(minutes=1.0)
     async def status_task(self) -> None:
         """Setup the game status task of the bot."""
+        from src.sdk.cache import response_cache
+        from src.sdk.memory import conversation_memory
+        from src.sdk.tokens import token_budget
+        from src.sdk.clients import client_registry
+        from src.sdk.cluster import register_shards
+        from src.sdk.storage import storage_registry
+        from src.sdk.admission import admission_controller
+        from src.sdk.lifecycle import command_sync
+        from src.sdk.dispatcher import llm_dispatcher
+        from src.sdk.log_writer import message_log_writer
+        from src.sdk.near_cache import near_duplicate_index
+        from src.sdk.log_database import SQLMessageSink
+        from src.sdk.singleflight import request_flights
+        from src.sdk.memory_budget import cache_usage
+        from src.sdk.message_index import message_index
+        from src.sdk.attachment_store import attachment_store
+
         statuses = ["your mama"]
         random_status = secrets.choice(statuses)
         await self.change_presence(activity=nextcord.Game(random_status))
         logfire.info("Status Changed", new_status=self.activity.name)
+        for pool_stats in client_registry.stats():
+            logfire.info("Client Pool Stats", **pool_stats.model_dump())
+        logfire.info("Message Log Writer Stats", **message_log_writer.stats().model_dump())
+        for sink in message_log_writer.sinks:
+            if isinstance(sink, SQLMessageSink):
+                logfire.info(
+                    "SQL Message Sink Stats",
+                    sink=type(sink).__name__,
+                    database=sink.engine.dialect.name,
+                    **sink.stats().model_dump(),
+                )
+        logfire.info("Attachment Store Stats", **attachment_store.stats().model_dump())
+        logfire.info("Response Cache Stats", **response_cache.stats().model_dump())
+        logfire.info("Near Cache Stats", **near_duplicate_index.stats().model_dump())
+        logfire.info("Message Index Stats", **message_index.index_stats().model_dump())
+        logfire.info("Token Usage Stats", **token_budget.stats().model_dump())
+        logfire.info("Conversation Memory Stats", **conversation_memory.stats().model_dump())
+        logfire.info("Admission Stats", **admission_controller.stats().model_dump())
+        logfire.info("Request Coalescing Stats", **request_flights.stats().model_dump())
+        for lane_stats in llm_dispatcher.stats():
+            logfire.info("Dispatch Lane Stats", **lane_stats.model_dump())
+        logfire.info("Command Sync Stats", **command_sync.stats().model_dump())
+        for health in await storage_registry.health():
+            logfire.info("Storage Health", **health.model_dump())
+        for usage in cache_usage(self):
+            logfire.info("Cache Usage", **usage.model_dump())
+        if self.clustered:
+            await register_shards(storage_registry.kv().client, self)
+
+    async def load_cache_snapshots(self) -> None:
+        """Restore the response cache and near-duplicate index saved by the last run."""
+        from src.sdk.cache import response_cache
+        from src.sdk.near_cache import near_duplicate_index
+
+        if not self.config.response_cache_enabled:
+            return
+        snapshot_dir = Path(self.config.cache_snapshot_dir)
+        restored = await asyncio.to_thread(
+            response_cache.load, str(snapshot_dir / "responses.json")
+        )
+        if self.config.near_cache_enabled:
+            await asyncio.to_thread(near_duplicate_index.load, str(snapshot_dir / "near.npz"))
+        logfire.info("Cache Snapshots Loaded", responses=restored)
+
+    @tasks.loop(minutes=10.0)
+    async def snapshot_task(self) -> None:
+        """Periodically snapshot the caches so a restart does not start cold."""
+        from src.sdk.cache import response_cache
+        from src.sdk.near_cache import near_duplicate_index
+
+        # Only one process of a cluster writes the snapshot files.
+        if not self.config.response_cache_enabled or not self.is_primary:
+            return
+        snapshot_dir = Path(self.config.cache_snapshot_dir)
+        await response_cache.save(str(snapshot_dir / "responses.json"))
+        if self.config.near_cache_enabled:
+            await near_duplicate_index.save(str(snapshot_dir / "near.npz"))
 
     @status_task.before_loop
     async def before_status_task(self) -> None:
@@ -79,21 +278,73 @@ class DiscordBot(commands.Bot):
             python_version=platform.python_version(),
             system=f"{platform.system()} {platform.release()} ({os.name})",
         )
+        from src.sdk.llm import get_llm_services
+        from src.sdk.cluster import register_shards
+        from src.sdk.metrics import metrics
+        from src.sdk.storage import storage_registry
+        from src.sdk.lifecycle import command_sync
+
+        await self.prepared
         await self.load_cogs()
-        guild_id = None
-        if self.config.discord_test_server_id:
-            guild_id = self.get_guild(self.config.discord_test_server_id)
-        # await self.tree.sync(guild=guild)
-        await self.sync_application_commands(guild_id=guild_id)
-        self.status_task.start()
+        await get_llm_services().warmup()
+        await self.load_cache_snapshots()
+        if self.config.metrics_port is not None:
+            # Every process of a cluster serves its own endpoint, on the next port up.
+            port = await metrics.serve(
+                host=self.config.metrics_host,
+                port=self.config.metrics_port + self.config.cluster_id,
+            )
+            logfire.info(
+                "Metrics Endpoint Started", url=f"http://{self.config.metrics_host}:{port}/metrics"
+            )
+        if self.is_primary:
+            await command_sync.sync(self)
+            if self.config.discord_test_server_id:
+                await command_sync.sync(self, guild_id=int(self.config.discord_test_server_id))
+        if self.clustered:
+            await register_shards(storage_registry.kv().client, self)
+        for task in (self.status_task, self.snapshot_task):
+            if not task.is_running():
+                task.start()
+
+    async def close(self) -> None:
+        """Flush pending message logs and close the shared connection pools before shutting down."""
+        from src.sdk.http import close_http_session
+        from src.sdk.cache import response_cache
+        from src.sdk.memory import conversation_memory
+        from src.sdk.clients import client_registry
+        from src.sdk.metrics import metrics
+        from src.sdk.storage import storage_registry
+        from src.sdk.admission import admission_controller
+        from src.sdk.log_writer import message_log_writer
+        from src.sdk.redis_store import dispose_pools
+        from src.sdk.log_database import dispose_engines
+
+        await message_log_writer.aclose()
+        # Pending summaries still need the model clients, which are closed below.
+        await conversation_memory.aclose()
+        await self.snapshot_task()
+        await dispose_engines()
+        await close_http_session()
+        await client_registry.aclose()
+        await response_cache.aclose()
+        await admission_controller.aclose()
+        await storage_registry.aclose()
+        await dispose_pools()
+        await metrics.aclose()
+        await super().close()
 
     async def on_message(self, message: nextcord.Message) -> None:
         """The code in this event is executed every time someone sends a message, with or without the prefix
 
         :param message: The message that was sent.
         """
+        from src.sdk.log_message import MessageLogger
+
         if message.author == self.user or message.author.bot:
             return
+        # Messages can arrive between READY and the end of `prepare`.
+        await self.prepared
         await MessageLogger(message=message).log()
         await self.process_commands(message)
 
@@ -102,6 +353,8 @@ class DiscordBot(commands.Bot):
 
         :param context: The context of the command that has been executed.
         """
+        from src.sdk.log_message import MessageLogger
+
         await MessageLogger(message=context.message).log()
         full_command_name = context.command.qualified_name
         split = full_command_name.split(" ")
@@ -177,8 +430,32 @@ class DiscordBot(commands.Bot):
         else:
             raise error
 
+    async def on_application_command_error(
+        self, interaction: nextcord.Interaction, error: nextcord.ApplicationError
+    ) -> None:
+        """The code in this event is executed every time a slash command fails a check or raises.
+
+        :param interaction: The interaction of the slash command that failed executing.
+        :param error: The error that has been faced.
+        """
+        from src.sdk.admission import RateLimited, slow_down_embed
+
+        if isinstance(error, RateLimited):
+            logfire.info(
+                "Command Rate Limited",
+                command=interaction.application_command.name,
+                user_id=interaction.user.id,
+                scope=error.scope,
+                retry_after=round(error.retry_after, 1),
+            )
+            await interaction.response.send_message(
+                embed=slow_down_embed(error.retry_after), ephemeral=True
+            )
+        else:
+            await super().on_application_command_error(interaction, error)
+
 
 if __name__ == "__main__":
-    config = Config()
+    config = get_config()
     bot = DiscordBot()
     bot.run(token=config.discord_bot_token)
@@ -2,15 +2,16 @@ import nextcord
 from nextcord import Locale, Interaction, SlashOption
 from nextcord.ext import commands
 
-from src.sdk.llm import LLMServices
-from src.types.config import Config
+from src.sdk.llm import get_llm_services
+from src.sdk.admission import rate_limited
+from src.sdk.dispatcher import format_queue_position
+from src.sdk.stream_renderer import StreamRenderer
 
 
 class ImageGeneratorCogs(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.config = Config()
-        self.llm_services = LLMServices()
+        self.llm_services = get_llm_services()
 
     @nextcord.slash_command(
         name="graph",
@@ -23,6 +24,7 @@ class ImageGeneratorCogs(commands.Cog):
         dm_permission=True,
         nsfw=False,
     )
+    @rate_limited()
     async def graph(
         self,
         interaction: Interaction,
@@ -35,12 +37,21 @@ class ImageGeneratorCogs(commands.Cog):
         ),
     ) -> None:
         message = await interaction.response.send_message(content="圖片生成中...")
+        renderer = StreamRenderer(
+            message=message,
+            send=interaction.followup.send,
+            content="圖片生成中...",
+            command="graph",
+        )
 
         try:
-            response = await self.llm_services.get_dalle_image(prompt=prompt)
-            await message.edit(content=f"{interaction.user.mention}\n{response.data[0].url}")
+            response = await self.llm_services.get_dalle_image(
+                prompt=prompt,
+                on_queued=lambda queued: renderer.update(format_queue_position(queued)),
+            )
+            await renderer.finish(content=f"{interaction.user.mention}\n{response.data[0].url}")
         except Exception as e:
-            await message.edit(content=f"生成圖片時發生錯誤: {e!s}")
+            await renderer.finish(content=f"生成圖片時發生錯誤: {e!s}")
 
 
 # 註冊 Cog
@@ -1,18 +1,19 @@
-import base64
-
-import aiohttp
 import logfire
 import nextcord
 from nextcord import Locale, Interaction, SlashOption
 from nextcord.ext import commands
 
-from src.sdk.llm import LLMServices
+from src.sdk.llm import get_llm_services
+from src.sdk.memory import Turn, conversation_memory
+from src.sdk.admission import rate_limited
+from src.sdk.dispatcher import QueueFull, format_queue_position
+from src.sdk.stream_renderer import StreamRenderer
 
 
 class ReplyGeneratorCogs(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.llm_services = LLMServices()
+        self.llm_services = get_llm_services()
 
     async def _get_attachment_list(self, message: nextcord.Message) -> list[str]:
         image_urls, embed_list, sticker_list = [], [], []
@@ -23,16 +24,21 @@ class ReplyGeneratorCogs(commands.Cog):
         if message.embeds:
             embed_list = [embed.description for embed in message.embeds if embed.description]
         if message.stickers:
-            async with aiohttp.ClientSession() as session:
-                for sticker in message.stickers:
-                    async with session.get(sticker.url) as response:
-                        if response.status == 200:
-                            sticker_data = await response.read()
-                            base64_image = base64.b64encode(sticker_data).decode("utf-8")
-                            sticker_list.append(f"data:image/png;base64,{base64_image}")
+            # The image pipeline decides whether to pass the sticker URL through or inline it.
+            sticker_list = [sticker.url for sticker in message.stickers]
         attachments = [*image_urls, *embed_list, *sticker_list]
         return attachments
 
+    async def _remember(self, interaction: Interaction, prompt: str, answer: str) -> None:
+        # 回覆送出後才寫入對話記憶，較舊的對話會在背景整理成摘要
+        await conversation_memory.append(
+            f"channel:{interaction.channel_id}",
+            [
+                Turn(role="user", content=prompt, author=interaction.user.name),
+                Turn(role="assistant", content=answer),
+            ],
+        )
+
     @nextcord.slash_command(
         name="oai",
         description="Generate a reply based on the given prompt.",
@@ -44,6 +50,7 @@ class ReplyGeneratorCogs(commands.Cog):
         dm_permission=True,
         nsfw=False,
     )
+    @rate_limited()
     async def oai(
         self,
         interaction: Interaction,
@@ -69,12 +76,23 @@ class ReplyGeneratorCogs(commands.Cog):
             # 再檢查參數是否有提供圖片，並加入附件列表
             if image:
                 attachments.append(image.url)
-            response = await self.llm_services.get_oai_reply(prompt=prompt, image_urls=attachments)
-            await interaction.response.send_message(
-                f"{interaction.user.mention} {response.choices[0].message.content}"
+            # 每個頻道（討論串也是頻道）各自保存最近的對話與較早對話的摘要
+            memory = await conversation_memory.load(f"channel:{interaction.channel_id}")
+            response = await self.llm_services.get_oai_reply(
+                prompt=prompt,
+                image_urls=attachments,
+                scope=f"guild:{interaction.guild_id}"
+                if interaction.guild_id
+                else f"user:{interaction.user.id}",
+                history=memory.to_messages(),
             )
+            answer = response.choices[0].message.content
+            await interaction.response.send_message(f"{interaction.user.mention} {answer}")
         except Exception as e:
             await interaction.response.send_message(content=f"處理訊息時發生錯誤: {e!s}")
+            return
+        # 回覆已經送出，寫入記憶失敗時不能再回應一次 interaction
+        await self._remember(interaction, prompt, answer)
 
     @nextcord.slash_command(
         name="oais",
@@ -87,6 +105,7 @@ class ReplyGeneratorCogs(commands.Cog):
         dm_permission=True,
         nsfw=False,
     )
+    @rate_limited()
     async def oais(
         self,
         interaction: Interaction,
@@ -111,25 +130,43 @@ class ReplyGeneratorCogs(commands.Cog):
         if image:
             attachments.append(image.url)
         message = await interaction.response.send_message(content="生成中...")
-        accumulated_text = f"{interaction.user.mention}\n"
+        mention = f"{interaction.user.mention}\n"
+        renderer = StreamRenderer(
+            message=message, send=interaction.followup.send, content=mention, command="oais"
+        )
 
         try:
+            memory = await conversation_memory.load(f"channel:{interaction.channel_id}")
+            answer = []
             async for res in self.llm_services.get_oai_reply_stream(
-                prompt=prompt, image_urls=attachments
+                prompt=prompt,
+                image_urls=attachments,
+                history=memory.to_messages(),
+                # 模型忙碌時顯示排隊順位，而不是停在「生成中...」
+                on_queued=lambda queued: renderer.update(mention + format_queue_position(queued)),
             ):
                 if (
                     hasattr(res, "choices")
                     and len(res.choices) > 0
                     and res.choices[0].delta.content
                 ):
-                    accumulated_text += res.choices[0].delta.content
-                    await message.edit(content=accumulated_text)
+                    if not answer:
+                        renderer.update(mention)
+                    answer.append(res.choices[0].delta.content)
+                    renderer.feed(res.choices[0].delta.content)
+            await renderer.finish()
 
+        except QueueFull as e:
+            await renderer.finish(content=f"{mention}{e!s}")
+            return
         except Exception as e:
-            await message.edit(
+            await renderer.finish(
                 content=f"{interaction.user.mention} 無法生成有效回應，請嘗試其他提示詞。"
             )
             logfire.error(f"Error in oais: {e}")
+            return
+        # 寫入記憶失敗時不應該把已經完成的回覆改成錯誤訊息
+        await self._remember(interaction, prompt, "".join(answer))
 
 
 # 註冊 Cog
@@ -4,7 +4,10 @@ import nextcord
 from nextcord import Locale, Interaction, SlashOption
 from nextcord.ext import commands
 
-from src.sdk.llm import LLMServices
+from src.sdk.llm import get_llm_services
+from src.sdk.admission import rate_limited
+from src.sdk.dispatcher import format_queue_position
+from src.sdk.stream_renderer import StreamRenderer
 
 os.environ["ANONYMIZED_TELEMETRY"] = "false"
 
@@ -12,7 +15,7 @@ os.environ["ANONYMIZED_TELEMETRY"] = "false"
 class WebSearchCogs(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.llm_services = LLMServices()
+        self.llm_services = get_llm_services()
 
     @nextcord.slash_command(
         name="search",
@@ -25,6 +28,7 @@ class WebSearchCogs(commands.Cog):
         dm_permission=True,
         nsfw=False,
     )
+    @rate_limited()
     async def search(
         self,
         interaction: Interaction,
@@ -36,11 +40,23 @@ class WebSearchCogs(commands.Cog):
             },
         ),
     ) -> None:
+        # 先回覆佔位訊息，避免排隊時超過 Discord 的 3 秒互動期限
+        message = await interaction.response.send_message(content="搜尋中...")
+        renderer = StreamRenderer(
+            message=message, send=interaction.followup.send, content="搜尋中...", command="search"
+        )
+
         try:
-            response = await self.llm_services.get_search_result(prompt=prompt)
-            await interaction.response.send_message(content=response.choices[0].message.content)
+            response = await self.llm_services.get_search_result(
+                prompt=prompt,
+                scope=f"guild:{interaction.guild_id}"
+                if interaction.guild_id
+                else f"user:{interaction.user.id}",
+                on_queued=lambda queued: renderer.update(format_queue_position(queued)),
+            )
+            await renderer.finish(content=response.choices[0].message.content)
         except Exception as e:
-            await interaction.response.send_message(content=f"搜尋時發生錯誤: {e!s}")
+            await renderer.finish(content=f"搜尋時發生錯誤: {e!s}")
 
 
 # 註冊 Cog
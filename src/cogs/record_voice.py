@@ -33,6 +33,9 @@ class AudioRecorder(nextcord.VoiceClient):
 
 
 class RecordCog(commands.Cog):
+    # 需要快取語音狀態才能找到使用者所在的語音頻道
+    required_intents = ("voice_states",)
+
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.voice_client = None
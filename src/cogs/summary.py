@@ -1,8 +1,16 @@
+from collections.abc import Callable
+
 import nextcord
 from nextcord import Locale, Member, Interaction
 from nextcord.ext import commands
 
-from src.sdk.llm import LLMServices
+from src.sdk.llm import get_llm_services
+from src.sdk.tokens import token_budget
+from src.sdk.admission import slow_down_embed, admission_controller
+from src.sdk.dispatcher import Priority, QueuePosition, format_queue_position
+from src.sdk.summarizer import CHUNK_PROMPT, ChatLine, SummaryProgress, MapReduceSummarizer
+from src.sdk.message_index import IndexedMessage, message_index
+from src.sdk.stream_renderer import StreamRenderer
 
 SUMMARY_PROMPT = """
 請將總結的部分以發送者當作主要分類，並將他在這段期間內發送的內容總結。
@@ -25,6 +33,9 @@ SUMMARY_MESSAGE = """
 {chat_history_string}
 """
 
+# 一則聊天訊息的平均 token 數，用來在讀取訊息之前估算 /sum 的成本
+TOKENS_PER_MESSAGE = 30
+
 
 # --- 定義選單視窗 ---
 class SummarizeMenuView(nextcord.ui.View):
@@ -42,6 +53,8 @@ class SummarizeMenuView(nextcord.ui.View):
             nextcord.SelectOption(label="10", value="10"),
             nextcord.SelectOption(label="20", value="20"),
             nextcord.SelectOption(label="50", value="50"),
+            nextcord.SelectOption(label="500", value="500"),
+            nextcord.SelectOption(label="5000", value="5000"),
         ],
     )
     async def select_history_count(
@@ -76,20 +89,61 @@ class SummarizeMenuView(nextcord.ui.View):
             self.stop()
             return
 
-        # 回應「處理中…」（避免互動逾時）
+        # 依要總結的訊息數量估算成本，超過使用者或伺服器的額度就請他稍後再試
+        cost = admission_controller.estimate_cost(
+            "sum", prompt_tokens=self.history_count * TOKENS_PER_MESSAGE
+        )
+        admission = await admission_controller.acquire(
+            "sum", interaction.user.id, interaction.guild_id, cost
+        )
+        if not admission.allowed:
+            await interaction.response.send_message(
+                embed=slow_down_embed(admission.retry_after), ephemeral=True
+            )
+            return
+
+        # 回應「處理中…」（避免互動逾時），之後的進度與結果都會更新在這則訊息上
         await interaction.response.defer(ephemeral=True)
+        message = await interaction.followup.send("讀取訊息中...", ephemeral=True, wait=True)
 
-        # 執行總結流程
-        summary = await cog.do_summarize(interaction.channel, self.history_count, self.target_user)
-        await interaction.followup.send(summary, ephemeral=True)
-        self.stop()
+        async def send(content: str) -> nextcord.WebhookMessage:
+            return await interaction.followup.send(content, ephemeral=True, wait=True)
+
+        renderer = StreamRenderer(
+            message=message, send=send, content="讀取訊息中...", command="sum"
+        )
+
+        # 執行總結流程；失敗時把錯誤顯示在同一則訊息上，而不是停在進度訊息
+        try:
+            summary = await cog.do_summarize(
+                interaction.channel,
+                self.history_count,
+                self.target_user,
+                on_progress=lambda progress: renderer.update(cog.format_progress(progress)),
+                on_queued=lambda queued: renderer.update(format_queue_position(queued)),
+            )
+            await renderer.finish(content=summary)
+        except Exception as e:
+            await renderer.finish(content=f"總結訊息時發生錯誤: {e!s}")
+        finally:
+            self.stop()
 
 
 # --- 原本的訊息總結 Cog ---
 class MessageFetcher(commands.Cog):
+    # 讀取歷史訊息的內容需要 message_content intent
+    required_intents = ("message_content",)
+
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.llm_services = LLMServices(system_prompt=SUMMARY_PROMPT)
+        # 總結較耗時，排在互動指令之後，避免大量總結拖慢一般回覆
+        self.llm_services = get_llm_services(
+            system_prompt=SUMMARY_PROMPT, priority=Priority.BACKGROUND
+        )
+        self.summarizer = MapReduceSummarizer(
+            map_llm=get_llm_services(system_prompt=CHUNK_PROMPT, priority=Priority.BACKGROUND),
+            reduce_llm=self.llm_services,
+        )
 
     @nextcord.slash_command(
         name="sum",
@@ -111,11 +165,18 @@ class MessageFetcher(commands.Cog):
         await interaction.response.send_message("請選擇總結選項：", view=view, ephemeral=True)
 
     async def do_summarize(
-        self, channel: nextcord.TextChannel, history_count: int, target_user: Member | None
+        self,
+        channel: nextcord.TextChannel,
+        history_count: int,
+        target_user: Member | None,
+        on_progress: Callable[[SummaryProgress], None] | None = None,
+        on_queued: Callable[[QueuePosition], None] | None = None,
     ) -> str:
         """根據頻道、訊息數量與目標使用者，抓取並整理訊息，
         接著呼叫 LLM 來產生總結內容。
 
+        放得進單一提示詞的訊息會直接總結；更長的歷史訊息會先分段並行總結，再合併成最終總結。
+
         Returns:
             str: 總結的結果。
         """
@@ -125,56 +186,77 @@ class MessageFetcher(commands.Cog):
                 return f"在此頻道中找不到 {target_user.mention} 的相關訊息。"
             return "此頻道沒有可供總結的訊息。"
 
+        chunks = self.summarizer.split([self._format_line(msg) for msg in messages])
+        if len(chunks) > 1:
+            return await self.summarizer.summarize(chunks, history_count, on_progress)
+
         chat_history_string, attachments = self._format_messages(messages)
         final_prompt = self._create_summary_prompt(history_count, chat_history_string)
-        summary = await self._call_llm(final_prompt, attachments)
+        summary = await self._call_llm(final_prompt, attachments, on_queued)
         return summary
 
+    @staticmethod
+    def format_progress(progress: SummaryProgress) -> str:
+        if progress.stage == "map":
+            return f"分段總結中... ({progress.done}/{progress.total})"
+        if progress.total == 1:
+            return "整合最終總結中..."
+        return f"合併分段總結中... ({progress.done}/{progress.total})"
+
     async def _fetch_messages(
         self, channel: nextcord.TextChannel, history_count: int, target_user: Member | None
-    ) -> list[nextcord.Message]:
-        messages = []
+    ) -> list[IndexedMessage]:
         if target_user:
-            # 從最舊到最新，過濾出指定使用者的訊息
-            async for msg in channel.history(limit=None):
-                if msg.author.id == target_user.id and not msg.author.bot:
-                    messages.append(msg)
-                    if len(messages) == history_count:
-                        break
-        else:
-            # 直接抓取最近 history_count 筆非機器人訊息
-            async for msg in channel.history(limit=history_count):
-                if not msg.author.bot:
-                    messages.append(msg)
+            # 從本地索引取得指定使用者的訊息，只有索引缺漏的區段才會向 Discord 補抓
+            return await message_index.recent_by_author(channel, target_user.id, history_count)
+        # 直接抓取最近 history_count 筆非機器人訊息
+        messages = [
+            IndexedMessage.from_message(msg)
+            async for msg in channel.history(limit=history_count)
+            if not msg.author.bot
+        ]
         messages.reverse()
         return messages
 
-    def _format_messages(self, messages: list[nextcord.Message]) -> tuple[str, list[str]]:
-        chat_history_lines = []
-        attachments = []
-        for msg in messages:
-            content_text = msg.content
-            if msg.embeds:
-                embed_descriptions = [
-                    embed.description for embed in msg.embeds if embed.description
-                ]
-                attachments.extend(embed_descriptions)
-                content_text = "嵌入內容: " + ", ".join(embed_descriptions)
-            elif msg.attachments:
-                attachment_urls = [att.url for att in msg.attachments]
-                attachments.extend(attachment_urls)
-                content_text = "附件: " + ", ".join(attachment_urls)
-            chat_history_lines.append(f"{msg.author.name}: {content_text}")
-        chat_history_string = "\n".join(chat_history_lines)
+    def _format_line(self, msg: IndexedMessage) -> ChatLine:
+        if msg.embeds:
+            return ChatLine(f"{msg.author}: 嵌入內容: " + ", ".join(msg.embeds), msg.embeds)
+        if msg.attachments:
+            # 附件網址的查詢字串只是 CDN 簽章，對總結沒有幫助卻很佔 token，所以只在文字中省略
+            names = [url.split("?", 1)[0] for url in msg.attachments]
+            return ChatLine(f"{msg.author}: 附件: " + ", ".join(names), msg.attachments)
+        return ChatLine(f"{msg.author}: {msg.content}", [])
+
+    def _format_messages(self, messages: list[IndexedMessage]) -> tuple[str, list[str]]:
+        lines = [self._format_line(msg) for msg in messages]
+        chat_history_string = "\n".join(line.text for line in lines)
+        attachments = [url for line in lines for url in line.attachments]
         return chat_history_string, attachments
 
     def _create_summary_prompt(self, history_count: int, chat_history_string: str) -> str:
+        # 超出模型上下文的部分從最舊的訊息開始捨棄
+        model = self.llm_services.llm_model
+        budget = token_budget.input_limit(model) - token_budget.count_messages(
+            [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": SUMMARY_MESSAGE},
+            ],
+            model,
+        )
+        chat_history_string = token_budget.trim(chat_history_string, budget, model, keep="tail")
         return SUMMARY_MESSAGE.format(
             history_count=history_count, chat_history_string=chat_history_string
         )
 
-    async def _call_llm(self, prompt: str, attachments: list[str]) -> str:
-        response = await self.llm_services.get_oai_reply(prompt=prompt, image_urls=attachments)
+    async def _call_llm(
+        self,
+        prompt: str,
+        attachments: list[str],
+        on_queued: Callable[[QueuePosition], None] | None = None,
+    ) -> str:
+        response = await self.llm_services.get_oai_reply(
+            prompt=prompt, image_urls=attachments, on_queued=on_queued
+        )
         return response.choices[0].message.content
 
 
@@ -0,0 +1,302 @@
+import time
+from typing import Any, TypeVar, NamedTuple
+from functools import cached_property
+from collections import OrderedDict
+from collections.abc import Callable
+
+import logfire
+import nextcord
+from nextcord import Interaction
+from pydantic import Field, BaseModel, ConfigDict
+from nextcord.ext import application_checks
+from redis.exceptions import RedisError, WatchError
+from redis.asyncio.client import Pipeline
+
+from src.sdk.tokens import token_budget
+
+T = TypeVar("T")
+
+
+def format_retry_after(seconds: float) -> str:
+    """Describe a wait as e.g. `1 minutes 5 seconds`."""
+    minutes, seconds = divmod(max(1, round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    parts = [
+        f"{value} {unit}"
+        for value, unit in ((hours, "hours"), (minutes, "minutes"), (seconds, "seconds"))
+        if value > 0
+    ]
+    return " ".join(parts)
+
+
+def slow_down_embed(retry_after: float) -> nextcord.Embed:
+    """Build the reply that tells a rate limited user when to try again."""
+    return nextcord.Embed(
+        description=f"**Please slow down** - You can use this command again in {format_retry_after(retry_after)}.",
+        color=0xE02B2B,
+    )
+
+
+class RateLimit(BaseModel):
+    capacity: float = Field(..., description="The burst size, in cost units.")
+    per_second: float = Field(..., description="Cost units refilled per second.")
+
+
+class Admission(NamedTuple):
+    allowed: bool
+    retry_after: float = 0.0
+    scope: str | None = None
+
+
+class AdmissionStats(BaseModel):
+    admitted: int = Field(default=0, description="Requests let through.")
+    rejected: int = Field(default=0, description="Requests turned away.")
+    conflicts: int = Field(default=0, description="Redis transactions retried after a race.")
+    redis_errors: int = Field(
+        default=0, description="Redis calls that failed and fell back to local buckets."
+    )
+    buckets: int = Field(default=0, description="Buckets currently held in process.")
+
+
+class RateLimited(nextcord.ApplicationCheckFailure):
+    """Raised by `rate_limited` checks; handled by the bot's application command error hook."""
+
+    def __init__(self, admission: Admission) -> None:
+        self.retry_after = admission.retry_after
+        self.scope = admission.scope
+        super().__init__(
+            f"Rate limited by {admission.scope}, retry in {admission.retry_after:.1f}s"
+        )
+
+
+class AdmissionController(BaseModel):
+    """Token-bucket admission control for commands that call the model providers.
+
+    Every request draws its cost from up to three buckets at once: the user's, the guild's and
+    the command's, which is shared by the whole bot and caps what one provider endpoint sees.
+    A request is admitted only if every bucket holds enough tokens, so a decision touches a
+    fixed number of buckets whatever the number of users. Idle buckets are dropped once they
+    would have refilled, which keeps memory proportional to recently active users.
+
+    With `redis` set the buckets are shared by every bot process through one optimistic
+    transaction per decision. Redis failures are logged and the local buckets are used.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    enabled: bool = Field(default=True, description="Admit everything when disabled.")
+    user_limit: RateLimit = Field(
+        default=RateLimit(capacity=6, per_second=6 / 60), description="The bucket of each user."
+    )
+    guild_limit: RateLimit = Field(
+        default=RateLimit(capacity=30, per_second=30 / 60), description="The bucket of each guild."
+    )
+    command_limits: dict[str, RateLimit] = Field(
+        default={"graph": RateLimit(capacity=10, per_second=10 / 60)},
+        description="Bot-wide buckets of the commands with a tight provider quota.",
+    )
+    costs: dict[str, float] = Field(
+        default={"oai": 1.0, "oais": 1.0, "search": 2.0, "graph": 5.0, "sum": 3.0},
+        description="The base cost of each command.",
+    )
+    default_cost: float = Field(default=1.0, description="The base cost of other commands.")
+    tokens_per_unit: int = Field(
+        default=2000, description="Prompt tokens that add one unit to a request's cost."
+    )
+    redis: Any | None = Field(
+        default=None, description="An optional `redis.asyncio.Redis` client for shared buckets."
+    )
+    prefix: str = Field(default="llmbot:admission:", description="The Redis key prefix.")
+
+    clock: Callable[[], float] = Field(
+        default=time.time, description="The wall clock; Redis buckets are shared between hosts."
+    )
+
+    # Decisions are on the hot path, where pydantic private attributes are slow to read.
+    @cached_property
+    def _buckets(self) -> OrderedDict[str, tuple[float, float, float]]:
+        return OrderedDict()
+
+    @cached_property
+    def _stats(self) -> AdmissionStats:
+        return AdmissionStats()
+
+    def estimate_cost(self, command: str, prompt_tokens: int = 0) -> float:
+        """Weigh a request by its command and by the size of its prompt.
+
+        Args:
+            command (str): The command name.
+            prompt_tokens (int): The estimated prompt size; see `TokenBudget.count`.
+
+        Returns:
+            float: The cost in bucket units.
+        """
+        return self.costs.get(command, self.default_cost) + prompt_tokens / self.tokens_per_unit
+
+    def _limits(
+        self, command: str, user_id: int, guild_id: int | None
+    ) -> list[tuple[str, RateLimit]]:
+        limits = [(f"user:{user_id}", self.user_limit)]
+        if guild_id is not None:
+            limits.append((f"guild:{guild_id}", self.guild_limit))
+        command_limit = self.command_limits.get(command)
+        if command_limit is not None:
+            limits.append((f"command:{command}", command_limit))
+        return limits
+
+    @staticmethod
+    def _decide(
+        limits: list[tuple[str, RateLimit]],
+        states: list[tuple[float, ...] | None],
+        cost: float,
+        now: float,
+    ) -> tuple[Admission, list[float]]:
+        """Refill the buckets and return the admission with the levels left after paying."""
+        levels = []
+        retry_after, rejected_by = 0.0, None
+        for (scope, limit), state in zip(limits, states, strict=True):
+            capacity = limit.capacity
+            level = (
+                capacity
+                if state is None
+                else min(capacity, state[0] + (now - state[1]) * limit.per_second)
+            )
+            # A request larger than a bucket drains it rather than never being admitted.
+            level -= cost if cost < capacity else capacity
+            if level < 0 and -level / limit.per_second > retry_after:
+                retry_after, rejected_by = -level / limit.per_second, scope
+            levels.append(level)
+        if rejected_by is None:
+            return Admission(allowed=True), levels
+        return Admission(allowed=False, retry_after=retry_after, scope=rejected_by), levels
+
+    def _acquire_local(
+        self, limits: list[tuple[str, RateLimit]], cost: float, now: float
+    ) -> Admission:
+        buckets = self._buckets
+        states = [buckets.get(key) for key, _ in limits]
+        admission, levels = self._decide(limits, states, cost, now)
+        if admission.allowed:
+            for (key, limit), level in zip(limits, levels, strict=True):
+                full_at = now + (limit.capacity - level) / limit.per_second
+                buckets[key] = (level, now, full_at)
+                buckets.move_to_end(key)
+        # A bucket that has refilled is the same as no bucket, so the least recently used
+        # ones are forgotten as soon as they are full.
+        while buckets and next(iter(buckets.values()))[2] <= now:
+            buckets.popitem(last=False)
+        return admission
+
+    async def _transact(
+        self,
+        pipe: Pipeline,
+        names: list[str],
+        limits: list[tuple[str, RateLimit]],
+        cost: float,
+        now: float,
+    ) -> Admission | None:
+        try:
+            await pipe.watch(*names)
+            raw = await pipe.mget(names)
+            states = [
+                tuple(float(part) for part in value.split(b":")) if value else None
+                for value in raw
+            ]
+            admission, levels = self._decide(limits, states, cost, now)
+            if not admission.allowed:
+                return admission
+            pipe.multi()
+            for name, level, (_, limit) in zip(names, levels, limits, strict=True):
+                refill_ms = int(limit.capacity / limit.per_second * 1000) + 1
+                pipe.set(name, f"{level}:{now}", px=refill_ms)
+            await pipe.execute()
+        except WatchError:
+            # Another process changed one of the buckets in between; decide again.
+            self._stats.conflicts += 1
+            return None
+        return admission
+
+    async def _acquire_redis(
+        self, limits: list[tuple[str, RateLimit]], cost: float, now: float
+    ) -> Admission | None:
+        names = [f"{self.prefix}{key}" for key, _ in limits]
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                admission = None
+                while admission is None:
+                    admission = await self._transact(pipe, names, limits, cost, now)
+                return admission
+        except (RedisError, OSError) as e:
+            self._stats.redis_errors += 1
+            logfire.warn("Admission control fell back to local buckets", error=str(e))
+            return None
+
+    async def acquire(
+        self, command: str, user_id: int, guild_id: int | None, cost: float | None = None
+    ) -> Admission:
+        """Admit a request and draw its cost from its buckets, or tell when to retry.
+
+        Args:
+            command (str): The command name.
+            user_id (int): The Discord user who sent it.
+            guild_id (int | None): The guild it was sent in, None in DMs.
+            cost (float | None): The cost from `estimate_cost`; the command's base cost if None.
+
+        Returns:
+            Admission: Whether it was admitted, and otherwise the wait and the full bucket.
+        """
+        if not self.enabled:
+            return Admission(allowed=True)
+        if cost is None:
+            cost = self.estimate_cost(command)
+        limits = self._limits(command, user_id, guild_id)
+        now = self.clock()
+        admission = None
+        if self.redis is not None:
+            admission = await self._acquire_redis(limits, cost, now)
+        if admission is None:
+            admission = self._acquire_local(limits, cost, now)
+        if admission.allowed:
+            self._stats.admitted += 1
+        else:
+            self._stats.rejected += 1
+        return admission
+
+    async def aclose(self) -> None:
+        """Let go of the Redis client; it is shared, so its storage backend closes it."""
+        self.redis = None
+
+    def stats(self) -> AdmissionStats:
+        return self._stats.model_copy(update={"buckets": len(self._buckets)})
+
+
+admission_controller = AdmissionController()
+
+
+def _prompt_option(interaction: Interaction) -> str:
+    options = (interaction.data or {}).get("options", [])
+    return next((str(option["value"]) for option in options if option["name"] == "prompt"), "")
+
+
+def rate_limited(command: str | None = None) -> Callable[[T], T]:
+    """Admit an application command through the shared `admission_controller`.
+
+    The cost is the command's base cost plus the size of its `prompt` option, if any. A
+    rejected command raises `RateLimited` before its body runs.
+
+    Args:
+        command (str | None): The name to charge; the command's own name if None.
+    """
+
+    async def predicate(interaction: Interaction) -> bool:
+        name = command or interaction.application_command.name
+        cost = admission_controller.estimate_cost(
+            name, token_budget.count(_prompt_option(interaction))
+        )
+        admission = await admission_controller.acquire(
+            name, interaction.user.id, interaction.guild_id, cost
+        )
+        if not admission.allowed:
+            raise RateLimited(admission)
+        return True
+
+    return application_checks.check(predicate)
@@ -1,81 +1,127 @@
-import time
 from typing import Any, Optional
+import asyncio
+from collections.abc import AsyncGenerator
 
-from openai import OpenAI
-from pydantic import Field, ConfigDict, computed_field
-from openai.pagination import SyncCursorPage
+from openai import AsyncOpenAI, NotFoundError
+from pydantic import Field, ConfigDict, PrivateAttr, computed_field
 from openai.types.beta import Thread, Assistant, ThreadDeleted, AssistantDeleted
 from openai.types.beta.threads import Run, Message, MessageDeleted
-from autogen.agentchat.contrib.img_utils import get_pil_image, pil_to_data_uri
 
+from src.sdk.images import image_pipeline
+from src.sdk.clients import client_registry
 from src.types.config import Config
-from src.types.database import DatabaseConfig
+from src.sdk.dispatcher import llm_dispatcher
+from src.sdk.asst_registry import AssistantRegistry, settings_key, assistant_registry
+
+# Run states in which the assistant is still working on the thread.
+PENDING_RUN_STATUSES = {"queued", "in_progress", "cancelling"}
+
+
+def _message_text(message: Message) -> str:
+    return "".join(part.text.value for part in message.content if part.type == "text")
 
 
 class AssistantAPI(Config):
+    """Async wrapper around one assistant and one thread of the OpenAI Assistants API.
+
+    Requests go through the shared connection pool of the client registry, and runs are
+    followed through their event stream, so many threads can run at once without holding up
+    the event loop.
+    """
+
     model_config = ConfigDict(arbitrary_types_allowed=True)
     thread_id: Optional[str] = Field(default=None)
     assistant_id: Optional[str] = Field(default=None)
     message_id: Optional[str] = Field(default=None)
     metadata: dict[str, str] = Field(default={"backend_id": "default"})
-    db: DatabaseConfig = Field(default_factory=DatabaseConfig)
+    registry: AssistantRegistry = Field(default_factory=lambda: assistant_registry)
+
+    _last_message: Optional[str] = PrivateAttr(default=None)
+    _conversation: Optional[str] = PrivateAttr(default=None)
 
     @computed_field
     @property
-    def client(self) -> OpenAI:
-        client = OpenAI(api_key=self.openai_api_key, base_url="https://api.openai.com/v1")
+    def client(self) -> AsyncOpenAI:
+        client = client_registry.get_client(
+            provider="openai", api_key=self.openai_api_key, base_url=self.openai_base_url
+        )
         return client
 
-    def create_or_retrieve_thread(self) -> Thread:
-        try:
-            thread = self.client.beta.threads.retrieve(self.thread_id)
-        except Exception:
-            thread = self.client.beta.threads.create(metadata=self.metadata)
+    async def create_or_retrieve_thread(self, conversation: Optional[str] = None) -> Thread:
+        """Return the thread of this wrapper, or of a Discord conversation.
+
+        The thread of a conversation is looked up in the registry without a request; it is
+        only created when the conversation has none yet.
+
+        Args:
+            conversation (Optional[str]): A conversation id such as `channel:<id>`.
+
+        Returns:
+            Thread: The thread that messages and runs now go to.
+        """
+        thread: Optional[Thread] = None
+        if self.thread_id is not None:
+            try:
+                thread = await self.client.beta.threads.retrieve(self.thread_id)
+            except NotFoundError:
+                thread = None
+        elif conversation is not None:
+            cached = await self.registry.get_thread(conversation)
+            if cached is not None:
+                thread = Thread.model_validate(cached)
+        if thread is None:
+            thread = await self.client.beta.threads.create(metadata=self.metadata)
+            if conversation is not None:
+                await self.registry.set_thread(conversation, thread.model_dump(mode="json"))
         self.thread_id = thread.id
+        self._conversation = conversation
         return thread
 
-    def retrieve_assistant_by_settings(
+    async def retrieve_assistant_by_settings(
         self, name: str, model: str, description: str, instructions: str
     ) -> Assistant:
-        existing_assistants = self.client.beta.assistants.list()
-        current_asst_config = {
-            "name": name,
-            "model": model,
-            "description": description,
-            "instructions": instructions,
-        }
-        matched_assistants: list[Assistant] = []
-        for _existing_assistant in existing_assistants:
-            existing_asst_config = _existing_assistant.model_dump(
-                include={"name", "model", "description", "instructions"}
-            )
-            if existing_asst_config == current_asst_config:
-                matched_assistants.append(_existing_assistant)
+        """Return an assistant with exactly these settings, creating one if none exists.
 
-        if not matched_assistants:
-            assistant = self.client.beta.assistants.create(
+        The match comes from the registry; the full assistant list is only paged through when
+        the registry has never seen these settings.
+        """
+        key = settings_key(
+            name=name, model=model, description=description, instructions=instructions
+        )
+        cached = await self.registry.resolve_assistant(
+            key, lambda: self.client.beta.assistants.list(limit=100)
+        )
+        if cached is not None:
+            matched_assistant = Assistant.model_validate(cached)
+        else:
+            matched_assistant = await self.client.beta.assistants.create(
                 name=name,
                 model=model,
                 description=description,
                 instructions=instructions,
                 metadata=self.metadata,
             )
-            matched_assistants.append(assistant)
+            await self.registry.set_assistants({key: matched_assistant.model_dump(mode="json")})
 
-        self.assistant_id = matched_assistants[0].id
-        return matched_assistants[0]
+        self.assistant_id = matched_assistant.id
+        return matched_assistant
 
-    def delete_thread(self, thread_id: str) -> ThreadDeleted:
-        deleted_thread = self.client.beta.threads.delete(thread_id=thread_id)
+    async def delete_thread(self, thread_id: str) -> ThreadDeleted:
+        deleted_thread = await self.client.beta.threads.delete(thread_id=thread_id)
+        await self.registry.forget_thread(thread_id)
         return deleted_thread
 
-    def create_or_retrieve_assistant(
+    async def create_or_retrieve_assistant(
         self, name: str, model: str, description: str, instructions: str
     ) -> Assistant:
-        try:
-            assistant = self.client.beta.assistants.retrieve(self.assistant_id)
-        except Exception:
-            assistant = self.client.beta.assistants.create(
+        assistant: Optional[Assistant] = None
+        if self.assistant_id is not None:
+            try:
+                assistant = await self.client.beta.assistants.retrieve(self.assistant_id)
+            except NotFoundError:
+                assistant = None
+        if assistant is None:
+            assistant = await self.client.beta.assistants.create(
                 name=name,
                 model=model,
                 description=description,
@@ -85,81 +131,143 @@ class AssistantAPI(Config):
         self.assistant_id = assistant.id
         return assistant
 
-    def delete_assistant(self, asst_id: str) -> AssistantDeleted:
-        deleted_assistant = self.client.beta.assistants.delete(assistant_id=asst_id)
+    async def delete_assistant(self, asst_id: str) -> AssistantDeleted:
+        deleted_assistant = await self.client.beta.assistants.delete(assistant_id=asst_id)
+        await self.registry.forget_assistant(asst_id)
         return deleted_assistant
 
-    def create_message(self, content: str, image_urls: list[str]) -> Message:
+    async def create_message(self, content: str, image_urls: list[str]) -> Message:
         base_content: list[dict[str, Any]] = [{"type": "text", "text": content}]
-        for image_url in image_urls:
-            image = get_pil_image(image_file=image_url)
-            image_base64 = pil_to_data_uri(image=image)
-            base_content.append({"type": "image_url", "image_url": {"url": image_base64}})
-
-        message = self.client.beta.threads.messages.create(
-            thread_id=self.thread_id, content=base_content, role="user"
-        )
+        base_content.extend(await image_pipeline.prepare(image_urls))
+        try:
+            message = await self.client.beta.threads.messages.create(
+                thread_id=self.thread_id, content=base_content, role="user"
+            )
+        except NotFoundError:
+            if self._conversation is None:
+                raise
+            # The remembered thread was deleted elsewhere; start the conversation over.
+            await self.registry.forget_thread(self.thread_id)
+            self.thread_id = None
+            await self.create_or_retrieve_thread(self._conversation)
+            message = await self.client.beta.threads.messages.create(
+                thread_id=self.thread_id, content=base_content, role="user"
+            )
         self.message_id = message.id
+        self._last_message = None
         return message
 
-    def list_messages(self, thread_id: str) -> list[Message]:
-        messages = self.client.beta.threads.messages.list(thread_id=thread_id)
+    async def list_messages(self, thread_id: str) -> list[Message]:
+        messages = [message async for message in self.client.beta.threads.messages.list(thread_id)]
         return messages
 
-    def retrieve_message(self, thread_id: str, message_id: str) -> Message:
-        message = self.client.beta.threads.messages.retrieve(
+    async def retrieve_message(self, thread_id: str, message_id: str) -> Message:
+        message = await self.client.beta.threads.messages.retrieve(
             thread_id=thread_id, message_id=message_id
         )
         return message
 
-    def delete_message(self, thread_id: str, message_id: str) -> MessageDeleted:
-        deleted_message = self.client.beta.threads.messages.delete(
+    async def delete_message(self, thread_id: str, message_id: str) -> MessageDeleted:
+        deleted_message = await self.client.beta.threads.messages.delete(
             thread_id=thread_id, message_id=message_id
         )
         return deleted_message
 
-    def retrieve_run(self, thread_id: str, run_id: str) -> Run:
-        message = self.client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
-        return message
-
-    def delete_run(self, thread_id: str, run_id: str) -> Run:
-        deleted_message = self.client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
-        return deleted_message
+    async def retrieve_run(self, thread_id: str, run_id: str) -> Run:
+        run = await self.client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+        return run
 
-    def create_run(self) -> Run:
-        run = self.client.beta.threads.runs.create(
-            thread_id=self.thread_id, assistant_id=self.assistant_id
+    async def delete_run(self, thread_id: str, run_id: str) -> Run:
+        cancelled_run = await self.client.beta.threads.runs.cancel(
+            thread_id=thread_id, run_id=run_id
         )
+        return cancelled_run
+
+    async def wait_for_run(
+        self, run_id: str, initial_interval: float = 0.1, max_interval: float = 2.0
+    ) -> Run:
+        """Poll a run until it leaves the pending states, backing off between polls.
+
+        Used for runs that were not started here, e.g. one left behind by a restart; runs
+        started by `create_run` or `stream_run` are followed through their events instead.
+
+        Args:
+            run_id (str): The run to wait for.
+            initial_interval (float): Seconds before the first poll.
+            max_interval (float): The longest pause between polls.
+
+        Returns:
+            Run: The run in its final state.
+        """
+        interval = initial_interval
+        while True:
+            run = await self.retrieve_run(thread_id=self.thread_id, run_id=run_id)
+            if run.status not in PENDING_RUN_STATUSES:
+                return run
+            await asyncio.sleep(interval)
+            interval = min(max_interval, interval * 2)
 
-        def wait_on_run(run: Run) -> Run:
-            while run.status == "queued" or run.status == "in_progress":
-                run = self.client.beta.threads.runs.retrieve(
-                    thread_id=self.thread_id, run_id=run.id
-                )
-                time.sleep(0.5)
-            return run
+    async def stream_run(self) -> AsyncGenerator[str, None]:
+        """Run the assistant on the thread and yield its reply text as it is generated."""
+        parts: list[str] = []
+        async with (
+            llm_dispatcher.slot("openai", "assistants"),
+            self.client.beta.threads.runs.stream(
+                thread_id=self.thread_id, assistant_id=self.assistant_id
+            ) as stream,
+        ):
+            async for event in stream:
+                if event.event != "thread.message.delta":
+                    continue
+                for part in event.data.delta.content or []:
+                    if part.type == "text" and part.text and part.text.value:
+                        parts.append(part.text.value)
+                        yield part.text.value
+        self._last_message = "".join(parts)
 
-        wait_on_run(run=run)
+    async def create_run(self) -> Run:
+        """Run the assistant on the thread and return the run once it has finished."""
+        async with (
+            llm_dispatcher.slot("openai", "assistants"),
+            self.client.beta.threads.runs.stream(
+                thread_id=self.thread_id, assistant_id=self.assistant_id
+            ) as stream,
+        ):
+            await stream.until_done()
+            run = await stream.get_final_run()
+            messages = await stream.get_final_messages()
+        if messages:
+            self._last_message = _message_text(messages[-1])
         return run
 
-    @computed_field
-    @property
-    def last_message(self) -> SyncCursorPage[Message]:
-        last_message = self.client.beta.threads.messages.list(
-            thread_id=self.thread_id, order="desc", after=self.message_id
-        )
-        return last_message.data[-1].content[-1].text
+    async def last_message(self) -> str:
+        """Return the text of the newest message, fetching it only if no run reported it."""
+        if self._last_message is None:
+            page = await self.client.beta.threads.messages.list(
+                thread_id=self.thread_id, order="desc", limit=1
+            )
+            self._last_message = _message_text(page.data[0]) if page.data else ""
+        return self._last_message
 
 
 if __name__ == "__main__":
-    asst_api = AssistantAPI()
-
-    asst_api.create_or_retrieve_thread()
-    asst_api.create_or_retrieve_assistant(
-        name="Personal Assistant For Wei Cheng",
-        model="aide-gpt-4o-realtime-preview",
-        description="A virtual Wei Cheng Lee.",
-        instructions="You are Wei Cheng Lee!!",
-    )
-    asst_api.create_message(content="請描述一下這張照片", image_urls=["./data/125075.jpg"])
-    asst_api.create_run()
+    from rich.console import Console
+
+    console = Console()
+
+    async def main() -> None:
+        asst_api = AssistantAPI()
+        await asst_api.create_or_retrieve_thread()
+        await asst_api.create_or_retrieve_assistant(
+            name="Personal Assistant For Wei Cheng",
+            model="aide-gpt-4o-realtime-preview",
+            description="A virtual Wei Cheng Lee.",
+            instructions="You are Wei Cheng Lee!!",
+        )
+        await asst_api.create_message(
+            content="請描述一下這張照片", image_urls=["./data/125075.jpg"]
+        )
+        async for text in asst_api.stream_run():
+            console.print(text, end="")
+
+    asyncio.run(main())
@@ -0,0 +1,237 @@
+from typing import Any
+import asyncio
+import hashlib
+from pathlib import Path
+from collections.abc import Callable, AsyncIterator
+
+import orjson
+import logfire
+from pydantic import Field, BaseModel, ConfigDict, PrivateAttr
+from redis.exceptions import RedisError
+from openai.types.beta import Assistant
+
+from src.sdk.cache import write_snapshot
+from src.sdk.redis_store import RedisStore
+
+# The assistant fields that decide whether an existing assistant can be reused.
+ASSISTANT_SETTINGS = ("name", "model", "description", "instructions")
+
+
+def settings_key(name: str, model: str, description: str, instructions: str) -> str:
+    """Hash assistant settings into a stable lookup key.
+
+    Args:
+        name (str): The assistant name.
+        model (str): The model the assistant runs on.
+        description (str): The assistant description.
+        instructions (str): The assistant instructions.
+
+    Returns:
+        str: The hex SHA-256 of the canonical JSON form of the settings.
+    """
+    settings = {
+        "name": name,
+        "model": model,
+        "description": description,
+        "instructions": instructions,
+    }
+    return hashlib.sha256(orjson.dumps(settings, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def _read_snapshot(path: Path) -> dict[str, Any]:
+    return orjson.loads(path.read_bytes()) if path.is_file() else {}
+
+
+class RegistryStats(BaseModel):
+    hits: int = Field(default=0, description="Lookups answered from either tier.")
+    redis_hits: int = Field(default=0, description="Hits that came from the Redis tier.")
+    misses: int = Field(default=0, description="Lookups that found nothing.")
+    rebuilds: int = Field(default=0, description="Cold rebuilds from the full assistant list.")
+    listed: int = Field(default=0, description="Assistants read while rebuilding.")
+    redis_errors: int = Field(default=0, description="Redis calls that failed and were skipped.")
+    assistants: int = Field(default=0, description="Assistants currently known in process.")
+    threads: int = Field(default=0, description="Channel threads currently known in process.")
+
+
+class AssistantRegistry(BaseModel):
+    """Remembers which assistant matches which settings, and which thread belongs to a channel.
+
+    Assistants are keyed by `settings_key`, so changed settings miss and resolve to a new
+    assistant while the old entry stays valid for anything still using it. Threads are keyed
+    by a conversation id such as `channel:<id>`. Entries are kept in process, written through
+    to a JSON file at `path` so restarts start warm, and mirrored into Redis hashes when
+    `redis` is set so several bot processes share them. Redis failures are logged and treated
+    as misses.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    path: str | None = Field(
+        default=None, description="The local JSON file the entries are persisted to."
+    )
+    redis: Any | None = Field(
+        default=None, description="An optional `redis.asyncio.Redis` client for the shared tier."
+    )
+    prefix: str = Field(default="llmbot:assistants:", description="The Redis key prefix.")
+
+    _assistants: dict[str, dict[str, Any]] = PrivateAttr(default_factory=dict)
+    _threads: dict[str, dict[str, Any]] = PrivateAttr(default_factory=dict)
+    _loaded: bool = PrivateAttr(default=False)
+    _lock: asyncio.Lock = PrivateAttr(default_factory=asyncio.Lock)
+    _stats: RegistryStats = PrivateAttr(default_factory=RegistryStats)
+    _store: RedisStore | None = PrivateAttr(default=None)
+
+    @property
+    def store(self) -> RedisStore | None:
+        """The hash store on `redis`, or None without a shared tier."""
+        if self.redis is None:
+            return None
+        if self._store is None or self._store.redis is not self.redis:
+            self._store = RedisStore(redis=self.redis)
+        return self._store
+
+    def _tables(self, kind: str) -> tuple[dict[str, dict[str, Any]], str]:
+        table = self._assistants if kind == "assistant" else self._threads
+        return table, f"{self.prefix}{kind}s"
+
+    async def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.path is None:
+            return
+        snapshot = await asyncio.to_thread(_read_snapshot, Path(self.path))
+        self._assistants.update(snapshot.get("assistants", {}))
+        self._threads.update(snapshot.get("threads", {}))
+
+    async def _persist(self) -> None:
+        if self.path is None:
+            return
+        data = orjson.dumps({"assistants": self._assistants, "threads": self._threads})
+        await asyncio.to_thread(write_snapshot, Path(self.path), data)
+
+    async def _get(self, kind: str, key: str) -> dict[str, Any] | None:
+        await self._ensure_loaded()
+        table, redis_key = self._tables(kind)
+        value = table.get(key)
+        if value is None and self.redis is not None:
+            try:
+                raw = await self.redis.hget(redis_key, key)
+            except (RedisError, OSError) as e:
+                self._stats.redis_errors += 1
+                logfire.warn("Assistant registry read failed", error=str(e))
+                raw = None
+            if raw is not None:
+                value = table[key] = orjson.loads(raw)
+                self._stats.redis_hits += 1
+        if value is None:
+            self._stats.misses += 1
+            return None
+        self._stats.hits += 1
+        return value
+
+    async def _set(self, kind: str, entries: dict[str, dict[str, Any]]) -> None:
+        await self._ensure_loaded()
+        table, redis_key = self._tables(kind)
+        table.update(entries)
+        await self._persist()
+        if self.store is None or not entries:
+            return
+        try:
+            await self.store.save(
+                redis_key, {key: orjson.dumps(value).decode() for key, value in entries.items()}
+            )
+        except (RedisError, OSError) as e:
+            self._stats.redis_errors += 1
+            logfire.warn("Assistant registry write failed", error=str(e))
+
+    async def _forget(self, kind: str, object_id: str) -> None:
+        await self._ensure_loaded()
+        table, redis_key = self._tables(kind)
+        stale = [key for key, value in table.items() if value["id"] == object_id]
+        for key in stale:
+            del table[key]
+        if stale:
+            await self._persist()
+        if self.store is None:
+            return
+        try:
+            # Other processes may hold entries this one never loaded.
+            remote = await self.store.load(redis_key)
+            stale = [
+                key for key, value in remote.items() if orjson.loads(value)["id"] == object_id
+            ]
+            await self.store.delete_fields(redis_key, *stale)
+        except (RedisError, OSError) as e:
+            self._stats.redis_errors += 1
+            logfire.warn("Assistant registry delete failed", error=str(e))
+
+    async def get_assistant(self, key: str) -> dict[str, Any] | None:
+        """Return the assistant stored under a `settings_key`, or None."""
+        return await self._get("assistant", key)
+
+    async def set_assistants(self, entries: dict[str, dict[str, Any]]) -> None:
+        """Store assistants under their `settings_key`s."""
+        await self._set("assistant", entries)
+
+    async def forget_assistant(self, assistant_id: str) -> None:
+        """Drop every entry that points at a deleted assistant."""
+        await self._forget("assistant", assistant_id)
+
+    async def get_thread(self, conversation: str) -> dict[str, Any] | None:
+        """Return the thread stored for a conversation, or None."""
+        return await self._get("thread", conversation)
+
+    async def set_thread(self, conversation: str, thread: dict[str, Any]) -> None:
+        """Store the thread of a conversation."""
+        await self._set("thread", {conversation: thread})
+
+    async def forget_thread(self, thread_id: str) -> None:
+        """Drop every conversation that points at a deleted thread."""
+        await self._forget("thread", thread_id)
+
+    async def resolve_assistant(
+        self, key: str, list_assistants: Callable[[], AsyncIterator[Assistant]]
+    ) -> dict[str, Any] | None:
+        """Look up an assistant, rebuilding the index from the full list on a miss.
+
+        Concurrent misses wait for one another, so the list is paged through only once.
+
+        Args:
+            key (str): The `settings_key` of the wanted settings.
+            list_assistants (Callable[[], AsyncIterator[Assistant]]): Iterates over every
+                assistant of the organisation, across all pages.
+
+        Returns:
+            dict[str, Any] | None: The assistant, or None if none has these settings.
+        """
+        assistant = await self.get_assistant(key)
+        if assistant is not None:
+            return assistant
+        async with self._lock:
+            assistant = await self.get_assistant(key)
+            if assistant is not None:
+                return assistant
+            entries: dict[str, dict[str, Any]] = {}
+            async for listed in list_assistants():
+                self._stats.listed += 1
+                settings = listed.model_dump(include=set(ASSISTANT_SETTINGS))
+                # The list is newest first; keep the first match, as the list scan did.
+                entries.setdefault(
+                    settings_key(**{field: settings[field] for field in ASSISTANT_SETTINGS}),
+                    listed.model_dump(mode="json"),
+                )
+            self._stats.rebuilds += 1
+            await self.set_assistants(entries)
+            return entries.get(key)
+
+    async def aclose(self) -> None:
+        """Let go of the Redis client; it is shared, so its storage backend closes it."""
+        self.redis = None
+
+    def stats(self) -> RegistryStats:
+        return self._stats.model_copy(
+            update={"assistants": len(self._assistants), "threads": len(self._threads)}
+        )
+
+
+assistant_registry = AssistantRegistry()
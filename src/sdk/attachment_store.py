@@ -0,0 +1,148 @@
+import os
+import asyncio
+import hashlib
+from pathlib import Path
+import secrets
+import contextlib
+
+import aiohttp
+import logfire
+from pydantic import Field, BaseModel, ConfigDict, PrivateAttr
+
+from src.sdk.http import get_http_session
+
+
+class StoreStats(BaseModel):
+    files: int = Field(default=0, description="Files saved, including duplicates.")
+    unique: int = Field(default=0, description="Files whose content was new to the store.")
+    duplicates: int = Field(default=0, description="Files whose content was already stored.")
+    failed: int = Field(default=0, description="Files that could not be downloaded or written.")
+    bytes_downloaded: int = Field(default=0, description="Bytes received from Discord.")
+    bytes_saved: int = Field(default=0, description="Bytes not written thanks to deduplication.")
+    dedup_ratio: float = Field(default=0.0, description="Share of files that were duplicates.")
+
+
+class AttachmentStore(BaseModel):
+    """Content-addressed storage for attachments and stickers.
+
+    Every file is streamed to disk in chunks while it is hashed, then stored once under
+    `<root>/<sha256[:2]>/<sha256><suffix>`. The per-channel path the logger records is a
+    hardlink to that blob, so a duplicate costs a directory entry instead of another copy.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    root: str = Field(default="./data/blobs", description="The directory holding the blobs.")
+    max_concurrency: int = Field(
+        default=16, description="The maximum number of downloads running across all messages."
+    )
+    per_message_concurrency: int = Field(
+        default=4, description="The maximum number of downloads running for a single message."
+    )
+    chunk_size: int = Field(default=256 * 1024, description="Bytes written per chunk.")
+
+    _semaphore: asyncio.Semaphore | None = PrivateAttr(default=None)
+    _stats: StoreStats = PrivateAttr(default_factory=StoreStats)
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _commit(self, tmp_path: Path, digest: str, link_path: Path) -> bool:
+        blob_path = Path(self.root) / digest[:2] / f"{digest}{link_path.suffix.lower()}"
+        if blob_path.exists():
+            tmp_path.unlink()
+            duplicate = True
+        else:
+            blob_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, blob_path)
+            duplicate = False
+        link_path.parent.mkdir(parents=True, exist_ok=True)
+        if not link_path.exists():
+            try:
+                os.link(blob_path, link_path)
+            except OSError:
+                # Filesystems without hardlink support still get a readable path.
+                link_path.symlink_to(blob_path.resolve())
+        return duplicate
+
+    @staticmethod
+    def _remove(path: Path) -> None:
+        with contextlib.suppress(OSError):
+            path.unlink(missing_ok=True)
+
+    async def _download(self, url: str, link_path: Path) -> str | None:
+        tmp_path = Path(self.root) / "tmp" / secrets.token_hex(16)
+        sha256 = hashlib.sha256()
+        size = 0
+        try:
+            await asyncio.to_thread(tmp_path.parent.mkdir, parents=True, exist_ok=True)
+            async with get_http_session().get(url) as response:
+                response.raise_for_status()
+                f = await asyncio.to_thread(tmp_path.open, "wb")
+                try:
+                    async for chunk in response.content.iter_chunked(self.chunk_size):
+                        sha256.update(chunk)
+                        size += len(chunk)
+                        await asyncio.to_thread(f.write, chunk)
+                finally:
+                    await asyncio.to_thread(f.close)
+            duplicate = await asyncio.to_thread(
+                self._commit, tmp_path, sha256.hexdigest(), link_path
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            # A full disk or a missing permission must not break logging the message itself.
+            self._stats.failed += 1
+            logfire.warn("Failed to save attachment", url=url, error=str(e))
+            return None
+        finally:
+            # The commit moves or removes the file; anything left is a failed download.
+            await asyncio.to_thread(self._remove, tmp_path)
+
+        self._stats.files += 1
+        self._stats.bytes_downloaded += size
+        if duplicate:
+            self._stats.duplicates += 1
+            self._stats.bytes_saved += size
+        else:
+            self._stats.unique += 1
+        return str(link_path)
+
+    async def save(self, url: str, link_path: Path) -> str | None:
+        """Download a file into the store and link it to `link_path`.
+
+        Args:
+            url (str): The URL to download.
+            link_path (Path): The human-readable path that should point at the stored blob.
+
+        Returns:
+            str | None: The linked path, or None if the download failed.
+        """
+        async with self.semaphore:
+            return await self._download(url, link_path)
+
+    async def save_many(self, files: list[tuple[str, Path]]) -> list[str]:
+        """Download the files of one message concurrently.
+
+        Args:
+            files (list[tuple[str, Path]]): Pairs of URL and link path.
+
+        Returns:
+            list[str]: The linked paths of the files that were saved, in input order.
+        """
+        per_message = asyncio.Semaphore(self.per_message_concurrency)
+
+        async def _save(url: str, link_path: Path) -> str | None:
+            async with per_message:
+                return await self.save(url, link_path)
+
+        results = await asyncio.gather(*[_save(url, link_path) for url, link_path in files])
+        return [result for result in results if result is not None]
+
+    def stats(self) -> StoreStats:
+        ratio = self._stats.duplicates / self._stats.files if self._stats.files else 0.0
+        return self._stats.model_copy(update={"dedup_ratio": round(ratio, 4)})
+
+
+attachment_store = AttachmentStore()
@@ -0,0 +1,211 @@
+import os
+import time
+from typing import Any
+import asyncio
+import hashlib
+from pathlib import Path
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qsl, urlencode, urlunsplit
+
+import orjson
+import logfire
+from pydantic import Field, BaseModel, ConfigDict, PrivateAttr
+from redis.exceptions import RedisError
+
+DISCORD_CDN_HOSTS = ("cdn.discordapp.com", "media.discordapp.net")
+
+# Responses are cached as their JSON form: a completion, or the chunks of a stream.
+CachedValue = dict[str, Any] | list[dict[str, Any]]
+
+
+def write_snapshot(path: Path, data: bytes) -> None:
+    """Replace a snapshot file atomically so a crash never leaves a torn file behind."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f"{path.suffix}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def image_digest(url: str) -> str:
+    """Identify an image part by its content rather than by a signed, short-lived URL.
+
+    Inlined images are hashed. Discord CDN URLs drop the expiring signature from their query
+    string; any other URL is kept whole, since its query may well select the image.
+    """
+    if url.startswith("data:"):
+        return f"sha256:{hashlib.sha256(url.encode('utf-8')).hexdigest()}"
+    parts = urlsplit(url)
+    if parts.hostname not in DISCORD_CDN_HOSTS:
+        return url
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query) if key not in ("ex", "is", "hm")
+    ]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _canonical_content(content: str | list[dict[str, Any]]) -> str | list[dict[str, Any]]:
+    if isinstance(content, str):
+        return content
+    parts = []
+    for part in content:
+        if part.get("type") == "image_url":
+            parts.append({"type": "image", "digest": image_digest(part["image_url"]["url"])})
+        else:
+            parts.append(part)
+    return parts
+
+
+def make_cache_key(kind: str, model: str, messages: list[dict[str, Any]]) -> str:
+    """Hash a request into a stable cache key.
+
+    Args:
+        kind (str): The kind of request, so streamed and complete answers never collide.
+        model (str): The model the request is sent to.
+        messages (list[dict[str, Any]]): The chat messages, including the system prompt.
+
+    Returns:
+        str: The hex SHA-256 of the canonical JSON form of the request.
+    """
+    canonical = {
+        "kind": kind,
+        "model": model,
+        "messages": [
+            {"role": message["role"], "content": _canonical_content(message["content"])}
+            for message in messages
+        ],
+    }
+    return hashlib.sha256(orjson.dumps(canonical, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+class CacheStats(BaseModel):
+    hits: int = Field(default=0, description="Lookups answered from either tier.")
+    misses: int = Field(default=0, description="Lookups that had to call the model.")
+    redis_hits: int = Field(default=0, description="Hits that came from the Redis tier.")
+    redis_errors: int = Field(default=0, description="Redis calls that failed and were skipped.")
+    stores: int = Field(default=0, description="Responses written to the cache.")
+    evictions: int = Field(default=0, description="Entries evicted by the size bound.")
+    entries: int = Field(default=0, description="Entries currently held in process.")
+    hit_ratio: float = Field(default=0.0, description="Share of lookups that were hits.")
+
+
+class ResponseCache(BaseModel):
+    """Exact-match cache for model responses.
+
+    Entries live in an in-process LRU bounded by `max_entries` and expire after
+    `ttl_seconds`. When `redis` is set, misses fall through to Redis so several bot processes
+    share answers; Redis failures are logged and treated as misses.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    max_entries: int = Field(default=1024, description="The in-process entry limit.")
+    ttl_seconds: int = Field(default=3600, description="How long an entry stays valid.")
+    redis: Any | None = Field(
+        default=None, description="An optional `redis.asyncio.Redis` client for the shared tier."
+    )
+    prefix: str = Field(default="llmbot:cache:", description="The Redis key prefix.")
+
+    _entries: OrderedDict[str, tuple[float, bytes]] = PrivateAttr(default_factory=OrderedDict)
+    _stats: CacheStats = PrivateAttr(default_factory=CacheStats)
+
+    def _get_local(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _set_local(self, key: str, value: bytes, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+    async def _get_redis(self, key: str) -> bytes | None:
+        try:
+            value = await self.redis.get(f"{self.prefix}{key}")
+            ttl = await self.redis.ttl(f"{self.prefix}{key}") if value is not None else 0
+        except (RedisError, OSError) as e:
+            self._stats.redis_errors += 1
+            logfire.warn("Response cache read failed", error=str(e))
+            return None
+        if value is not None:
+            # Keep the shared expiry so a promoted entry does not outlive the Redis copy.
+            self._set_local(key, value, ttl if ttl > 0 else self.ttl_seconds)
+        return value
+
+    async def get(self, key: str) -> CachedValue | None:
+        """Return the cached JSON value for `key`, or None on a miss."""
+        value = self._get_local(key)
+        if value is None and self.redis is not None:
+            value = await self._get_redis(key)
+            if value is not None:
+                self._stats.redis_hits += 1
+        if value is None:
+            self._stats.misses += 1
+            return None
+        self._stats.hits += 1
+        return orjson.loads(value)
+
+    async def set(self, key: str, value: CachedValue) -> None:
+        """Store a JSON-serialisable value under `key` in every tier."""
+        data = orjson.dumps(value)
+        self._set_local(key, data, self.ttl_seconds)
+        self._stats.stores += 1
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(f"{self.prefix}{key}", data, ex=self.ttl_seconds)
+        except (RedisError, OSError) as e:
+            self._stats.redis_errors += 1
+            logfire.warn("Response cache write failed", error=str(e))
+
+    async def aclose(self) -> None:
+        """Let go of the Redis client; it is shared, so its storage backend closes it."""
+        self.redis = None
+
+    def clear(self) -> None:
+        """Drop the in-process entries; the Redis tier expires on its own."""
+        self._entries.clear()
+
+    async def save(self, path: str) -> None:
+        """Write the unexpired in-process entries to disk so a restart keeps them."""
+        now, wall = time.monotonic(), time.time()
+        entries = [
+            {"key": key, "expires_at": wall + expires_at - now, "value": orjson.Fragment(value)}
+            for key, (expires_at, value) in self._entries.items()
+            if expires_at > now
+        ]
+        await asyncio.to_thread(write_snapshot, Path(path), orjson.dumps(entries))
+
+    def load(self, path: str) -> int:
+        """Restore entries written by `save`, skipping the ones that expired meanwhile.
+
+        Returns:
+            int: The number of entries restored.
+        """
+        source = Path(path)
+        if not source.is_file():
+            return 0
+        wall = time.time()
+        restored = 0
+        for entry in orjson.loads(source.read_bytes()):
+            ttl = entry["expires_at"] - wall
+            if ttl > 0:
+                self._set_local(entry["key"], orjson.dumps(entry["value"]), ttl)
+                restored += 1
+        return restored
+
+    def stats(self) -> CacheStats:
+        lookups = self._stats.hits + self._stats.misses
+        ratio = self._stats.hits / lookups if lookups else 0.0
+        return self._stats.model_copy(
+            update={"entries": len(self._entries), "hit_ratio": round(ratio, 4)}
+        )
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,180 @@
+import time
+from typing import Any
+import asyncio
+from collections import deque
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+import logfire
+from pydantic import Field, BaseModel, ConfigDict, PrivateAttr
+
+from src.sdk.metrics import metrics
+
+UPSTREAM_CONNECT = metrics.histogram(
+    "llmbot_llm_connect_seconds",
+    "Time from sending a request until the response headers arrived, including any new "
+    "connection and TLS handshake.",
+    labels=("provider",),
+)
+
+
+class PoolStats(BaseModel):
+    provider: str = Field(..., description="The provider name, e.g. openai or perplexity.")
+    base_url: str = Field(..., description="The base URL served by this connection pool.")
+    requests: int = Field(default=0, description="Total requests sent through the pool.")
+    in_flight: int = Field(default=0, description="Requests still waiting for response headers.")
+    connections_opened: int = Field(default=0, description="New TCP connections established.")
+    tls_handshakes: int = Field(default=0, description="TLS handshakes performed.")
+    reuse_ratio: float = Field(
+        default=0.0, description="Share of requests served on an already open connection."
+    )
+    avg_ttfb_ms: float = Field(default=0.0, description="Mean time to first byte.")
+    p95_ttfb_ms: float = Field(default=0.0, description="95th percentile time to first byte.")
+
+
+class _ProviderPool:
+    """One keep-alive httpx pool plus the counters describing how it is used."""
+
+    def __init__(
+        self, provider: str, base_url: str, limits: httpx.Limits, timeout: httpx.Timeout
+    ) -> None:
+        self.provider = provider
+        self.base_url = base_url
+        self.http_client = DefaultAsyncHttpxClient(
+            limits=limits,
+            timeout=timeout,
+            event_hooks={"request": [self.on_request], "response": [self.on_response]},
+        )
+        self.clients: dict[str, AsyncOpenAI] = {}
+        self.requests = 0
+        self.in_flight = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+        self.ttfb_samples: deque[float] = deque(maxlen=1024)
+
+    async def on_request(self, request: httpx.Request) -> None:
+        self.requests += 1
+        self.in_flight += 1
+        state = {"started_at": time.perf_counter(), "settled": False}
+
+        async def on_trace(event_name: str, info: dict[str, Any]) -> None:
+            if event_name == "connection.connect_tcp.complete":
+                self.connections_opened += 1
+            elif event_name == "connection.start_tls.complete":
+                self.tls_handshakes += 1
+            elif event_name.endswith(".failed") and not state["settled"]:
+                state["settled"] = True
+                self.in_flight -= 1
+
+        request.extensions["trace"] = on_trace
+        request.extensions["pool_state"] = state
+
+    async def on_response(self, response: httpx.Response) -> None:
+        # Response hooks fire once the headers arrived, before the body is read.
+        state = response.request.extensions.get("pool_state")
+        if state is None or state["settled"]:
+            return
+        state["settled"] = True
+        self.in_flight -= 1
+        elapsed = time.perf_counter() - state["started_at"]
+        self.ttfb_samples.append(elapsed * 1000)
+        UPSTREAM_CONNECT.observe(elapsed, provider=self.provider)
+
+    def stats(self) -> PoolStats:
+        samples = sorted(self.ttfb_samples)
+        avg_ttfb = sum(samples) / len(samples) if samples else 0.0
+        p95_ttfb = samples[min(len(samples) - 1, int(len(samples) * 0.95))] if samples else 0.0
+        reused = max(self.requests - self.connections_opened, 0)
+        return PoolStats(
+            provider=self.provider,
+            base_url=self.base_url,
+            requests=self.requests,
+            in_flight=self.in_flight,
+            connections_opened=self.connections_opened,
+            tls_handshakes=self.tls_handshakes,
+            reuse_ratio=reused / self.requests if self.requests else 0.0,
+            avg_ttfb_ms=round(avg_ttfb, 2),
+            p95_ttfb_ms=round(p95_ttfb, 2),
+        )
+
+
+class ClientRegistry(BaseModel):
+    """Process-wide registry of provider clients backed by long-lived connection pools.
+
+    Every provider and base URL gets exactly one keep-alive httpx pool, shared by all
+    `AsyncOpenAI` clients created for it, so cogs reuse warm TLS connections instead of
+    opening a new pool per request.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    max_connections: int = Field(
+        default=100, description="The maximum number of concurrent connections per pool."
+    )
+    max_keepalive_connections: int = Field(
+        default=20, description="The maximum number of idle connections kept per pool."
+    )
+    keepalive_expiry: float = Field(
+        default=60.0, description="Seconds an idle connection is kept open before closing."
+    )
+    timeout: float = Field(default=60.0, description="The default request timeout in seconds.")
+
+    _pools: dict[tuple[str, str], _ProviderPool] = PrivateAttr(default_factory=dict)
+
+    def _get_pool(self, provider: str, base_url: str) -> _ProviderPool:
+        key = (provider, base_url)
+        pool = self._pools.get(key)
+        if pool is None or pool.http_client.is_closed:
+            pool = _ProviderPool(
+                provider=provider,
+                base_url=base_url,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+            )
+            self._pools[key] = pool
+        return pool
+
+    def get_client(self, provider: str, api_key: str, base_url: str) -> AsyncOpenAI:
+        """Return the shared client for the provider, creating its pool on first use.
+
+        Args:
+            provider (str): The provider name, used to label the pool.
+            api_key (str): The API key for the provider.
+            base_url (str): The base URL of the provider's OpenAI-compatible API.
+
+        Returns:
+            AsyncOpenAI: A client bound to the shared connection pool.
+        """
+        pool = self._get_pool(provider=provider, base_url=base_url)
+        client = pool.clients.get(api_key)
+        if client is None:
+            client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=pool.http_client)
+            pool.clients[api_key] = client
+        return client
+
+    async def warmup(self) -> None:
+        """Open one connection per registered pool so the first user request skips the handshake."""
+
+        async def _warmup(pool: _ProviderPool) -> None:
+            try:
+                await pool.http_client.get(pool.base_url)
+            except httpx.HTTPError as e:
+                logfire.warn("Client warmup failed", provider=pool.provider, error=str(e))
+
+        await asyncio.gather(*[_warmup(pool) for pool in self._pools.values()])
+        logfire.info("Client pools warmed up", pools=len(self._pools))
+
+    async def aclose(self) -> None:
+        """Close every pool; the registry can be reused afterwards and will reconnect lazily."""
+        for pool in self._pools.values():
+            await pool.http_client.aclose()
+        self._pools.clear()
+
+    def stats(self) -> list[PoolStats]:
+        return [pool.stats() for pool in self._pools.values()]
+
+
+client_registry = ClientRegistry()
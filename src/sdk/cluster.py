@@ -0,0 +1,184 @@
+import os
+import sys
+import time
+from typing import TYPE_CHECKING, Any
+import asyncio
+import contextlib
+
+import orjson
+import logfire
+import nextcord
+from pydantic import Field, BaseModel, PrivateAttr
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis as AsyncRedis
+
+SHARDS_KEY = "llmbot:shards"
+
+
+def plan_clusters(shard_count: int, processes: int) -> list[list[int]]:
+    """Split the shards into contiguous groups, one per process, as evenly as possible.
+
+    Args:
+        shard_count (int): The shards across the whole bot.
+        processes (int): The processes to split them between; at most one per shard is used.
+
+    Returns:
+        list[list[int]]: The shard ids of each process.
+    """
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    groups, start = [], 0
+    for index in range(processes):
+        end = start + size + (index < extra)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+
+async def recommended_shard_count(token: str) -> int:
+    """Ask Discord how many shards the bot should run for its current guild count."""
+    http = nextcord.http.HTTPClient()
+    try:
+        await http.static_login(token)
+        shards, _ = await http.get_bot_gateway()
+    finally:
+        await http.close()
+    return shards
+
+
+async def register_shards(redis: "AsyncRedis", bot: nextcord.AutoShardedClient) -> None:
+    """Record the shards of this process and their guild counts in the shared Redis hash.
+
+    Every process of a cluster writes its own fields, so `cluster_shards` sees the whole bot.
+    """
+    guilds: dict[int, int] = {}
+    for guild in bot.guilds:
+        guilds[guild.shard_id] = guilds.get(guild.shard_id, 0) + 1
+    shard_ids = bot.shard_ids if bot.shard_ids is not None else range(bot.shard_count or 1)
+    seen_at = time.time()
+    await redis.hset(
+        SHARDS_KEY,
+        mapping={
+            str(shard_id): orjson.dumps({
+                "pid": os.getpid(),
+                "guilds": guilds.get(shard_id, 0),
+                "seen_at": seen_at,
+            })
+            for shard_id in shard_ids
+        },
+    )
+
+
+async def cluster_shards(redis: "AsyncRedis") -> dict[int, dict[str, Any]]:
+    """Return what every shard of the cluster last recorded, by shard id."""
+    raw = await redis.hgetall(SHARDS_KEY)
+    return {int(shard_id): orjson.loads(entry) for shard_id, entry in raw.items()}
+
+
+class ClusterStats(BaseModel):
+    processes: int = Field(default=0, description="Shard processes the cluster runs.")
+    running: int = Field(default=0, description="Shard processes currently alive.")
+    restarts: int = Field(default=0, description="Shard processes restarted after a crash.")
+
+
+class ClusterLauncher(BaseModel):
+    """Runs the bot's shards in groups, one OS process per group.
+
+    Each process gets `SHARD_COUNT` and its own `SHARD_IDS` in the environment and runs the
+    shards of its group with the autosharded bot, so a busy guild only slows the guilds of
+    its own process. Processes are started `start_interval` apart, which keeps their
+    IDENTIFY calls from colliding with Discord's identify rate limit. A process that exits
+    with an error is restarted after `restart_delay`, up to `max_restarts` times.
+    """
+
+    shard_count: int = Field(..., description="The shards across the whole bot.")
+    processes: int = Field(..., description="The processes to split the shards between.")
+    command: list[str] = Field(
+        default_factory=lambda: [sys.executable, "main.py"],
+        description="The command that runs the bot in one process.",
+    )
+    env: dict[str, str] = Field(
+        default={}, description="Extra environment variables for every process."
+    )
+    start_interval: float = Field(
+        default=5.0, description="Seconds between starting one process and the next."
+    )
+    restart_delay: float = Field(
+        default=5.0, description="Seconds to wait before restarting a crashed process."
+    )
+    max_restarts: int = Field(default=5, description="Restarts allowed per process.")
+
+    _processes: dict[int, asyncio.subprocess.Process] = PrivateAttr(default_factory=dict)
+    _stats: ClusterStats = PrivateAttr(default_factory=ClusterStats)
+    _stopping: bool = PrivateAttr(default=False)
+
+    def environment(self, cluster_id: int, shard_ids: list[int]) -> dict[str, str]:
+        return {
+            **os.environ,
+            **self.env,
+            "SHARD_COUNT": str(self.shard_count),
+            "SHARD_IDS": orjson.dumps(shard_ids).decode(),
+            "CLUSTER_ID": str(cluster_id),
+        }
+
+    async def _run_process(self, cluster_id: int, shard_ids: list[int]) -> None:
+        await asyncio.sleep(cluster_id * self.start_interval)
+        restarts = 0
+        while not self._stopping:
+            process = await asyncio.create_subprocess_exec(
+                *self.command, env=self.environment(cluster_id, shard_ids)
+            )
+            self._processes[cluster_id] = process
+            logfire.info("Shard Process Started", cluster_id=cluster_id, shard_ids=shard_ids)
+            returncode = await process.wait()
+            del self._processes[cluster_id]
+            if returncode == 0 or self._stopping:
+                return
+            restarts += 1
+            if restarts > self.max_restarts:
+                raise RuntimeError(
+                    f"Shard process {cluster_id} exited with {returncode} "
+                    f"{restarts} times; giving up"
+                )
+            self._stats.restarts += 1
+            logfire.warn("Shard Process Crashed", cluster_id=cluster_id, returncode=returncode)
+            await asyncio.sleep(self.restart_delay)
+
+    async def run(self) -> None:
+        """Start every process and wait until all of them exit; a crash loop stops the rest."""
+        groups = plan_clusters(self.shard_count, self.processes)
+        self._stats.processes = len(groups)
+        runners = [
+            asyncio.create_task(self._run_process(cluster_id, shard_ids))
+            for cluster_id, shard_ids in enumerate(groups)
+        ]
+        try:
+            await asyncio.gather(*runners)
+        finally:
+            for runner in runners:
+                runner.cancel()
+            await self.stop()
+            await asyncio.gather(*runners, return_exceptions=True)
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Ask every process to shut down, and kill the ones still running after `timeout`."""
+        self._stopping = True
+        processes = list(self._processes.values())
+        for process in processes:
+            with contextlib.suppress(ProcessLookupError):
+                process.terminate()
+        if not processes:
+            return
+        _, pending = await asyncio.wait(
+            [asyncio.create_task(process.wait()) for process in processes], timeout=timeout
+        )
+        for process in processes:
+            if process.returncode is None:
+                with contextlib.suppress(ProcessLookupError):
+                    process.kill()
+        if pending:
+            await asyncio.wait(pending)
+
+    def stats(self) -> ClusterStats:
+        return self._stats.model_copy(update={"running": len(self._processes)})
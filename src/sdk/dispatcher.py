@@ -0,0 +1,241 @@
+from enum import IntEnum
+import time
+import heapq
+from typing import NamedTuple
+import asyncio
+import itertools
+import contextlib
+from collections.abc import Callable, AsyncIterator
+
+import logfire
+from pydantic import Field, BaseModel, PrivateAttr
+
+from src.sdk.metrics import metrics
+
+
+class Priority(IntEnum):
+    """Queue order of upstream calls; lower values are served first."""
+
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class QueuePosition(NamedTuple):
+    position: int
+    estimated_wait: float
+
+
+def format_queue_position(queued: QueuePosition) -> str:
+    """Describe a queue position for users, e.g. while a reply waits for a free slot."""
+    return f"排隊中 (#{queued.position}，預計等待約 {max(1, round(queued.estimated_wait))} 秒)..."
+
+
+QUEUE_WAIT = metrics.histogram(
+    "llmbot_dispatch_queue_wait_seconds",
+    "Time calls waited for a free upstream slot; calls that got one right away count as 0.",
+    labels=("lane", "priority"),
+)
+QUEUE_DEPTH = metrics.gauge(
+    "llmbot_dispatch_queue_depth", "Calls waiting for a free upstream slot.", labels=("lane",)
+)
+QUEUE_REJECTED = metrics.counter(
+    "llmbot_dispatch_rejected_total",
+    "Calls turned away because the lane's queue was full.",
+    labels=("lane",),
+)
+
+
+class LaneStats(BaseModel):
+    lane: str = Field(..., description="The provider and model, e.g. `openai:gpt-4o`.")
+    limit: int = Field(..., description="Upstream calls allowed at once.")
+    active: int = Field(default=0, description="Upstream calls currently running.")
+    queued: int = Field(default=0, description="Calls currently waiting for a slot.")
+    max_queued: int = Field(default=0, description="The deepest the queue has been.")
+    dispatched: int = Field(default=0, description="Calls that got a slot.")
+    waited: int = Field(default=0, description="Calls that had to queue for their slot.")
+    rejected: int = Field(default=0, description="Calls turned away because the queue was full.")
+    avg_wait: float = Field(default=0.0, description="Mean queue wait in seconds of queued calls.")
+    max_wait: float = Field(default=0.0, description="Longest queue wait in seconds.")
+    service_time: float = Field(
+        default=0.0, description="Moving average of how long a call holds its slot."
+    )
+
+
+class QueueFull(Exception):  # noqa: N818
+    """Raised instead of queueing when a lane already has too many calls waiting."""
+
+    def __init__(self, lane: str, retry_after: float) -> None:
+        self.lane = lane
+        self.retry_after = retry_after
+        super().__init__(f"目前請求過多，請約 {max(1, round(retry_after))} 秒後再試。")
+
+
+class _Waiter:
+    def __init__(
+        self,
+        priority: Priority,
+        sequence: int,
+        future: asyncio.Future,
+        on_queued: Callable[[QueuePosition], None] | None,
+    ) -> None:
+        self.order = (priority, sequence)
+        self.future = future
+        self.on_queued = on_queued
+        self.position = 0
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return self.order < other.order
+
+
+class _Lane:
+    def __init__(self, name: str, limit: int, service_time: float) -> None:
+        self.name = name
+        self.limit = limit
+        self.active = 0
+        self.waiters: list[_Waiter] = []
+        self.service_time = service_time
+        self.total_wait = 0.0
+        self.stats = LaneStats(lane=name, limit=limit)
+
+    def estimate(self, position: int) -> float:
+        """Seconds until the call at this queue position gets a slot."""
+        return position * self.service_time / self.limit
+
+
+class LLMDispatcher(BaseModel):
+    """Admits every upstream model call through a bounded, prioritised queue per provider and model.
+
+    Each lane, e.g. `openai:gpt-4o` or `perplexity`, runs at most its limit of calls at once.
+    Further calls wait in a priority queue, interactive commands ahead of background work such
+    as summaries and FIFO within a priority, and get their queue position and an estimated wait
+    through `on_queued` whenever it changes. A lane whose queue is full raises `QueueFull`
+    right away instead of letting latency pile up for everyone.
+    """
+
+    concurrency: int = Field(default=8, description="Upstream calls per lane allowed at once.")
+    limits: dict[str, int] = Field(
+        default_factory=dict,
+        description="Per-lane overrides keyed by `provider:model` or `provider`.",
+    )
+    max_queue: int = Field(default=50, description="Calls allowed to wait per lane.")
+    initial_service_time: float = Field(
+        default=5.0, description="Assumed seconds per call until calls have been timed."
+    )
+    smoothing: float = Field(
+        default=0.2, description="Weight of the newest call in the service time average."
+    )
+
+    _lanes: dict[str, _Lane] = PrivateAttr(default_factory=dict)
+    _sequence: itertools.count = PrivateAttr(default_factory=itertools.count)
+
+    def _lane(self, provider: str, model: str) -> _Lane:
+        name = f"{provider}:{model}"
+        lane = self._lanes.get(name)
+        if lane is None:
+            limit = self.limits.get(name, self.limits.get(provider, self.concurrency))
+            lane = _Lane(name, max(1, limit), self.initial_service_time)
+            self._lanes[name] = lane
+        return lane
+
+    def _notify(self, lane: _Lane) -> None:
+        # Queues are short (at most `max_queue`), so sorting on every change is cheap.
+        for index, waiter in enumerate(sorted(lane.waiters), start=1):
+            if waiter.position != index and waiter.on_queued is not None:
+                waiter.on_queued(QueuePosition(index, lane.estimate(index)))
+            waiter.position = index
+        QUEUE_DEPTH.set(len(lane.waiters), lane=lane.name)
+
+    async def _acquire(
+        self, lane: _Lane, priority: Priority, on_queued: Callable[[QueuePosition], None] | None
+    ) -> None:
+        if lane.active < lane.limit and not lane.waiters:
+            lane.active += 1
+            lane.stats.dispatched += 1
+            QUEUE_WAIT.observe(0.0, lane=lane.name, priority=priority.name.lower())
+            return
+        if len(lane.waiters) >= self.max_queue:
+            lane.stats.rejected += 1
+            QUEUE_REJECTED.inc(lane=lane.name)
+            raise QueueFull(lane.name, retry_after=lane.estimate(len(lane.waiters) + 1))
+        waiter = _Waiter(
+            priority, next(self._sequence), asyncio.get_running_loop().create_future(), on_queued
+        )
+        heapq.heappush(lane.waiters, waiter)
+        lane.stats.max_queued = max(lane.stats.max_queued, len(lane.waiters))
+        self._notify(lane)
+        queued_at = time.monotonic()
+        try:
+            with logfire.span("Queued for {lane}", lane=lane.name, priority=priority.name.lower()):
+                await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # The slot was handed over just as the caller went away; pass it on.
+                self._release(lane)
+            elif waiter in lane.waiters:
+                lane.waiters.remove(waiter)
+                heapq.heapify(lane.waiters)
+                self._notify(lane)
+            raise
+        wait = time.monotonic() - queued_at
+        QUEUE_WAIT.observe(wait, lane=lane.name, priority=priority.name.lower())
+        lane.stats.waited += 1
+        lane.total_wait += wait
+        lane.stats.max_wait = max(lane.stats.max_wait, wait)
+
+    def _release(self, lane: _Lane) -> None:
+        while lane.waiters:
+            waiter = heapq.heappop(lane.waiters)
+            if not waiter.future.done():
+                # The slot passes straight to the next waiter, so `active` stays the same.
+                waiter.future.set_result(None)
+                lane.stats.dispatched += 1
+                self._notify(lane)
+                return
+        lane.active -= 1
+        QUEUE_DEPTH.set(0, lane=lane.name)
+
+    @contextlib.asynccontextmanager
+    async def slot(
+        self,
+        provider: str,
+        model: str,
+        priority: Priority = Priority.INTERACTIVE,
+        on_queued: Callable[[QueuePosition], None] | None = None,
+    ) -> AsyncIterator[None]:
+        """Hold one of the lane's slots for the duration of an upstream call.
+
+        Args:
+            provider (str): The provider, e.g. `openai` or `perplexity`.
+            model (str): The model the call uses.
+            priority (Priority): Where the call queues relative to others in the lane.
+            on_queued (Callable[[QueuePosition], None] | None): Called with the queue position
+                and estimated wait whenever they change; never called if a slot is free.
+
+        Raises:
+            QueueFull: The lane already has `max_queue` calls waiting.
+        """
+        lane = self._lane(provider, model)
+        await self._acquire(lane, priority, on_queued)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            lane.service_time += self.smoothing * (elapsed - lane.service_time)
+            self._release(lane)
+
+    def stats(self) -> list[LaneStats]:
+        return [
+            lane.stats.model_copy(
+                update={
+                    "active": lane.active,
+                    "queued": len(lane.waiters),
+                    "avg_wait": lane.total_wait / lane.stats.waited if lane.stats.waited else 0.0,
+                    "service_time": lane.service_time,
+                }
+            )
+            for lane in self._lanes.values()
+        ]
+
+
+llm_dispatcher = LLMDispatcher()
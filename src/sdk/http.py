@@ -0,0 +1,25 @@
+import aiohttp
+
+_session: aiohttp.ClientSession | None = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Return the process-wide aiohttp session used for downloading attachments and images.
+
+    The session is created lazily inside the running event loop and keeps its connections
+    alive between downloads.
+    """
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=64, limit_per_host=16, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=120, sock_connect=10),
+        )
+    return _session
+
+
+async def close_http_session() -> None:
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
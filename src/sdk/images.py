@@ -0,0 +1,179 @@
+import io
+import base64
+from typing import Any
+import asyncio
+from pathlib import Path
+import binascii
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, UnidentifiedImageError
+import aiohttp
+import logfire
+from pydantic import Field, BaseModel, ConfigDict, PrivateAttr
+
+from src.sdk.http import get_http_session
+
+# Image types the OpenAI vision models accept as URLs.
+SUPPORTED_CONTENT_TYPES = {"image/png", "image/jpeg", "image/gif", "image/webp"}
+
+
+class ImageTooLarge(Exception):  # noqa: N818
+    """Raised when an image is larger than the pipeline downloads."""
+
+
+def decode_data_uri(data_uri: str) -> bytes:
+    _, _, payload = data_uri.partition(",")
+    return base64.b64decode(payload)
+
+
+def to_data_uri(
+    data: bytes, max_long_side: int = 2048, max_short_side: int = 768, quality: int = 85
+) -> str:
+    """Decode an image, downscale it to what the vision model uses and re-encode it.
+
+    OpenAI scales high-detail images to fit 2048x2048 and then to 768 pixels on the short
+    side, so anything larger only costs upload time.
+
+    Args:
+        data (bytes): The encoded image.
+        max_long_side (int): The maximum length of the longer side.
+        max_short_side (int): The maximum length of the shorter side.
+        quality (int): The JPEG quality used for opaque images.
+
+    Returns:
+        str: A `data:` URI holding a JPEG, or a PNG for images with transparency.
+    """
+    image = Image.open(io.BytesIO(data))
+    # JPEG can decode straight at a reduced scale, which skips most of the decoding work.
+    image.draft("RGB", (max_long_side, max_long_side))
+    width, height = image.size
+    scale = min(1.0, max_long_side / max(width, height), max_short_side / min(width, height))
+    if scale < 1.0:
+        image = image.resize(
+            (max(1, round(width * scale)), max(1, round(height * scale))), Image.Resampling.LANCZOS
+        )
+
+    buffer = io.BytesIO()
+    if image.mode in {"RGBA", "LA"} or (image.mode == "P" and "transparency" in image.info):
+        image.convert("RGBA").save(buffer, format="PNG", optimize=True)
+        mime_type = "image/png"
+    else:
+        image.convert("RGB").save(buffer, format="JPEG", quality=quality, optimize=True)
+        mime_type = "image/jpeg"
+    return f"data:{mime_type};base64,{base64.b64encode(buffer.getvalue()).decode('utf-8')}"
+
+
+def load_image_source(source: str) -> bytes | None:
+    """Read the bytes of a data URI or a local file, or None if the source is neither."""
+    if source.startswith("data:"):
+        return decode_data_uri(source)
+    path = Path(source)
+    if path.is_file():
+        return path.read_bytes()
+    return None
+
+
+class ImagePipeline(BaseModel):
+    """Turn image references into vision content parts without blocking the event loop.
+
+    URLs are inspected concurrently over the shared HTTP session. Public images the model
+    can fetch itself are passed through untouched; everything else is downloaded, then
+    decoded, downscaled and re-encoded in a worker pool.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    max_long_side: int = Field(default=2048, description="The maximum longer side in pixels.")
+    max_short_side: int = Field(default=768, description="The maximum shorter side in pixels.")
+    quality: int = Field(default=85, description="The JPEG quality of inlined images.")
+    passthrough_max_bytes: int = Field(
+        default=2 * 1024 * 1024,
+        description="Public images up to this size are sent as URLs instead of data URIs.",
+    )
+    max_download_bytes: int = Field(
+        default=20 * 1024 * 1024,
+        description="Images larger than this are skipped instead of downloaded.",
+    )
+    max_workers: int = Field(default=4, description="Threads decoding and encoding images.")
+
+    _executor: ThreadPoolExecutor | None = PrivateAttr(default=None)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="image-pipeline"
+            )
+        return self._executor
+
+    async def _encode(self, data: bytes) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, to_data_uri, data, self.max_long_side, self.max_short_side, self.quality
+        )
+
+    async def _prepare_url(self, url: str) -> str:
+        session = get_http_session()
+        async with session.get(url) as response:
+            response.raise_for_status()
+            content_type = response.content_type
+            content_length = response.content_length
+            if (
+                content_type in SUPPORTED_CONTENT_TYPES
+                and content_length is not None
+                and content_length <= self.passthrough_max_bytes
+            ):
+                return url
+            if content_length is not None and content_length > self.max_download_bytes:
+                raise ImageTooLarge(f"{content_length} bytes")
+            data = await self._read_limited(response)
+        return await self._encode(data)
+
+    async def _read_limited(self, response: aiohttp.ClientResponse) -> bytes:
+        # The length header may be missing or wrong, so the body is counted as it arrives.
+        chunks: list[bytes] = []
+        size = 0
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            size += len(chunk)
+            if size > self.max_download_bytes:
+                raise ImageTooLarge(f"more than {self.max_download_bytes} bytes")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    async def _prepare_one(self, source: str) -> dict[str, Any] | None:
+        try:
+            if source.startswith(("http://", "https://")):
+                url = await self._prepare_url(source)
+            else:
+                loop = asyncio.get_running_loop()
+                data = await loop.run_in_executor(self.executor, load_image_source, source)
+                if data is None:
+                    logfire.warn("Skipping a non-image attachment", source=source[:100])
+                    return None
+                url = await self._encode(data)
+        except (
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+            binascii.Error,
+            UnidentifiedImageError,
+            Image.DecompressionBombError,
+            ImageTooLarge,
+            OSError,
+        ) as e:
+            logfire.warn("Failed to prepare image", source=source[:100], error=str(e))
+            return None
+        return {"type": "image_url", "image_url": {"url": url}}
+
+    async def prepare(self, sources: list[str]) -> list[dict[str, Any]]:
+        """Prepare image content parts concurrently, keeping the input order.
+
+        Args:
+            sources (list[str]): URLs, data URIs or local file paths.
+
+        Returns:
+            list[dict[str, Any]]: `image_url` content parts for the images that could be read.
+        """
+        parts = await asyncio.gather(*[self._prepare_one(source) for source in sources])
+        return [part for part in parts if part is not None]
+
+
+image_pipeline = ImagePipeline()
@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+from pathlib import Path
+from collections.abc import Callable, Iterable, Awaitable
+
+import orjson
+import logfire
+import nextcord
+from pydantic import Field, BaseModel, PrivateAttr
+
+from src.sdk.cache import write_snapshot
+from src.sdk.metrics import metrics
+
+COMMAND_SYNCS = metrics.counter(
+    "llmbot_command_syncs_total",
+    "Application command syncs per scope, run or skipped because the schema was unchanged.",
+    labels=("scope", "outcome"),
+)
+
+
+def command_schema_hash(
+    commands: Iterable[nextcord.BaseApplicationCommand], guild_id: int | None = None
+) -> str:
+    """Hash the payloads Discord would receive for the commands of one scope.
+
+    The payloads cover names, descriptions, localizations, options and permissions, and are
+    sorted and serialized with sorted keys, so the hash only changes with the schema.
+
+    Args:
+        commands (Iterable[nextcord.BaseApplicationCommand]): The bot's application commands.
+        guild_id (int | None): The guild to hash the commands of, or None for global ones.
+
+    Returns:
+        str: The hex SHA-256 of the scope's command payloads.
+    """
+    payloads = sorted(
+        (
+            command.get_payload(guild_id)
+            for command in commands
+            if (
+                command.is_global if guild_id is None else guild_id in command.guild_ids_to_rollout
+            )
+        ),
+        key=lambda payload: (payload["type"], payload["name"]),
+    )
+    return hashlib.sha256(orjson.dumps(payloads, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+class SyncStats(BaseModel):
+    synced: int = Field(default=0, description="Scopes whose commands were synced with Discord.")
+    skipped: int = Field(default=0, description="Syncs skipped because the schema was unchanged.")
+
+
+class CommandSync(BaseModel):
+    """Syncs application commands with Discord only when their schema changed.
+
+    The schema hash of every synced scope is kept in `state_file`, keyed by application id and
+    guild, so restarts and reconnects with unchanged commands make no REST calls. Commands
+    that were not synced in this process are still resolved by nextcord on first use.
+    """
+
+    state_file: str = Field(
+        default="./data/command_sync.json", description="Where the synced schema hashes are kept."
+    )
+
+    _hashes: dict[str, str] | None = PrivateAttr(default=None)
+    _stats: SyncStats = PrivateAttr(default_factory=SyncStats)
+
+    def _load(self) -> dict[str, str]:
+        if self._hashes is None:
+            path = Path(self.state_file)
+            self._hashes = orjson.loads(path.read_bytes()) if path.is_file() else {}
+        return self._hashes
+
+    async def sync(self, bot: nextcord.Client, guild_id: int | None = None) -> bool:
+        """Sync the commands of one scope unless the same schema was synced before.
+
+        Args:
+            bot (nextcord.Client): The logged-in bot whose commands are synced.
+            guild_id (int | None): The guild to sync, or None for the global commands.
+
+        Returns:
+            bool: Whether the commands were synced.
+        """
+        scope = "global" if guild_id is None else str(guild_id)
+        key = f"{bot.application_id}:{scope}"
+        digest = command_schema_hash(bot.get_all_application_commands(), guild_id)
+        hashes = self._load()
+        if hashes.get(key) == digest:
+            self._stats.skipped += 1
+            COMMAND_SYNCS.inc(scope=scope, outcome="skipped")
+            logfire.info("Command Sync Skipped", scope=scope)
+            return False
+        await bot.sync_application_commands(guild_id=guild_id)
+        hashes[key] = digest
+        write_snapshot(Path(self.state_file), orjson.dumps(hashes, option=orjson.OPT_INDENT_2))
+        self._stats.synced += 1
+        COMMAND_SYNCS.inc(scope=scope, outcome="synced")
+        return True
+
+    def stats(self) -> SyncStats:
+        return self._stats.model_copy()
+
+
+class Lifecycle(BaseModel):
+    """Runs each named startup step once per process, however often the gateway says ready.
+
+    `on_ready` fires again after every reconnect. A step started by an earlier call is awaited
+    instead of run again; a step that failed is forgotten, so the next call retries it.
+    """
+
+    _steps: dict[str, asyncio.Task] = PrivateAttr(default_factory=dict)
+
+    def _forget_failed(self, name: str, step: asyncio.Task) -> None:
+        if (step.cancelled() or step.exception() is not None) and self._steps.get(name) is step:
+            del self._steps[name]
+
+    async def once(self, name: str, start: Callable[[], Awaitable[None]]) -> bool:
+        """Run `start` the first time `name` is asked for, and wait for it on later calls.
+
+        Args:
+            name (str): The name of the step.
+            start (Callable[[], Awaitable[None]]): Starts the step.
+
+        Returns:
+            bool: Whether this call started the step.
+        """
+        step = self._steps.get(name)
+        started = step is None
+        if step is None:
+            step = self._steps[name] = asyncio.create_task(start(), name=name)
+            step.add_done_callback(lambda done: self._forget_failed(name, done))
+        await asyncio.shield(step)
+        return started
+
+
+lifecycle = Lifecycle()
+command_sync = CommandSync()
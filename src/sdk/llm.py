@@ -1,16 +1,28 @@
+import time
 from typing import TYPE_CHECKING, Any, Optional
-from collections.abc import AsyncGenerator
+import functools
+import contextlib
+from collections.abc import Callable, Iterator, AsyncGenerator
 
 from openai import AsyncOpenAI
+import logfire
 from pydantic import Field, ConfigDict, computed_field
 from openai.types.chat import ChatCompletion, ChatCompletionChunk
 from openai.types.images_response import ImagesResponse
-from autogen.agentchat.contrib.img_utils import get_pil_image, pil_to_data_uri
 
+from src.sdk.cache import CachedValue, make_cache_key, response_cache
+from src.sdk.images import image_pipeline
+from src.sdk.tokens import token_budget
+from src.sdk.clients import client_registry
+from src.sdk.metrics import RATE_BUCKETS, metrics
 from src.types.config import Config
+from src.sdk.dispatcher import Priority, QueuePosition, llm_dispatcher
+from src.sdk.near_cache import near_duplicate_index
+from src.sdk.singleflight import request_flights
 
 if TYPE_CHECKING:
     from openai._streaming import AsyncStream
+    from openai.types.completion_usage import CompletionUsage
 
 SYSTEM_PROMPT = "你是一個有用的Discord機器人, Mai 創造你的目的是為了幫助用戶解決問題, 你可以回答用戶的問題, 也可以提供一些有趣的功能。"
 # SYSTEM_PROMPT = """
@@ -36,6 +48,86 @@ SYSTEM_PROMPT = "你是一個有用的Discord機器人, Mai 創造你的目的
 # 勝者為王 敗者為寇
 # """
 
+LLM_LABELS = ("provider", "model", "kind")
+LLM_DURATION = metrics.histogram(
+    "llmbot_llm_duration_seconds",
+    "Time an upstream model call took, from sending it until its last token.",
+    labels=(*LLM_LABELS, "outcome"),
+)
+LLM_FIRST_TOKEN = metrics.histogram(
+    "llmbot_llm_time_to_first_token_seconds",
+    "Time from sending a streamed model call until its first token arrived.",
+    labels=LLM_LABELS,
+)
+LLM_TOKEN_RATE = metrics.histogram(
+    "llmbot_llm_tokens_per_second",
+    "Output tokens per second of generation, counted from the first token for streams.",
+    labels=LLM_LABELS,
+    buckets=RATE_BUCKETS,
+    unit="1/s",
+)
+LLM_TOKENS = metrics.counter(
+    "llmbot_llm_tokens_total",
+    "Tokens sent to (input) and received from (output) the models.",
+    labels=(*LLM_LABELS, "direction"),
+)
+ATTACHMENT_PREPARE = metrics.histogram(
+    "llmbot_attachment_prepare_seconds", "Time spent preparing the images sent with a prompt."
+)
+
+
+class _CallTrace:
+    """Timings of one upstream model call, written to its span and the metrics when it ends."""
+
+    def __init__(self, provider: str, model: str, kind: str) -> None:
+        self.labels = {"provider": provider, "model": model, "kind": kind}
+        self.started = time.perf_counter()
+        self.first_token_at: float | None = None
+        self.usage: CompletionUsage | None = None
+
+    def first_token(self) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+    def finish(self, span: logfire.LogfireSpan, outcome: str) -> None:
+        duration = time.perf_counter() - self.started
+        LLM_DURATION.observe(duration, outcome=outcome, **self.labels)
+        attributes: dict[str, Any] = {"duration": duration, "outcome": outcome}
+        generating = duration
+        if self.first_token_at is not None:
+            first_token = self.first_token_at - self.started
+            LLM_FIRST_TOKEN.observe(first_token, **self.labels)
+            attributes["time_to_first_token"] = first_token
+            generating -= first_token
+        if self.usage is not None:
+            LLM_TOKENS.inc(self.usage.prompt_tokens, direction="input", **self.labels)
+            LLM_TOKENS.inc(self.usage.completion_tokens, direction="output", **self.labels)
+            attributes["input_tokens"] = self.usage.prompt_tokens
+            attributes["output_tokens"] = self.usage.completion_tokens
+            if generating > 0 and self.usage.completion_tokens:
+                rate = self.usage.completion_tokens / generating
+                LLM_TOKEN_RATE.observe(rate, **self.labels)
+                attributes["tokens_per_second"] = rate
+        span.set_attributes(attributes)
+
+
+@contextlib.contextmanager
+def _trace_call(provider: str, model: str, kind: str) -> Iterator[_CallTrace]:
+    trace = _CallTrace(provider, model, kind)
+    with logfire.span(
+        "{kind} call to {provider} {model}", provider=provider, model=model, kind=kind
+    ) as span:
+        try:
+            yield trace
+        except Exception:
+            trace.finish(span, "error")
+            raise
+        except BaseException:
+            # Cancelled, or a stream closed before it ended.
+            trace.finish(span, "cancelled")
+            raise
+        trace.finish(span, "ok")
+
 
 class LLMServices(Config):
     model_config = ConfigDict(arbitrary_types_allowed=True)
@@ -52,13 +144,32 @@ class LLMServices(Config):
         alias="graph_model",
     )
     system_prompt: str = Field(default=SYSTEM_PROMPT)
+    priority: Priority = Field(
+        default=Priority.INTERACTIVE,
+        description="Where this service's upstream calls queue in the dispatcher.",
+    )
 
     @computed_field
     @property
     def client(self) -> AsyncOpenAI:
-        client = AsyncOpenAI(api_key=self.openai_api_key, base_url="https://api.openai.com/v1")
+        client = client_registry.get_client(
+            provider="openai", api_key=self.openai_api_key, base_url=self.openai_base_url
+        )
         return client
 
+    @computed_field
+    @property
+    def pplx_client(self) -> AsyncOpenAI:
+        client = client_registry.get_client(
+            provider="perplexity", api_key=self.pplx_api_key, base_url=self.pplx_base_url
+        )
+        return client
+
+    async def warmup(self) -> None:
+        """Register the provider clients and open their connection pools ahead of the first request."""
+        _ = self.client, self.pplx_client
+        await client_registry.warmup()
+
     @classmethod
     async def _get_llm_config(cls, config_dict: dict[str, Any]) -> dict[str, Any]:
         llm_config = {
@@ -70,70 +181,290 @@ class LLMServices(Config):
         return llm_config
 
     async def prepare_content(
-        self, prompt: str, image_urls: Optional[list[str]] = None
+        self,
+        prompt: str,
+        image_urls: Optional[list[str]] = None,
+        history: Optional[list[dict[str, Any]]] = None,
     ) -> list[dict[str, Any]]:
+        """Build the user content, trimmed to what the model's context window can take.
+
+        The text comes first: it is cut to the budget left after the system prompt and the
+        conversation history, and images are only attached while they still fit, so an
+        oversized request is never uploaded just to be rejected.
+        """
+        budget = token_budget.input_limit(self.llm_model) - token_budget.count_messages(
+            [
+                {"role": "system", "content": self.system_prompt},
+                *(history or []),
+                {"role": "user", "content": ""},
+            ],
+            self.llm_model,
+        )
+        prompt = token_budget.trim(prompt, budget, self.llm_model)
         content: list[dict[str, Any]] = [{"type": "text", "text": prompt}]
         if not image_urls:
             return content
-        for image_url in image_urls:
-            image = get_pil_image(image_file=image_url)
-            image_base64 = pil_to_data_uri(image=image)
-            content.append({"type": "image_url", "image_url": {"url": image_base64}})
+        remaining = budget - token_budget.count(prompt, self.llm_model)
+        max_images = max(0, remaining // token_budget.image_tokens)
+        started = time.perf_counter()
+        with logfire.span("Prepare {count} attachments", count=min(len(image_urls), max_images)):
+            content.extend(await image_pipeline.prepare(image_urls[:max_images]))
+        ATTACHMENT_PREPARE.observe(time.perf_counter() - started)
         return content
 
-    async def get_search_result(self, prompt: str) -> ChatCompletion:
-        client = AsyncOpenAI(api_key=self.pplx_api_key, base_url="https://api.perplexity.ai")
-        response = await client.chat.completions.create(
-            model="llama-3.1-sonar-large-128k-online",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an artificial intelligence assistant and you need to engage in a helpful, detailed, polite conversation with a user.",
-                },
-                {"role": "user", "content": prompt},
-            ],
+    @staticmethod
+    def _near_scope(scope: str, kind: str, model: str, messages: list[dict[str, Any]]) -> str:
+        # Everything except the prompt text must match exactly: scope, model, system prompt
+        # and images. Hashing the request without its text yields exactly that.
+        *context, question = messages
+        content = question["content"]
+        images = (
+            [part for part in content if part["type"] != "text"]
+            if isinstance(content, list)
+            else []
         )
-        return response
-
-    async def get_dalle_image(self, prompt: str) -> ImagesResponse:
-        response = await self.client.images.generate(
-            prompt=prompt,
-            model=self.graph_model,
-            quality="hd",
-            response_format="url",
-            size="1024x1024",
-            style="vivid",
+        digest = make_cache_key(
+            kind=kind, model=model, messages=[*context, {"role": "user", "content": images}]
         )
-        return response
+        return f"{scope}:{digest}"
 
-    async def get_oai_reply(
-        self, prompt: str, image_urls: Optional[list[str]] = None
+    async def _get_cached(
+        self,
+        key: str,
+        prompt: str,
+        scope: Optional[str],
+        kind: str,
+        model: str,
+        messages: list[dict[str, Any]],
+    ) -> Optional[CachedValue]:
+        if not self.response_cache_enabled:
+            return None
+        cached = await response_cache.get(key)
+        if cached is None and self.near_cache_enabled and scope is not None:
+            near_key = near_duplicate_index.lookup(
+                prompt, scope=self._near_scope(scope, kind, model, messages)
+            )
+            if near_key is not None:
+                cached = await response_cache.get(near_key)
+        return cached
+
+    async def _set_cached(
+        self,
+        key: str,
+        value: CachedValue,
+        prompt: str,
+        scope: Optional[str],
+        kind: str,
+        model: str,
+        messages: list[dict[str, Any]],
+    ) -> None:
+        if not self.response_cache_enabled:
+            return
+        await response_cache.set(key, value)
+        if self.near_cache_enabled and scope is not None:
+            near_duplicate_index.add(
+                prompt, key=key, scope=self._near_scope(scope, kind, model, messages)
+            )
+
+    async def get_search_result(
+        self,
+        prompt: str,
+        scope: Optional[str] = None,
+        on_queued: Optional[Callable[[QueuePosition], None]] = None,
     ) -> ChatCompletion:
-        content = await self.prepare_content(prompt, image_urls)
-        completion = self.client.chat.completions.create(
-            model=self.llm_model,
-            messages=[
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": content},
-            ],
+        """Search the web with Perplexity.
+
+        Args:
+            prompt (str): The search query.
+            scope (Optional[str]): Enables near-duplicate cache hits shared within this scope,
+                e.g. a guild; None only allows exact hits.
+            on_queued (Optional[Callable[[QueuePosition], None]]): Called with the queue
+                position while the search waits for a free upstream slot.
+
+        Returns:
+            ChatCompletion: The search answer.
+        """
+        model = "llama-3.1-sonar-large-128k-online"
+        messages = [
+            {
+                "role": "system",
+                "content": "You are an artificial intelligence assistant and you need to engage in a helpful, detailed, polite conversation with a user.",
+            },
+            {"role": "user", "content": prompt},
+        ]
+        key = make_cache_key(kind="search", model=model, messages=messages)
+        cached = await self._get_cached(key, prompt, scope, "search", model, messages)
+        if cached is not None:
+            return ChatCompletion.model_validate(cached)
+
+        async def search() -> ChatCompletion:
+            async with llm_dispatcher.slot("perplexity", model, self.priority, on_queued):
+                with _trace_call("perplexity", model, "search") as trace:
+                    response = await self.pplx_client.chat.completions.create(
+                        model=model, messages=messages
+                    )
+                    trace.usage = response.usage
+            token_budget.record(model, messages, response.usage)
+            await self._set_cached(
+                key, response.model_dump(mode="json"), prompt, scope, "search", model, messages
+            )
+            return response
+
+        # Identical searches already in flight share their upstream call.
+        return await request_flights.do(key, search)
+
+    async def get_dalle_image(
+        self, prompt: str, on_queued: Optional[Callable[[QueuePosition], None]] = None
+    ) -> ImagesResponse:
+        key = make_cache_key(
+            kind="image", model=self.graph_model, messages=[{"role": "user", "content": prompt}]
         )
-        return await completion
+
+        async def generate() -> ImagesResponse:
+            async with llm_dispatcher.slot("openai", self.graph_model, self.priority, on_queued):
+                with _trace_call("openai", self.graph_model, "image"):
+                    return await self.client.images.generate(
+                        prompt=prompt,
+                        model=self.graph_model,
+                        quality="hd",
+                        response_format="url",
+                        size="1024x1024",
+                        style="vivid",
+                    )
+
+        return await request_flights.do(key, generate)
+
+    async def _build_messages(
+        self,
+        prompt: str,
+        image_urls: Optional[list[str]] = None,
+        history: Optional[list[dict[str, Any]]] = None,
+    ) -> list[dict[str, Any]]:
+        content = await self.prepare_content(prompt, image_urls, history)
+        return [
+            {"role": "system", "content": self.system_prompt},
+            *(history or []),
+            {"role": "user", "content": content},
+        ]
+
+    async def get_oai_reply(
+        self,
+        prompt: str,
+        image_urls: Optional[list[str]] = None,
+        scope: Optional[str] = None,
+        history: Optional[list[dict[str, Any]]] = None,
+        on_queued: Optional[Callable[[QueuePosition], None]] = None,
+    ) -> ChatCompletion:
+        """Generate a reply with the OpenAI model.
+
+        Args:
+            prompt (str): The user prompt.
+            image_urls (Optional[list[str]]): Images sent along with the prompt.
+            scope (Optional[str]): Enables near-duplicate cache hits shared within this scope,
+                e.g. a guild; None only allows exact hits.
+            history (Optional[list[dict[str, Any]]]): Earlier conversation messages placed
+                between the system prompt and the prompt.
+            on_queued (Optional[Callable[[QueuePosition], None]]): Called with the queue
+                position while the request waits for a free upstream slot.
+
+        Returns:
+            ChatCompletion: The model's reply.
+        """
+        messages = await self._build_messages(prompt, image_urls, history)
+        key = make_cache_key(kind="oai", model=self.llm_model, messages=messages)
+        cached = await self._get_cached(key, prompt, scope, "oai", self.llm_model, messages)
+        if cached is not None:
+            return ChatCompletion.model_validate(cached)
+
+        async def complete() -> ChatCompletion:
+            async with llm_dispatcher.slot("openai", self.llm_model, self.priority, on_queued):
+                with _trace_call("openai", self.llm_model, "chat") as trace:
+                    completion = await self.client.chat.completions.create(
+                        model=self.llm_model, messages=messages
+                    )
+                    trace.usage = completion.usage
+            token_budget.record(self.llm_model, messages, completion.usage)
+            await self._set_cached(
+                key,
+                completion.model_dump(mode="json"),
+                prompt,
+                scope,
+                "oai",
+                self.llm_model,
+                messages,
+            )
+            return completion
+
+        # Identical requests already in flight share their upstream call.
+        return await request_flights.do(key, complete)
 
     async def get_oai_reply_stream(
-        self, prompt: str, image_urls: Optional[list[str]] = None
+        self,
+        prompt: str,
+        image_urls: Optional[list[str]] = None,
+        history: Optional[list[dict[str, Any]]] = None,
+        on_queued: Optional[Callable[[QueuePosition], None]] = None,
     ) -> AsyncGenerator[ChatCompletionChunk, None]:
-        content = await self.prepare_content(prompt, image_urls)
-        completion: AsyncStream[ChatCompletionChunk] = await self.client.chat.completions.create(
-            model=self.llm_model,
-            messages=[
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": content},
-            ],
-            stream=True,
-        )
-        async for chunk in completion:
-            if len(chunk.choices) > 0:
-                yield chunk
+        messages = await self._build_messages(prompt, image_urls, history)
+        key = make_cache_key(kind="oai_stream", model=self.llm_model, messages=messages)
+        if self.response_cache_enabled:
+            cached = await response_cache.get(key)
+            if cached is not None:
+                for chunk in cached:
+                    yield ChatCompletionChunk.model_validate(chunk)
+                return
+        # Identical streams already in flight are shared: a late caller first gets the chunks
+        # produced so far, then the rest as they arrive.
+        async for chunk in request_flights.stream(
+            key, lambda: self._stream_upstream(key, messages, on_queued)
+        ):
+            yield chunk
+
+    async def _stream_upstream(
+        self,
+        key: str,
+        messages: list[dict[str, Any]],
+        on_queued: Optional[Callable[[QueuePosition], None]] = None,
+    ) -> AsyncGenerator[ChatCompletionChunk, None]:
+        chunks: list[dict[str, Any]] = []
+        # The slot is held until the stream ends, since that is how long the upstream works on it.
+        async with llm_dispatcher.slot("openai", self.llm_model, self.priority, on_queued):
+            with _trace_call("openai", self.llm_model, "chat_stream") as trace:
+                completion: AsyncStream[
+                    ChatCompletionChunk
+                ] = await self.client.chat.completions.create(
+                    model=self.llm_model,
+                    messages=messages,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                async with completion:
+                    async for chunk in completion:
+                        # The usage arrives in a last chunk without choices.
+                        if chunk.usage is not None:
+                            token_budget.record(self.llm_model, messages, chunk.usage)
+                            trace.usage = chunk.usage
+                        if len(chunk.choices) > 0:
+                            if chunk.choices[0].delta.content:
+                                trace.first_token()
+                            if self.response_cache_enabled:
+                                chunks.append(chunk.model_dump(mode="json"))
+                            yield chunk
+        # Only a stream that ran to completion is stored; an abandoned one never gets here.
+        if self.response_cache_enabled and chunks:
+            await response_cache.set(key, chunks)
+
+
+@functools.cache
+def get_llm_services(
+    system_prompt: str = SYSTEM_PROMPT, priority: Priority = Priority.INTERACTIVE
+) -> LLMServices:
+    """Return the shared services for a system prompt and queue priority.
+
+    Cogs that only differ in these share one instance, so the settings are read from the
+    environment once per combination rather than once per cog.
+    """
+    return LLMServices(system_prompt=system_prompt, priority=priority)
 
 
 if __name__ == "__main__":
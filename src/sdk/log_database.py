@@ -0,0 +1,165 @@
+import time
+from typing import Any
+import asyncio
+import datetime
+from collections import deque
+
+from pydantic import Field, BaseModel, ConfigDict, PrivateAttr
+from sqlalchemy import Text, Index, Table, Column, String, Integer, DateTime, MetaData, BigInteger
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncConnection, create_async_engine
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+
+from src.sdk.log_writer import MessageRecord
+
+metadata = MetaData()
+
+message_table = Table(
+    "llmbot_message",
+    metadata,
+    Column("message_id", BigInteger, primary_key=True, autoincrement=False),
+    Column("author", String(255), nullable=False),
+    Column("author_id", BigInteger, nullable=False),
+    Column("content", Text, nullable=False),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+    Column("channel_name", String(255), nullable=False),
+    Column("channel_id", BigInteger, nullable=True),
+    Column("attachments", Text, nullable=False),
+    Column("stickers", Text, nullable=False),
+    Index("ix_llmbot_message_author_id", "author_id"),
+    Index("ix_llmbot_message_channel_id", "channel_id"),
+    Index("ix_llmbot_message_created_at", "created_at"),
+    # Message ids are snowflakes, so this orders a user's messages in a channel by time.
+    Index("ix_llmbot_message_channel_author_id", "channel_id", "author_id", "message_id"),
+)
+
+# Message id ranges per channel whose non-bot messages are all present in `llmbot_message`.
+coverage_table = Table(
+    "llmbot_message_coverage",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("channel_id", BigInteger, nullable=False),
+    Column("start_id", BigInteger, nullable=False),
+    Column("end_id", BigInteger, nullable=False),
+    Index("ix_llmbot_message_coverage_channel_end", "channel_id", "end_id"),
+)
+
+_engines: dict[str, AsyncEngine] = {}
+
+
+def get_async_engine(dsn: str) -> AsyncEngine:
+    """Return the process-wide pooled engine for the DSN, creating it on first use.
+
+    Args:
+        dsn (str): An async SQLAlchemy URL, e.g. `postgresql+asyncpg://...` or `sqlite+aiosqlite:///...`.
+
+    Returns:
+        AsyncEngine: The shared engine for the DSN.
+    """
+    engine = _engines.get(dsn)
+    if engine is None:
+        engine_kwargs: dict[str, Any] = {"pool_pre_ping": True}
+        if make_url(dsn).get_backend_name() != "sqlite":
+            engine_kwargs.update(pool_size=5, max_overflow=10, pool_recycle=1800)
+        engine = create_async_engine(dsn, **engine_kwargs)
+        _engines[dsn] = engine
+    return engine
+
+
+async def dispose_engine(dsn: str) -> None:
+    """Dispose the shared engine of a DSN, if one was created; the next use builds a new one."""
+    engine = _engines.pop(dsn, None)
+    if engine is not None:
+        await engine.dispose()
+
+
+async def dispose_engines() -> None:
+    """Dispose every shared engine, closing their pooled connections."""
+    for engine in _engines.values():
+        await engine.dispose()
+    _engines.clear()
+
+
+class SinkStats(BaseModel):
+    rows: int = Field(default=0, description="Rows submitted to the database.")
+    batches: int = Field(default=0, description="Batches flushed to the database.")
+    rows_per_sec: float = Field(default=0.0, description="Rows per second of flush time.")
+    p99_flush_ms: float = Field(default=0.0, description="99th percentile batch flush latency.")
+
+
+class SQLMessageSink(BaseModel):
+    """Bulk-insert sink that writes message records into `llmbot_message`.
+
+    Each batch is one bulk `INSERT ... ON CONFLICT (message_id) DO NOTHING` executed over
+    all rows in a single transaction, so replaying a batch never duplicates rows.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    dsn: str = Field(..., description="The async SQLAlchemy URL of the database.")
+
+    _initialized: bool = PrivateAttr(default=False)
+    _init_lock: asyncio.Lock = PrivateAttr(default_factory=asyncio.Lock)
+    _stats: SinkStats = PrivateAttr(default_factory=SinkStats)
+    _flush_seconds: float = PrivateAttr(default=0.0)
+    _flush_samples: deque[float] = PrivateAttr(default_factory=lambda: deque(maxlen=1024))
+
+    @property
+    def engine(self) -> AsyncEngine:
+        return get_async_engine(self.dsn)
+
+    async def create_table(self) -> None:
+        """Create the message tables and their indexes if they do not exist yet."""
+        async with self._init_lock:
+            if self._initialized:
+                return
+            async with self.engine.begin() as conn:
+                await conn.run_sync(metadata.create_all)
+            self._initialized = True
+
+    @staticmethod
+    def _to_row(record: MessageRecord) -> dict[str, Any]:
+        return {
+            "message_id": int(record.message_id),
+            "author": record.author,
+            "author_id": int(record.author_id),
+            "content": record.content,
+            "created_at": datetime.datetime.fromisoformat(record.created_at),
+            "channel_name": record.channel_name,
+            "channel_id": int(record.channel_id) if record.channel_id.isdigit() else None,
+            "attachments": record.attachments,
+            "stickers": record.stickers,
+        }
+
+    async def _insert_rows(self, conn: AsyncConnection, rows: list[dict[str, Any]]) -> None:
+        insert = postgresql_insert if self.engine.dialect.name == "postgresql" else sqlite_insert
+        statement = insert(message_table).on_conflict_do_nothing(index_elements=["message_id"])
+        await conn.execute(statement, rows)
+
+    async def _after_insert(self, conn: AsyncConnection, records: list[MessageRecord]) -> None:
+        """Hook for subclasses to write more in the same transaction as the batch."""
+
+    async def write_batch(self, records: list[MessageRecord]) -> None:
+        await self.create_table()
+        rows = [self._to_row(record) for record in records if record.message_id]
+        if not rows:
+            return
+
+        started = time.perf_counter()
+        async with self.engine.begin() as conn:
+            await self._insert_rows(conn, rows)
+            await self._after_insert(conn, records)
+        elapsed = time.perf_counter() - started
+
+        self._flush_seconds += elapsed
+        self._flush_samples.append(elapsed * 1000)
+        self._stats.rows += len(rows)
+        self._stats.batches += 1
+
+    def stats(self) -> SinkStats:
+        samples = sorted(self._flush_samples)
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] if samples else 0.0
+        rows_per_sec = self._stats.rows / self._flush_seconds if self._flush_seconds else 0.0
+        return self._stats.model_copy(
+            update={"rows_per_sec": round(rows_per_sec, 2), "p99_flush_ms": round(p99, 2)}
+        )
@@ -1,34 +1,79 @@
+import time
+from typing import TYPE_CHECKING
+import asyncio
 from pathlib import Path
 import datetime
 
-import pandas as pd
 import logfire
 import nextcord
-from pydantic import Field, BaseModel, ConfigDict, computed_field
-import sqlalchemy
-from sqlalchemy import create_engine
+from pydantic import BaseModel, ConfigDict
 from nextcord.message import Attachment, StickerItem
 
-from src.types.database import DatabaseConfig
+from src.sdk.metrics import metrics
+from src.sdk.log_writer import MessageSink, MessageRecord, CSVMessageSink, message_log_writer
+from src.sdk.attachment_store import attachment_store
+
+if TYPE_CHECKING:
+    from src.sdk.storage import StorageRegistry
+    from src.sdk.message_index import MessageIndex
+
+
+def build_message_sinks(
+    sink_names: list[str], storage: "StorageRegistry", index: "MessageIndex | None" = None
+) -> list[MessageSink]:
+    """Build the message log sinks selected in the config.
+
+    Args:
+        sink_names (list[str]): The selected sinks, any of "csv", "postgres" and "sqlite".
+        storage (StorageRegistry): The storage backends; only the ones selected here are built.
+        index (MessageIndex | None): The message index to feed; it replaces the SQL sink
+            writing to the same database.
+
+    Returns:
+        list[MessageSink]: The sinks for the background message log writer.
+    """
+    # SQLAlchemy is only imported when a database sink is selected.
+    from src.sdk.log_database import SQLMessageSink
+
+    sinks: list[MessageSink] = []
+    for sink_name in sink_names:
+        if sink_name == "csv":
+            sinks.append(CSVMessageSink())
+        elif sink_name in ("postgres", "sqlite"):
+            sinks.append(SQLMessageSink(dsn=storage.backend(sink_name).dsn))
+    if index is not None:
+        sinks = [sink for sink in sinks if getattr(sink, "dsn", None) != index.dsn]
+        sinks.append(index)
+    return sinks
+
+
+MESSAGE_LOG = metrics.histogram(
+    "llmbot_message_log_seconds",
+    "Time spent logging one message: saving its files, queueing its record, and in total.",
+    labels=("phase",),
+)
 
 
 class MessageLogger(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
     message: nextcord.Message
-    database: DatabaseConfig = Field(default_factory=DatabaseConfig)
-
-    @computed_field
-    @property
-    def engine(self) -> sqlalchemy.Engine:
-        engine = create_engine(self.database.postgres.postgres_dsn, echo=True)
-        return engine
 
     async def log(self) -> None:
-        """Log a message to a CSV file and save attachments and stickers to disk."""
+        """Save the attachments and stickers of a message, then queue its record for the sinks.
+
+        The record goes to `message_log_writer`, which writes it in batches to the configured
+        sinks (CSV, PostgreSQL or SQLite, and the message index) in the background.
+        """
         # 避免記錄到機器人自己的訊息
         if self.message.author.bot:
             return
 
+        started = time.perf_counter()
+        with logfire.span("Log message", channel_id=getattr(self.message.channel, "id", None)):
+            await self._log(started)
+        MESSAGE_LOG.observe(time.perf_counter() - started, phase="total")
+
+    async def _log(self, started: float) -> None:
         # 判斷頻道類型並獲取頻道名稱
         channel_name = await self._get_channel_name(self.message)
 
@@ -37,8 +82,12 @@ class MessageLogger(BaseModel):
         base_dir = Path("data") / today / channel_name
 
         # 保存附件與貼圖
-        attachment_paths = await self._save_attachments(self.message.attachments, base_dir)
-        sticker_paths = await self._save_stickers(self.message.stickers, base_dir)
+        attachment_paths, sticker_paths = await asyncio.gather(
+            self._save_attachments(self.message.attachments, base_dir),
+            self._save_stickers(self.message.stickers, base_dir),
+        )
+        saved = time.perf_counter()
+        MESSAGE_LOG.observe(saved - started, phase="files")
 
         # 紀錄到 logfire
         logfire.info(
@@ -49,8 +98,9 @@ class MessageLogger(BaseModel):
             channel_id=getattr(self.message.channel, "id", None),
         )
 
-        # 寫入 CSV（或改成寫入資料庫）
+        # 排入 message_log_writer，由背景批次寫入各個 sink
         await self._save_message_data(self.message, attachment_paths, sticker_paths)
+        MESSAGE_LOG.observe(time.perf_counter() - saved, phase="enqueue")
 
     async def _get_channel_name(self, message: nextcord.Message) -> str:
         """Determine if the message is from a direct message (DM) or a server channel, and return the corresponding name.
@@ -66,51 +116,40 @@ class MessageLogger(BaseModel):
         return f"{message.channel.name}_{message.channel.id}"
 
     async def _save_attachments(self, attachments: list[Attachment], base_dir: Path) -> list[str]:
-        """Save attachments to the specified directory and return a list of file paths.
+        """Save attachments into the content-addressed store and return their linked file paths.
 
         Args:
             attachments (list[Attachment]): A list of Attachment objects to be saved.
-            base_dir (Path): The base directory where attachments will be saved.
+            base_dir (Path): The base directory where the attachment links will be created.
 
         Returns:
             list[str]: A list of file paths where the attachments were saved.
         """
-        saved_paths = []
-        for attachment in attachments:
-            filepath = base_dir / attachment.filename
-            base_dir.mkdir(parents=True, exist_ok=True)
-            await attachment.save(filepath)
-            saved_paths.append(str(filepath))
-        return saved_paths
+        files = [
+            (attachment.url, base_dir / f"{attachment.id}_{attachment.filename}")
+            for attachment in attachments
+        ]
+        return await attachment_store.save_many(files)
 
     async def _save_stickers(self, stickers: list[StickerItem], base_dir: Path) -> list[str]:
-        """Downloads and saves stickers to the specified directory, and returns a list of file paths.
+        """Save stickers into the content-addressed store and return their linked file paths.
+
+        Stickers that cannot be downloaded (e.g. deleted stickers) are skipped.
 
         Args:
             stickers (list[StickerItem]): A list of StickerItem objects to be saved.
-            base_dir (Path): The base directory where the stickers will be saved.
+            base_dir (Path): The base directory where the sticker links will be created.
 
         Returns:
             list[str]: A list of file paths where the stickers were saved.
-
-        Raises:
-            discord.NotFound: If a sticker is not found.
         """
-        saved_paths = []
-        for sticker in stickers:
-            filepath = base_dir / f"sticker_{sticker.id}.png"
-            try:
-                base_dir.mkdir(parents=True, exist_ok=True)
-                await sticker.save(filepath)
-                saved_paths.append(str(filepath))
-            except nextcord.NotFound:
-                logfire.warn("Sticker is not found", sticker_id=sticker.id)
-        return saved_paths
+        files = [(sticker.url, base_dir / f"sticker_{sticker.id}.png") for sticker in stickers]
+        return await attachment_store.save_many(files)
 
     async def _save_message_data(
         self, message: nextcord.Message, attachment_paths: list[str], sticker_paths: list[str]
     ) -> None:
-        """Saves message data to a CSV file.
+        """Queues the message data for the background writer, which writes it to every configured sink in batches.
 
         Args:
             message (discord.Message): The Discord message object containing the message details.
@@ -120,24 +159,15 @@ class MessageLogger(BaseModel):
         Returns:
             None
         """
-        message_data = {
-            "author": [message.author.name],
-            "author_id": [str(message.author.id)],
-            "content": [message.content],
-            "created_at": [message.created_at.isoformat()],
-            "channel_name": [getattr(message.channel, "name", "DM")],
-            "channel_id": [str(getattr(message.channel, "id", None))],
-            "attachments": [";".join(attachment_paths)],
-            "stickers": [";".join(sticker_paths)],
-        }
-        message_df = pd.DataFrame(message_data)
-        message_df = message_df.astype(str)
-
-        # 寫入 CSV (append 模式，不覆蓋既有資料)
-        message_df.to_csv("./data/llmbot_message.csv", mode="a", header=False, index=False)
-
-        # 或改用 to_sql 寫入資料庫：
-        # df.to_sql("llmbot_message", con=self.engine, if_exists="append", index=False)
-
-        # # 繼續處理其他命令
-        # await self.bot.process_commands(message)
+        record = MessageRecord(
+            author=message.author.name,
+            author_id=str(message.author.id),
+            content=message.content,
+            created_at=message.created_at.isoformat(),
+            channel_name=getattr(message.channel, "name", "DM"),
+            channel_id=str(getattr(message.channel, "id", None)),
+            attachments=";".join(attachment_paths),
+            stickers=";".join(sticker_paths),
+            message_id=str(message.id),
+        )
+        await message_log_writer.put(record)
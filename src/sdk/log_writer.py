@@ -0,0 +1,226 @@
+import os
+import csv
+import time
+from typing import Literal, Protocol, NamedTuple, runtime_checkable
+import asyncio
+from pathlib import Path
+from collections import deque
+
+import logfire
+from pydantic import Field, BaseModel, ConfigDict, PrivateAttr
+
+from src.sdk.metrics import metrics
+
+SINK_WRITE = metrics.histogram(
+    "llmbot_message_sink_write_seconds",
+    "Time a message log sink took to write one batch.",
+    labels=("sink", "outcome"),
+)
+
+
+class MessageRecord(NamedTuple):
+    author: str
+    author_id: str
+    content: str
+    created_at: str
+    channel_name: str
+    channel_id: str
+    attachments: str
+    stickers: str
+    message_id: str = ""
+
+
+@runtime_checkable
+class MessageSink(Protocol):
+    """Receives batches of message records.
+
+    A sink may also define `discard(record)`, which is called for records dropped because the
+    queue was full, e.g. to stop treating the channel history as complete.
+    """
+
+    async def write_batch(self, records: list[MessageRecord]) -> None: ...
+
+
+class CSVMessageSink(BaseModel):
+    """Appends message records to a headerless CSV file, one column per record field.
+
+    A file written with another set of columns, e.g. before `message_id` was added, is moved
+    aside to `<name>.<n>-columns.csv` on the first write, so no file mixes two layouts.
+    """
+
+    path: str = Field(
+        default="./data/llmbot_message.csv",
+        description="The CSV file the message records are appended to.",
+    )
+
+    _checked: bool = PrivateAttr(default=False)
+
+    @staticmethod
+    def _rotate_other_layout(path: Path) -> None:
+        if not path.exists():
+            return
+        with path.open(encoding="utf-8", newline="") as f:
+            first_row = next(csv.reader(f), None)
+        columns = len(first_row) if first_row is not None else len(MessageRecord._fields)
+        if columns == len(MessageRecord._fields):
+            return
+        rotated = path.with_name(f"{path.stem}.{columns}-columns{path.suffix}")
+        index = 1
+        while rotated.exists():
+            index += 1
+            rotated = path.with_name(f"{path.stem}.{columns}-columns.{index}{path.suffix}")
+        os.replace(path, rotated)
+        logfire.info("Message log with other columns moved aside", path=str(rotated))
+
+    def _append(self, records: list[MessageRecord]) -> None:
+        path = Path(self.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if not self._checked:
+            self._rotate_other_layout(path)
+            self._checked = True
+        with path.open("a", encoding="utf-8", newline="") as f:
+            csv.writer(f).writerows(records)
+
+    async def write_batch(self, records: list[MessageRecord]) -> None:
+        await asyncio.to_thread(self._append, records)
+
+
+class WriterStats(BaseModel):
+    enqueued: int = Field(default=0, description="Records accepted into the queue.")
+    written: int = Field(default=0, description="Records written by every sink.")
+    dropped: int = Field(default=0, description="Records dropped because the queue was full.")
+    failed: int = Field(default=0, description="Records lost because a sink raised.")
+    batches: int = Field(default=0, description="Batches flushed to the sinks.")
+    queue_size: int = Field(default=0, description="Records currently waiting in the queue.")
+    p99_flush_ms: float = Field(
+        default=0.0, description="99th percentile time to write one batch to every sink."
+    )
+
+
+class MessageLogWriter(BaseModel):
+    """Bounded queue plus a background task that writes message records in batches.
+
+    The gateway handler only pays for a queue insert; the background task flushes
+    whenever `batch_size` records are waiting or `flush_interval_ms` has elapsed since
+    the first record of the batch arrived.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    sinks: list[MessageSink] = Field(default_factory=lambda: [CSVMessageSink()])
+    max_queue_size: int = Field(
+        default=10000, description="The maximum number of records waiting to be written."
+    )
+    batch_size: int = Field(default=500, description="Flush once this many records are queued.")
+    flush_interval_ms: int = Field(
+        default=1000, description="Flush at least this often while records are waiting."
+    )
+    overflow: Literal["drop", "block"] = Field(
+        default="drop",
+        description="Drop new records when the queue is full, or block the caller until there is room.",
+    )
+
+    _queue: asyncio.Queue | None = PrivateAttr(default=None)
+    _task: asyncio.Task | None = PrivateAttr(default=None)
+    _stats: WriterStats = PrivateAttr(default_factory=WriterStats)
+    _flush_samples: deque[float] = PrivateAttr(default_factory=lambda: deque(maxlen=1024))
+
+    def _ensure_started(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="message-log-writer")
+        return self._queue
+
+    async def put(self, record: MessageRecord) -> bool:
+        """Queue a record for writing.
+
+        Args:
+            record (MessageRecord): The record to write.
+
+        Returns:
+            bool: False if the record was dropped because the queue was full.
+        """
+        queue = self._ensure_started()
+        if self.overflow == "block":
+            await queue.put(record)
+        else:
+            try:
+                queue.put_nowait(record)
+            except asyncio.QueueFull:
+                self._stats.dropped += 1
+                for sink in self.sinks:
+                    discard = getattr(sink, "discard", None)
+                    if discard is not None:
+                        discard(record)
+                if self._stats.dropped % 1000 == 1:
+                    logfire.warn("Message log queue is full", dropped=self._stats.dropped)
+                return False
+        self._stats.enqueued += 1
+        return True
+
+    async def _collect_batch(self, queue: asyncio.Queue) -> list[MessageRecord]:
+        batch = [await queue.get()]
+        deadline = time.monotonic() + self.flush_interval_ms / 1000
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write_to_sink(self, sink: MessageSink, batch: list[MessageRecord]) -> bool:
+        sink_name = type(sink).__name__
+        started = time.perf_counter()
+        try:
+            with logfire.span("Write message batch to {sink}", sink=sink_name, size=len(batch)):
+                await sink.write_batch(batch)
+        except Exception as e:
+            SINK_WRITE.observe(time.perf_counter() - started, sink=sink_name, outcome="error")
+            logfire.error("Failed to write message batch", sink=sink_name, error=str(e))
+            return False
+        SINK_WRITE.observe(time.perf_counter() - started, sink=sink_name, outcome="ok")
+        return True
+
+    async def _flush(self, batch: list[MessageRecord]) -> None:
+        started = time.perf_counter()
+        results = [await self._write_to_sink(sink, batch) for sink in self.sinks]
+        self._flush_samples.append((time.perf_counter() - started) * 1000)
+        if all(results):
+            self._stats.written += len(batch)
+        else:
+            self._stats.failed += len(batch)
+        self._stats.batches += 1
+
+    async def _run(self) -> None:
+        queue = self._queue
+        while True:
+            batch = await self._collect_batch(queue)
+            # Shielded so that a shutdown cancelling this task never loses a half-written batch.
+            await asyncio.shield(self._flush(batch))
+            for _ in batch:
+                queue.task_done()
+
+    async def aclose(self) -> None:
+        """Flush everything still queued and stop the background task."""
+        if self._queue is None:
+            return
+        if self._task is not None and not self._task.done():
+            await self._queue.join()
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._queue = None
+
+    def stats(self) -> WriterStats:
+        queue_size = self._queue.qsize() if self._queue is not None else 0
+        samples = sorted(self._flush_samples)
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] if samples else 0.0
+        return self._stats.model_copy(
+            update={"queue_size": queue_size, "p99_flush_ms": round(p99, 2)}
+        )
+
+
+message_log_writer = MessageLogWriter()
@@ -0,0 +1,214 @@
+from typing import Any, Literal
+import asyncio
+
+from openai import OpenAIError
+import orjson
+import logfire
+from pydantic import Field, BaseModel, ConfigDict, PrivateAttr
+from redis.exceptions import RedisError
+
+from src.sdk.llm import LLMServices
+from src.sdk.tokens import token_budget
+from src.sdk.dispatcher import Priority
+
+FOLD_PROMPT = """
+你負責維護一段 Discord 對話的摘要。
+請把既有摘要與新加入的對話合併成一份新的摘要，保留使用者的需求、已經給出的結論與尚未解決的問題。
+只輸出摘要本身，不要超過 300 字。
+"""
+
+FOLD_MESSAGE = """
+既有摘要：
+{summary}
+
+新加入的對話：
+{turns}
+"""
+
+SUMMARY_CONTEXT = "以下是這段對話較早內容的摘要：\n{summary}"
+
+
+class Turn(BaseModel):
+    role: Literal["user", "assistant"] = Field(..., description="Who spoke.")
+    content: str = Field(..., description="What was said, as text.")
+    author: str | None = Field(default=None, description="The Discord name of a user turn.")
+
+
+class Conversation(BaseModel):
+    summary: str = Field(default="", description="The rolling summary of older turns.")
+    turns: list[Turn] = Field(default_factory=list, description="The recent turns, oldest first.")
+
+    def to_messages(self) -> list[dict[str, Any]]:
+        """Render the memory as chat messages placed between the system prompt and the prompt."""
+        messages: list[dict[str, Any]] = []
+        if self.summary:
+            messages.append({
+                "role": "system",
+                "content": SUMMARY_CONTEXT.format(summary=self.summary),
+            })
+        for turn in self.turns:
+            content = f"{turn.author}: {turn.content}" if turn.author else turn.content
+            messages.append({"role": turn.role, "content": content})
+        return messages
+
+
+class MemoryStats(BaseModel):
+    reads: int = Field(default=0, description="Conversations loaded.")
+    writes: int = Field(default=0, description="Turn batches appended.")
+    folds: int = Field(default=0, description="Aged-out turn batches folded into summaries.")
+    folded_turns: int = Field(default=0, description="Turns folded into summaries.")
+    errors: int = Field(
+        default=0, description="Redis or model calls that failed and were skipped."
+    )
+
+
+class ConversationMemory(BaseModel):
+    """Per-channel conversation memory kept in Redis.
+
+    Each conversation is a ring buffer of the last `max_turns` turns plus a rolling summary.
+    Loading is one pipelined round trip, and so is appending: the push, the read of the
+    turns that fell out and the trim run in one transaction. Turns that fell out are folded
+    into the summary by a background task, so the prompt stays the same size however long
+    the conversation runs and the reply never waits for the summary.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    redis: Any | None = Field(
+        default=None, description="A `redis.asyncio.Redis` client; None disables the memory."
+    )
+    prefix: str = Field(default="llmbot:memory:", description="The Redis key prefix.")
+    max_turns: int = Field(default=12, description="Recent turns kept verbatim.")
+    max_turn_tokens: int = Field(default=1000, description="Longer turns are stored trimmed.")
+    max_summary_tokens: int = Field(default=600, description="The longest summary kept.")
+    ttl_seconds: int = Field(
+        default=7 * 24 * 3600, description="How long an idle conversation is remembered."
+    )
+    llm: LLMServices | None = Field(
+        default=None, description="Writes the summaries; built from the environment if unset."
+    )
+
+    _locks: dict[str, asyncio.Lock] = PrivateAttr(default_factory=dict)
+    _tasks: set[asyncio.Task] = PrivateAttr(default_factory=set)
+    _stats: MemoryStats = PrivateAttr(default_factory=MemoryStats)
+
+    @property
+    def enabled(self) -> bool:
+        return self.redis is not None
+
+    def _keys(self, conversation: str) -> tuple[str, str]:
+        return f"{self.prefix}{conversation}:turns", f"{self.prefix}{conversation}:summary"
+
+    async def load(self, conversation: str) -> Conversation:
+        """Read the summary and the recent turns of a conversation in one round trip.
+
+        Args:
+            conversation (str): The conversation id, e.g. `channel:<id>`; threads are channels.
+
+        Returns:
+            Conversation: The memory, empty when disabled or when Redis is unavailable.
+        """
+        if self.redis is None:
+            return Conversation()
+        turns_key, summary_key = self._keys(conversation)
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.get(summary_key)
+                pipe.lrange(turns_key, 0, -1)
+                summary, turns = await pipe.execute()
+        except (RedisError, OSError) as e:
+            self._stats.errors += 1
+            logfire.warn("Conversation memory read failed", error=str(e))
+            return Conversation()
+        self._stats.reads += 1
+        return Conversation(
+            summary=summary.decode("utf-8") if summary else "",
+            turns=[Turn.model_validate_json(turn) for turn in turns],
+        )
+
+    async def append(self, conversation: str, turns: list[Turn]) -> None:
+        """Push turns into the ring buffer and fold whatever fell out in the background.
+
+        Args:
+            conversation (str): The conversation id.
+            turns (list[Turn]): The new turns, oldest first.
+        """
+        if self.redis is None or not turns:
+            return
+        turns_key, summary_key = self._keys(conversation)
+        model = self.llm.llm_model if self.llm is not None else ""
+        values = [
+            orjson.dumps(
+                turn.model_copy(
+                    update={
+                        "content": token_budget.trim(turn.content, self.max_turn_tokens, model)
+                    }
+                ).model_dump(exclude_none=True)
+            )
+            for turn in turns
+        ]
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.rpush(turns_key, *values)
+                # Everything but the newest `max_turns` entries falls out of the buffer.
+                pipe.lrange(turns_key, 0, -(self.max_turns + 1))
+                pipe.ltrim(turns_key, -self.max_turns, -1)
+                pipe.expire(turns_key, self.ttl_seconds)
+                pipe.expire(summary_key, self.ttl_seconds)
+                _, overflow, *_ = await pipe.execute()
+        except (RedisError, OSError) as e:
+            self._stats.errors += 1
+            logfire.warn("Conversation memory write failed", error=str(e))
+            return
+        self._stats.writes += 1
+        if overflow:
+            aged_out = [Turn.model_validate_json(turn) for turn in overflow]
+            task = asyncio.create_task(self._fold(conversation, aged_out), name="memory-fold")
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _fold(self, conversation: str, turns: list[Turn]) -> None:
+        _, summary_key = self._keys(conversation)
+        if self.llm is None:
+            self.llm = LLMServices(system_prompt=FOLD_PROMPT, priority=Priority.BACKGROUND)
+        # Folds of one conversation run one after another so none overwrites another's work.
+        lock = self._locks.setdefault(conversation, asyncio.Lock())
+        async with lock:
+            try:
+                summary = await self.redis.get(summary_key)
+                lines = "\n".join(f"{turn.author or turn.role}: {turn.content}" for turn in turns)
+                response = await self.llm.get_oai_reply(
+                    prompt=FOLD_MESSAGE.format(
+                        summary=summary.decode("utf-8") if summary else "（無）", turns=lines
+                    )
+                )
+                folded = token_budget.trim(
+                    response.choices[0].message.content or "",
+                    self.max_summary_tokens,
+                    self.llm.llm_model,
+                )
+                await self.redis.set(summary_key, folded, ex=self.ttl_seconds)
+            except (RedisError, OSError, OpenAIError) as e:
+                self._stats.errors += 1
+                logfire.warn("Conversation summary failed", error=str(e))
+                return
+        self._stats.folds += 1
+        self._stats.folded_turns += len(turns)
+
+    async def drain(self) -> None:
+        """Wait for the background summaries that are still running."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def aclose(self) -> None:
+        """Finish the pending summaries and let go of the Redis client.
+
+        The client is shared with the other Redis users, so its storage backend closes it.
+        """
+        await self.drain()
+        self.redis = None
+
+    def stats(self) -> MemoryStats:
+        return self._stats.model_copy()
+
+
+conversation_memory = ConversationMemory()
@@ -0,0 +1,232 @@
+import sys
+import enum
+import types
+from typing import Any
+import inspect
+import itertools
+from collections import deque
+from collections.abc import Iterable
+
+import nextcord
+from pydantic import Field, BaseModel
+from nextcord.ext import commands
+
+from src.sdk.metrics import metrics
+
+# The intents whose events each listener receives; `on_message` also reads the content.
+EVENT_INTENTS: dict[str, tuple[str, ...]] = {
+    "on_message": ("guild_messages", "dm_messages", "message_content"),
+    "on_message_edit": ("guild_messages", "dm_messages", "message_content"),
+    "on_message_delete": ("guild_messages", "dm_messages"),
+    "on_bulk_message_delete": ("guild_messages",),
+    "on_reaction_add": ("guild_reactions", "dm_reactions"),
+    "on_reaction_remove": ("guild_reactions", "dm_reactions"),
+    "on_reaction_clear": ("guild_reactions", "dm_reactions"),
+    "on_typing": ("guild_typing", "dm_typing"),
+    "on_member_join": ("members",),
+    "on_member_remove": ("members",),
+    "on_member_update": ("members",),
+    "on_presence_update": ("presences",),
+    "on_voice_state_update": ("voice_states",),
+    "on_member_ban": ("moderation",),
+    "on_member_unban": ("moderation",),
+    "on_guild_emojis_update": ("emojis_and_stickers",),
+    "on_guild_stickers_update": ("emojis_and_stickers",),
+    "on_invite_create": ("invites",),
+    "on_invite_delete": ("invites",),
+    "on_webhooks_update": ("webhooks",),
+    "on_guild_integrations_update": ("integrations",),
+    "on_guild_scheduled_event_create": ("scheduled_events",),
+    "on_auto_moderation_rule_create": ("auto_moderation_configuration",),
+    "on_auto_moderation_action_execution": ("auto_moderation_execution",),
+}
+
+CACHE_OBJECTS = metrics.gauge(
+    "llmbot_cache_objects", "Objects held in each of nextcord's caches.", labels=("cache",)
+)
+CACHE_BYTES = metrics.gauge(
+    "llmbot_cache_bytes",
+    "Estimated bytes held in each of nextcord's caches, from a sample of its objects.",
+    labels=("cache",),
+)
+
+
+def _listener_names(source: type) -> Iterable[str]:
+    if isinstance(source, commands.CogMeta):
+        return (name for name, _ in source.__cog_listeners__)
+    # Event handlers defined on the bot class itself, not the ones nextcord ships with.
+    return (
+        name
+        for klass in source.__mro__
+        if not klass.__module__.startswith(("nextcord", "builtins"))
+        for name, member in vars(klass).items()
+        if name.startswith("on_") and inspect.iscoroutinefunction(member)
+    )
+
+
+def required_intents(*sources: type) -> nextcord.Intents:
+    """Derive the gateway intents a bot needs from its class and its cogs.
+
+    Every listener turns on the intents of its event (see `EVENT_INTENTS`), and a class can
+    add more with a `required_intents` tuple of intent names, for data its commands read from
+    the cache or from message content. `guilds` is always on: channels, roles and threads are
+    needed by nearly every command.
+
+    Args:
+        *sources (type): The bot class and the cog classes.
+
+    Returns:
+        nextcord.Intents: The union of the intents they need.
+    """
+    intents = nextcord.Intents.none()
+    intents.guilds = True
+    for source in sources:
+        names = itertools.chain(
+            getattr(source, "required_intents", ()),
+            *(EVENT_INTENTS.get(event, ()) for event in _listener_names(source)),
+        )
+        for name in names:
+            setattr(intents, name, True)
+    return intents
+
+
+def cog_classes(module_names: Iterable[str]) -> list[type[commands.Cog]]:
+    """Return the cogs defined in the imported modules; modules not imported yet are skipped."""
+    return [
+        value
+        for name in module_names
+        if name in sys.modules
+        for value in vars(sys.modules[name]).values()
+        if isinstance(value, commands.CogMeta) and value.__module__ == name
+    ]
+
+
+def client_options(
+    memory_budget: bool, message_cache_size: int, intents: nextcord.Intents | None = None
+) -> dict[str, Any]:
+    """Return the caching options of the bot for the chosen mode.
+
+    Without the memory budget the bot asks for every intent and caches every member. With it
+    the member cache is off and guilds are not chunked at startup: members still arrive with
+    every interaction and message, and `guild.fetch_member` or `guild.chunk` load them when
+    needed. The intents are the ones given, usually `required_intents` of the bot class; the
+    cogs' needs can be added before the bot connects.
+
+    Args:
+        memory_budget (bool): Whether to keep the caches small.
+        message_cache_size (int): The most messages to cache; 0 turns the message cache off.
+        intents (nextcord.Intents | None): The intents in budget mode; None means `guilds` only.
+
+    Returns:
+        dict[str, Any]: Keyword arguments for the nextcord client.
+    """
+    options: dict[str, Any] = {"max_messages": message_cache_size or None}
+    if not memory_budget:
+        return {**options, "intents": nextcord.Intents.all()}
+    return {
+        **options,
+        "intents": intents or nextcord.Intents(guilds=True),
+        "member_cache_flags": nextcord.MemberCacheFlags.none(),
+        "chunk_guilds_at_startup": False,
+    }
+
+
+class CacheUsage(BaseModel):
+    cache: str = Field(..., description="The name of the cache.")
+    objects: int = Field(..., description="Objects held in the cache.")
+    bytes: int = Field(..., description="Estimated bytes the cached objects hold.")
+
+
+# Objects that live in a cache of their own, or are shared, and are not counted again when
+# another cached object refers to them.
+_SHARED = (
+    nextcord.Guild,
+    nextcord.User,
+    nextcord.ClientUser,
+    nextcord.Member,
+    nextcord.Role,
+    nextcord.abc.GuildChannel,
+    nextcord.Thread,
+    nextcord.Emoji,
+    nextcord.GuildSticker,
+    nextcord.Message,
+    nextcord.state.ConnectionState,
+    enum.Enum,
+    type,
+    types.FunctionType,
+    types.MethodType,
+)
+_ATOMIC = (str, bytes, int, float, bool, type(None))
+
+
+def _slots(klass: type) -> tuple[str, ...]:
+    slots = vars(klass).get("__slots__", ())
+    return (slots,) if isinstance(slots, str) else tuple(slots)
+
+
+def _deep_size(value: object, seen: set[int], top: bool = False) -> int:
+    if id(value) in seen or (not top and isinstance(value, _SHARED)):
+        return 0
+    seen.add(id(value))
+    size = sys.getsizeof(value)
+    if isinstance(value, _ATOMIC):
+        return size
+    if isinstance(value, dict):
+        children: Iterable[object] = itertools.chain(value.keys(), value.values())
+    elif isinstance(value, (list, tuple, set, frozenset, deque)):
+        children = value
+    else:
+        slots = (
+            getattr(value, slot, None)
+            for klass in type(value).__mro__
+            for slot in _slots(klass)
+            if slot not in ("__dict__", "__weakref__")
+        )
+        children = itertools.chain(slots, getattr(value, "__dict__", {}).values())
+    return size + sum(_deep_size(child, seen) for child in children)
+
+
+def _usage(cache: str, objects: list[object], sample: int) -> CacheUsage:
+    step = max(1, len(objects) // sample)
+    sampled = objects[::step][:sample]
+    each = sum(_deep_size(value, set(), top=True) for value in sampled) / max(1, len(sampled))
+    return CacheUsage(cache=cache, objects=len(objects), bytes=round(each * len(objects)))
+
+
+def cache_usage(client: nextcord.Client, sample: int = 200) -> list[CacheUsage]:
+    """Count the objects in each of the client's caches and estimate the bytes they hold.
+
+    The bytes of a cache are its object count times the mean size of up to `sample` evenly
+    spaced objects, each measured with the containers and values it owns. Objects that live
+    in another cache, such as the user of a member, are counted under that cache. The
+    results are also exported as the `llmbot_cache_objects` and `llmbot_cache_bytes` gauges.
+
+    Args:
+        client (nextcord.Client): The client whose caches are measured.
+        sample (int): The most objects measured per cache.
+
+    Returns:
+        list[CacheUsage]: The objects and estimated bytes of every cache.
+    """
+    guilds = client.guilds
+    caches: dict[str, list[object]] = {
+        "guilds": list(guilds),
+        "channels": [channel for guild in guilds for channel in guild.channels],
+        "threads": [thread for guild in guilds for thread in guild.threads],
+        "roles": [role for guild in guilds for role in guild.roles],
+        "members": [member for guild in guilds for member in guild.members],
+        "voice_states": [
+            state
+            for guild in guilds
+            for state in guild._voice_states.values()  # noqa: SLF001
+        ],
+        "users": list(client.users),
+        "emojis": list(client.emojis),
+        "stickers": list(client.stickers),
+        "messages": list(client.cached_messages),
+    }
+    usage = [_usage(cache, objects, sample) for cache, objects in caches.items()]
+    for entry in usage:
+        CACHE_OBJECTS.set(entry.objects, cache=entry.cache)
+        CACHE_BYTES.set(entry.bytes, cache=entry.cache)
+    return usage
@@ -0,0 +1,300 @@
+import bisect
+import datetime
+
+import nextcord
+from pydantic import Field, BaseModel, PrivateAttr
+from sqlalchemy import and_, delete, insert, select
+from nextcord.abc import Messageable
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from src.sdk.log_writer import MessageRecord
+from src.sdk.log_database import SQLMessageSink, message_table, coverage_table
+
+
+def _as_utc(value: datetime.datetime) -> datetime.datetime:
+    # SQLite drops the offset of stored timestamps, which are written in UTC.
+    return value if value.tzinfo is not None else value.replace(tzinfo=datetime.timezone.utc)
+
+
+class IndexedMessage(BaseModel):
+    message_id: int = Field(..., description="The Discord message id.")
+    author: str = Field(..., description="The author's user name.")
+    author_id: int = Field(..., description="The author's user id.")
+    content: str = Field(default="", description="The message text.")
+    created_at: datetime.datetime = Field(..., description="When the message was sent.")
+    attachments: list[str] = Field(
+        default_factory=list, description="Attachment URLs, or paths of the stored copies."
+    )
+    embeds: list[str] = Field(
+        default_factory=list, description="Embed descriptions; only known for fetched messages."
+    )
+
+    @classmethod
+    def from_message(cls, message: nextcord.Message) -> "IndexedMessage":
+        return cls(
+            message_id=message.id,
+            author=message.author.name,
+            author_id=message.author.id,
+            content=message.content,
+            created_at=message.created_at,
+            attachments=[attachment.url for attachment in message.attachments],
+            embeds=[embed.description for embed in message.embeds if embed.description],
+        )
+
+    def to_record(self, channel: Messageable) -> MessageRecord:
+        return MessageRecord(
+            author=self.author,
+            author_id=str(self.author_id),
+            content=self.content,
+            created_at=self.created_at.isoformat(),
+            channel_name=getattr(channel, "name", "DM"),
+            channel_id=str(channel.id),
+            attachments=";".join(self.attachments),
+            stickers="",
+            message_id=str(self.message_id),
+        )
+
+
+class IndexStats(BaseModel):
+    indexed_hits: int = Field(default=0, description="Messages served from the index.")
+    api_messages: int = Field(default=0, description="Messages fetched from Discord to fill gaps.")
+    api_pages: int = Field(default=0, description="History pages requested from Discord.")
+    live_gaps: int = Field(
+        default=0, description="Times dropped records or disconnects broke live coverage."
+    )
+
+
+class MessageIndex(SQLMessageSink):
+    """Local index of channel history, answering per-author lookups without paging Discord.
+
+    It is fed by the message log writer like any other sink. Alongside the messages it keeps
+    coverage segments: message id ranges per channel in which every non-bot message is
+    indexed. Live logging grows one segment per channel, which ends where a record was
+    dropped or the gateway disconnected; gaps (before the bot joined, while it was offline,
+    or where records were dropped) are fetched from the Discord API once and recorded as
+    covered, so the next lookup no longer needs them.
+    """
+
+    enabled: bool = Field(
+        default=True,
+        description="Page Discord without reading or writing the index when disabled.",
+    )
+    page_size: int = Field(default=100, description="Messages per Discord history request.")
+
+    _live: dict[int, list[int]] = PrivateAttr(default_factory=dict)
+    _dropped: dict[int, int] = PrivateAttr(default_factory=dict)
+    _breaks: list[int] = PrivateAttr(default_factory=list)
+    _index_stats: IndexStats = PrivateAttr(default_factory=IndexStats)
+
+    def discard(self, record: MessageRecord) -> None:
+        """Remember a dropped record so live coverage never spans it."""
+        if record.channel_id.isdigit() and record.message_id:
+            channel_id = int(record.channel_id)
+            self._dropped[channel_id] = max(
+                self._dropped.get(channel_id, 0), int(record.message_id)
+            )
+            self._index_stats.live_gaps += 1
+
+    def end_live(self) -> None:
+        """End the live segment of every channel, e.g. because the gateway disconnected.
+
+        Messages sent until the bot is back never reach the writer, so records on either side
+        of this moment must not be joined into one segment, even when they arrive in one batch.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        # Records are written within seconds of arriving, so day-old breaks separate nothing.
+        cutoff = nextcord.utils.time_snowflake(now - datetime.timedelta(days=1))
+        self._breaks = [break_id for break_id in self._breaks if break_id > cutoff]
+        self._breaks.append(nextcord.utils.time_snowflake(now))
+        self._index_stats.live_gaps += 1
+
+    def _broken(self, after_id: int, before_id: int, dropped: int | None) -> bool:
+        """Whether a dropped record or a disconnect lies between the two message ids."""
+        if dropped is not None and after_id < dropped < before_id:
+            return True
+        position = bisect.bisect_right(self._breaks, after_id)
+        return position < len(self._breaks) and self._breaks[position] < before_id
+
+    async def _after_insert(self, conn: AsyncConnection, records: list[MessageRecord]) -> None:
+        by_channel: dict[int, list[int]] = {}
+        for record in records:
+            if record.channel_id.isdigit() and record.message_id:
+                by_channel.setdefault(int(record.channel_id), []).append(int(record.message_id))
+        for channel_id, message_ids in by_channel.items():
+            for start_id, end_id in self._extend_live(channel_id, sorted(message_ids)):
+                await self._add_segment(conn, channel_id, start_id, end_id)
+
+    def _extend_live(self, channel_id: int, message_ids: list[int]) -> list[tuple[int, int]]:
+        dropped = self._dropped.pop(channel_id, None)
+        live = self._live.get(channel_id)
+        segments = []
+        for message_id in message_ids:
+            if live is None:
+                live = [message_id, message_id]
+            elif self._broken(live[1], message_id, dropped):
+                # A record between the two was lost; start a new segment after it.
+                segments.append((live[0], live[1]))
+                live = [message_id, message_id]
+            else:
+                live[1] = max(live[1], message_id)
+        self._live[channel_id] = live
+        segments.append((live[0], live[1]))
+        return segments
+
+    @staticmethod
+    async def _add_segment(
+        conn: AsyncConnection, channel_id: int, start_id: int, end_id: int
+    ) -> None:
+        overlapping = and_(
+            coverage_table.c.channel_id == channel_id,
+            coverage_table.c.start_id <= end_id,
+            coverage_table.c.end_id >= start_id,
+        )
+        result = await conn.execute(
+            select(coverage_table.c.start_id, coverage_table.c.end_id).where(overlapping)
+        )
+        for other_start, other_end in result.all():
+            start_id, end_id = min(start_id, other_start), max(end_id, other_end)
+        await conn.execute(delete(coverage_table).where(overlapping))
+        await conn.execute(
+            insert(coverage_table).values(channel_id=channel_id, start_id=start_id, end_id=end_id)
+        )
+
+    async def coverage(self, channel_id: int) -> list[tuple[int, int]]:
+        """Return the covered message id ranges of a channel, newest first."""
+        await self.create_table()
+        async with self.engine.connect() as conn:
+            result = await conn.execute(
+                select(coverage_table.c.start_id, coverage_table.c.end_id)
+                .where(coverage_table.c.channel_id == channel_id)
+                .order_by(coverage_table.c.end_id.desc())
+            )
+            return [(start_id, end_id) for start_id, end_id in result.all()]
+
+    async def _query(
+        self, channel_id: int, author_id: int, start_id: int, end_id: int, limit: int
+    ) -> list[IndexedMessage]:
+        async with self.engine.connect() as conn:
+            result = await conn.execute(
+                select(message_table)
+                .where(
+                    message_table.c.channel_id == channel_id,
+                    message_table.c.author_id == author_id,
+                    message_table.c.message_id.between(start_id, end_id),
+                )
+                .order_by(message_table.c.message_id.desc())
+                .limit(limit)
+            )
+            rows = result.mappings().all()
+        return [
+            IndexedMessage(
+                message_id=row["message_id"],
+                author=row["author"],
+                author_id=row["author_id"],
+                content=row["content"],
+                created_at=_as_utc(row["created_at"]),
+                attachments=[path for path in row["attachments"].split(";") if path],
+            )
+            for row in rows
+        ]
+
+    async def _fill_gap(
+        self,
+        channel: Messageable,
+        author_id: int,
+        before_id: int,
+        after_id: int | None,
+        limit: int,
+    ) -> list[IndexedMessage]:
+        """Page Discord history from `before_id` back to `after_id`, indexing what it reads.
+
+        Stops early once `limit` messages from the author were found; the part that was read
+        is still recorded as covered.
+        """
+        found: list[IndexedMessage] = []
+        cursor = before_id
+        while len(found) < limit:
+            page = [
+                message
+                async for message in channel.history(
+                    limit=self.page_size,
+                    before=nextcord.Object(id=cursor),
+                    after=nextcord.Object(id=after_id) if after_id is not None else None,
+                    oldest_first=False,
+                )
+            ]
+            self._index_stats.api_pages += 1
+            self._index_stats.api_messages += len(page)
+            messages = [IndexedMessage.from_message(m) for m in page if not m.author.bot]
+            found.extend(m for m in messages if m.author_id == author_id)
+            exhausted = len(page) < self.page_size
+            # The channel start counts as id 0, so a fully read channel is one closed segment.
+            oldest = (after_id or 0) if exhausted else page[-1].id
+            async with self.engine.begin() as conn:
+                if messages:
+                    rows = [self._to_row(message.to_record(channel)) for message in messages]
+                    await self._insert_rows(conn, rows)
+                await self._add_segment(conn, channel.id, oldest, cursor)
+            if exhausted:
+                break
+            cursor = page[-1].id
+        return found[:limit]
+
+    @staticmethod
+    async def _scan(channel: Messageable, author_id: int, limit: int) -> list[IndexedMessage]:
+        found: list[IndexedMessage] = []
+        async for message in channel.history(
+            limit=None, before=None, after=None, oldest_first=False
+        ):
+            if message.author.id == author_id and not message.author.bot:
+                found.append(IndexedMessage.from_message(message))
+                if len(found) == limit:
+                    break
+        found.reverse()
+        return found
+
+    async def recent_by_author(
+        self, channel: Messageable, author_id: int, limit: int
+    ) -> list[IndexedMessage]:
+        """Return the author's latest non-bot messages in a channel, oldest first.
+
+        Covered ranges are answered from the index; only the gaps between them are read from
+        the Discord API, newest first, until enough messages were found. The stretch newer
+        than the last flushed batch is always read, since its records may still be queued.
+
+        Args:
+            channel (Messageable): The channel, which must have an `id`.
+            author_id (int): The author whose messages are wanted.
+            limit (int): How many messages to return at most.
+
+        Returns:
+            list[IndexedMessage]: The messages in chronological order.
+        """
+        if not self.enabled:
+            return await self._scan(channel, author_id, limit)
+        await self.create_table()
+        found: list[IndexedMessage] = []
+        cursor = nextcord.utils.time_snowflake(datetime.datetime.now(datetime.timezone.utc))
+        for start_id, end_id in [*await self.coverage(channel.id), (None, None)]:
+            if end_id is None or end_id < cursor:
+                found.extend(
+                    await self._fill_gap(channel, author_id, cursor, end_id, limit - len(found))
+                )
+            if len(found) >= limit or start_id is None:
+                break
+            indexed = await self._query(
+                channel.id, author_id, start_id, min(end_id, cursor), limit - len(found)
+            )
+            self._index_stats.indexed_hits += len(indexed)
+            found.extend(indexed)
+            cursor = start_id
+            if len(found) >= limit:
+                break
+        found.reverse()
+        return found
+
+    def index_stats(self) -> IndexStats:
+        return self._index_stats.model_copy()
+
+
+message_index = MessageIndex(dsn="sqlite+aiosqlite:///./data/sqlite.db")
@@ -0,0 +1,203 @@
+import abc
+import bisect
+from collections.abc import Iterable
+
+from aiohttp import web
+import logfire
+from pydantic import BaseModel, PrivateAttr
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_BUCKETS = (1.0, 5.0, 10.0, 20.0, 40.0, 80.0, 160.0, 320.0, 640.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs: Iterable[tuple[str, str]]) -> str:
+    text = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return f"{{{text}}}" if text else ""
+
+
+def _number(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...]) -> None:
+        self.name = name
+        self.description = description
+        self.labels = labels
+
+    def _key(self, labels: dict[str, object]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+
+    @abc.abstractmethod
+    def render(self) -> list[str]:
+        """Return the metric in the Prometheus text exposition format, one line per item."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...]) -> None:
+        super().__init__(name, description, labels)
+        self.values: dict[tuple[str, ...], float] = {}
+        self._otel = logfire.metric_counter(name, description=description)
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0.0) + amount
+        self._otel.add(amount, attributes=dict(zip(self.labels, key, strict=True)))
+
+    def render(self) -> list[str]:
+        return [
+            *self._header(),
+            *(
+                f"{self.name}{_labels(zip(self.labels, key, strict=True))} {_number(value)}"
+                for key, value in sorted(self.values.items())
+            ),
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...]) -> None:
+        super().__init__(name, description, labels)
+        self.values: dict[tuple[str, ...], float] = {}
+        self._otel = logfire.metric_gauge(name, description=description)
+
+    def set(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        self.values[key] = value
+        self._otel.set(value, attributes=dict(zip(self.labels, key, strict=True)))
+
+    render = Counter.render
+
+
+class _Series:
+    def __init__(self, buckets: int) -> None:
+        # One count per bucket plus one for values above the largest bound.
+        self.counts = [0] * (buckets + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: tuple[str, ...],
+        buckets: tuple[float, ...],
+        unit: str,
+    ) -> None:
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+        self.series: dict[tuple[str, ...], _Series] = {}
+        self._otel = logfire.metric_histogram(name, unit=unit, description=description)
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = _Series(len(self.buckets))
+        # Buckets are cumulative upper bounds, so a value equal to a bound belongs to it.
+        series.counts[bisect.bisect_left(self.buckets, value)] += 1
+        series.sum += value
+        series.count += 1
+        self._otel.record(value, attributes=dict(zip(self.labels, key, strict=True)))
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        for key, series in sorted(self.series.items()):
+            pairs = list(zip(self.labels, key, strict=True))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), series.counts, strict=True):
+                cumulative += count
+                bucket_labels = _labels([*pairs, ("le", _number(bound))])
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(pairs)} {_number(series.sum)}")
+            lines.append(f"{self.name}_count{_labels(pairs)} {series.count}")
+        return lines
+
+
+class MetricsRegistry(BaseModel):
+    """Process-wide metrics, recorded through logfire and served in the Prometheus text format.
+
+    Every observation goes to the matching logfire (OpenTelemetry) instrument and to an
+    in-process copy that `render` turns into the Prometheus exposition format, so a local
+    Prometheus can scrape `/metrics` and p99 dashboards work without a hosted service.
+    Asking for a metric that already exists returns the existing one.
+    """
+
+    _metrics: dict[str, _Metric] = PrivateAttr(default_factory=dict)
+    _runner: web.AppRunner | None = PrivateAttr(default=None)
+
+    def _get(self, metric_type: type[_Metric], name: str, **kwargs: object) -> _Metric:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = metric_type(name, **kwargs)
+        elif not isinstance(metric, metric_type):
+            raise ValueError(f"Metric {name} is already registered as a {metric.kind}.")
+        return metric
+
+    def counter(self, name: str, description: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._get(Counter, name, description=description, labels=labels)
+
+    def gauge(self, name: str, description: str, labels: tuple[str, ...] = ()) -> Gauge:
+        return self._get(Gauge, name, description=description, labels=labels)
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+        unit: str = "s",
+    ) -> Histogram:
+        return self._get(
+            Histogram, name, description=description, labels=labels, buckets=buckets, unit=unit
+        )
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = [line for metric in self._metrics.values() for line in metric.render()]
+        return "\n".join(lines) + "\n"
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 9464) -> int:
+        """Serve the metrics at `/metrics` until `aclose` is called; serving twice is a no-op.
+
+        Args:
+            host (str): The interface to listen on.
+            port (int): The port to listen on; 0 picks a free one.
+
+        Returns:
+            int: The port the endpoint listens on.
+        """
+        if self._runner is None:
+            app = web.Application()
+            app.router.add_get("/metrics", self._handle)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, host=host, port=port).start()
+        return self._runner.addresses[0][1]
+
+    async def aclose(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+metrics = MetricsRegistry()
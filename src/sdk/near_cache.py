@@ -0,0 +1,343 @@
+import io
+import re
+import time
+import zlib
+import asyncio
+import hashlib
+from pathlib import Path
+import unicodedata
+
+import numpy as np
+import logfire
+from pydantic import Field, BaseModel, ConfigDict, PrivateAttr
+
+from src.sdk.cache import write_snapshot
+
+# Punctuation, symbols, whitespace and underscores; letters and digits of any script survive.
+_NON_WORD = re.compile(r"[\W_]+")
+_SHIFT = np.uint64(32)
+_LOW_BITS = np.uint64(0xFFFFFFFF)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+# The names of the arrays a snapshot holds, in the order they are allocated.
+_SNAPSHOT_ARRAYS = ("signatures", "heads", "chain", "seq", "scopes", "guards", "created", "keys")
+# Numbers, single CJK characters and runs of other letters.
+_TOKEN = re.compile(
+    r"\d+|[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]|[^\W\d_\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]+"
+)
+# Words that only make a prompt more polite or more fluent, never change what it asks.
+FILLER_TOKENS = frozenset({
+    "a",
+    "an",
+    "the",
+    "please",
+    "pls",
+    "plz",
+    "kindly",
+    "can",
+    "could",
+    "would",
+    "you",
+    "u",
+    "me",
+    "tell",
+    "hey",
+    "hi",
+    "hello",
+    "just",
+    "請",
+    "幫",
+    "麻",
+    "煩",
+    "嗎",
+    "吗",
+    "呢",
+    "啊",
+    "吧",
+    "呀",
+})
+
+
+def normalize_prompt(text: str) -> str:
+    """Fold away differences that never change the answer: width, case, punctuation and spacing."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def shingle_hashes(text: str, size: int = 3) -> np.ndarray:
+    """Hash every character n-gram of the text, which suits Chinese as well as spaced languages.
+
+    Args:
+        text (str): The normalised text.
+        size (int): Characters per shingle.
+
+    Returns:
+        np.ndarray: The distinct 32-bit shingle hashes as uint64.
+    """
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    if len(codes) == 0:
+        return np.zeros(1, dtype=np.uint64)
+    size = min(size, len(codes))
+    count = len(codes) - size + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(size):
+        hashes = hashes * _MIX + codes[offset : offset + count]
+    return np.unique((hashes >> _SHIFT) ^ (hashes & _LOW_BITS))
+
+
+def content_guard(text: str) -> int:
+    """Hash the set of content tokens of a normalised prompt.
+
+    Shingle similarity cannot tell "capital of France" from "capital of Spain" or 2024 from
+    2025, so a near-duplicate must also use exactly the same words, numbers and CJK characters,
+    in any order and ignoring `FILLER_TOKENS`.
+
+    Args:
+        text (str): The normalised text.
+
+    Returns:
+        int: A 64-bit hash of the sorted content tokens.
+    """
+    tokens = sorted({token for token in _TOKEN.findall(text) if token not in FILLER_TOKENS})
+    digest = hashlib.blake2b("\x00".join(tokens).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class NearCacheStats(BaseModel):
+    hits: int = Field(default=0, description="Lookups that found a similar prompt.")
+    misses: int = Field(default=0, description="Lookups without a similar prompt.")
+    candidates: int = Field(default=0, description="LSH candidates checked across all lookups.")
+    entries: int = Field(default=0, description="Prompts currently indexed.")
+    memory_bytes: int = Field(default=0, description="Bytes held by the index arrays.")
+    evictions: int = Field(
+        default=0, description="Prompts overwritten because the index was full."
+    )
+
+
+class NearDuplicateIndex(BaseModel):
+    """MinHash/LSH index mapping prompts to the cache key of a similar earlier prompt.
+
+    Prompts are normalised, split into character shingles and reduced to a MinHash
+    signature. The signature is cut into bands; two prompts become candidates when any band
+    matches, and a candidate is accepted when its estimated Jaccard similarity reaches
+    `threshold` and it has the same `content_guard`, so a prompt that swaps a name or a
+    number is never answered with another prompt's answer. The scope (e.g. the guild) is hashed into every band so lookups never
+    cross scopes.
+
+    Everything lives in fixed-size numpy arrays used as a ring buffer, so memory is bounded
+    by `capacity` and the oldest prompt is overwritten first. Each band is a hash table of
+    chained slots, so a lookup touches a handful of slots however many prompts are stored.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    capacity: int = Field(default=100_000, description="The maximum number of indexed prompts.")
+    num_perm: int = Field(default=64, description="The MinHash signature length.")
+    bands: int = Field(default=16, description="LSH bands; `num_perm` must be a multiple.")
+    shingle_size: int = Field(default=3, description="Characters per shingle.")
+    threshold: float = Field(default=0.8, description="The minimum estimated Jaccard similarity.")
+    ttl_seconds: int = Field(default=3600, description="How long an indexed prompt stays usable.")
+    max_chain: int = Field(
+        default=32, description="Slots visited per band; the most recent ones come first."
+    )
+    seed: int = Field(
+        default=1, description="Seeds the hash permutations; snapshots depend on it."
+    )
+
+    _a: np.ndarray | None = PrivateAttr(default=None)
+    _b: np.ndarray | None = PrivateAttr(default=None)
+    _signatures: np.ndarray | None = PrivateAttr(default=None)
+    _heads: np.ndarray | None = PrivateAttr(default=None)
+    _chain: np.ndarray | None = PrivateAttr(default=None)
+    _seq: np.ndarray | None = PrivateAttr(default=None)
+    _scopes: np.ndarray | None = PrivateAttr(default=None)
+    _guards: np.ndarray | None = PrivateAttr(default=None)
+    _created: np.ndarray | None = PrivateAttr(default=None)
+    _keys: np.ndarray | None = PrivateAttr(default=None)
+    _next: int = PrivateAttr(default=0)
+    _size: int = PrivateAttr(default=0)
+    _stats: NearCacheStats = PrivateAttr(default_factory=NearCacheStats)
+
+    @property
+    def _mask(self) -> int:
+        # At least one bucket per slot keeps the expected chain length at or below one.
+        return (1 << max(self.capacity - 1, 1).bit_length()) - 1
+
+    def _allocate(self) -> None:
+        if self._signatures is not None:
+            return
+        rng = np.random.default_rng(self.seed)
+        # Multiply-shift hashing: odd 64-bit multipliers, keeping the high 32 bits.
+        self._a = rng.integers(0, 2**64, size=self.num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**64, size=self.num_perm, dtype=np.uint64)
+        # Only the low 16 bits are kept for verification; a false match costs 1 in 65536.
+        self._signatures = np.zeros((self.capacity, self.num_perm), dtype=np.uint16)
+        # Per band, a hash table of chains from the newest slot to older slots in a bucket.
+        self._heads = np.full((self.bands, self._mask + 1), -1, dtype=np.int32)
+        self._chain = np.full((self.bands, self.capacity), -1, dtype=np.int32)
+        self._seq = np.full(self.capacity, -1, dtype=np.int64)
+        self._scopes = np.zeros(self.capacity, dtype=np.uint32)
+        self._guards = np.zeros(self.capacity, dtype=np.uint64)
+        self._created = np.zeros(self.capacity, dtype=np.float64)
+        self._keys = np.zeros(self.capacity, dtype="S32")
+
+    def signature(self, prompt: str) -> np.ndarray:
+        """Compute the MinHash signature of a prompt."""
+        return self._fingerprint(normalize_prompt(prompt))
+
+    def _fingerprint(self, text: str) -> np.ndarray:
+        self._allocate()
+        hashes = shingle_hashes(text, self.shingle_size)
+        # uint64 arithmetic wraps around, which is exactly what multiply-shift relies on.
+        permuted = np.multiply.outer(self._a, hashes) + self._b[:, None]
+        return (permuted.min(axis=1) >> _SHIFT).astype(np.uint32)
+
+    def _buckets(self, signature: np.ndarray, scope: int) -> list[int]:
+        rows = self.num_perm // self.bands
+        mask = self._mask
+        # Every band has its own table, so the scope is the only seed the hash needs.
+        return [
+            zlib.crc32(signature[band * rows : (band + 1) * rows].tobytes(), scope) & mask
+            for band in range(self.bands)
+        ]
+
+    @staticmethod
+    def _scope_hash(scope: str) -> int:
+        return zlib.crc32(scope.encode("utf-8"))
+
+    def add(self, prompt: str, key: str, scope: str = "") -> None:
+        """Index a prompt under the exact cache key its answer was stored with.
+
+        Args:
+            prompt (str): The prompt text.
+            key (str): The hex SHA-256 cache key of the answer.
+            scope (str): Prompts only match others from the same scope.
+        """
+        text = normalize_prompt(prompt)
+        signature = self._fingerprint(text)
+        scope_hash = self._scope_hash(scope)
+        slot = self._next % self.capacity
+        if self._size == self.capacity:
+            self._stats.evictions += 1
+        heads, chain = self._heads, self._chain
+        for band, bucket in enumerate(self._buckets(signature, scope_hash)):
+            chain[band, slot] = heads[band, bucket]
+            heads[band, bucket] = slot
+        self._signatures[slot] = signature.astype(np.uint16)
+        self._seq[slot] = self._next
+        self._scopes[slot] = scope_hash
+        self._guards[slot] = content_guard(text)
+        self._created[slot] = time.time()
+        self._keys[slot] = bytes.fromhex(key)
+        self._next += 1
+        self._size = min(self._size + 1, self.capacity)
+
+    def _candidates(self, buckets: list[int]) -> set[int]:
+        # Pydantic private attributes are slow to resolve, so they are bound once per lookup.
+        heads, chain, sequence = self._heads, self._chain, self._seq
+        oldest = self._next - self._size
+        found: set[int] = set()
+        for band, bucket in enumerate(buckets):
+            newer, visited = self._next, 0
+            slot = int(heads[band, bucket])
+            while slot >= 0 and visited < self.max_chain:
+                seq = int(sequence[slot])
+                # Chains run from newer to older entries. A slot that is not older than its
+                # predecessor was overwritten by the ring buffer, so the chain ends there.
+                if seq >= newer or seq < oldest:
+                    break
+                found.add(slot)
+                newer, visited = seq, visited + 1
+                slot = int(chain[band, slot])
+        return found
+
+    def lookup(self, prompt: str, scope: str = "") -> str | None:
+        """Return the cache key of the most similar indexed prompt, if it is similar enough.
+
+        Args:
+            prompt (str): The prompt text.
+            scope (str): Only prompts indexed with the same scope are considered.
+
+        Returns:
+            str | None: The hex cache key, or None if no prompt reaches the threshold.
+        """
+        if self._size == 0:
+            self._stats.misses += 1
+            return None
+        text = normalize_prompt(prompt)
+        signature = self._fingerprint(text)
+        scope_hash = self._scope_hash(scope)
+        found = self._candidates(self._buckets(signature, scope_hash))
+        self._stats.candidates += len(found)
+        candidates = np.fromiter(found, dtype=np.int64, count=len(found))
+        if len(candidates):
+            fresh = (
+                (self._scopes[candidates] == scope_hash)
+                & (self._guards[candidates] == np.uint64(content_guard(text)))
+                & (self._created[candidates] > time.time() - self.ttl_seconds)
+            )
+            candidates = candidates[fresh]
+        if len(candidates):
+            similarity = (self._signatures[candidates] == signature.astype(np.uint16)).mean(axis=1)
+            best = int(np.argmax(similarity))
+            if similarity[best] >= self.threshold:
+                self._stats.hits += 1
+                return self._keys[candidates[best]].hex()
+        self._stats.misses += 1
+        return None
+
+    async def save(self, path: str) -> None:
+        """Write the index to disk; the arrays are copied first so lookups can continue."""
+        if self._signatures is None:
+            return
+        arrays = {name: getattr(self, f"_{name}").copy() for name in _SNAPSHOT_ARRAYS}
+        arrays["meta"] = np.array([
+            self.capacity,
+            self.num_perm,
+            self.bands,
+            self.seed,
+            self._next,
+            self._size,
+        ])
+
+        def _write() -> None:
+            buffer = io.BytesIO()
+            np.savez(buffer, **arrays)
+            write_snapshot(Path(path), buffer.getvalue())
+
+        await asyncio.to_thread(_write)
+
+    def load(self, path: str) -> bool:
+        """Restore a snapshot written by `save` with the same index settings.
+
+        Returns:
+            bool: Whether the snapshot was restored.
+        """
+        source = Path(path)
+        if not source.is_file():
+            return False
+        with np.load(source) as snapshot:
+            if not set(_SNAPSHOT_ARRAYS) <= set(snapshot.files):
+                logfire.warn("Ignoring a near-duplicate snapshot from an older layout")
+                return False
+            capacity, num_perm, bands, seed, next_slot, size = snapshot["meta"].tolist()
+            if (capacity, num_perm, bands, seed) != (
+                self.capacity,
+                self.num_perm,
+                self.bands,
+                self.seed,
+            ):
+                logfire.warn("Ignoring a near-duplicate snapshot built with other settings")
+                return False
+            self._allocate()
+            for name in _SNAPSHOT_ARRAYS:
+                getattr(self, f"_{name}")[:] = snapshot[name]
+        self._next, self._size = next_slot, size
+        return True
+
+    def stats(self) -> NearCacheStats:
+        memory = 0
+        if self._signatures is not None:
+            memory = sum(getattr(self, f"_{name}").nbytes for name in _SNAPSHOT_ARRAYS)
+        return self._stats.model_copy(update={"entries": self._size, "memory_bytes": memory})
+
+
+near_duplicate_index = NearDuplicateIndex()
@@ -0,0 +1,206 @@
+import time
+from typing import Any
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+
+from pydantic import Field, BaseModel, ConfigDict, PrivateAttr
+from redis.asyncio import ConnectionPool as AsyncConnectionPool
+
+_async_pools: dict[str, AsyncConnectionPool] = {}
+
+
+def get_async_pool(url: str, max_connections: int = 64) -> AsyncConnectionPool:
+    """Return the process-wide async connection pool for a Redis URL, creating it on first use.
+
+    Every client built on it shares its connections, so closing such a client only returns its
+    connection to the pool; `dispose_pools` closes them.
+
+    Args:
+        url (str): A `redis://` URL.
+        max_connections (int): The most connections the pool opens.
+
+    Returns:
+        AsyncConnectionPool: The shared pool for the URL.
+    """
+    pool = _async_pools.get(url)
+    if pool is None:
+        pool = _async_pools[url] = AsyncConnectionPool.from_url(
+            url, max_connections=max_connections
+        )
+    return pool
+
+
+async def dispose_pool(url: str) -> None:
+    """Close the shared pool of a Redis URL, if one was created; the next use opens a new one."""
+    pool = _async_pools.pop(url, None)
+    if pool is not None:
+        await pool.aclose()
+
+
+async def dispose_pools() -> None:
+    """Close every shared pool and its connections."""
+    for pool in _async_pools.values():
+        await pool.aclose()
+    _async_pools.clear()
+
+
+def _text(value: bytes | str) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _hash(raw: dict[bytes | str, bytes | str]) -> dict[str, str]:
+    return {_text(field): _text(value) for field, value in raw.items()}
+
+
+class RedisStoreStats(BaseModel):
+    round_trips: int = Field(default=0, description="Requests sent to Redis; a pipeline is one.")
+    commands: int = Field(default=0, description="Commands sent to Redis.")
+    cache_hits: int = Field(default=0, description="Hashes served from process memory.")
+    cache_misses: int = Field(default=0, description="Hashes that had to be read from Redis.")
+    cached: int = Field(default=0, description="Hashes currently held in process memory.")
+
+
+class RedisStore(BaseModel):
+    """Async access to Redis hashes, with bulk operations pipelined into one round trip.
+
+    Keys are listed with `SCAN`, a page at a time, so a large keyspace never blocks the
+    server the way `KEYS *` does. With `cache_ttl` above zero, loaded hashes are also kept in
+    an in-process LRU and served from it for that long (client-side caching of hot keys).
+    Writes and deletes through the store drop the cached copy, so only other writers can make
+    it stale, and for at most `cache_ttl` seconds.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    redis: Any = Field(
+        ..., description="A `redis.asyncio.Redis` client, normally on a shared pool."
+    )
+    scan_count: int = Field(default=500, description="Keys asked for per SCAN round trip.")
+    cache_ttl: float = Field(
+        default=0.0, description="Seconds a loaded hash is served from memory; 0 disables it."
+    )
+    cache_size: int = Field(default=1024, description="The most hashes kept in memory.")
+
+    _cache: OrderedDict[str, tuple[float, dict[str, str]]] = PrivateAttr(
+        default_factory=OrderedDict
+    )
+    _stats: RedisStoreStats = PrivateAttr(default_factory=RedisStoreStats)
+
+    def _cached(self, key: str) -> dict[str, str] | None:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return value
+
+    def _remember(self, key: str, value: dict[str, str]) -> None:
+        if self.cache_ttl <= 0:
+            return
+        self._cache[key] = (time.monotonic() + self.cache_ttl, value)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _count(self, commands: int) -> None:
+        self._stats.round_trips += 1
+        self._stats.commands += commands
+
+    async def scan(self, match: str = "*") -> AsyncIterator[str]:
+        """Yield the keys matching a glob pattern, reading `scan_count` keys per round trip."""
+        cursor = 0
+        while True:
+            cursor, keys = await self.redis.scan(cursor, match=match, count=self.scan_count)
+            self._count(1)
+            for key in keys:
+                yield _text(key)
+            if not cursor:
+                break
+
+    async def keys(self, match: str = "*") -> list[str]:
+        """Return the keys matching a glob pattern; see `scan`."""
+        return [key async for key in self.scan(match)]
+
+    async def load(self, key: str) -> dict[str, str]:
+        """Return every field of the hash at `key`, or an empty dict if it does not exist."""
+        return (await self.load_many([key]))[key]
+
+    async def load_many(self, keys: list[str]) -> dict[str, dict[str, str]]:
+        """Read many hashes in one pipelined round trip, skipping the ones cached in memory.
+
+        Args:
+            keys (list[str]): The hash keys to read.
+
+        Returns:
+            dict[str, dict[str, str]]: The fields of each hash by key; empty for missing keys.
+        """
+        found: dict[str, dict[str, str]] = {}
+        missing = []
+        for key in keys:
+            cached = self._cached(key)
+            if cached is None:
+                missing.append(key)
+            else:
+                found[key] = cached
+        self._stats.cache_hits += len(found)
+        self._stats.cache_misses += len(missing)
+        if missing:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key in missing:
+                    pipe.hgetall(key)
+                results = await pipe.execute()
+            self._count(len(missing))
+            for key, raw in zip(missing, results, strict=True):
+                found[key] = _hash(raw)
+                self._remember(key, found[key])
+        return {key: dict(found[key]) for key in keys}
+
+    async def save(self, key: str, data: dict[str, str]) -> dict[str, str]:
+        """Set fields of the hash at `key`, keeping the fields not in `data`."""
+        await self.save_many({key: data})
+        return data
+
+    async def save_many(self, items: dict[str, dict[str, str]]) -> None:
+        """Set fields of many hashes in one pipelined round trip.
+
+        Args:
+            items (dict[str, dict[str, str]]): The fields to set, by hash key.
+        """
+        items = {key: data for key, data in items.items() if data}
+        if not items:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, data in items.items():
+                pipe.hset(key, mapping=data)
+            await pipe.execute()
+        self._count(len(items))
+        for key in items:
+            self._cache.pop(key, None)
+
+    async def values(self, key: str) -> list[str]:
+        """Return the values of the hash at `key`."""
+        return list((await self.load(key)).values())
+
+    async def delete_fields(self, key: str, *fields: str) -> int:
+        """Delete fields of the hash at `key` and return how many existed."""
+        if not fields:
+            return 0
+        deleted = await self.redis.hdel(key, *fields)
+        self._count(1)
+        self._cache.pop(key, None)
+        return deleted
+
+    async def delete(self, *keys: str) -> int:
+        """Delete whole hashes and return how many existed."""
+        if not keys:
+            return 0
+        deleted = await self.redis.delete(*keys)
+        self._count(1)
+        for key in keys:
+            self._cache.pop(key, None)
+        return deleted
+
+    def stats(self) -> RedisStoreStats:
+        return self._stats.model_copy(update={"cached": len(self._cache)})
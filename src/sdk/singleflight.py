@@ -0,0 +1,148 @@
+from typing import Any, Generic, TypeVar
+import asyncio
+from collections.abc import Callable, Awaitable, AsyncIterator
+
+from pydantic import Field, BaseModel, PrivateAttr
+
+T = TypeVar("T")
+
+
+class FlightStats(BaseModel):
+    flights: int = Field(default=0, description="Upstream calls started.")
+    joined: int = Field(default=0, description="Calls that shared an upstream call in flight.")
+    abandoned: int = Field(
+        default=0, description="Upstream calls cancelled because every caller went away."
+    )
+    in_flight: int = Field(default=0, description="Upstream calls currently running.")
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class _Stream(Generic[T]):
+    def __init__(self) -> None:
+        self.items: list[T] = []
+        self.finished = False
+        self.error: BaseException | None = None
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+
+    def publish(self) -> None:
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight(BaseModel):
+    """Shares one upstream call between concurrent callers that make the same request.
+
+    Callers pass a canonical request key, such as the response cache key. The first caller
+    starts the call in its own task and later callers with the same key wait on that task, so
+    N identical requests in flight cost one upstream call. A caller that goes away only stops
+    waiting; the call is cancelled once no caller is left. Finished calls are forgotten, so a
+    later request calls upstream again (or hits the response cache).
+
+    Streams are shared the same way: a producer task reads the upstream stream into a buffer,
+    and every subscriber replays the buffer from the start and then follows the live tail.
+    """
+
+    _calls: dict[str, _Call] = PrivateAttr(default_factory=dict)
+    _streams: dict[str, _Stream] = PrivateAttr(default_factory=dict)
+    _stats: FlightStats = PrivateAttr(default_factory=FlightStats)
+
+    def _forget(self, table: dict[str, Any], key: str, flight: object) -> None:
+        if table.get(key) is flight:
+            del table[key]
+
+    async def do(self, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        """Run `call`, or wait for the identical call already in flight.
+
+        Args:
+            key (str): The canonical request key.
+            call (Callable[[], Awaitable[T]]): Makes the upstream call; only the first caller's
+                is used.
+
+        Returns:
+            T: The shared result; every caller gets the same object.
+        """
+        flight = self._calls.get(key)
+        if flight is None:
+            flight = _Call(asyncio.ensure_future(call()))
+            self._calls[key] = flight
+            self._stats.flights += 1
+            flight.task.add_done_callback(lambda _: self._forget(self._calls, key, flight))
+        else:
+            self._stats.joined += 1
+        flight.waiters += 1
+        try:
+            # The shield keeps one caller's cancellation from cancelling everyone's call.
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                self._forget(self._calls, key, flight)
+                flight.task.cancel()
+                self._stats.abandoned += 1
+
+    async def _produce(self, flight: _Stream[T], stream: AsyncIterator[T]) -> None:
+        try:
+            async for item in stream:
+                flight.items.append(item)
+                flight.publish()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.finished = True
+            flight.publish()
+
+    async def stream(
+        self, key: str, open_stream: Callable[[], AsyncIterator[T]]
+    ) -> AsyncIterator[T]:
+        """Iterate over a stream, sharing it with identical streams already in flight.
+
+        Args:
+            key (str): The canonical request key.
+            open_stream (Callable[[], AsyncIterator[T]]): Opens the upstream stream; only the
+                first caller's is used.
+
+        Yields:
+            T: Every item of the stream from the first one, including those produced before
+                this caller joined.
+        """
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = _Stream()
+            flight.task = asyncio.create_task(self._produce(flight, open_stream()))
+            self._streams[key] = flight
+            self._stats.flights += 1
+            flight.task.add_done_callback(lambda _: self._forget(self._streams, key, flight))
+        else:
+            self._stats.joined += 1
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                if index < len(flight.items):
+                    index += 1
+                    yield flight.items[index - 1]
+                elif flight.finished:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                else:
+                    await flight.changed.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.finished:
+                self._forget(self._streams, key, flight)
+                flight.task.cancel()
+                self._stats.abandoned += 1
+
+    def stats(self) -> FlightStats:
+        return self._stats.model_copy(update={"in_flight": len(self._calls) + len(self._streams)})
+
+
+request_flights = SingleFlight()
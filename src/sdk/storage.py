@@ -0,0 +1,243 @@
+import os
+import abc
+import time
+from typing import TYPE_CHECKING, Any, Literal, ClassVar
+import asyncio
+from pathlib import Path
+from collections.abc import Callable
+
+from pydantic import Field, BaseModel, ConfigDict, PrivateAttr
+
+from src.sdk.metrics import metrics
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis as AsyncRedis
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+    from src.sdk.redis_store import RedisStore
+    from src.sdk.attachment_store import AttachmentStore
+
+Capability = Literal["kv", "relational", "blob"]
+
+STORAGE_HEALTH = metrics.gauge(
+    "llmbot_storage_healthy",
+    "Whether the last health check of a storage backend succeeded (1) or failed (0).",
+    labels=("backend", "capability"),
+)
+
+
+class StorageBackend(BaseModel, abc.ABC):
+    """A storage service offering one capability.
+
+    Backends are cheap to build: they hold settings only, and their clients, engines and
+    pools are created on first use and shared process-wide.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    capability: ClassVar[Capability]
+    name: str = Field(..., description="The name the backend is registered under.")
+
+    @abc.abstractmethod
+    async def ping(self) -> None:
+        """Raise if the backend cannot serve requests."""
+
+    async def aclose(self) -> None:
+        """Close the pooled connections of the backend; it reconnects on next use."""
+
+
+class RedisBackend(StorageBackend):
+    capability: ClassVar[Capability] = "kv"
+    url: str = Field(..., description="The `redis://` URL of the server.")
+
+    _client: "AsyncRedis | None" = PrivateAttr(default=None)
+
+    @property
+    def client(self) -> "AsyncRedis":
+        """The client on the shared pool, built once and handed to every caller."""
+        if self._client is None:
+            from redis.asyncio import Redis as AsyncRedis
+
+            from src.sdk.redis_store import get_async_pool
+
+            self._client = AsyncRedis(connection_pool=get_async_pool(self.url))
+        return self._client
+
+    def store(self, cache_ttl: float = 0.0) -> "RedisStore":
+        """Return a pipelined hash store on the shared pool; see `RedisStore`."""
+        from src.sdk.redis_store import RedisStore
+
+        return RedisStore(redis=self.client, cache_ttl=cache_ttl)
+
+    async def ping(self) -> None:
+        await self.client.ping()
+
+    async def aclose(self) -> None:
+        from src.sdk.redis_store import dispose_pool
+
+        self._client = None
+        await dispose_pool(self.url)
+
+
+class SQLBackend(StorageBackend):
+    capability: ClassVar[Capability] = "relational"
+    dsn: str = Field(..., description="The async SQLAlchemy URL of the database.")
+
+    @property
+    def engine(self) -> "AsyncEngine":
+        from src.sdk.log_database import get_async_engine
+
+        return get_async_engine(self.dsn)
+
+    async def ping(self) -> None:
+        from sqlalchemy import text
+
+        async with self.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    async def aclose(self) -> None:
+        from src.sdk.log_database import dispose_engine
+
+        await dispose_engine(self.dsn)
+
+
+class FileBlobBackend(StorageBackend):
+    capability: ClassVar[Capability] = "blob"
+    store: Any = Field(..., description="The content-addressed `AttachmentStore` on local disk.")
+
+    async def ping(self) -> None:
+        store: AttachmentStore = self.store
+        root = Path(store.root)
+        await asyncio.to_thread(root.mkdir, parents=True, exist_ok=True)
+        if not os.access(root, os.W_OK):
+            raise PermissionError(f"{root} is not writable")
+
+
+def _redis() -> RedisBackend:
+    from src.types.database import RedisConfig
+
+    return RedisBackend(name="redis", url=RedisConfig().redis_url)
+
+
+def _postgres() -> SQLBackend:
+    from src.types.database import PostgreSQLConfig
+
+    return SQLBackend(name="postgres", dsn=PostgreSQLConfig().postgres_async_dsn)
+
+
+def _sqlite() -> SQLBackend:
+    from src.types.database import SQLiteConfig
+
+    return SQLBackend(name="sqlite", dsn=SQLiteConfig().sqlite_async_dsn)
+
+
+def _file() -> FileBlobBackend:
+    from src.sdk.attachment_store import attachment_store
+
+    return FileBlobBackend(name="file", store=attachment_store)
+
+
+class BackendHealth(BaseModel):
+    name: str = Field(..., description="The name of the backend.")
+    capability: Capability = Field(..., description="The capability the backend offers.")
+    healthy: bool = Field(..., description="Whether the backend answered the health check.")
+    seconds: float = Field(..., description="How long the health check took.")
+    error: str | None = Field(default=None, description="Why the health check failed.")
+
+
+class StorageRegistry(BaseModel):
+    """Storage backends by name, created on first use and kept for the life of the process.
+
+    Callers ask for a capability (`kv`, `relational` or `blob`) and get the backend that
+    `selected` names for it, so only the backends in use ever read their settings or open
+    connections. New drivers are added with `register`.
+    """
+
+    selected: dict[Capability, str] = Field(
+        default={"kv": "redis", "relational": "sqlite", "blob": "file"},
+        description="The backend serving each capability.",
+    )
+    health_timeout: float = Field(
+        default=5.0, description="Seconds a backend has to answer a health check."
+    )
+
+    _factories: dict[str, Callable[[], StorageBackend]] = PrivateAttr(
+        default_factory=lambda: {
+            "redis": _redis,
+            "postgres": _postgres,
+            "sqlite": _sqlite,
+            "file": _file,
+        }
+    )
+    _backends: dict[str, StorageBackend] = PrivateAttr(default_factory=dict)
+
+    def register(self, name: str, factory: Callable[[], StorageBackend]) -> None:
+        """Add or replace the factory of a backend; a backend already built is dropped."""
+        self._factories[name] = factory
+        self._backends.pop(name, None)
+
+    def backend(self, name: str) -> StorageBackend:
+        """Return the backend registered under `name`, building it on first use."""
+        backend = self._backends.get(name)
+        if backend is None:
+            if name not in self._factories:
+                raise KeyError(f"Unknown storage backend: {name}")
+            backend = self._backends[name] = self._factories[name]()
+        return backend
+
+    def get(self, capability: Capability) -> StorageBackend:
+        """Return the backend selected for a capability.
+
+        Args:
+            capability (Capability): One of `kv`, `relational` and `blob`.
+
+        Returns:
+            StorageBackend: The selected backend.
+
+        Raises:
+            ValueError: If the selected backend offers another capability.
+        """
+        backend = self.backend(self.selected[capability])
+        if backend.capability != capability:
+            raise ValueError(
+                f"Storage backend {backend.name} offers {backend.capability}, not {capability}"
+            )
+        return backend
+
+    def kv(self) -> RedisBackend:
+        return self.get("kv")
+
+    def relational(self) -> SQLBackend:
+        return self.get("relational")
+
+    def blob(self) -> FileBlobBackend:
+        return self.get("blob")
+
+    async def _check(self, backend: StorageBackend) -> BackendHealth:
+        started = time.perf_counter()
+        error = None
+        try:
+            await asyncio.wait_for(backend.ping(), timeout=self.health_timeout)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        STORAGE_HEALTH.set(
+            float(error is None), backend=backend.name, capability=backend.capability
+        )
+        return BackendHealth(
+            name=backend.name,
+            capability=backend.capability,
+            healthy=error is None,
+            seconds=round(time.perf_counter() - started, 4),
+            error=error,
+        )
+
+    async def health(self) -> list[BackendHealth]:
+        """Check every backend built so far, concurrently; backends never used are skipped."""
+        return list(await asyncio.gather(*(self._check(b) for b in self._backends.values())))
+
+    async def aclose(self) -> None:
+        for backend in self._backends.values():
+            await backend.aclose()
+        self._backends.clear()
+
+
+storage_registry = StorageRegistry()
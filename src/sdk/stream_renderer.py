@@ -0,0 +1,218 @@
+import time
+from typing import Any
+import asyncio
+import contextlib
+from collections.abc import Callable, Awaitable
+
+import logfire
+import nextcord
+from pydantic import Field, BaseModel, ConfigDict, PrivateAttr
+
+from src.sdk.metrics import metrics
+
+DISCORD_MESSAGE_LIMIT = 2000
+_FENCE = "```"
+
+DISCORD_EDIT = metrics.histogram(
+    "llmbot_discord_edit_seconds",
+    "Time a streamed answer's message edit took, including waits for Discord's rate limit.",
+    labels=("command", "outcome"),
+)
+
+
+def split_markdown(text: str, limit: int = DISCORD_MESSAGE_LIMIT) -> tuple[str, str]:
+    """Split text into a head that fits in one Discord message and the remaining tail.
+
+    The split prefers a paragraph break, then a line break, then a space. If the split lands
+    inside a code block, the head closes the fence and the tail reopens it with the same
+    language so both messages still render correctly.
+
+    Args:
+        text (str): The text to split.
+        limit (int): The maximum length of the head.
+
+    Returns:
+        tuple[str, str]: The head and the tail; the tail is empty if the text already fits.
+    """
+    if len(text) <= limit:
+        return text, ""
+    window = text[: limit - len(_FENCE) - 1]
+    cut, skip = len(window), 0
+    for separator in ("\n\n", "\n", " "):
+        position = window.rfind(separator)
+        if position >= len(window) // 2:
+            cut, skip = position, len(separator)
+            break
+    head, tail = text[:cut], text[cut + skip :]
+
+    fence_language = None
+    for line in head.split("\n"):
+        stripped = line.strip()
+        if stripped.startswith(_FENCE):
+            fence_language = None if fence_language is not None else stripped[len(_FENCE) :]
+    if fence_language is not None:
+        head = f"{head}\n{_FENCE}"
+        tail = f"{_FENCE}{fence_language}\n{tail}"
+    return head, tail
+
+
+class RendererStats(BaseModel):
+    edits: int = Field(default=0, description="Edits sent to Discord.")
+    messages: int = Field(default=1, description="Messages used to render the answer.")
+    rate_limited: int = Field(default=0, description="Edits that were slowed down by rate limits.")
+    interval: float = Field(default=0.0, description="The current edit interval in seconds.")
+
+
+class StreamRenderer(BaseModel):
+    """Render a streamed answer into Discord messages without editing on every token.
+
+    `feed` only appends to a buffer; a background task pushes edits on a time or size
+    cadence. The interval backs off whenever an edit is slowed down by Discord's rate limit
+    (nextcord waits out 429s inside the request, so slow edits are the observable signal)
+    and recovers gradually afterwards. Text that outgrows a message rolls over into
+    continuation messages at a Markdown-safe boundary. `finish` always performs the final
+    edit.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    message: Any = Field(..., description="The message being edited, anything with `edit`.")
+    send: Callable[[str], Awaitable[Any]] = Field(
+        ..., description="Sends a continuation message and returns it."
+    )
+    content: str = Field(default="", description="The initial content, e.g. a mention.")
+    command: str = Field(default="", description="The command being answered, for metrics.")
+    limit: int = Field(default=DISCORD_MESSAGE_LIMIT, description="The message length limit.")
+    min_interval: float = Field(default=1.0, description="The shortest time between edits.")
+    max_interval: float = Field(default=5.0, description="The longest time between edits.")
+    flush_chars: int = Field(
+        default=300, description="Edit early once this many characters are pending."
+    )
+    slow_edit_seconds: float = Field(
+        default=1.0, description="Edits slower than this are treated as rate limited."
+    )
+
+    _interval: float = PrivateAttr(default=0.0)
+    # The message starts out with a placeholder, so the first render always edits.
+    _rendered: str = PrivateAttr(default="")
+    _last_edit: float = PrivateAttr(default=0.0)
+    _wakeup: asyncio.Event | None = PrivateAttr(default=None)
+    _closing: asyncio.Event | None = PrivateAttr(default=None)
+    _task: asyncio.Task | None = PrivateAttr(default=None)
+    _stats: RendererStats = PrivateAttr(default_factory=RendererStats)
+
+    def _start(self) -> None:
+        if not self._interval:
+            self._interval = self.min_interval
+
+    def feed(self, text: str) -> None:
+        """Append streamed text; the edit happens in the background."""
+        self.update(self.content + text)
+
+    def update(self, content: str) -> None:
+        """Replace the pending content, e.g. with a progress line; the edit happens in the background."""
+        self._start()
+        self.content = content
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._closing = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name="stream-renderer")
+        self._wakeup.set()
+
+    def _delay(self) -> float:
+        """Seconds until the next edit is due, or 0 if it is due now."""
+        pending = len(self.content) - len(self._rendered)
+        elapsed = time.monotonic() - self._last_edit
+        if pending >= self.flush_chars:
+            return max(0.0, self.min_interval - elapsed)
+        return max(0.0, self._interval - elapsed)
+
+    async def _edit(self, content: str) -> None:
+        started = time.monotonic()
+        try:
+            with logfire.span("Edit {command} message", command=self.command, length=len(content)):
+                await self.message.edit(content=content)
+        except nextcord.HTTPException as e:
+            outcome = "rate_limited" if e.status == 429 else "error"
+            DISCORD_EDIT.observe(time.monotonic() - started, command=self.command, outcome=outcome)
+            if e.status != 429:
+                raise
+            self._stats.rate_limited += 1
+            self._interval = min(self.max_interval, self._interval * 2)
+            raise
+        elapsed = time.monotonic() - started
+        self._stats.edits += 1
+        self._last_edit = time.monotonic()
+        if elapsed >= self.slow_edit_seconds:
+            DISCORD_EDIT.observe(elapsed, command=self.command, outcome="slow")
+            self._stats.rate_limited += 1
+            self._interval = min(self.max_interval, self._interval * 2)
+        else:
+            DISCORD_EDIT.observe(elapsed, command=self.command, outcome="ok")
+            self._interval = max(self.min_interval, self._interval * 0.8)
+
+    async def _render(self) -> None:
+        while len(self.content) > self.limit:
+            snapshot = self.content
+            head, tail = split_markdown(snapshot, self.limit)
+            if head != self._rendered:
+                await self._edit(head)
+            self.message = await self.send(tail[: self.limit])
+            self._stats.messages += 1
+            # `feed` may have appended more text while we were waiting on Discord.
+            self.content = tail + self.content[len(snapshot) :]
+            self._rendered = tail[: self.limit]
+        content = self.content
+        if content != self._rendered:
+            await self._edit(content)
+            self._rendered = content
+
+    async def _run(self) -> None:
+        while not self._closing.is_set():
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            delay = self._delay()
+            while delay > 0 and not self._closing.is_set():
+                # Wake up a little early if enough text piles up to justify a size-based edit.
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._closing.wait(), timeout=min(delay, 0.25))
+                delay = self._delay()
+            if self._closing.is_set():
+                return
+            try:
+                await self._render()
+            except nextcord.HTTPException as e:
+                logfire.warn("Stream edit failed", status=e.status, error=str(e))
+
+    async def finish(self, content: str | None = None, attempts: int = 3) -> None:
+        """Stop the background edits and make sure the final content is visible.
+
+        Args:
+            content (str | None): Replace the current message content, e.g. with an error.
+            attempts (int): How many times the final edit is retried before sending it anew.
+        """
+        if self._task is not None:
+            # Let an in-flight edit complete so the message and the buffer never disagree.
+            self._closing.set()
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._start()
+        if content is not None:
+            self.content = content
+        for attempt in range(attempts):
+            if await self._try_render(attempt):
+                return
+            await asyncio.sleep(self._interval)
+        self.message = await self.send(self.content[: self.limit])
+        self._stats.messages += 1
+
+    async def _try_render(self, attempt: int) -> bool:
+        try:
+            await self._render()
+        except nextcord.HTTPException as e:
+            logfire.warn("Final stream edit failed", attempt=attempt, error=str(e))
+            return False
+        return True
+
+    def stats(self) -> RendererStats:
+        return self._stats.model_copy(update={"interval": round(self._interval, 3)})
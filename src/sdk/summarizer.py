@@ -0,0 +1,183 @@
+from typing import Literal, NamedTuple
+import asyncio
+from collections.abc import Callable, Awaitable
+
+from pydantic import Field, BaseModel, ConfigDict
+
+from src.sdk.llm import LLMServices
+from src.sdk.tokens import token_budget
+
+CHUNK_PROMPT = """
+你會收到一段聊天紀錄的其中一部分。
+請以發送者當作主要分類，條列每位發送者在這段期間內發送的重點，保留連結與具體的數字。
+不要加入整體總結，之後會與其他部分合併。
+"""
+
+CHUNK_MESSAGE = """
+以下是第 {index}/{total} 段聊天紀錄，共 {count} 則消息：
+{chat_history_string}
+"""
+
+MERGE_MESSAGE = """
+以下是依時間順序排列的 {count} 份部分摘要，請合併同一位發送者的重點，維持以發送者分類：
+{summaries}
+"""
+
+REDUCE_MESSAGE = """
+以下是 {history_count} 則消息依時間順序分段整理的摘要，請合併同一位發送者的重點並完成總結：
+{summaries}
+"""
+
+
+class ChatLine(NamedTuple):
+    text: str
+    attachments: list[str]
+
+
+class SummaryProgress(BaseModel):
+    stage: Literal["map", "reduce"] = Field(..., description="The phase that made progress.")
+    done: int = Field(..., description="Calls of this phase that completed.")
+    total: int = Field(..., description="Calls this phase needs.")
+
+
+class MapReduceSummarizer(BaseModel):
+    """Summarise chat histories that do not fit one prompt.
+
+    The history is cut into token-budgeted chunks of consecutive lines. Every chunk is
+    summarised per author concurrently (map); the partial summaries are then merged in
+    chronological order until they fit a single final prompt (reduce), which the reduce
+    model answers with its own system prompt.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    map_llm: LLMServices = Field(
+        ..., description="Summarises chunks and merges partial summaries."
+    )
+    reduce_llm: LLMServices = Field(..., description="Writes the final summary.")
+    chunk_tokens: int = Field(default=8000, description="The token budget of one chunk's history.")
+    reduce_tokens: int = Field(
+        default=12000, description="The token budget of the partial summaries merged at once."
+    )
+    max_concurrency: int = Field(default=4, description="Model calls running at the same time.")
+    max_images_per_chunk: int = Field(
+        default=4, description="Attachments sent along with one chunk; the rest stay as links."
+    )
+
+    def split(self, lines: list[ChatLine]) -> list[list[ChatLine]]:
+        """Cut the history into chunks of consecutive lines within `chunk_tokens`.
+
+        A single line longer than the budget becomes a chunk of its own.
+        """
+        chunks: list[list[ChatLine]] = []
+        current: list[ChatLine] = []
+        used = 0
+        model = self.map_llm.llm_model
+        for line in lines:
+            tokens = token_budget.count(line.text, model)
+            if current and used + tokens > self.chunk_tokens:
+                chunks.append(current)
+                current, used = [], 0
+            current.append(line)
+            used += tokens
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _group(self, summaries: list[str]) -> list[list[str]]:
+        groups: list[list[str]] = []
+        used = 0
+        model = self.map_llm.llm_model
+        for summary in summaries:
+            tokens = token_budget.count(summary, model)
+            if not groups or used + tokens > self.reduce_tokens:
+                groups.append([])
+                used = 0
+            groups[-1].append(summary)
+            used += tokens
+        return groups
+
+    async def _complete(
+        self, llm: LLMServices, prompt: str, image_urls: list[str] | None = None
+    ) -> str:
+        response = await llm.get_oai_reply(prompt=prompt, image_urls=image_urls)
+        return response.choices[0].message.content or ""
+
+    async def summarize(
+        self,
+        chunks: list[list[ChatLine]],
+        history_count: int,
+        on_progress: Callable[[SummaryProgress], None] | None = None,
+    ) -> str:
+        """Summarise the chunks concurrently, then reduce the partial summaries.
+
+        Args:
+            chunks (list[list[ChatLine]]): The history as returned by `split`.
+            history_count (int): The number of messages asked for, quoted in the final prompt.
+            on_progress (Callable[[SummaryProgress], None] | None): Called whenever a model
+                call completes, and before the final call starts.
+
+        Returns:
+            str: The final summary.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        def report(stage: Literal["map", "reduce"], done: int, total: int) -> None:
+            if on_progress is not None:
+                on_progress(SummaryProgress(stage=stage, done=done, total=total))
+
+        done = 0
+
+        async def run(stage: Literal["map", "reduce"], total: int, call: Awaitable[str]) -> str:
+            nonlocal done
+            async with semaphore:
+                summary = await call
+            done += 1
+            report(stage, done, total)
+            return summary
+
+        summaries = await asyncio.gather(*[
+            run(
+                "map",
+                len(chunks),
+                self._complete(
+                    self.map_llm,
+                    CHUNK_MESSAGE.format(
+                        index=index,
+                        total=len(chunks),
+                        count=len(chunk),
+                        chat_history_string="\n".join(line.text for line in chunk),
+                    ),
+                    [url for line in chunk for url in line.attachments][
+                        : self.max_images_per_chunk
+                    ],
+                ),
+            )
+            for index, chunk in enumerate(chunks, start=1)
+        ])
+
+        while True:
+            groups = self._group(summaries)
+            # Stop once everything fits, or when no group holds two summaries to merge.
+            if len(groups) == 1 or len(groups) == len(summaries):
+                break
+            # Too many partial summaries for one prompt: merge neighbours level by level.
+            done = 0
+            summaries = await asyncio.gather(*[
+                run(
+                    "reduce",
+                    len(groups),
+                    self._complete(
+                        self.map_llm,
+                        MERGE_MESSAGE.format(count=len(group), summaries="\n\n".join(group)),
+                    ),
+                )
+                for group in groups
+            ])
+
+        report("reduce", 0, 1)
+        final = await self._complete(
+            self.reduce_llm,
+            REDUCE_MESSAGE.format(history_count=history_count, summaries="\n\n".join(summaries)),
+        )
+        report("reduce", 1, 1)
+        return final
@@ -0,0 +1,225 @@
+import math
+from typing import TYPE_CHECKING, Any, Literal
+from pathlib import Path
+from functools import cached_property
+
+import logfire
+from pydantic import Field, BaseModel, ConfigDict, PrivateAttr
+from openai.types import CompletionUsage
+
+if TYPE_CHECKING:
+    from tiktoken import Encoding
+
+# Context windows in tokens; prompts and the reserved output share them.
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o": 128_000,
+    "gpt-4o-mini": 128_000,
+    "gpt-4-turbo": 128_000,
+    "gpt-4": 8_192,
+    "o1": 200_000,
+    "o1-mini": 128_000,
+    "o3-mini": 200_000,
+    "llama-3.1-sonar-small-128k-online": 127_072,
+    "llama-3.1-sonar-large-128k-online": 127_072,
+    "llama-3.1-sonar-huge-128k-online": 127_072,
+}
+
+# The split pattern of `o200k_base`, so a local vocabulary file needs no download.
+_O200K_PATTERN = (
+    r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]*[\p{Ll}\p{Lm}\p{Lo}\p{M}]+(?i:'s|'t|'re|'ve|'m|'ll|'d)?"""
+    r"""|[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]+[\p{Ll}\p{Lm}\p{Lo}\p{M}]*(?i:'s|'t|'re|'ve|'m|'ll|'d)?"""
+    r"""|\p{N}{1,3}"""
+    r"""| ?[^\s\p{L}\p{N}]+[\r\n/]*"""
+    r"""|\s*[\r\n]+"""
+    r"""|\s+(?!\S)"""
+    r"""|\s+"""
+)
+
+# Every chat message is wrapped in a few formatting tokens, and the reply is primed with more.
+_TOKENS_PER_MESSAGE = 3
+_TOKENS_PER_REPLY = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of text without a vocabulary.
+
+    English averages about four characters per token, while CJK characters cost about one
+    token each. Both are told apart by their UTF-8 length, which keeps the estimate a pair
+    of C-level length computations.
+    """
+    if not text:
+        return 0
+    chars = len(text)
+    if text.isascii():
+        return chars // 4 + 1
+    # 2-byte characters add one byte, CJK characters two and emoji three.
+    wide = (len(text.encode("utf-8")) - chars + 1) // 2
+    return (chars - wide) // 4 + wide + 1
+
+
+class TokenStats(BaseModel):
+    calls: int = Field(default=0, description="Model calls recorded.")
+    prompt_tokens: int = Field(default=0, description="Prompt tokens billed by the API.")
+    completion_tokens: int = Field(default=0, description="Completion tokens billed by the API.")
+    estimated_prompt_tokens: int = Field(
+        default=0, description="Prompt tokens counted locally for the same calls."
+    )
+    trimmed: int = Field(default=0, description="Inputs shortened to fit the budget.")
+    tokenizer: str = Field(default="estimate", description="The counting method in use.")
+    calibration: dict[str, float] = Field(
+        default_factory=dict, description="Billed over estimated prompt tokens per model."
+    )
+
+
+class TokenBudget(BaseModel):
+    """Count tokens offline and keep prompts within each model's context window.
+
+    With `tokenizer_file` pointing at a local `o200k_base.tiktoken` vocabulary, tokens are
+    counted exactly by tiktoken. Otherwise `estimate_tokens` is used and calibrated per
+    model against the prompt tokens the API reports for text-only calls.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    context_windows: dict[str, int] = Field(
+        default_factory=lambda: dict(MODEL_CONTEXT_WINDOWS),
+        description="Context window per model.",
+    )
+    default_context_window: int = Field(
+        default=128_000, description="The context window of models not listed."
+    )
+    output_reserve: int = Field(default=4096, description="Tokens kept free for the answer.")
+    image_tokens: int = Field(
+        default=1445, description="The most a high-detail image costs once downscaled to 768x2048."
+    )
+    tokenizer_file: str | None = Field(
+        default=None, description="A local `o200k_base.tiktoken` file for exact counts."
+    )
+    calibration_weight: float = Field(
+        default=0.1, description="How fast the estimate follows the billed token counts."
+    )
+    calibration: dict[str, float] = Field(
+        default_factory=dict, description="Billed over estimated prompt tokens per model."
+    )
+
+    _stats: TokenStats = PrivateAttr(default_factory=TokenStats)
+
+    # Counting runs per message, and a cached property is a plain attribute lookup once
+    # computed, unlike pydantic private attributes.
+    @cached_property
+    def encoding(self) -> "Encoding | None":
+        """The tiktoken encoding loaded from `tokenizer_file`, or None to estimate."""
+        if not self.tokenizer_file:
+            return None
+        try:
+            import tiktoken
+            from tiktoken.load import load_tiktoken_bpe
+
+            ranks = load_tiktoken_bpe(str(Path(self.tokenizer_file)))
+        except (ImportError, OSError, ValueError) as e:
+            logfire.warn("Falling back to estimated token counts", error=str(e))
+            return None
+        return tiktoken.Encoding(
+            name="o200k_base", pat_str=_O200K_PATTERN, mergeable_ranks=ranks, special_tokens={}
+        )
+
+    def context_window(self, model: str) -> int:
+        return self.context_windows.get(model, self.default_context_window)
+
+    def input_limit(self, model: str) -> int:
+        """Return how many prompt tokens the model takes once the output is reserved."""
+        return self.context_window(model) - self.output_reserve
+
+    def count(self, text: str, model: str = "") -> int:
+        """Count the tokens of text, exactly when a tokenizer is loaded."""
+        encoding = self.encoding
+        if encoding is not None:
+            return len(encoding.encode_ordinary(text))
+        return math.ceil(estimate_tokens(text) * self.calibration.get(model, 1.0))
+
+    def count_messages(self, messages: list[dict[str, Any]], model: str = "") -> int:
+        """Count the prompt tokens of chat messages, including images and formatting."""
+        total = _TOKENS_PER_REPLY
+        for message in messages:
+            total += _TOKENS_PER_MESSAGE
+            content = message["content"]
+            if isinstance(content, str):
+                total += self.count(content, model)
+                continue
+            for part in content:
+                if part["type"] == "text":
+                    total += self.count(part["text"], model)
+                else:
+                    total += self.image_tokens
+        return total
+
+    def trim(
+        self, text: str, max_tokens: int, model: str = "", keep: Literal["head", "tail"] = "head"
+    ) -> str:
+        """Shorten text to at most `max_tokens`, keeping its start or its end.
+
+        Args:
+            text (str): The text to shorten.
+            max_tokens (int): The token budget.
+            model (str): The model the text is sent to.
+            keep (Literal["head", "tail"]): Whether the beginning or the end is kept.
+
+        Returns:
+            str: The text itself if it fits, otherwise the kept part marked with an ellipsis.
+        """
+        tokens = self.count(text, model)
+        if tokens <= max_tokens:
+            return text
+        self._stats.trimmed += 1
+        if max_tokens <= 0:
+            return ""
+        chars = len(text)
+        # Tokens per character are roughly constant within a text, so a proportional cut
+        # lands close; the margin absorbs the variance and one more pass fixes the rest.
+        while tokens > max_tokens and chars > 0:
+            chars = int(chars * max_tokens / tokens * 0.95)
+            kept = text[:chars] + "…" if keep == "head" else "…" + text[len(text) - chars :]
+            tokens = self.count(kept, model)
+        return kept if chars > 0 else ""
+
+    def record(
+        self, model: str, messages: list[dict[str, Any]], usage: CompletionUsage | None
+    ) -> None:
+        """Account for a model call and calibrate the estimate on text-only prompts.
+
+        Args:
+            model (str): The model that answered.
+            messages (list[dict[str, Any]]): The prompt that was sent.
+            usage (CompletionUsage | None): The usage of the response, which some providers
+                omit.
+        """
+        if usage is None:
+            return
+        stats = self._stats
+        estimated = self.count_messages(messages, model)
+        stats.calls += 1
+        stats.prompt_tokens += usage.prompt_tokens
+        stats.completion_tokens += usage.completion_tokens
+        stats.estimated_prompt_tokens += estimated
+        text_only = all(
+            isinstance(message["content"], str)
+            or all(part["type"] == "text" for part in message["content"])
+            for message in messages
+        )
+        if self.encoding is not None or not text_only:
+            return
+        previous = self.calibration.get(model, 1.0)
+        raw = estimated / previous
+        ratio = min(2.0, max(0.5, usage.prompt_tokens / raw)) if raw else previous
+        weight = self.calibration_weight
+        self.calibration[model] = round(previous * (1 - weight) + ratio * weight, 4)
+
+    def stats(self) -> TokenStats:
+        return self._stats.model_copy(
+            update={
+                "tokenizer": "estimate" if self.encoding is None else "tiktoken",
+                "calibration": dict(self.calibration),
+            }
+        )
+
+
+token_budget = TokenBudget()
@@ -1,4 +1,5 @@
-from typing import Optional
+from typing import Literal, Optional
+import functools
 
 import logfire
 from pydantic import Field
@@ -16,6 +17,14 @@ class Config(BaseSettings):
         frozen=False,
         deprecated=False,
     )
+    openai_base_url: str = Field(
+        default="https://api.openai.com/v1",
+        description="The base url of the OpenAI-compatible API.",
+        examples=["https://api.openai.com/v1"],
+        alias="OPENAI_BASE_URL",
+        frozen=False,
+        deprecated=False,
+    )
     pplx_api_key: str = Field(
         ...,
         description="The api key from perplexity for calling models.",
@@ -24,6 +33,14 @@ class Config(BaseSettings):
         frozen=False,
         deprecated=False,
     )
+    pplx_base_url: str = Field(
+        default="https://api.perplexity.ai",
+        description="The base url of the Perplexity API.",
+        examples=["https://api.perplexity.ai"],
+        alias="PERPLEXITY_BASE_URL",
+        frozen=False,
+        deprecated=False,
+    )
     discord_bot_token: str = Field(
         ...,
         description="The token from discord for calling models.",
@@ -40,3 +57,225 @@ class Config(BaseSettings):
         frozen=False,
         deprecated=False,
     )
+    message_log_sinks: list[Literal["csv", "postgres", "sqlite"]] = Field(
+        default=["csv"],
+        description="Where the message logger writes records, any of csv, postgres and sqlite.",
+        examples=[["csv", "postgres"]],
+        alias="MESSAGE_LOG_SINKS",
+        frozen=False,
+        deprecated=False,
+    )
+    message_index_enabled: bool = Field(
+        default=False,
+        description="Answer /sum for a user from a local index, which stores every logged message in the MESSAGE_INDEX database.",
+        examples=[True],
+        alias="MESSAGE_INDEX_ENABLED",
+        frozen=False,
+        deprecated=False,
+    )
+    message_index: Literal["sqlite", "postgres"] = Field(
+        default="sqlite",
+        description="The database holding the message index that /sum reads from.",
+        examples=["postgres"],
+        alias="MESSAGE_INDEX",
+        frozen=False,
+        deprecated=False,
+    )
+    response_cache_enabled: bool = Field(
+        default=False,
+        description="Answer repeated /oai and /search requests from the response cache.",
+        examples=[True],
+        alias="RESPONSE_CACHE_ENABLED",
+        frozen=False,
+        deprecated=False,
+    )
+    response_cache_ttl: int = Field(
+        default=3600,
+        description="How many seconds a cached response stays valid.",
+        examples=[3600],
+        alias="RESPONSE_CACHE_TTL",
+        frozen=False,
+        deprecated=False,
+    )
+    response_cache_redis: bool = Field(
+        default=False,
+        description="Share cached responses between bot processes through Redis.",
+        examples=[True],
+        alias="RESPONSE_CACHE_REDIS",
+        frozen=False,
+        deprecated=False,
+    )
+    near_cache_enabled: bool = Field(
+        default=False,
+        description="Also answer prompts that are near duplicates of a cached prompt in the same guild.",
+        examples=[True],
+        alias="NEAR_CACHE_ENABLED",
+        frozen=False,
+        deprecated=False,
+    )
+    near_cache_threshold: float = Field(
+        default=0.8,
+        description="The minimum Jaccard similarity between the prompt shingles for a near-duplicate hit; the words and numbers must also match.",
+        examples=[0.8],
+        alias="NEAR_CACHE_THRESHOLD",
+        frozen=False,
+        deprecated=False,
+    )
+    conversation_memory_enabled: bool = Field(
+        default=False,
+        description="Give /oai and /oais the recent conversation of the channel, kept in Redis.",
+        examples=[True],
+        alias="CONVERSATION_MEMORY_ENABLED",
+        frozen=False,
+        deprecated=False,
+    )
+    conversation_memory_turns: int = Field(
+        default=12,
+        description="Recent turns kept verbatim per channel; older ones are folded into a summary.",
+        examples=[12],
+        alias="CONVERSATION_MEMORY_TURNS",
+        frozen=False,
+        deprecated=False,
+    )
+    rate_limit_enabled: bool = Field(
+        default=True,
+        description="Rate limit the model commands per user, guild and command with token buckets.",
+        examples=[True],
+        alias="RATE_LIMIT_ENABLED",
+        frozen=False,
+        deprecated=False,
+    )
+    rate_limit_redis: bool = Field(
+        default=False,
+        description="Share the rate limit buckets between bot processes through Redis.",
+        examples=[True],
+        alias="RATE_LIMIT_REDIS",
+        frozen=False,
+        deprecated=False,
+    )
+    metrics_port: Optional[int] = Field(
+        default=None,
+        description="Serve Prometheus metrics at /metrics on this port; unset disables the endpoint.",
+        examples=[9464],
+        alias="METRICS_PORT",
+        frozen=False,
+        deprecated=False,
+    )
+    metrics_host: str = Field(
+        default="127.0.0.1",
+        description="The interface the metrics endpoint listens on.",
+        examples=["127.0.0.1"],
+        alias="METRICS_HOST",
+        frozen=False,
+        deprecated=False,
+    )
+    dispatch_concurrency: int = Field(
+        default=8,
+        description="Upstream calls allowed at once per provider and model; more calls queue.",
+        examples=[8],
+        alias="DISPATCH_CONCURRENCY",
+        frozen=False,
+        deprecated=False,
+    )
+    dispatch_limits: dict[str, int] = Field(
+        default={},
+        description="Concurrency overrides keyed by `provider:model` or `provider`.",
+        examples=[{"perplexity": 2, "openai:dall-e-3": 2}],
+        alias="DISPATCH_LIMITS",
+        frozen=False,
+        deprecated=False,
+    )
+    dispatch_max_queue: int = Field(
+        default=50,
+        description="Calls allowed to wait per provider and model before new ones are turned away.",
+        examples=[50],
+        alias="DISPATCH_MAX_QUEUE",
+        frozen=False,
+        deprecated=False,
+    )
+    tokenizer_file: Optional[str] = Field(
+        default=None,
+        description="A local o200k_base.tiktoken vocabulary for exact token counts; without it tokens are estimated.",
+        examples=["./data/o200k_base.tiktoken"],
+        alias="TOKENIZER_FILE",
+        frozen=False,
+        deprecated=False,
+    )
+    cache_snapshot_dir: str = Field(
+        default="./data/cache",
+        description="Where the response cache and near-duplicate index are snapshotted.",
+        examples=["./data/cache"],
+        alias="CACHE_SNAPSHOT_DIR",
+        frozen=False,
+        deprecated=False,
+    )
+    command_sync_file: str = Field(
+        default="./data/command_sync.json",
+        description="Where the hashes of the synced slash-command schemas are kept, so unchanged commands are not synced again.",
+        examples=["./data/command_sync.json"],
+        alias="COMMAND_SYNC_FILE",
+        frozen=False,
+        deprecated=False,
+    )
+    assistant_registry_file: str = Field(
+        default="./data/assistants.json",
+        description="Where the assistants and channel threads resolved by the assistant registry are kept, so a restart does not list every assistant again.",
+        examples=["./data/assistants.json"],
+        alias="ASSISTANT_REGISTRY_FILE",
+        frozen=False,
+        deprecated=False,
+    )
+    shard_count: int | Literal["auto"] = Field(
+        default=1,
+        description="Gateway shards across the whole bot; `auto` uses the count Discord recommends.",
+        examples=[1, 4, "auto"],
+        alias="SHARD_COUNT",
+        frozen=False,
+        deprecated=False,
+    )
+    shard_ids: Optional[list[int]] = Field(
+        default=None,
+        description="The shards this process runs; unset runs all of them. Set by the cluster launcher.",
+        examples=[[0, 1]],
+        alias="SHARD_IDS",
+        frozen=False,
+        deprecated=False,
+    )
+    cluster_processes: int = Field(
+        default=1,
+        description="Processes the cluster launcher splits the shards between.",
+        examples=[4],
+        alias="CLUSTER_PROCESSES",
+        frozen=False,
+        deprecated=False,
+    )
+    cluster_id: int = Field(
+        default=0,
+        description="The index of this process in the cluster, which offsets its metrics port. Set by the cluster launcher.",
+        examples=[0],
+        alias="CLUSTER_ID",
+        frozen=False,
+        deprecated=False,
+    )
+    memory_budget: bool = Field(
+        default=False,
+        description="Ask only for the intents the cogs need, cache no members and cap the message cache.",
+        examples=[True],
+        alias="MEMORY_BUDGET",
+        frozen=False,
+        deprecated=False,
+    )
+    message_cache_size: int = Field(
+        default=1000,
+        description="The most messages kept in the message cache; 0 turns it off.",
+        examples=[200],
+        alias="MESSAGE_CACHE_SIZE",
+        frozen=False,
+        deprecated=False,
+    )
+
+
+@functools.cache
+def get_config() -> Config:
+    """Return the process-wide settings, read from the environment on first use."""
+    return Config()
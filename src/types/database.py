@@ -1,7 +1,10 @@
 from typing import Optional
+import functools
+from urllib.parse import quote
 
 from redis import Redis
 from pydantic import Field, BaseModel, AliasChoices, computed_field
+from redis.asyncio import Redis as AsyncRedis
 from pydantic_settings import BaseSettings
 
 
@@ -42,6 +45,11 @@ class PostgreSQLConfig(BaseSettings):
     def postgres_dsn(self) -> str:
         return f"postgresql://{self.postgres_user}:{self.postgres_password}@{self.postgres_host}:{self.postgres_port}/{self.postgres_db}"
 
+    @computed_field
+    @property
+    def postgres_async_dsn(self) -> str:
+        return f"postgresql+asyncpg://{self.postgres_user}:{self.postgres_password}@{self.postgres_host}:{self.postgres_port}/{self.postgres_db}"
+
 
 class SQLiteConfig(BaseSettings):
     sqlite_file_path: str = Field(
@@ -57,8 +65,19 @@ class SQLiteConfig(BaseSettings):
         description="The timeout duration (in seconds) for SQLite operations. Defaults to 30 seconds.",
     )
 
+    @computed_field
+    @property
+    def sqlite_async_dsn(self) -> str:
+        return f"sqlite+aiosqlite:///{self.sqlite_file_path}"
+
 
 class RedisConfig(BaseSettings):
+    """The Redis settings, with blocking helpers for scripts and one-off checks.
+
+    Async code should use `src.sdk.storage.storage_registry.kv().store()`, which pipelines bulk
+    reads and writes on the shared connection pool.
+    """
+
     redis_host: str = Field(
         ...,
         validation_alias=AliasChoices("REDIS_HOST"),
@@ -84,23 +103,28 @@ class RedisConfig(BaseSettings):
         description="The password used to authenticate with the Redis server, if required.",
     )
 
-    @computed_field
     @property
+    def redis_url(self) -> str:
+        password = f":{quote(self.redis_password, safe='')}@" if self.redis_password else ""
+        return f"redis://{password}{self.redis_host}:{self.redis_port}/{self.redis_db}"
+
+    @computed_field
+    @functools.cached_property
     def redis_instance(self) -> Redis:
-        return Redis(
-            host=self.redis_host,
-            port=self.redis_port,
-            db=self.redis_db,
-            password=self.redis_password,
-        )
+        # 建立一次後重複使用，同一份設定的存取共用這個 client 的連線池
+        return Redis.from_url(self.redis_url)
+
+    @functools.cached_property
+    def async_redis_instance(self) -> AsyncRedis:
+        return AsyncRedis.from_url(self.redis_url)
 
     @computed_field
     @property
     def hkeys(self) -> list[str]:
         # 這裡的 hkeys 沒有指定要對哪一個 hash 進行操作，
         # 因此假設是要取得所有的 key (相當於 Redis 的 keys *)
-        # 若想要針對特定 hash，請更改此處為 self.redis_instance.hkeys('your_hash_key')
-        all_keys: list[bytes] = self.redis_instance.keys("*")
+        # 以 SCAN 分批取得，避免 KEYS * 在大量 key 時阻塞 Redis
+        all_keys = self.redis_instance.scan_iter(match="*", count=500)
         return [key.decode("utf-8") for key in all_keys]
 
     def hvalues(self, key: str) -> list[str]:
@@ -127,6 +151,19 @@ class RedisConfig(BaseSettings):
 
 
 class DatabaseConfig(BaseModel):
-    postgres: PostgreSQLConfig = PostgreSQLConfig()
-    sqlite: SQLiteConfig = SQLiteConfig()
-    redis: RedisConfig = RedisConfig()
+    """The settings of every backend, each read from the environment on first access.
+
+    Prefer `src.sdk.storage.storage_registry`, which only builds the backends in use.
+    """
+
+    @functools.cached_property
+    def postgres(self) -> PostgreSQLConfig:
+        return PostgreSQLConfig()
+
+    @functools.cached_property
+    def sqlite(self) -> SQLiteConfig:
+        return SQLiteConfig()
+
+    @functools.cached_property
+    def redis(self) -> RedisConfig:
+        return RedisConfig()
@@ -0,0 +1,128 @@
+from types import SimpleNamespace
+
+import pytest
+from fakeredis import FakeAsyncRedis
+from src.sdk.admission import (
+    RateLimit,
+    RateLimited,
+    AdmissionController,
+    rate_limited,
+    format_retry_after,
+    admission_controller,
+)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> Clock:
+    return Clock()
+
+
+def make_controller(clock: Clock, **kwargs: object) -> AdmissionController:
+    return AdmissionController(
+        clock=clock,
+        user_limit=RateLimit(capacity=3, per_second=1),
+        guild_limit=RateLimit(capacity=5, per_second=1),
+        command_limits={"graph": RateLimit(capacity=10, per_second=0.5)},
+        costs={"oai": 1.0, "graph": 5.0},
+        **kwargs,
+    )
+
+
+@pytest.mark.asyncio
+async def test_buckets_admit_bursts_and_tell_when_to_retry(clock: Clock) -> None:
+    controller = make_controller(clock)
+
+    assert [(await controller.acquire("oai", 1, None)).allowed for _ in range(4)] == [
+        True,
+        True,
+        True,
+        False,
+    ]
+    rejected = await controller.acquire("oai", 1, None)
+    assert rejected.scope == "user:1"
+    assert rejected.retry_after == pytest.approx(1.0)
+
+    clock.now += rejected.retry_after
+    assert (await controller.acquire("oai", 1, None)).allowed
+    # Another user is not affected, but the guild bucket is shared by its members.
+    for user in range(2, 7):
+        await controller.acquire("oai", user, 100)
+    guild_rejected = await controller.acquire("oai", 7, 100)
+    assert guild_rejected.scope == "guild:100"
+
+    stats = controller.stats()
+    assert stats.admitted == 9
+    assert stats.rejected == 3
+
+
+@pytest.mark.asyncio
+async def test_costs_weigh_commands_and_prompts(clock: Clock) -> None:
+    controller = make_controller(clock)
+
+    assert controller.estimate_cost("graph") == 5.0
+    assert controller.estimate_cost("oai", prompt_tokens=4000) == 3.0
+    # A request larger than the user bucket drains it instead of never running.
+    assert (await controller.acquire("graph", 1, None, 5.0)).allowed
+    assert (await controller.acquire("graph", 2, None, 5.0)).allowed
+    rejected = await controller.acquire("graph", 3, None, 5.0)
+    assert rejected.scope == "command:graph"
+    assert rejected.retry_after == pytest.approx(10.0)
+
+
+@pytest.mark.asyncio
+async def test_idle_buckets_are_forgotten_once_full(clock: Clock) -> None:
+    controller = make_controller(clock)
+    for user in range(100):
+        await controller.acquire("oai", user, None)
+    assert controller.stats().buckets == 100
+
+    clock.now += 1.0
+    await controller.acquire("oai", 1000, None)
+    assert controller.stats().buckets == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_buckets_are_shared_between_processes(clock: Clock) -> None:
+    redis = FakeAsyncRedis()
+    first, second = make_controller(clock, redis=redis), make_controller(clock, redis=redis)
+
+    assert (await first.acquire("oai", 1, None, 2.0)).allowed
+    rejected = await second.acquire("oai", 1, None, 2.0)
+    assert not rejected.allowed
+    assert rejected.retry_after == pytest.approx(1.0)
+    assert second.stats().buckets == 0
+
+    broken = make_controller(clock, redis=FakeAsyncRedis(connected=False))
+    assert (await broken.acquire("oai", 1, None)).allowed
+    assert broken.stats().redis_errors == 1
+    assert broken.stats().buckets == 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_check_raises_with_retry_after(
+    clock: Clock, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(admission_controller, "user_limit", RateLimit(capacity=1, per_second=0.1))
+    monkeypatch.setattr(admission_controller, "clock", clock)
+    predicate = rate_limited().predicate
+    interaction = SimpleNamespace(
+        application_command=SimpleNamespace(name="oai"),
+        user=SimpleNamespace(id=42),
+        guild_id=None,
+        data={"options": [{"name": "prompt", "value": "hello"}]},
+    )
+
+    assert await predicate(interaction)
+    with pytest.raises(RateLimited) as error:
+        await predicate(interaction)
+    assert error.value.scope == "user:42"
+    assert format_retry_after(error.value.retry_after) == "10 seconds"
+    assert format_retry_after(3725) == "1 hours 2 minutes 5 seconds"
@@ -0,0 +1,290 @@
+import asyncio
+from pathlib import Path
+from collections.abc import Mapping
+
+import orjson
+import pytest
+from aiohttp import web
+from fakeredis import FakeAsyncRedis
+from src.sdk.asst import AssistantAPI
+from aiohttp.test_utils import TestServer
+from src.sdk.asst_registry import AssistantRegistry
+
+RUN_DELAY = 0.2
+
+
+def make_run(thread_id: str, status: str) -> dict:
+    return {
+        "id": f"run_{thread_id}",
+        "object": "thread.run",
+        "created_at": 0,
+        "thread_id": thread_id,
+        "assistant_id": "asst_1",
+        "status": status,
+        "model": "gpt-4o",
+        "instructions": "",
+        "tools": [],
+        "parallel_tool_calls": True,
+    }
+
+
+def make_message(thread_id: str, message_id: str, text: str, status: str = "completed") -> dict:
+    return {
+        "id": message_id,
+        "object": "thread.message",
+        "created_at": 0,
+        "thread_id": thread_id,
+        "role": "assistant",
+        "status": status,
+        "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+        "attachments": [],
+        "metadata": {},
+    }
+
+
+def make_assistant(index: int) -> dict:
+    return {
+        "id": f"asst_{index}",
+        "object": "assistant",
+        "created_at": 0,
+        "name": f"helper {index}",
+        "model": "gpt-4o",
+        "description": "d",
+        "instructions": "i",
+        "tools": [],
+        "metadata": {},
+    }
+
+
+def paginate(items: list[dict], query: Mapping[str, str]) -> dict:
+    ids = [item["id"] for item in items]
+    start = ids.index(query["after"]) + 1 if "after" in query else 0
+    page = items[start : start + int(query.get("limit", 20))]
+    return {
+        "object": "list",
+        "data": page,
+        "first_id": page[0]["id"] if page else None,
+        "last_id": page[-1]["id"] if page else None,
+        "has_more": start + len(page) < len(items),
+    }
+
+
+def sse(event: str, data: dict) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+async def write_run_events(response: web.StreamResponse, thread_id: str) -> None:
+    await response.write(sse("thread.run.created", make_run(thread_id, "queued")))
+    await response.write(sse("thread.run.in_progress", make_run(thread_id, "in_progress")))
+    await response.write(
+        sse("thread.message.created", make_message(thread_id, "msg_1", "", "in_progress"))
+    )
+    for text in ("Hello", " from ", thread_id):
+        # The model is slow; a blocking client would serialise the runs.
+        await asyncio.sleep(RUN_DELAY / 3)
+        delta = {"content": [{"index": 0, "type": "text", "text": {"value": text}}]}
+        await response.write(
+            sse(
+                "thread.message.delta",
+                {"id": "msg_1", "object": "thread.message.delta", "delta": delta},
+            )
+        )
+    reply = f"Hello from {thread_id}"
+    await response.write(sse("thread.message.completed", make_message(thread_id, "msg_1", reply)))
+    await response.write(sse("thread.run.completed", make_run(thread_id, "completed")))
+    await response.write(b"event: done\ndata: [DONE]\n\n")
+
+
+@pytest.fixture
+async def fake_assistants(monkeypatch: pytest.MonkeyPatch):
+    calls: dict[str, int] = {
+        "threads": 0,
+        "runs": 0,
+        "polls": 0,
+        "lists": 0,
+        "assistant_pages": 0,
+        "assistant_creates": 0,
+        "messages": 0,
+        "running": 0,
+        "peak_running": 0,
+    }
+    assistants = [make_assistant(index) for index in range(250)]
+    deleted_threads: set[str] = set()
+
+    async def create_thread(request: web.Request) -> web.Response:
+        calls["threads"] += 1
+        return web.json_response({
+            "id": f"thread_{calls['threads']}",
+            "object": "thread",
+            "created_at": 0,
+            "metadata": {},
+        })
+
+    async def create_run(request: web.Request) -> web.StreamResponse:
+        calls["runs"] += 1
+        calls["running"] += 1
+        calls["peak_running"] = max(calls["peak_running"], calls["running"])
+        try:
+            response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+            await response.prepare(request)
+            await write_run_events(response, request.match_info["thread_id"])
+        finally:
+            calls["running"] -= 1
+        return response
+
+    async def retrieve_run(request: web.Request) -> web.Response:
+        calls["polls"] += 1
+        status = "completed" if calls["polls"] >= 3 else "in_progress"
+        return web.json_response(make_run(request.match_info["thread_id"], status))
+
+    async def list_messages(request: web.Request) -> web.Response:
+        calls["lists"] += 1
+        thread_id = request.match_info["thread_id"]
+        return web.json_response({
+            "object": "list",
+            "data": [make_message(thread_id, "msg_9", "stored reply")],
+            "first_id": "msg_9",
+            "last_id": "msg_9",
+            "has_more": False,
+        })
+
+    async def list_assistants(request: web.Request) -> web.Response:
+        calls["assistant_pages"] += 1
+        return web.json_response(paginate(assistants, request.query))
+
+    async def create_assistant(request: web.Request) -> web.Response:
+        calls["assistant_creates"] += 1
+        body = await request.json()
+        assistant = {**make_assistant(len(assistants)), **body}
+        assistants.insert(0, assistant)
+        return web.json_response(assistant)
+
+    async def delete_thread(request: web.Request) -> web.Response:
+        thread_id = request.match_info["thread_id"]
+        deleted_threads.add(thread_id)
+        return web.json_response({"id": thread_id, "object": "thread.deleted", "deleted": True})
+
+    async def create_message(request: web.Request) -> web.Response:
+        calls["messages"] += 1
+        thread_id = request.match_info["thread_id"]
+        if thread_id in deleted_threads:
+            return web.json_response({"error": {"message": "No thread found"}}, status=404)
+        message = make_message(thread_id, f"msg_{calls['messages']}", "question")
+        return web.json_response({**message, "role": "user"})
+
+    app = web.Application()
+    app.router.add_get("/v1/assistants", list_assistants)
+    app.router.add_post("/v1/assistants", create_assistant)
+    app.router.add_post("/v1/threads", create_thread)
+    app.router.add_delete("/v1/threads/{thread_id}", delete_thread)
+    app.router.add_get("/v1/threads/{thread_id}/messages", list_messages)
+    app.router.add_post("/v1/threads/{thread_id}/messages", create_message)
+    app.router.add_post("/v1/threads/{thread_id}/runs", create_run)
+    app.router.add_get("/v1/threads/{thread_id}/runs/{run_id}", retrieve_run)
+    server = TestServer(app, host="127.0.0.1")
+    await server.start_server()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.port}/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("PERPLEXITY_API_KEY", "pplx-test")
+    monkeypatch.setenv("DISCORD_BOT_TOKEN", "token")
+    yield calls
+    await server.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_runs_do_not_block_each_other(fake_assistants: dict[str, int]) -> None:
+    assistants = [AssistantAPI(assistant_id="asst_1") for _ in range(5)]
+    for assistant in assistants:
+        await assistant.create_or_retrieve_thread()
+
+    runs = await asyncio.gather(*(assistant.create_run() for assistant in assistants))
+
+    assert [run.status for run in runs] == ["completed"] * 5
+    assert fake_assistants["runs"] == 5
+    # Every run was streaming at the same time, so none waited for another.
+    assert fake_assistants["peak_running"] == 5
+    # The reply came with the run's events, so reading it costs no extra request.
+    replies = [await assistant.last_message() for assistant in assistants]
+    assert replies == [f"Hello from thread_{index}" for index in range(1, 6)]
+    assert fake_assistants["lists"] == 0
+    assert fake_assistants["polls"] == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_run_yields_text_deltas(fake_assistants: dict[str, int]) -> None:
+    assistant = AssistantAPI(assistant_id="asst_1", thread_id="thread_7")
+
+    deltas = [delta async for delta in assistant.stream_run()]
+
+    assert deltas == ["Hello", " from ", "thread_7"]
+    assert await assistant.last_message() == "Hello from thread_7"
+
+
+@pytest.mark.asyncio
+async def test_wait_for_run_and_last_message_fallback(fake_assistants: dict[str, int]) -> None:
+    assistant = AssistantAPI(assistant_id="asst_1", thread_id="thread_7")
+
+    run = await assistant.wait_for_run("run_thread_7", initial_interval=0.01)
+
+    assert run.status == "completed"
+    assert fake_assistants["polls"] == 3
+    assert await assistant.last_message() == "stored reply"
+    assert await assistant.last_message() == "stored reply"
+    assert fake_assistants["lists"] == 1
+
+
+@pytest.mark.asyncio
+async def test_assistant_resolution_lists_only_on_cold_rebuild(
+    fake_assistants: dict[str, int], tmp_path: Path
+) -> None:
+    redis = FakeAsyncRedis()
+    registry = AssistantRegistry(path=str(tmp_path / "assistants.json"), redis=redis)
+    settings = {"name": "helper 230", "model": "gpt-4o", "description": "d", "instructions": "i"}
+
+    # The match is on the third page, which the old scan never reached; the client reads
+    # on until it gets an empty page.
+    assistant = await AssistantAPI(registry=registry).retrieve_assistant_by_settings(**settings)
+    assert assistant.id == "asst_230"
+    assert fake_assistants["assistant_pages"] == 4
+
+    # Warm lookups, from this process, from another one through Redis and after a restart.
+    for warm in (
+        registry,
+        AssistantRegistry(redis=redis),
+        AssistantRegistry(path=str(tmp_path / "assistants.json")),
+    ):
+        api = AssistantAPI(registry=warm)
+        assert (await api.retrieve_assistant_by_settings(**settings)).id == "asst_230"
+        assert api.assistant_id == "asst_230"
+    assert fake_assistants["assistant_pages"] == 4
+
+    # Changed settings miss, rebuild once and create the assistant; after that they hit.
+    changed = settings | {"instructions": "be brief"}
+    created = await AssistantAPI(registry=registry).retrieve_assistant_by_settings(**changed)
+    again = await AssistantAPI(registry=registry).retrieve_assistant_by_settings(**changed)
+    assert created.id == again.id == "asst_250"
+    assert fake_assistants["assistant_creates"] == 1
+    assert fake_assistants["assistant_pages"] == 8
+    assert registry.stats().rebuilds == 2
+
+
+@pytest.mark.asyncio
+async def test_channel_threads_are_remembered(fake_assistants: dict[str, int]) -> None:
+    registry = AssistantRegistry(redis=FakeAsyncRedis())
+
+    first = await AssistantAPI(registry=registry).create_or_retrieve_thread("channel:1")
+    second = await AssistantAPI(registry=registry).create_or_retrieve_thread("channel:1")
+    other = await AssistantAPI(registry=registry).create_or_retrieve_thread("channel:2")
+
+    assert first.id == second.id == "thread_1"
+    assert other.id == "thread_2"
+    assert fake_assistants["threads"] == 2
+    assert fake_assistants["polls"] == 0
+
+    # Another process deletes the thread; the next message starts the conversation over.
+    await AssistantAPI(registry=AssistantRegistry()).delete_thread("thread_1")
+    api = AssistantAPI(registry=registry)
+    await api.create_or_retrieve_thread("channel:1")
+    message = await api.create_message(content="hi", image_urls=[])
+    assert message.thread_id == api.thread_id == "thread_3"
+    assert (await registry.get_thread("channel:1"))["id"] == "thread_3"
@@ -0,0 +1,72 @@
+import errno
+from pathlib import Path
+
+import pytest
+from aiohttp import web
+from src.sdk.http import close_http_session
+from aiohttp.test_utils import TestServer
+from src.sdk.attachment_store import AttachmentStore
+
+MEME = b"\x89PNG" + b"meme" * 100_000
+
+
+@pytest.fixture
+async def base_url():
+    async def meme(request: web.Request) -> web.Response:
+        return web.Response(body=MEME, content_type="image/png")
+
+    async def other(request: web.Request) -> web.Response:
+        return web.Response(body=b"other", content_type="image/png")
+
+    app = web.Application()
+    app.router.add_get("/meme.png", meme)
+    app.router.add_get("/other.png", other)
+    server = TestServer(app, host="127.0.0.1")
+    await server.start_server()
+    yield f"http://127.0.0.1:{server.port}"
+    await close_http_session()
+    await server.close()
+
+
+@pytest.mark.asyncio
+async def test_duplicates_are_stored_once(tmp_path: Path, base_url: str) -> None:
+    store = AttachmentStore(root=str(tmp_path / "blobs"), chunk_size=4096)
+    first = await store.save_many([
+        (f"{base_url}/meme.png", tmp_path / "2025-01-01" / "general" / "1_meme.png"),
+        (f"{base_url}/other.png", tmp_path / "2025-01-01" / "general" / "2_other.png"),
+    ])
+    second = await store.save_many([
+        (f"{base_url}/meme.png", tmp_path / "2025-01-02" / "random" / "3_meme.png"),
+        (f"{base_url}/missing.png", tmp_path / "2025-01-02" / "random" / "4_missing.png"),
+    ])
+
+    assert len(first) == 2
+    assert second == [str(tmp_path / "2025-01-02" / "random" / "3_meme.png")]
+    assert Path(second[0]).read_bytes() == MEME
+    assert Path(first[0]).stat().st_ino == Path(second[0]).stat().st_ino
+    blobs = [path for path in (tmp_path / "blobs").rglob("*") if path.is_file()]
+    assert len(blobs) == 2
+
+    stats = store.stats()
+    assert stats.files == 3
+    assert stats.unique == 2
+    assert stats.duplicates == 1
+    assert stats.failed == 1
+    assert stats.bytes_saved == len(MEME)
+    assert stats.dedup_ratio == pytest.approx(1 / 3, abs=1e-3)
+
+
+@pytest.mark.asyncio
+async def test_write_errors_are_contained(
+    tmp_path: Path, base_url: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def disk_full(*args: object) -> bool:
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    store = AttachmentStore(root=str(tmp_path / "blobs"), chunk_size=4096)
+    monkeypatch.setattr(store, "_commit", disk_full)
+    saved = await store.save_many([(f"{base_url}/meme.png", tmp_path / "general" / "1_meme.png")])
+
+    assert saved == []
+    assert store.stats().failed == 1
+    assert list((tmp_path / "blobs" / "tmp").iterdir()) == []
@@ -0,0 +1,172 @@
+import time
+from pathlib import Path
+
+import pytest
+from aiohttp import web
+from fakeredis import FakeAsyncRedis
+from src.sdk.llm import LLMServices
+from src.sdk.cache import ResponseCache, make_cache_key, response_cache
+from aiohttp.test_utils import TestServer
+
+COMPLETION = {
+    "id": "chatcmpl-1",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o",
+    "choices": [
+        {
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": "cached answer"},
+        }
+    ],
+}
+
+
+def make_chunk(content: str) -> dict:
+    return {
+        "id": "chatcmpl-2",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "gpt-4o",
+        "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}],
+    }
+
+
+@pytest.fixture
+async def fake_openai(monkeypatch: pytest.MonkeyPatch):
+    calls: list[dict] = []
+
+    async def completions(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        calls.append(body)
+        if not body.get("stream"):
+            return web.json_response(COMPLETION)
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for token in ("Hello", " world"):
+            await response.write(f"data: {web.json_response(make_chunk(token)).text}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    server = TestServer(app, host="127.0.0.1")
+    await server.start_server()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.port}/v1")
+    monkeypatch.setenv("RESPONSE_CACHE_ENABLED", "true")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("PERPLEXITY_API_KEY", "pplx-test")
+    monkeypatch.setenv("DISCORD_BOT_TOKEN", "token")
+    response_cache.clear()
+    yield calls
+    response_cache.clear()
+    await server.close()
+
+
+def test_cache_key_ignores_signed_url_parameters() -> None:
+    def messages(url: str) -> list[dict]:
+        return [
+            {"role": "system", "content": "sys"},
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": "what is this"},
+                    {"type": "image_url", "image_url": {"url": url}},
+                ],
+            },
+        ]
+
+    base = "https://cdn.discordapp.com/attachments/1/2/meme.png"
+    key = make_cache_key(kind="oai", model="gpt-4o", messages=messages(f"{base}?ex=1&hm=a"))
+    assert key == make_cache_key(kind="oai", model="gpt-4o", messages=messages(f"{base}?ex=2"))
+    assert key != make_cache_key(kind="oai", model="gpt-4o-mini", messages=messages(base))
+    assert key != make_cache_key(kind="oai_stream", model="gpt-4o", messages=messages(base))
+    # Outside the Discord CDN the query can select the image, and resizing changes it.
+    other = "https://example.com/image"
+    assert make_cache_key(
+        kind="oai", model="gpt-4o", messages=messages(f"{other}?id=1")
+    ) != make_cache_key(kind="oai", model="gpt-4o", messages=messages(f"{other}?id=2"))
+    media = "https://media.discordapp.net/attachments/1/2/meme.png"
+    assert make_cache_key(
+        kind="oai", model="gpt-4o", messages=messages(f"{media}?ex=1&width=100")
+    ) != make_cache_key(kind="oai", model="gpt-4o", messages=messages(f"{media}?ex=1&width=200"))
+
+
+@pytest.mark.asyncio
+async def test_lru_and_ttl(monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = ResponseCache(max_entries=2, ttl_seconds=10)
+    await cache.set("a", {"value": 1})
+    await cache.set("b", {"value": 2})
+    assert await cache.get("a") == {"value": 1}
+    await cache.set("c", {"value": 3})
+    assert await cache.get("b") is None
+    assert await cache.get("c") == {"value": 3}
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert await cache.get("a") is None
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.evictions, stats.entries) == (2, 2, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_redis_tier_is_shared_between_processes() -> None:
+    redis = FakeAsyncRedis()
+    first = ResponseCache(redis=redis, ttl_seconds=60)
+    second = ResponseCache(redis=redis, ttl_seconds=60)
+    await first.set("key", {"answer": 42})
+    assert await second.get("key") == {"answer": 42}
+    assert second.stats().redis_hits == 1
+    assert 0 < await redis.ttl("llmbot:cache:key") <= 60
+    # The promoted entry is now served in process.
+    assert await second.get("key") == {"answer": 42}
+    assert second.stats().redis_hits == 1
+    await first.aclose()
+
+
+@pytest.mark.asyncio
+async def test_oai_reply_is_cached(fake_openai: list[dict]) -> None:
+    llm = LLMServices()
+    first = await llm.get_oai_reply(prompt="faq")
+    second = await llm.get_oai_reply(prompt="faq")
+    assert first.choices[0].message.content == second.choices[0].message.content == "cached answer"
+    assert len(fake_openai) == 1
+    await llm.get_oai_reply(prompt="another question")
+    assert len(fake_openai) == 2
+
+
+@pytest.mark.asyncio
+async def test_stream_hit_replays_chunks(fake_openai: list[dict]) -> None:
+    llm = LLMServices()
+    first = [chunk.choices[0].delta.content async for chunk in llm.get_oai_reply_stream("faq")]
+    second = [chunk.choices[0].delta.content async for chunk in llm.get_oai_reply_stream("faq")]
+    assert first == second == ["Hello", " world"]
+    assert len(fake_openai) == 1
+
+
+@pytest.mark.asyncio
+async def test_snapshot_round_trip(tmp_path: Path) -> None:
+    path = tmp_path / "responses.json"
+    cache = ResponseCache(ttl_seconds=60)
+    await cache.set("key", {"answer": 42})
+    await cache.save(str(path))
+
+    restored = ResponseCache()
+    assert restored.load(str(path)) == 1
+    assert await restored.get("key") == {"answer": 42}
+
+
+@pytest.mark.asyncio
+async def test_near_duplicate_hits_are_scoped(
+    fake_openai: list[dict], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("NEAR_CACHE_ENABLED", "true")
+    llm = LLMServices()
+    await llm.get_oai_reply(prompt="What is the capital of France?", scope="guild:1")
+    await llm.get_oai_reply(prompt="what is the capital of france", scope="guild:1")
+    assert len(fake_openai) == 1
+    await llm.get_oai_reply(prompt="what is the capital of france", scope="guild:2")
+    await llm.get_oai_reply(prompt="What is the capital of France!")
+    assert len(fake_openai) == 3
@@ -0,0 +1,49 @@
+import pytest
+from aiohttp import web
+from src.sdk.clients import ClientRegistry
+from aiohttp.test_utils import TestServer
+
+
+@pytest.fixture
+async def base_url():
+    async def models(request: web.Request) -> web.Response:
+        return web.json_response({"object": "list", "data": []})
+
+    app = web.Application()
+    app.router.add_get("/v1/models", models)
+    server = TestServer(app, host="127.0.0.1")
+    await server.start_server()
+    yield f"http://127.0.0.1:{server.port}/v1"
+    await server.close()
+
+
+@pytest.mark.asyncio
+async def test_get_client_is_shared_per_provider_and_base_url() -> None:
+    registry = ClientRegistry()
+    client = registry.get_client(provider="openai", api_key="sk-a", base_url="http://a/v1")
+    assert registry.get_client(provider="openai", api_key="sk-a", base_url="http://a/v1") is client
+    assert (
+        registry.get_client(provider="openai", api_key="sk-b", base_url="http://a/v1")
+        is not client
+    )
+    assert len(registry.stats()) == 1
+    registry.get_client(provider="openai", api_key="sk-a", base_url="http://b/v1")
+    assert len(registry.stats()) == 2
+    await registry.aclose()
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_connections(base_url: str) -> None:
+    registry = ClientRegistry()
+    client = registry.get_client(provider="openai", api_key="sk-test", base_url=base_url)
+    await registry.warmup()
+    for _ in range(5):
+        await client.models.list()
+
+    (stats,) = registry.stats()
+    assert stats.requests == 6
+    assert stats.connections_opened == 1
+    assert stats.in_flight == 0
+    assert stats.reuse_ratio > 0.8
+    await registry.aclose()
+    assert registry.stats() == []
@@ -0,0 +1,59 @@
+import sys
+import asyncio
+from pathlib import Path
+
+import orjson
+import pytest
+from redis.asyncio import Redis as AsyncRedis
+from src.sdk.cluster import ClusterLauncher, plan_clusters, cluster_shards
+from benchmarks.bench_redis import fake_redis_server
+from benchmarks.bench_startup import environment
+
+
+def test_shards_are_split_into_contiguous_groups() -> None:
+    assert plan_clusters(10, 3) == [[0, 1, 2, 3], [4, 5, 6], [7, 8, 9]]
+    assert plan_clusters(2, 5) == [[0], [1]]
+    assert plan_clusters(1, 1) == [[0]]
+
+
+def read_reports(report_dir: Path) -> list[dict]:
+    return [orjson.loads(path.read_bytes()) for path in report_dir.glob("*.json")]
+
+
+@pytest.mark.asyncio
+async def test_shard_processes_share_state_through_redis(tmp_path: Path) -> None:
+    (tmp_path / "reports").mkdir()
+    with fake_redis_server() as url:
+        port = url.rsplit(":", 1)[1].split("/", 1)[0]
+        env = environment(str(tmp_path / "sync.json"))
+        env.pop("REDIS_PASSWORD", None)
+        env.update(REDIS_HOST="127.0.0.1", REDIS_PORT=port, SQLITE_FILE_PATH=str(tmp_path / "db"))
+        launcher = ClusterLauncher(
+            shard_count=5,
+            processes=3,
+            command=[
+                sys.executable,
+                "-m",
+                "benchmarks.fake_gateway",
+                f"--report-dir={tmp_path / 'reports'}",
+            ],
+            env=env,
+            start_interval=0.0,
+            max_restarts=0,
+        )
+        await asyncio.wait_for(launcher.run(), timeout=120)
+
+        redis = AsyncRedis.from_url(url)
+        shards = await cluster_shards(redis)
+        await redis.aclose()
+
+    reports = read_reports(tmp_path / "reports")
+    assert sorted(report["shard_ids"] for report in reports) == [[0, 1], [2, 3], [4]]
+    assert {report["shard_count"] for report in reports} == {5}
+    assert all(report["shared_state"] for report in reports)
+    # Only the process running shard 0 syncs the commands.
+    assert sum(report["syncs"] for report in reports) == 1
+    assert sorted(shards) == [0, 1, 2, 3, 4]
+    pids = {report["pid"]: set(report["shard_ids"]) for report in reports}
+    assert all(shard_id in pids[entry["pid"]] for shard_id, entry in shards.items())
+    assert launcher.stats().model_dump() == {"processes": 3, "running": 0, "restarts": 0}
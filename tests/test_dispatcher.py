@@ -0,0 +1,173 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from src.sdk.llm import LLMServices
+from aiohttp.test_utils import TestServer
+from src.sdk.dispatcher import Priority, QueueFull, LLMDispatcher, QueuePosition, llm_dispatcher
+
+
+async def hold(
+    dispatcher: LLMDispatcher,
+    release: asyncio.Event,
+    order: list[str],
+    name: str,
+    priority: Priority = Priority.INTERACTIVE,
+    positions: list[QueuePosition] | None = None,
+) -> None:
+    async with dispatcher.slot(
+        "openai", "gpt-4o", priority, on_queued=positions.append if positions is not None else None
+    ):
+        order.append(name)
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_interactive_calls_are_served_before_background_ones() -> None:
+    dispatcher = LLMDispatcher(concurrency=1)
+    release, order = asyncio.Event(), []
+    first = asyncio.create_task(hold(dispatcher, release, order, "first"))
+    await asyncio.sleep(0)
+    positions: list[QueuePosition] = []
+    queued = [
+        asyncio.create_task(
+            hold(dispatcher, release, order, "summary 1", Priority.BACKGROUND, positions)
+        ),
+        asyncio.create_task(hold(dispatcher, release, order, "summary 2", Priority.BACKGROUND)),
+        asyncio.create_task(hold(dispatcher, release, order, "reply", Priority.INTERACTIVE)),
+    ]
+    await asyncio.sleep(0.01)
+
+    (lane,) = dispatcher.stats()
+    assert lane.active == 1
+    assert lane.queued == 3
+    # The first summary moved back one place when the interactive reply jumped ahead of it.
+    assert [position.position for position in positions] == [1, 2]
+    assert positions[-1].estimated_wait == pytest.approx(2 * 5.0)
+
+    release.set()
+    await asyncio.gather(first, *queued)
+    assert order == ["first", "reply", "summary 1", "summary 2"]
+    assert [position.position for position in positions] == [1, 2, 1]
+    lane = dispatcher.stats()[0]
+    assert lane.active == 0
+    assert lane.dispatched == 4
+    assert lane.waited == 3
+    assert lane.max_queued == 3
+    assert lane.max_wait > 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_turns_calls_away() -> None:
+    dispatcher = LLMDispatcher(limits={"openai": 1}, max_queue=1)
+    release, order = asyncio.Event(), []
+    running = [asyncio.create_task(hold(dispatcher, release, order, name)) for name in "ab"]
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(QueueFull) as error:
+        await hold(dispatcher, release, order, "c")
+    assert error.value.retry_after == pytest.approx(2 * 5.0)
+    # Other lanes are not affected.
+    async with dispatcher.slot("perplexity", "sonar"):
+        pass
+
+    release.set()
+    await asyncio.gather(*running)
+    assert order == ["a", "b"]
+    assert {lane.lane: lane.rejected for lane in dispatcher.stats()} == {
+        "openai:gpt-4o": 1,
+        "perplexity:sonar": 0,
+    }
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiters_give_up_their_place_and_slot() -> None:
+    dispatcher = LLMDispatcher(concurrency=1)
+    release, order = asyncio.Event(), []
+    first = asyncio.create_task(hold(dispatcher, release, order, "first"))
+    await asyncio.sleep(0)
+    leaving = asyncio.create_task(hold(dispatcher, release, order, "leaving"))
+    positions: list[QueuePosition] = []
+    staying = asyncio.create_task(hold(dispatcher, release, order, "staying", positions=positions))
+    await asyncio.sleep(0.01)
+
+    leaving.cancel()
+    await asyncio.sleep(0.01)
+    assert [position.position for position in positions] == [2, 1]
+    assert dispatcher.stats()[0].queued == 1
+
+    release.set()
+    await asyncio.gather(first, staying)
+    assert order == ["first", "staying"]
+
+    # A waiter cancelled right after being handed the slot passes it on.
+    release.clear()
+    async with dispatcher.slot("openai", "gpt-4o"):
+        handed = asyncio.create_task(hold(dispatcher, release, order, "handed"))
+        waiting = asyncio.create_task(hold(dispatcher, release, order, "waiting"))
+        await asyncio.sleep(0.01)
+    handed.cancel()
+    await asyncio.sleep(0.01)
+    assert handed.cancelled()
+    assert order == ["first", "staying", "waiting"]
+    release.set()
+    await waiting
+    assert dispatcher.stats()[0].active == 0
+
+
+@pytest.fixture
+async def slow_openai(monkeypatch: pytest.MonkeyPatch):
+    concurrency = {"now": 0, "peak": 0}
+
+    async def completions(request: web.Request) -> web.Response:
+        body = await request.json()
+        concurrency["now"] += 1
+        concurrency["peak"] = max(concurrency["peak"], concurrency["now"])
+        await asyncio.sleep(0.05)
+        concurrency["now"] -= 1
+        return web.json_response({
+            "id": "chatcmpl-1",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": "answer"},
+                }
+            ],
+        })
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    server = TestServer(app, host="127.0.0.1")
+    await server.start_server()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.port}/v1")
+    monkeypatch.setenv("RESPONSE_CACHE_ENABLED", "false")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("PERPLEXITY_API_KEY", "pplx-test")
+    monkeypatch.setenv("DISCORD_BOT_TOKEN", "token")
+    monkeypatch.setattr(llm_dispatcher, "limits", {"openai:dispatch-test": 2})
+    yield concurrency
+    await server.close()
+
+
+@pytest.mark.asyncio
+async def test_replies_respect_the_model_concurrency_limit(slow_openai: dict[str, int]) -> None:
+    llm = LLMServices(model="dispatch-test")
+    positions: list[QueuePosition] = []
+
+    await asyncio.gather(
+        *(
+            llm.get_oai_reply(prompt=f"question {index}", on_queued=positions.append)
+            for index in range(6)
+        )
+    )
+
+    assert slow_openai["peak"] == 2
+    assert positions
+    lane = next(lane for lane in llm_dispatcher.stats() if lane.lane == "openai:dispatch-test")
+    assert lane.limit == 2
+    assert lane.dispatched == 6
+    assert lane.waited == 4
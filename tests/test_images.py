@@ -0,0 +1,88 @@
+import io
+import base64
+from pathlib import Path
+
+from PIL import Image
+import pytest
+from aiohttp import web
+from src.sdk.http import close_http_session
+from src.sdk.images import ImagePipeline, decode_data_uri
+from aiohttp.test_utils import TestServer
+
+
+def make_image(width: int, height: int, image_format: str = "JPEG") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color=(200, 100, 50)).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+async def base_url():
+    small = make_image(64, 64, "PNG")
+    large = make_image(4000, 3000)
+
+    async def small_image(request: web.Request) -> web.Response:
+        return web.Response(body=small, content_type="image/png")
+
+    async def large_image(request: web.Request) -> web.Response:
+        return web.Response(body=large, content_type="image/jpeg")
+
+    async def streamed_image(request: web.Request) -> web.StreamResponse:
+        # Chunked, so the size is only known once the body was read.
+        response = web.StreamResponse(headers={"Content-Type": "image/jpeg"})
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        await response.write(large)
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_get("/small.png", small_image)
+    app.router.add_get("/large.jpg", large_image)
+    app.router.add_get("/streamed.jpg", streamed_image)
+    server = TestServer(app, host="127.0.0.1")
+    await server.start_server()
+    yield f"http://127.0.0.1:{server.port}"
+    await close_http_session()
+    await server.close()
+
+
+@pytest.mark.asyncio
+async def test_prepare_passes_small_urls_and_inlines_large_ones(base_url: str) -> None:
+    pipeline = ImagePipeline(passthrough_max_bytes=10_000)
+    small_part, large_part = await pipeline.prepare([
+        f"{base_url}/small.png",
+        f"{base_url}/large.jpg",
+    ])
+    assert small_part["image_url"]["url"] == f"{base_url}/small.png"
+    data_uri = large_part["image_url"]["url"]
+    assert data_uri.startswith("data:image/jpeg;base64,")
+    image = Image.open(io.BytesIO(decode_data_uri(data_uri)))
+    assert max(image.size) <= 2048
+    assert min(image.size) <= 768
+
+
+@pytest.mark.asyncio
+async def test_prepare_reads_data_uris_and_files(tmp_path: Path) -> None:
+    image_path = tmp_path / "image.png"
+    image_path.write_bytes(make_image(3000, 100, "PNG"))
+    data_uri = "data:image/png;base64," + base64.b64encode(make_image(32, 32, "PNG")).decode()
+
+    parts = await ImagePipeline().prepare([str(image_path), data_uri, "just an embed text"])
+    assert len(parts) == 2
+    resized = Image.open(io.BytesIO(decode_data_uri(parts[0]["image_url"]["url"])))
+    assert resized.size == (2048, 68)
+
+
+@pytest.mark.asyncio
+async def test_oversized_images_are_skipped(
+    base_url: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    pipeline = ImagePipeline(passthrough_max_bytes=10_000, max_download_bytes=50_000)
+    parts = await pipeline.prepare([f"{base_url}/large.jpg", f"{base_url}/streamed.jpg"])
+    assert parts == []
+
+    # Decompression bombs are refused while decoding, in the worker thread.
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1_000)
+    data_uri = f"data:image/png;base64,{base64.b64encode(make_image(64, 64, 'PNG')).decode()}"
+    assert await pipeline.prepare([data_uri]) == []
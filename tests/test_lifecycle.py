@@ -0,0 +1,96 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+import nextcord
+from nextcord import Locale, SlashOption
+from nextcord.ext import commands
+from src.sdk.lifecycle import COMMAND_SYNCS, Lifecycle, CommandSync, command_schema_hash
+
+
+def make_commands(
+    option: str = "What to ask.", localized: str = "問", guild_ids: list[int] | None = None
+) -> list[nextcord.BaseApplicationCommand]:
+    class Commands(commands.Cog):
+        @nextcord.slash_command(
+            name="oai", description="Ask a model.", name_localizations={Locale.zh_TW: localized}
+        )
+        async def oai(
+            self, interaction: nextcord.Interaction, prompt: str = SlashOption(description=option)
+        ) -> None: ...
+
+        @nextcord.slash_command(name="ping", description="Check latency.", guild_ids=guild_ids)
+        async def ping(self, interaction: nextcord.Interaction) -> None: ...
+
+    return Commands().application_commands
+
+
+class FakeBot:
+    application_id = 42
+
+    def __init__(self, app_commands: list[nextcord.BaseApplicationCommand]) -> None:
+        self.app_commands = app_commands
+        self.syncs: list[int | None] = []
+
+    def get_all_application_commands(self) -> set[nextcord.BaseApplicationCommand]:
+        return set(self.app_commands)
+
+    async def sync_application_commands(self, guild_id: int | None = None) -> None:
+        self.syncs.append(guild_id)
+
+
+def test_schema_hash_follows_names_localizations_options_and_scope() -> None:
+    schema = command_schema_hash(make_commands())
+
+    assert command_schema_hash(list(reversed(make_commands()))) == schema
+    assert command_schema_hash(make_commands(option="Something else.")) != schema
+    assert command_schema_hash(make_commands(localized="問問")) != schema
+    # A command moved to a guild leaves the global scope and enters the guild's.
+    in_guild = make_commands(guild_ids=[7])
+    assert command_schema_hash(in_guild) != schema
+    assert command_schema_hash(in_guild, guild_id=7) != command_schema_hash(make_commands(), 7)
+
+
+@pytest.mark.asyncio
+async def test_sync_runs_only_when_the_schema_changed(tmp_path: Path) -> None:
+    state_file = str(tmp_path / "sync.json")
+    bot = FakeBot(make_commands())
+    skipped = COMMAND_SYNCS.values.get(("global", "skipped"), 0.0)
+
+    assert await CommandSync(state_file=state_file).sync(bot) is True
+    # A restart reads the hashes back from the state file.
+    restarted = CommandSync(state_file=state_file)
+    assert await restarted.sync(bot) is False
+    assert await restarted.sync(bot, guild_id=7) is True
+    bot.app_commands = make_commands(option="Something else.")
+    assert await restarted.sync(bot) is True
+
+    assert bot.syncs == [None, 7, None]
+    assert restarted.stats().model_dump() == {"synced": 2, "skipped": 1}
+    assert COMMAND_SYNCS.values[("global", "skipped")] == skipped + 1
+
+
+@pytest.mark.asyncio
+async def test_steps_run_once_and_retry_after_a_failure() -> None:
+    lifecycle = Lifecycle()
+    runs = []
+
+    async def setup() -> None:
+        runs.append("setup")
+        await asyncio.sleep(0.01)
+
+    started = await asyncio.gather(*(lifecycle.once("setup", setup) for _ in range(3)))
+    assert started == [True, False, False]
+    assert await lifecycle.once("setup", setup) is False
+    assert runs == ["setup"]
+
+    async def flaky() -> None:
+        runs.append("flaky")
+        if runs.count("flaky") == 1:
+            raise RuntimeError("sync failed")
+
+    with pytest.raises(RuntimeError, match="sync failed"):
+        await lifecycle.once("flaky", flaky)
+    assert await lifecycle.once("flaky", flaky) is True
+    assert await lifecycle.once("flaky", flaky) is False
+    assert runs.count("flaky") == 2
@@ -0,0 +1,24 @@
+import pytest
+from src.sdk.admission import admission_controller
+from benchmarks.bench_load import COMMANDS, measure, environment, serve_in_thread
+from benchmarks.fake_openai import FakeOpenAI
+
+
+@pytest.mark.asyncio
+async def test_every_command_answers_under_concurrent_load(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    fake = FakeOpenAI(ttft=0.01, tokens_per_sec=2000, reply_tokens=20, image_seconds=0.01)
+    monkeypatch.setattr(admission_controller, "enabled", False)
+    with serve_in_thread(fake) as server:
+        for key, value in environment(server).items():
+            monkeypatch.setenv(key, value)
+        report = await measure(len(COMMANDS) * 4, server, api_latency=0.001)
+
+    assert all(result.ok for result in report.results)
+    assert {result.command for result in report.results} == set(COMMANDS)
+    # Every answer, streamed or not, was visible before its command finished.
+    assert all(result.visible is not None for result in report.results)
+    assert all(result.visible <= result.latency for result in report.results)
+    assert set(server.requests) == {"chat", "search", "images"}
+    assert report.lags
@@ -0,0 +1,46 @@
+from pathlib import Path
+
+import pytest
+from sqlalchemy import func, select, inspect
+from src.sdk.log_writer import MessageRecord
+from src.sdk.log_database import SQLMessageSink, message_table, dispose_engines
+
+
+def make_record(index: int) -> MessageRecord:
+    return MessageRecord(
+        author="wei",
+        author_id="1143289646042853487",
+        content=f"hello {index}",
+        created_at="2025-01-01T00:00:00+00:00",
+        channel_name="general",
+        channel_id="1143289646042853488",
+        attachments="",
+        stickers="",
+        message_id=str(1300000000000000000 + index),
+    )
+
+
+@pytest.mark.asyncio
+async def test_sql_sink_inserts_idempotently(tmp_path: Path) -> None:
+    sink = SQLMessageSink(dsn=f"sqlite+aiosqlite:///{tmp_path / 'messages.db'}")
+    records = [make_record(index) for index in range(1500)]
+    await sink.write_batch(records)
+    await sink.write_batch(records[:100])
+
+    async with sink.engine.connect() as conn:
+        count = await conn.scalar(select(func.count()).select_from(message_table))
+        indexes = await conn.run_sync(
+            lambda sync_conn: inspect(sync_conn).get_indexes("llmbot_message")
+        )
+    assert count == 1500
+    assert {tuple(index["column_names"]) for index in indexes} >= {
+        ("author_id",),
+        ("channel_id",),
+        ("created_at",),
+    }
+
+    stats = sink.stats()
+    assert stats.batches == 2
+    assert stats.rows_per_sec > 0
+    assert stats.p99_flush_ms > 0
+    await dispose_engines()
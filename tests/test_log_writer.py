@@ -0,0 +1,77 @@
+import csv
+import asyncio
+from pathlib import Path
+
+import pytest
+from src.sdk.log_writer import MessageRecord, CSVMessageSink, MessageLogWriter
+
+
+def make_record(index: int) -> MessageRecord:
+    return MessageRecord(
+        author="wei",
+        author_id="1",
+        content=f"hello {index}",
+        created_at="2025-01-01T00:00:00",
+        channel_name="general",
+        channel_id="2",
+        attachments="",
+        stickers="",
+    )
+
+
+class SlowSink:
+    def __init__(self) -> None:
+        self.batches: list[list[MessageRecord]] = []
+        self.release = asyncio.Event()
+
+    async def write_batch(self, records: list[MessageRecord]) -> None:
+        await self.release.wait()
+        self.batches.append(records)
+
+
+@pytest.mark.asyncio
+async def test_writer_flushes_in_batches(tmp_path: Path) -> None:
+    path = tmp_path / "messages.csv"
+    writer = MessageLogWriter(
+        sinks=[CSVMessageSink(path=str(path))], batch_size=10, flush_interval_ms=50
+    )
+    for index in range(25):
+        assert await writer.put(make_record(index))
+    await writer.aclose()
+
+    with path.open(encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert [row[2] for row in rows] == [f"hello {index}" for index in range(25)]
+    stats = writer.stats()
+    assert stats.written == 25
+    assert stats.batches == 3
+    assert stats.queue_size == 0
+    assert stats.p99_flush_ms > 0
+
+
+@pytest.mark.asyncio
+async def test_writer_drops_when_full() -> None:
+    sink = SlowSink()
+    writer = MessageLogWriter(sinks=[sink], max_queue_size=5, batch_size=5, flush_interval_ms=10)
+    results = [await writer.put(make_record(index)) for index in range(20)]
+    assert results.count(False) > 0
+    sink.release.set()
+    await writer.aclose()
+
+    stats = writer.stats()
+    assert stats.dropped == results.count(False)
+    assert stats.written == stats.enqueued == sum(len(batch) for batch in sink.batches)
+
+
+@pytest.mark.asyncio
+async def test_csv_with_other_columns_is_moved_aside(tmp_path: Path) -> None:
+    path = tmp_path / "messages.csv"
+    # A log written before records carried the message id.
+    old_row = "wei,1,hello,2025-01-01T00:00:00,general,2,,\n"
+    path.write_text(old_row, encoding="utf-8")
+
+    await CSVMessageSink(path=str(path)).write_batch([make_record(0)._replace(message_id="3")])
+
+    assert (tmp_path / "messages.8-columns.csv").read_text(encoding="utf-8") == old_row
+    with path.open(encoding="utf-8") as f:
+        assert list(csv.reader(f)) == [list(make_record(0)._replace(message_id="3"))]
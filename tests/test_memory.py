@@ -0,0 +1,115 @@
+import pytest
+from aiohttp import web
+from fakeredis import FakeAsyncRedis
+from src.sdk.llm import LLMServices
+from src.sdk.memory import FOLD_PROMPT, Turn, ConversationMemory
+from aiohttp.test_utils import TestServer
+
+
+@pytest.fixture
+async def fake_openai(monkeypatch: pytest.MonkeyPatch):
+    requests: list[dict] = []
+
+    async def completions(request: web.Request) -> web.Response:
+        body = await request.json()
+        requests.append(body)
+        return web.json_response({
+            "id": "chatcmpl-1",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-4o",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": f"summary {len(requests)}"},
+                }
+            ],
+        })
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    server = TestServer(app, host="127.0.0.1")
+    await server.start_server()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.port}/v1")
+    monkeypatch.setenv("RESPONSE_CACHE_ENABLED", "false")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("PERPLEXITY_API_KEY", "pplx-test")
+    monkeypatch.setenv("DISCORD_BOT_TOKEN", "token")
+    yield requests
+    await server.close()
+
+
+def make_turns(start: int, count: int) -> list[Turn]:
+    return [
+        Turn(role="user", content=f"question {index}", author="wei")
+        if index % 2 == 0
+        else Turn(role="assistant", content=f"answer {index}")
+        for index in range(start, start + count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_ring_buffer_folds_aged_out_turns(fake_openai: list[dict]) -> None:
+    memory = ConversationMemory(redis=FakeAsyncRedis(), max_turns=4)
+    for start in range(0, 10, 2):
+        await memory.append("channel:1", make_turns(start, 2))
+    await memory.drain()
+
+    conversation = await memory.load("channel:1")
+    assert [turn.content for turn in conversation.turns] == [
+        "question 6",
+        "answer 7",
+        "question 8",
+        "answer 9",
+    ]
+    # Three appends pushed six turns out of the buffer; each batch was folded in order.
+    assert conversation.summary == "summary 3"
+    assert len(fake_openai) == 3
+    assert fake_openai[0]["messages"][0]["content"] == FOLD_PROMPT
+    assert "wei: question 0" in fake_openai[0]["messages"][1]["content"][0]["text"]
+    assert "summary 2" in fake_openai[2]["messages"][1]["content"][0]["text"]
+
+    stats = memory.stats()
+    assert stats.writes == 5
+    assert stats.folds == 3
+    assert stats.folded_turns == 6
+    assert await memory.load("channel:2") == conversation.model_copy(
+        update={"summary": "", "turns": []}
+    )
+    await memory.aclose()
+
+
+@pytest.mark.asyncio
+async def test_memory_is_sent_between_system_prompt_and_prompt(fake_openai: list[dict]) -> None:
+    memory = ConversationMemory(redis=FakeAsyncRedis(), max_turns=2)
+    await memory.append("channel:1", make_turns(0, 4))
+    await memory.drain()
+    conversation = await memory.load("channel:1")
+
+    await LLMServices(system_prompt="sys").get_oai_reply(
+        prompt="follow-up", history=conversation.to_messages()
+    )
+
+    messages = fake_openai[-1]["messages"]
+    assert [message["role"] for message in messages] == [
+        "system",
+        "system",
+        "user",
+        "assistant",
+        "user",
+    ]
+    assert messages[1]["content"].endswith("summary 1")
+    assert messages[2]["content"] == "wei: question 2"
+    assert messages[4]["content"][0]["text"] == "follow-up"
+    await memory.aclose()
+
+
+@pytest.mark.asyncio
+async def test_disabled_or_unreachable_memory_is_empty() -> None:
+    assert (await ConversationMemory().load("channel:1")).to_messages() == []
+
+    broken = ConversationMemory(redis=FakeAsyncRedis(connected=False))
+    await broken.append("channel:1", make_turns(0, 2))
+    assert (await broken.load("channel:1")).turns == []
+    assert broken.stats().errors == 2
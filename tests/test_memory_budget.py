@@ -0,0 +1,60 @@
+import pytest
+import nextcord
+from nextcord.ext import commands
+from src.cogs.summary import MessageFetcher
+from src.cogs.record_voice import RecordCog
+from src.sdk.memory_budget import CACHE_OBJECTS, cache_usage, client_options, required_intents
+from benchmarks.bench_memory import feed
+
+
+def enabled(intents: nextcord.Intents) -> set[str]:
+    return {name for name, value in intents if value}
+
+
+def test_intents_follow_listeners_and_declared_needs() -> None:
+    class Reactions(commands.Cog):
+        @commands.Cog.listener()
+        async def on_reaction_add(self, reaction: nextcord.Reaction, user: nextcord.User) -> None:
+            pass
+
+    class Bot(commands.Bot):
+        async def on_message(self, message: nextcord.Message) -> None:
+            pass
+
+    assert enabled(required_intents()) == {"guilds"}
+    assert enabled(required_intents(RecordCog, MessageFetcher)) == {
+        "guilds",
+        "voice_states",
+        "message_content",
+    }
+    assert enabled(required_intents(Bot, Reactions)) == {
+        "guilds",
+        "guild_messages",
+        "dm_messages",
+        "message_content",
+        "guild_reactions",
+        "dm_reactions",
+    }
+
+
+@pytest.mark.asyncio
+async def test_budget_mode_caches_no_members_and_caps_messages() -> None:
+    full = nextcord.Client(**client_options(memory_budget=False, message_cache_size=1000))
+    budget = nextcord.Client(**client_options(memory_budget=True, message_cache_size=20))
+    for client in (full, budget):
+        feed(client, guilds=2, members=300, messages=100)
+
+    full_usage = {usage.cache: usage for usage in cache_usage(full)}
+    budget_usage = {usage.cache: usage for usage in cache_usage(budget)}
+
+    assert full_usage["members"].objects == 600
+    assert full_usage["members"].bytes > 600 * 200
+    assert full_usage["messages"].objects == 100
+    assert budget_usage["members"].objects == 0
+    assert budget_usage["members"].bytes == 0
+    assert budget_usage["messages"].objects == 20
+    assert budget_usage["guilds"].objects == full_usage["guilds"].objects == 2
+    assert budget_usage["channels"].objects == 44
+    assert CACHE_OBJECTS.values[("messages",)] == 20
+    assert not budget.intents.members
+    assert not budget.intents.presences
@@ -0,0 +1,157 @@
+from types import SimpleNamespace
+import asyncio
+from pathlib import Path
+import datetime
+from collections.abc import AsyncIterator
+
+import pytest
+import nextcord
+from src.sdk.log_database import dispose_engines
+from src.sdk.message_index import MessageIndex, IndexedMessage
+
+BASE_ID = 1300000000000000000
+ALICE = 1143289646042853487
+BOB = 1143289646042853489
+
+
+def make_message(index: int, author_id: int, bot: bool = False) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=BASE_ID + index,
+        author=SimpleNamespace(id=author_id, name=f"user-{author_id}", bot=bot),
+        content=f"message {index}",
+        created_at=datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc),
+        attachments=[],
+        embeds=[],
+    )
+
+
+class FakeChannel:
+    """A channel whose history pages are served from a list and counted."""
+
+    def __init__(self, messages: list[SimpleNamespace]) -> None:
+        self.id = 1143289646042853488
+        self.name = "general"
+        self.messages = messages
+        self.pages = 0
+
+    async def history(
+        self,
+        limit: int | None,
+        before: SimpleNamespace | None,
+        after: SimpleNamespace | None,
+        oldest_first: bool,
+    ) -> AsyncIterator[SimpleNamespace]:
+        self.pages += 1
+        lower = after.id if after is not None else -1
+        upper = before.id if before is not None else float("inf")
+        page = [m for m in reversed(self.messages) if lower < m.id < upper][:limit]
+        for message in page:
+            yield message
+
+
+def make_index(tmp_path: Path) -> MessageIndex:
+    return MessageIndex(dsn=f"sqlite+aiosqlite:///{tmp_path / 'index.db'}", page_size=10)
+
+
+@pytest.mark.asyncio
+async def test_gap_is_fetched_once(tmp_path: Path) -> None:
+    messages = [
+        make_message(i, ALICE if i % 3 == 0 else BOB, bot=i % 7 == 0) for i in range(1, 60)
+    ]
+    channel = FakeChannel(messages)
+    index = make_index(tmp_path)
+
+    first = await index.recent_by_author(channel, ALICE, 5)
+    assert [m.message_id for m in first] == [BASE_ID + i for i in (45, 48, 51, 54, 57)]
+    assert channel.pages > 0
+
+    channel.pages = 0
+    second = await index.recent_by_author(channel, ALICE, 5)
+    assert second == first
+    # Only the stretch newer than the covered range is asked for again.
+    assert channel.pages == 1
+
+    # Bot messages are never indexed, even when the author id matches.
+    everything = await index.recent_by_author(channel, ALICE, 100)
+    assert [m.message_id for m in everything] == [
+        BASE_ID + i for i in range(1, 60) if i % 3 == 0 and i % 7 != 0
+    ]
+    # Reading back to the channel start leaves a single segment beginning at id 0.
+    coverage = await index.coverage(channel.id)
+    assert len(coverage) == 1
+    assert coverage[0][0] == 0
+    await dispose_engines()
+
+
+@pytest.mark.asyncio
+async def test_live_coverage_needs_no_api(tmp_path: Path) -> None:
+    messages = [make_message(i, ALICE if i % 2 else BOB) for i in range(1, 21)]
+    channel = FakeChannel(messages)
+    index = make_index(tmp_path)
+    records = [IndexedMessage.from_message(m).to_record(channel) for m in messages]
+    await index.write_batch(records[:10])
+    await index.write_batch(records[10:])
+
+    assert await index.coverage(channel.id) == [(BASE_ID + 1, BASE_ID + 20)]
+    found = await index.recent_by_author(channel, ALICE, 3)
+    assert [m.message_id for m in found] == [BASE_ID + 15, BASE_ID + 17, BASE_ID + 19]
+    # Records may still be queued, so only the stretch after the last flush is asked for.
+    assert channel.pages == 1
+    assert index.index_stats().api_messages == 0
+    assert index.index_stats().indexed_hits == 3
+    await dispose_engines()
+
+
+@pytest.mark.asyncio
+async def test_disconnect_ends_live_coverage(tmp_path: Path) -> None:
+    before = [make_message(i, ALICE) for i in range(1, 4)]
+    channel = FakeChannel(before)
+    index = make_index(tmp_path)
+    await index.write_batch([IndexedMessage.from_message(m).to_record(channel) for m in before])
+    index.end_live()
+    await asyncio.sleep(0.01)
+    now = nextcord.utils.time_snowflake(datetime.datetime.now(datetime.timezone.utc))
+    # Sent while the gateway was away, so only Discord knows about it.
+    missed = make_message(now - BASE_ID - 2, ALICE)
+    after = make_message(now - BASE_ID - 1, ALICE)
+    channel.messages = [*before, missed, after]
+    await index.write_batch([IndexedMessage.from_message(after).to_record(channel)])
+
+    assert await index.coverage(channel.id) == [(after.id, after.id), (BASE_ID + 1, BASE_ID + 3)]
+    found = await index.recent_by_author(channel, ALICE, 10)
+    assert [m.message_id for m in found] == [m.id for m in channel.messages]
+    await dispose_engines()
+
+
+@pytest.mark.asyncio
+async def test_dropped_record_splits_coverage(tmp_path: Path) -> None:
+    messages = [make_message(i, ALICE) for i in range(1, 11)]
+    channel = FakeChannel(messages)
+    index = make_index(tmp_path)
+    records = [IndexedMessage.from_message(m).to_record(channel) for m in messages]
+    await index.write_batch(records[:4])
+    index.discard(records[4])
+    await index.write_batch(records[5:])
+
+    assert await index.coverage(channel.id) == [
+        (BASE_ID + 6, BASE_ID + 10),
+        (BASE_ID + 1, BASE_ID + 4),
+    ]
+    found = await index.recent_by_author(channel, ALICE, 10)
+    assert [m.message_id for m in found] == [m.id for m in messages]
+    assert index.index_stats().live_gaps == 1
+    # The dropped message was fetched once, after which the channel is covered end to end.
+    assert len(await index.coverage(channel.id)) == 1
+    await dispose_engines()
+
+
+@pytest.mark.asyncio
+async def test_disabled_index_pages_discord_and_stores_nothing(tmp_path: Path) -> None:
+    messages = [make_message(i, ALICE if i % 2 else BOB) for i in range(1, 21)]
+    channel = FakeChannel(messages)
+    index = make_index(tmp_path)
+    index.enabled = False
+
+    found = await index.recent_by_author(channel, ALICE, 3)
+    assert [m.message_id for m in found] == [BASE_ID + 15, BASE_ID + 17, BASE_ID + 19]
+    assert not (tmp_path / "index.db").exists()
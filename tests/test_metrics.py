@@ -0,0 +1,114 @@
+import asyncio
+
+import orjson
+import pytest
+import aiohttp
+from aiohttp import web
+from src.sdk.llm import LLM_TOKENS, LLM_DURATION, LLM_TOKEN_RATE, LLM_FIRST_TOKEN, LLMServices
+from src.sdk.metrics import MetricsRegistry
+from aiohttp.test_utils import TestServer
+from src.sdk.dispatcher import QUEUE_WAIT
+
+
+def test_histograms_render_cumulative_buckets() -> None:
+    registry = MetricsRegistry()
+    histogram = registry.histogram(
+        "test_seconds", "A test histogram.", labels=("command",), buckets=(0.1, 1.0)
+    )
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, command='say "hi"')
+    registry.counter("test_total", "A test counter.", labels=("kind",)).inc(2, kind="a")
+
+    assert registry.render().splitlines() == [
+        "# HELP test_seconds A test histogram.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{command="say \\"hi\\"",le="0.1"} 2',
+        'test_seconds_bucket{command="say \\"hi\\"",le="1.0"} 3',
+        'test_seconds_bucket{command="say \\"hi\\"",le="+Inf"} 4',
+        'test_seconds_sum{command="say \\"hi\\""} 3.65',
+        'test_seconds_count{command="say \\"hi\\""} 4',
+        "# HELP test_total A test counter.",
+        "# TYPE test_total counter",
+        'test_total{kind="a"} 2.0',
+    ]
+    # Metrics are registered once per name.
+    assert registry.histogram("test_seconds", "Again.") is histogram
+    with pytest.raises(ValueError, match="already registered"):
+        registry.counter("test_seconds", "Not a counter.")
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_serves_the_text_format() -> None:
+    registry = MetricsRegistry()
+    registry.gauge("test_depth", "A test gauge.").set(3)
+    port = await registry.serve(port=0)
+    try:
+        assert await registry.serve(port=0) == port
+        async with (
+            aiohttp.ClientSession() as session,
+            session.get(f"http://127.0.0.1:{port}/metrics") as response,
+        ):
+            body = await response.text()
+    finally:
+        await registry.aclose()
+
+    assert response.status == 200
+    assert response.content_type == "text/plain"
+    assert "# TYPE test_depth gauge\ntest_depth 3.0\n" in body
+
+
+@pytest.fixture
+async def streaming_openai(monkeypatch: pytest.MonkeyPatch):
+    async def completions(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        chunk = {"id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 0}
+        chunk["model"] = body["model"]
+        await asyncio.sleep(0.05)
+        for word in ("one", "two", "three"):
+            delta = {"index": 0, "delta": {"content": word}, "finish_reason": None}
+            await response.write(b"data: " + orjson.dumps({**chunk, "choices": [delta]}) + b"\n\n")
+            await asyncio.sleep(0.01)
+        usage = {"prompt_tokens": 12, "completion_tokens": 3, "total_tokens": 15}
+        await response.write(
+            b"data: " + orjson.dumps({**chunk, "choices": [], "usage": usage}) + b"\n\n"
+        )
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    server = TestServer(app, host="127.0.0.1")
+    await server.start_server()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.port}/v1")
+    monkeypatch.setenv("RESPONSE_CACHE_ENABLED", "false")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("PERPLEXITY_API_KEY", "pplx-test")
+    monkeypatch.setenv("DISCORD_BOT_TOKEN", "token")
+    yield
+    await server.close()
+
+
+@pytest.mark.asyncio
+async def test_streamed_reply_records_its_lifecycle(streaming_openai: None) -> None:
+    llm = LLMServices(model="metrics-test")
+
+    words = [
+        chunk.choices[0].delta.content
+        async for chunk in llm.get_oai_reply_stream(prompt="count to three")
+    ]
+
+    assert words == ["one", "two", "three"]
+    labels = ("openai", "metrics-test", "chat_stream")
+    assert LLM_DURATION.series[(*labels, "ok")].count == 1
+    first_token = LLM_FIRST_TOKEN.series[labels]
+    assert first_token.count == 1
+    assert first_token.sum >= 0.05
+    assert LLM_DURATION.series[(*labels, "ok")].sum > first_token.sum
+    assert LLM_TOKEN_RATE.series[labels].count == 1
+    assert LLM_TOKENS.values[(*labels, "input")] == 12
+    assert LLM_TOKENS.values[(*labels, "output")] == 3
+    # The slot was free, so the call is counted as not having waited.
+    queue_wait = QUEUE_WAIT.series[("openai:metrics-test", "interactive")]
+    assert (queue_wait.count, queue_wait.sum) == (1, 0.0)
@@ -0,0 +1,70 @@
+import hashlib
+from pathlib import Path
+
+import pytest
+from src.sdk.near_cache import NearDuplicateIndex, normalize_prompt
+
+
+def make_key(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def test_normalize_prompt_folds_case_width_and_punctuation() -> None:
+    assert normalize_prompt("  What IS the capital of France??") == "what is the capital of france"
+    assert normalize_prompt("\uff21\uff22\uff23\uff0c\u3000你好\uff01") == "abc 你好"
+
+
+def test_lookup_matches_near_duplicates_within_scope() -> None:
+    index = NearDuplicateIndex(capacity=100)
+    index.add("What is the capital of France?", key=make_key("france"), scope="guild:1")
+    index.add("用一句話解釋什麼是黑洞", key=make_key("black hole"), scope="guild:1")
+
+    assert index.lookup("what is the capital of   france", scope="guild:1") == make_key("france")
+    assert index.lookup("請用一句話解釋什麼是黑洞", scope="guild:1") == make_key("black hole")
+    assert index.lookup("What is the capital of France?", scope="guild:2") is None
+    assert index.lookup("What is the capital of Germany?", scope="guild:1") is None
+    stats = index.stats()
+    assert (stats.hits, stats.misses, stats.entries) == (2, 2, 2)
+
+
+def test_lookup_misses_prompts_that_swap_a_name_or_a_number() -> None:
+    index = NearDuplicateIndex(capacity=100)
+    pairs = [
+        (
+            "What is the capital of France? Answer briefly.",
+            "What is the capital of Spain? Answer briefly.",
+        ),
+        ("is 1000003 prime", "is 1000033 prime"),
+        ("how many days from 2023 to 2024", "how many days from 2023 to 2025"),
+        ("法國的首都是哪裡", "德國的首都是哪裡"),
+    ]
+    for cached, _ in pairs:
+        index.add(cached, key=make_key(cached))
+
+    for cached, other in pairs:
+        assert index.lookup(other) is None
+        assert index.lookup(f"  {cached.upper()}?!") == make_key(cached)
+
+
+def test_capacity_bounds_memory_and_evicts_oldest() -> None:
+    index = NearDuplicateIndex(capacity=3)
+    prompts = [f"prompt number {word}" for word in ("alpha", "bravo", "charlie", "delta")]
+    for prompt in prompts:
+        index.add(prompt, key=make_key(prompt))
+    assert index.lookup(prompts[0]) is None
+    assert index.lookup(prompts[-1]) == make_key(prompts[-1])
+    assert index.stats().entries == 3
+    assert index.stats().evictions == 1
+
+
+@pytest.mark.asyncio
+async def test_snapshot_round_trip(tmp_path: Path) -> None:
+    path = tmp_path / "near.npz"
+    index = NearDuplicateIndex(capacity=10)
+    index.add("how do I reset my password", key=make_key("reset"), scope="guild:1")
+    await index.save(str(path))
+
+    restored = NearDuplicateIndex(capacity=10)
+    assert restored.load(str(path))
+    assert restored.lookup("How do I reset my password?", scope="guild:1") == make_key("reset")
+    assert not NearDuplicateIndex(capacity=20).load(str(path))
@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+from fakeredis import FakeAsyncRedis
+from src.types.database import RedisConfig
+from src.sdk.redis_store import RedisStore, dispose_pools, get_async_pool
+
+
+@pytest.mark.asyncio
+async def test_scan_pages_through_every_matching_key() -> None:
+    redis = FakeAsyncRedis()
+    store = RedisStore(redis=redis, scan_count=10)
+    await store.save_many({f"user:{index}": {"name": f"u{index}"} for index in range(35)})
+    await redis.set("other", "1")
+
+    keys = await store.keys("user:*")
+
+    assert sorted(keys) == sorted(f"user:{index}" for index in range(35))
+    # One round trip for the pipelined write and several for the SCAN pages.
+    assert store.stats().round_trips > 3
+
+
+@pytest.mark.asyncio
+async def test_bulk_operations_take_one_round_trip() -> None:
+    store = RedisStore(redis=FakeAsyncRedis())
+
+    await store.save_many({"a": {"x": "1"}, "b": {"y": "2", "z": "3"}, "empty": {}})
+    await store.save("a", {"w": "0"})
+    loaded = await store.load_many(["a", "b", "missing"])
+
+    assert loaded == {"a": {"x": "1", "w": "0"}, "b": {"y": "2", "z": "3"}, "missing": {}}
+    assert await store.values("b") == ["2", "3"]
+    assert await store.delete_fields("b", "y", "missing") == 1
+    assert await store.delete("a", "missing") == 1
+    assert await store.load_many(["a", "b"]) == {"a": {}, "b": {"z": "3"}}
+    stats = store.stats()
+    assert (stats.round_trips, stats.commands) == (7, 11)
+
+
+@pytest.mark.asyncio
+async def test_hot_keys_are_served_from_memory_until_they_expire() -> None:
+    redis = FakeAsyncRedis()
+    store = RedisStore(redis=redis, cache_ttl=0.05)
+    await store.save("hot", {"v": "1"})
+
+    assert await store.load("hot") == {"v": "1"}
+    await redis.hset("hot", "v", "2")  # Another process writes behind the cache.
+    assert await store.load("hot") == {"v": "1"}
+    await store.save("hot", {"v": "3"})  # Our own writes drop the cached copy.
+    assert await store.load("hot") == {"v": "3"}
+    await redis.hset("hot", "v", "4")
+    await asyncio.sleep(0.06)
+    assert await store.load("hot") == {"v": "4"}
+
+    stats = store.stats()
+    assert (stats.cache_hits, stats.cache_misses, stats.cached) == (1, 3, 1)
+
+
+@pytest.mark.asyncio
+async def test_clients_share_one_pool_per_url() -> None:
+    url = "redis://:p%40ss@localhost:6379/0"
+
+    assert get_async_pool(url) is get_async_pool(url)
+    assert get_async_pool(url).connection_kwargs["password"] == "p@ss"  # noqa: S105
+    await dispose_pools()
+    assert get_async_pool(url) is not None
+    await dispose_pools()
+
+
+def test_redis_config_reuses_its_clients() -> None:
+    config = RedisConfig(redis_host="localhost", redis_password="p@ss")  # noqa: S106
+
+    assert config.redis_instance is config.redis_instance
+    assert config.async_redis_instance is config.async_redis_instance
+    assert config.redis_instance.connection_pool.connection_kwargs["password"] == "p@ss"  # noqa: S105
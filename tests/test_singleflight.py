@@ -0,0 +1,166 @@
+import asyncio
+
+import orjson
+import pytest
+from aiohttp import web
+from src.sdk.llm import LLMServices
+from aiohttp.test_utils import TestServer
+from src.sdk.singleflight import SingleFlight
+
+CHUNK_DELAY = 0.05
+
+
+def make_chunk(content: str) -> dict:
+    return {
+        "id": "chatcmpl-1",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": "gpt-4o",
+        "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}],
+    }
+
+
+@pytest.fixture
+async def fake_openai(monkeypatch: pytest.MonkeyPatch):
+    requests: list[dict] = []
+
+    async def completions(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        requests.append(body)
+        if not body.get("stream"):
+            await asyncio.sleep(CHUNK_DELAY)
+            return web.json_response({
+                "id": "chatcmpl-1",
+                "object": "chat.completion",
+                "created": 0,
+                "model": "gpt-4o",
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": f"answer {len(requests)}"},
+                    }
+                ],
+            })
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for word in ("one", "two", "three", "four"):
+            await asyncio.sleep(CHUNK_DELAY)
+            await response.write(b"data: " + orjson.dumps(make_chunk(word)) + b"\n\n")
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    server = TestServer(app, host="127.0.0.1")
+    await server.start_server()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.port}/v1")
+    monkeypatch.setenv("RESPONSE_CACHE_ENABLED", "false")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("PERPLEXITY_API_KEY", "pplx-test")
+    monkeypatch.setenv("DISCORD_BOT_TOKEN", "token")
+    yield requests
+    await server.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_replies_share_one_request(fake_openai: list[dict]) -> None:
+    llm = LLMServices()
+
+    replies = await asyncio.gather(*(llm.get_oai_reply(prompt="same question") for _ in range(20)))
+
+    assert len(fake_openai) == 1
+    assert {reply.choices[0].message.content for reply in replies} == {"answer 1"}
+    # A different prompt, or the same one once the first call has finished, goes upstream.
+    await asyncio.gather(
+        llm.get_oai_reply(prompt="same question"), llm.get_oai_reply(prompt="other")
+    )
+    assert len(fake_openai) == 3
+
+
+@pytest.mark.asyncio
+async def test_late_stream_joiner_gets_produced_chunks_then_live_tail(
+    fake_openai: list[dict],
+) -> None:
+    llm = LLMServices()
+
+    async def collect(delay: float) -> list[str]:
+        await asyncio.sleep(delay)
+        return [
+            chunk.choices[0].delta.content
+            async for chunk in llm.get_oai_reply_stream(prompt="tell me a story")
+        ]
+
+    # The second caller joins after about two chunks were produced.
+    first, late = await asyncio.gather(collect(0), collect(CHUNK_DELAY * 2.5))
+
+    assert first == late == ["one", "two", "three", "four"]
+    assert len(fake_openai) == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_the_call_to_the_others() -> None:
+    flights = SingleFlight()
+    started, finished = asyncio.Event(), asyncio.Event()
+
+    async def call() -> str:
+        started.set()
+        try:
+            await asyncio.sleep(0.1)
+        except asyncio.CancelledError:
+            finished.set()
+            raise
+        finished.set()
+        return "result"
+
+    leader = asyncio.create_task(flights.do("key", call))
+    follower = asyncio.create_task(flights.do("key", call))
+    await started.wait()
+    leader.cancel()
+
+    assert await follower == "result"
+    assert leader.cancelled()
+    assert flights.stats().joined == 1
+    assert flights.stats().abandoned == 0
+
+    # Once every caller is gone the upstream call itself is cancelled.
+    finished.clear()
+    only = asyncio.create_task(flights.do("key", call))
+    await asyncio.sleep(0.01)
+    only.cancel()
+    await asyncio.wait_for(finished.wait(), timeout=1)
+    assert flights.stats().abandoned == 1
+    assert flights.stats().in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_is_cancelled_when_the_last_subscriber_leaves() -> None:
+    flights = SingleFlight()
+    closed = asyncio.Event()
+
+    async def upstream():
+        try:
+            for index in range(100):
+                await asyncio.sleep(0.01)
+                yield index
+        finally:
+            closed.set()
+
+    async def take(count: int) -> list[int]:
+        items = []
+        async for item in flights.stream("key", upstream):
+            items.append(item)
+            if len(items) == count:
+                break
+        return items
+
+    # Breaking out of one subscription leaves the stream running for the other.
+    short, longer = await asyncio.gather(take(2), take(5))
+    assert short == [0, 1]
+    assert longer == [0, 1, 2, 3, 4]
+    await asyncio.wait_for(closed.wait(), timeout=1)
+    stats = flights.stats()
+    assert stats.flights == 1
+    assert stats.joined == 1
+    assert stats.abandoned == 1
+    assert stats.in_flight == 0
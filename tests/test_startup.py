@@ -0,0 +1,25 @@
+from pathlib import Path
+
+from benchmarks.bench_startup import cold_start, heavy_imports
+
+
+def test_importing_main_leaves_heavy_modules_for_later() -> None:
+    assert heavy_imports() == []
+
+
+def test_bot_is_ready_with_every_cog_after_a_cold_start(tmp_path: Path) -> None:
+    report = cold_start(eager=False, sync_file=str(tmp_path / "sync.json"))
+
+    assert report["cogs"] == 6
+    assert report["syncs"] == 1
+    assert report["imported"] < report["ready"]
+
+
+def test_reconnects_and_restarts_skip_the_command_sync(tmp_path: Path) -> None:
+    sync_file = str(tmp_path / "sync.json")
+
+    first = cold_start(eager=False, sync_file=sync_file, reconnects=2)
+    restarted = cold_start(eager=False, sync_file=sync_file)
+
+    assert first["syncs"] == 1
+    assert restarted["syncs"] == 0
@@ -0,0 +1,75 @@
+from pathlib import Path
+
+import pytest
+from src.sdk.storage import (
+    STORAGE_HEALTH,
+    SQLBackend,
+    RedisBackend,
+    StorageBackend,
+    StorageRegistry,
+)
+from src.sdk.log_message import build_message_sinks
+
+
+class BrokenBackend(StorageBackend):
+    capability = "kv"
+
+    async def ping(self) -> None:
+        raise ConnectionError("connection refused")
+
+
+@pytest.mark.asyncio
+async def test_only_selected_backends_are_built(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Building the PostgreSQL or Redis backend would fail: their settings are missing.
+    for name in ("POSTGRES_HOST", "REDIS_HOST"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("SQLITE_FILE_PATH", str(tmp_path / "bot.db"))
+    storage = StorageRegistry()
+
+    relational = storage.relational()
+    sinks = build_message_sinks(["csv", "sqlite"], storage=storage)
+
+    assert relational.dsn == f"sqlite+aiosqlite:///{tmp_path / 'bot.db'}"
+    assert storage.relational() is relational
+    assert [getattr(sink, "dsn", None) for sink in sinks] == [None, relational.dsn]
+    assert [health.name for health in await storage.health()] == ["sqlite"]
+    await storage.aclose()
+
+
+@pytest.mark.asyncio
+async def test_backends_are_picked_by_capability_and_health_checked(tmp_path: Path) -> None:
+    storage = StorageRegistry(selected={"kv": "broken", "relational": "db", "blob": "db"})
+    storage.register("broken", lambda: BrokenBackend(name="broken"))
+    storage.register("db", lambda: SQLBackend(name="db", dsn=f"sqlite+aiosqlite:///{tmp_path}/x"))
+
+    assert storage.relational().name == "db"
+    with pytest.raises(ValueError, match="offers relational, not blob"):
+        storage.blob()
+    with pytest.raises(KeyError, match="mongo"):
+        storage.backend("mongo")
+    storage.kv()
+
+    health = {result.name: result for result in await storage.health()}
+
+    assert health["db"].healthy
+    assert not health["broken"].healthy
+    assert health["broken"].error == "ConnectionError: connection refused"
+    assert STORAGE_HEALTH.values[("broken", "kv")] == 0.0
+    assert STORAGE_HEALTH.values[("db", "relational")] == 1.0
+    await storage.aclose()
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_hands_out_one_client_until_closed() -> None:
+    backend = RedisBackend(name="redis", url="redis://localhost:6379/0")
+    client = backend.client
+
+    assert backend.client is client
+    assert backend.store().redis is client
+    await backend.aclose()
+    assert backend.client is not client
+    await backend.aclose()
+    with pytest.raises(TypeError, match="abstract"):
+        StorageBackend(name="base")
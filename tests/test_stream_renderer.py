@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+from src.sdk.stream_renderer import StreamRenderer, split_markdown
+
+
+class FakeMessage:
+    def __init__(self, content: str = "") -> None:
+        self.content = content
+        self.edits = 0
+
+    async def edit(self, content: str) -> None:
+        await asyncio.sleep(0)
+        self.content = content
+        self.edits += 1
+
+
+def test_split_markdown_reopens_code_fence() -> None:
+    text = "intro\n```python\n" + "print('hello')\n" * 20
+    head, tail = split_markdown(text, limit=100)
+    assert len(head) <= 100
+    assert head.endswith("\n```")
+    assert tail.startswith("```python\n")
+    assert head.count("```") == 2
+
+
+def test_split_markdown_prefers_paragraphs() -> None:
+    text = "a" * 60 + "\n\n" + "b" * 60
+    head, tail = split_markdown(text, limit=100)
+    assert head == "a" * 60
+    assert tail == "b" * 60
+
+
+@pytest.mark.asyncio
+async def test_renderer_coalesces_and_rolls_over() -> None:
+    first = FakeMessage("生成中...")
+    sent: list[FakeMessage] = []
+
+    async def send(content: str) -> FakeMessage:
+        message = FakeMessage(content)
+        sent.append(message)
+        return message
+
+    renderer = StreamRenderer(
+        message=first, send=send, content="@wei\n", limit=200, min_interval=0.05
+    )
+    tokens = [f"token{index} " for index in range(100)]
+    for token in tokens:
+        renderer.feed(token)
+        await asyncio.sleep(0.001)
+    await renderer.finish()
+
+    messages = [first, *sent]
+    assert all(len(message.content) <= 200 for message in messages)
+    rendered = " ".join(message.content for message in messages).split()
+    assert rendered == ["@wei", *[token.strip() for token in tokens]]
+    stats = renderer.stats()
+    assert stats.messages == len(messages)
+    assert stats.edits < len(tokens) / 2
+
+
+@pytest.mark.asyncio
+async def test_renderer_final_edit_without_tokens() -> None:
+    message = FakeMessage("生成中...")
+    renderer = StreamRenderer(message=message, send=FakeMessage, content="@wei\n")
+    await renderer.finish(content="@wei error")
+    assert message.content == "@wei error"
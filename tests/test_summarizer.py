@@ -0,0 +1,134 @@
+import io
+from types import SimpleNamespace
+import base64
+import asyncio
+
+from PIL import Image
+import pytest
+from aiohttp import web
+from src.sdk.llm import LLMServices
+from src.sdk.tokens import token_budget
+from src.cogs.summary import SummarizeMenuView
+from aiohttp.test_utils import TestServer
+from src.sdk.dispatcher import QueueFull
+from src.sdk.summarizer import CHUNK_PROMPT, ChatLine, SummaryProgress, MapReduceSummarizer
+from benchmarks.fake_discord import FakeUser, FakeInteraction, make_channel
+
+
+def make_image() -> str:
+    buffer = io.BytesIO()
+    Image.new("RGB", (1, 1)).save(buffer, format="PNG")
+    return f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
+
+
+@pytest.fixture
+async def fake_openai(monkeypatch: pytest.MonkeyPatch):
+    state = {"in_flight": 0, "peak": 0, "prompts": []}
+
+    async def completions(request: web.Request) -> web.Response:
+        body = await request.json()
+        system, user = body["messages"]
+        text = user["content"][0]["text"]
+        state["prompts"].append((system["content"], text, len(user["content"]) - 1))
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        await asyncio.sleep(0.01)
+        state["in_flight"] -= 1
+        return web.json_response({
+            "id": "chatcmpl-1",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-4o",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": f"summary of {len(text)} chars"},
+                }
+            ],
+        })
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    server = TestServer(app, host="127.0.0.1")
+    await server.start_server()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.port}/v1")
+    monkeypatch.setenv("RESPONSE_CACHE_ENABLED", "false")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("PERPLEXITY_API_KEY", "pplx-test")
+    monkeypatch.setenv("DISCORD_BOT_TOKEN", "token")
+    yield state
+    await server.close()
+
+
+@pytest.mark.asyncio
+async def test_split_keeps_order_within_budget(fake_openai: dict) -> None:
+    llm = LLMServices()
+    summarizer = MapReduceSummarizer(map_llm=llm, reduce_llm=llm, chunk_tokens=100)
+    lines = [ChatLine(f"user-{index % 3}: message number {index}", []) for index in range(200)]
+    chunks = summarizer.split(lines)
+
+    assert len(chunks) > 1
+    assert [line for chunk in chunks for line in chunk] == lines
+    assert all(
+        sum(token_budget.count(line.text, llm.llm_model) for line in chunk) <= 100
+        for chunk in chunks
+    )
+
+
+@pytest.mark.asyncio
+async def test_map_reduce_respects_concurrency_and_merges(fake_openai: dict) -> None:
+    reduce_llm = LLMServices(system_prompt="final")
+    summarizer = MapReduceSummarizer(
+        map_llm=LLMServices(system_prompt=CHUNK_PROMPT),
+        reduce_llm=reduce_llm,
+        chunk_tokens=200,
+        reduce_tokens=20,
+        max_concurrency=3,
+    )
+    image = make_image()
+    lines = [
+        ChatLine(f"user-{index % 4}: message number {index}", [image] if index % 10 == 0 else [])
+        for index in range(300)
+    ]
+    chunks = summarizer.split(lines)
+    progress: list[SummaryProgress] = []
+
+    summary = await summarizer.summarize(chunks, 300, on_progress=progress.append)
+
+    assert summary.startswith("summary of")
+    assert fake_openai["peak"] == 3
+    map_calls = [prompt for prompt in fake_openai["prompts"] if "段聊天紀錄" in prompt[1]]
+    assert len(map_calls) == len(chunks)
+    # Every chunk carries the attachments posted in it; calls finish in any order.
+    assert sorted(images for _, _, images in map_calls) == sorted(
+        min(sum(len(line.attachments) for line in chunk), summarizer.max_images_per_chunk)
+        for chunk in chunks
+    )
+    # The partial summaries did not fit `reduce_tokens`, so a merge level ran first.
+    assert any(item.stage == "reduce" and item.total > 1 for item in progress)
+    assert [item.done for item in progress if item.stage == "map"] == list(
+        range(1, len(chunks) + 1)
+    )
+    assert fake_openai["prompts"][-1][0] == "final"
+    assert progress[-1] == SummaryProgress(stage="reduce", done=1, total=1)
+
+
+@pytest.mark.asyncio
+async def test_failed_summary_is_reported_and_closes_the_menu() -> None:
+    class BusyFetcher:
+        def format_progress(self, progress: SummaryProgress) -> str:
+            return ""
+
+        async def do_summarize(self, *args: object, **kwargs: object) -> str:
+            raise QueueFull("openai:gpt-4o", retry_after=5)
+
+    bot = SimpleNamespace(get_cog=lambda name: BusyFetcher())
+    interaction = FakeInteraction("sum", FakeUser(1), make_channel(1, 0), api_latency=0)
+    view = SummarizeMenuView(bot, interaction)
+    await view.submit.callback(interaction)
+
+    assert (
+        interaction.messages[-1].content == "總結訊息時發生錯誤: 目前請求過多，請約 5 秒後再試。"
+    )
+    assert view.is_finished()
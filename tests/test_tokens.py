@@ -0,0 +1,72 @@
+import base64
+from pathlib import Path
+
+import pytest
+from openai.types import CompletionUsage
+from src.sdk.tokens import TokenBudget, estimate_tokens
+
+
+def test_estimate_tells_cjk_from_english() -> None:
+    english = "The quick brown fox jumps over the lazy dog."
+    chinese = "既然從地球發射火箭那麼困難\uff0c為何我們不直接在太空中建造火箭呢\uff1f"
+
+    assert estimate_tokens("") == 0
+    assert 9 <= estimate_tokens(english) <= 13
+    assert len(chinese) * 0.8 <= estimate_tokens(chinese) <= len(chinese) * 1.2
+    assert estimate_tokens(english + chinese) == pytest.approx(
+        estimate_tokens(english) + estimate_tokens(chinese), abs=2
+    )
+
+
+def test_trim_keeps_head_or_tail_within_budget() -> None:
+    budget = TokenBudget()
+    text = "\n".join(f"user-{index}: 第 {index} 則訊息的內容" for index in range(500))
+
+    head = budget.trim(text, 200)
+    tail = budget.trim(text, 200, keep="tail")
+
+    assert budget.count(head) <= 200
+    assert budget.count(tail) <= 200
+    assert head.startswith("user-0:")
+    assert tail.endswith("user-499: 第 499 則訊息的內容")
+    assert budget.trim("short", 200) == "short"
+    assert budget.stats().trimmed == 2
+
+
+def test_record_calibrates_text_only_prompts() -> None:
+    budget = TokenBudget(calibration_weight=0.5)
+    messages = [{"role": "user", "content": "hello world " * 100}]
+    estimated = budget.count_messages(messages, "gpt-4o")
+
+    for _ in range(10):
+        usage = CompletionUsage(
+            prompt_tokens=estimated * 2 // 3, completion_tokens=10, total_tokens=0
+        )
+        budget.record("gpt-4o", messages, usage)
+
+    assert budget.count_messages(messages, "gpt-4o") == pytest.approx(estimated * 2 / 3, rel=0.05)
+    # Image prompts are billed by tiles, so they never move the text calibration.
+    calibration = budget.stats().calibration["gpt-4o"]
+    image_message = {
+        "role": "user",
+        "content": [{"type": "image_url", "image_url": {"url": "https://example.com/a.png"}}],
+    }
+    budget.record("gpt-4o", [image_message], usage)
+    stats = budget.stats()
+    assert stats.calibration["gpt-4o"] == calibration
+    assert stats.calls == 11
+    assert stats.completion_tokens == 110
+
+
+def test_tokenizer_file_counts_exactly(tmp_path: Path) -> None:
+    pytest.importorskip("tiktoken")
+    # A byte-level vocabulary without merges: every UTF-8 byte is one token.
+    vocabulary = tmp_path / "bytes.tiktoken"
+    vocabulary.write_text(
+        "\n".join(f"{base64.b64encode(bytes([rank])).decode()} {rank}" for rank in range(256))
+    )
+    budget = TokenBudget(tokenizer_file=str(vocabulary))
+
+    assert budget.count("hello") == 5
+    assert budget.count("中文") == 6
+    assert budget.stats().tokenizer == "tiktoken"